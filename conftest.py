@@ -0,0 +1,47 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import os
+
+import pytest
+
+##  Benchmarks are marked with pytest.mark.benchmark. They take long, so they
+#   only run when CURA_BENCHMARKS is set.
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: a benchmark, which only runs when CURA_BENCHMARKS is set.")
+
+def pytest_collection_modifyitems(config, items):
+    if os.environ.get("CURA_BENCHMARKS"):
+        return
+    skip_benchmark = pytest.mark.skip(reason = "Set CURA_BENCHMARKS to run the benchmarks.")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip_benchmark)
+
+##  Reports a result of a benchmark, as one line of text.
+#
+#   The results are shown after the tests and stored as properties of the
+#   test in the JUnit XML report.
+@pytest.fixture
+def benchmark_report(request):
+    def report(line):
+        request.node.user_properties.append(("benchmark", line))
+    return report
+
+def pytest_terminal_summary(terminalreporter):
+    results = []
+    for reports in terminalreporter.stats.values():
+        for report in reports:
+            if getattr(report, "when", None) != "call":
+                continue
+            lines = [value for name, value in getattr(report, "user_properties", []) if name == "benchmark"]
+            if lines:
+                results.append((report.nodeid, lines))
+    if not results:
+        return
+
+    terminalreporter.section("benchmarks")
+    for node_id, lines in results:
+        terminalreporter.write_line(node_id)
+        for line in lines:
+            terminalreporter.write_line("    " + line)
@@ -34,6 +34,7 @@ class Arrange:
         self._offset_y = offset_y
         self._last_priority = 0
         self._is_empty = True
+        self._occupied_fft = None  # Fourier transform of _occupied, until something is placed
 
     ##  Helper to create an Arranger instance
     #
@@ -160,8 +161,66 @@ class Arrange:
             offset_x:offset_x + shape_arr.arr.shape[1]]
         return numpy.sum(prio_slice[numpy.where(shape_arr.arr == 1)])
 
+    ##  Find out where the shape array can be put, for all positions at once.
+    #
+    #   The number of occupied cells under the shape is computed for every
+    #   position with a single correlation of _occupied with the shape (using
+    #   FFTs), instead of slicing _occupied for every position like checkShape
+    #   does.
+    #   \param shape_arr ShapeArray object
+    #   \return Boolean array like _occupied, True where the top left corner of
+    #   shape_arr.arr can be put without covering an occupied cell or going out
+    #   of bounds. This gives the same result as checkShape.
+    def _freePositions(self, shape_arr):
+        grid_height, grid_width = self._occupied.shape
+        mask = shape_arr.arr == 1
+        rows = numpy.where(mask.any(axis = 1))[0]
+        columns = numpy.where(mask.any(axis = 0))[0]
+        if len(rows) == 0:  # Empty shape, fits everywhere.
+            return numpy.ones(self._occupied.shape, dtype = numpy.bool_)
+        free = numpy.zeros(self._occupied.shape, dtype = numpy.bool_)
+
+        # Only the cells that are covered by the shape matter, the rest of the
+        # shape array may be out of bounds (like it may in checkShape).
+        mask = mask[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1]
+        mask_height, mask_width = mask.shape
+        if mask_height > grid_height or mask_width > grid_width:
+            return free
+
+        if self._occupied_fft is None:
+            self._occupied_fft = numpy.fft.rfft2((self._occupied != 0).astype(numpy.float64))
+        mask_fft = numpy.fft.rfft2(mask.astype(numpy.float64), s = self._occupied.shape)
+        # Wraps around at the edges, but those positions are out of bounds anyway.
+        overlap = numpy.fft.irfft2(self._occupied_fft * numpy.conj(mask_fft), s = self._occupied.shape)
+
+        # The top left corner of the shape array itself has to be in the grid,
+        # because checkShape slices from there.
+        free_height = grid_height - mask_height + 1 - rows[0]
+        free_width = grid_width - mask_width + 1 - columns[0]
+        if free_height > 0 and free_width > 0:
+            free[:free_height, :free_width] = overlap[rows[0]:rows[0] + free_height, columns[0]:columns[0] + free_width] < 0.5
+        return free
+
+    ##  Find out for every cell whether checkShape would succeed there.
+    #   \param shape_arr ShapeArray object
+    #   \return Boolean array like _priority, True for the free cells.
+    def _freeCells(self, shape_arr):
+        # Where the shape array ends up for every cell, like in checkShape.
+        grid_height, grid_width = self._priority.shape
+        cell_y, cell_x = numpy.indices(self._priority.shape)
+        offset_x = (self._scale * (cell_x - self._offset_x)).astype(numpy.int64) + self._offset_x + shape_arr.offset_x
+        offset_y = (self._scale * (cell_y - self._offset_y)).astype(numpy.int64) + self._offset_y + shape_arr.offset_y
+        in_bounds = (offset_x >= 0) & (offset_x < grid_width) & (offset_y >= 0) & (offset_y < grid_height)
+
+        free = in_bounds
+        free[in_bounds] = self._freePositions(shape_arr)[offset_y[in_bounds], offset_x[in_bounds]]
+        return free
+
     ##  Find "best" spot for ShapeArray
     #   Return namedtuple with properties x, y, penalty_points, priority
+    #
+    #   The spot is the first cell in the priority order (and then row by row)
+    #   where checkShape would succeed, but all cells are checked at once.
     #   \param shape_arr ShapeArray
     #   \param start_prio Start with this priority value (and skip the ones before)
     #   \param step Slicing value, higher = more skips = faster but less accurate
@@ -171,19 +230,67 @@ class Arrange:
             start_idx = start_idx_list[0][0]
         else:
             start_idx = 0
-        for priority in self._priority_unique_values[start_idx::step]:
-            tryout_idx = numpy.where(self._priority == priority)
-            for idx in range(len(tryout_idx[0])):
-                y = tryout_idx[0][idx]
-                x = tryout_idx[1][idx]
-                projected_x = x - self._offset_x
-                projected_y = y - self._offset_y
-
-                # array to "world" coordinates
-                penalty_points = self.checkShape(projected_x, projected_y, shape_arr)
-                if penalty_points is not None:
-                    return LocationSuggestion(x = projected_x, y = projected_y, penalty_points = penalty_points, priority = priority)
-        return LocationSuggestion(x = None, y = None, penalty_points = None, priority = priority)  # No suitable location found :-(
+        priorities = self._priority_unique_values[start_idx::step]
+        if len(priorities) == 0:
+            return LocationSuggestion(x = None, y = None, penalty_points = None, priority = None)
+
+        candidates = numpy.isin(self._priority, priorities) & self._freeCells(shape_arr)
+
+        # The first candidate with the lowest priority.
+        best_idx = numpy.argmin(numpy.where(candidates, self._priority, numpy.iinfo(self._priority.dtype).max))
+        if not candidates.flat[best_idx]:
+            return LocationSuggestion(x = None, y = None, penalty_points = None, priority = priorities[-1])  # No suitable location found :-(
+        y, x = divmod(int(best_idx), self._priority.shape[1])
+        projected_x = x - self._offset_x
+        projected_y = y - self._offset_y
+        penalty_points = self.checkShape(projected_x, projected_y, shape_arr)
+        return LocationSuggestion(x = projected_x, y = projected_y, penalty_points = penalty_points, priority = self._priority[y, x])
+
+    ##  Find spots for a number of copies of the same object at once, on a
+    #   lattice.
+    #
+    #   The lattice starts at the best free spot and its spacing is just enough
+    #   to keep the offset shape of a copy away from the hulls of its
+    #   neighbours, so the copies only have to be checked against what was on
+    #   the build plate already. The lattice points with the lowest priority
+    #   are taken. Nothing is placed yet.
+    #   \param offset_shape_arr ShapeArray with offset, used to find locations
+    #   \param hull_shape_arr ShapeArray without offset, that will be placed
+    #   \param count The number of copies.
+    #   \return List of (x, y) for at most count copies, best first.
+    def latticeSpots(self, offset_shape_arr, hull_shape_arr, count):
+        free = self._freeCells(offset_shape_arr)
+        if count <= 0 or not free.any():
+            return []
+        priority = numpy.where(free, self._priority, numpy.iinfo(self._priority.dtype).max)
+        anchor_y, anchor_x = divmod(int(numpy.argmin(priority)), self._priority.shape[1])
+
+        # Distance between the copies, in cells.
+        pitch_y, pitch_x = (int(numpy.ceil(pitch / self._scale)) for pitch in self._latticePitch(offset_shape_arr, hull_shape_arr))
+        rows = numpy.arange(anchor_y % pitch_y, self._priority.shape[0], pitch_y)
+        columns = numpy.arange(anchor_x % pitch_x, self._priority.shape[1], pitch_x)
+        lattice_y, lattice_x = numpy.meshgrid(rows, columns, indexing = "ij")
+        lattice_free = free[lattice_y, lattice_x]
+        lattice_y = lattice_y[lattice_free]
+        lattice_x = lattice_x[lattice_free]
+
+        best = numpy.argsort(self._priority[lattice_y, lattice_x], kind = "mergesort")[:count]  # Stable, so row by row for the same priority.
+        return [(int(x) - self._offset_x, int(y) - self._offset_y) for y, x in zip(lattice_y[best], lattice_x[best])]
+
+    ##  The smallest distance between copies of a shape in both directions, so
+    #   that the offset shape of one copy doesn't cover the hull of another.
+    #   \return (rows, columns) in shape array cells.
+    @staticmethod
+    def _latticePitch(offset_shape_arr, hull_shape_arr):
+        pitch = []
+        for axis, offset_name in ((1, "offset_y"), (0, "offset_x")):  # Rows, then columns.
+            offset_cells = numpy.where((offset_shape_arr.arr == 1).any(axis = axis))[0] + getattr(offset_shape_arr, offset_name)
+            hull_cells = numpy.where((hull_shape_arr.arr == 1).any(axis = axis))[0] + getattr(hull_shape_arr, offset_name)
+            if len(offset_cells) == 0 or len(hull_cells) == 0:
+                pitch.append(1)
+                continue
+            pitch.append(max(hull_cells[-1] - offset_cells[0], offset_cells[-1] - hull_cells[0]) + 1)
+        return tuple(pitch)
 
     ##  Place the object.
     #   Marks the locations in self._occupied and self._priority
@@ -209,6 +316,7 @@ class Arrange:
         if update_empty and new_occupied:
             self._is_empty = False
         occupied_slice[new_occupied] = 1
+        self._occupied_fft = None
 
         # Set priority to low (= high number), so it won't get picked at trying out.
         prio_slice = self._priority[min_y:max_y, min_x:max_x]
@@ -0,0 +1,117 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+from UM.Logger import Logger
+
+from collections import namedtuple, OrderedDict
+
+import numpy
+import time
+
+
+##  Return object for BatchPacker.pack, where to put one object.
+#   x and y are None if the object could not be placed.
+Placement = namedtuple("Placement", ["x", "y", "build_plate"])
+
+##  Return object for BatchPacker.getReport
+#   density is the part of the used build plates that is covered by the
+#   placed objects, between 0 and 1.
+PackingReport = namedtuple("PackingReport", ["placed", "total", "build_plates", "density", "time"])
+
+
+##  Places many objects at once, on one or more build plates.
+#
+#   Objects with the same footprint (ShapeArray.fromNode gives them the same
+#   shape arrays) are placed together, on a lattice where possible, so that
+#   multiplying an object doesn't need a search for every copy. The objects
+#   are placed biggest first, each on the first build plate where it fits
+#   (first fit decreasing), and new build plates are added when they don't
+#   fit on any.
+class BatchPacker:
+    ##  \param arranger Arrange of the first build plate.
+    #   \param create_arranger Function that returns an Arrange for a new,
+    #   empty build plate, or None to only use the first build plate.
+    def __init__(self, arranger, create_arranger = None):
+        self._arrangers = [arranger]
+        self._create_arranger = create_arranger
+        self._placed_area = [0]
+        self._placed = 0
+        self._total = 0
+        self._time = 0.0
+
+    ##  The Arrange of each build plate that is used.
+    def getArrangers(self):
+        return self._arrangers
+
+    ##  Find a place for a number of objects and place them in the arrangers.
+    #   \param footprints List of (offset_shape_arr, hull_shape_arr) tuples, as
+    #   given by ShapeArray.fromNode.
+    #   \return List of Placement, in the order of the footprints.
+    def pack(self, footprints):
+        start_time = time.time()
+        placements = [Placement(x = None, y = None, build_plate = None)] * len(footprints)
+
+        groups = OrderedDict()  # Indices of the footprints, by footprint.
+        for index, (offset_shape_arr, hull_shape_arr) in enumerate(footprints):
+            if offset_shape_arr is None or hull_shape_arr is None:  # Too small to have a convex hull.
+                continue
+            groups.setdefault((id(offset_shape_arr), id(hull_shape_arr)), []).append(index)
+
+        # Biggest first.
+        ordered_groups = sorted(groups.values(), key = lambda indices: -self._area(footprints[indices[0]][1]))
+        for indices in ordered_groups:
+            offset_shape_arr, hull_shape_arr = footprints[indices[0]]
+            build_plate = 0
+            while indices:
+                if build_plate == len(self._arrangers):
+                    if self._create_arranger is None:
+                        break
+                    self._arrangers.append(self._create_arranger())
+                    self._placed_area.append(0)
+                arranger = self._arrangers[build_plate]
+
+                spots = self._packCopies(arranger, offset_shape_arr, hull_shape_arr, len(indices))
+                for index, (x, y) in zip(indices, spots):
+                    placements[index] = Placement(x = x, y = y, build_plate = build_plate)
+                self._placed_area[build_plate] += len(spots) * self._area(hull_shape_arr)
+                indices = indices[len(spots):]
+
+                if indices and not spots and arranger.isEmpty:  # Doesn't even fit on an empty build plate.
+                    break
+                build_plate += 1
+
+        self._placed += sum(1 for placement in placements if placement.x is not None)
+        self._total += len(footprints)
+        self._time += time.time() - start_time
+        report = self.getReport()
+        Logger.log("i", "Packed %s of %s objects on %s build plate(s) in %.2f s, packing density %.1f%%",
+                   report.placed, report.total, report.build_plates, report.time, report.density * 100)
+        return placements
+
+    ##  How well the objects are packed so far.
+    def getReport(self):
+        used_build_plates = [index for index, area in enumerate(self._placed_area) if area > 0]
+        total_area = sum(self._arrangers[index].shape[0] * self._arrangers[index].shape[1] for index in used_build_plates)
+        density = sum(self._placed_area) / total_area if total_area > 0 else 0.0
+        return PackingReport(placed = self._placed, total = self._total, build_plates = len(used_build_plates), density = density, time = self._time)
+
+    ##  Place as many copies of an object on a build plate as fit, up to count.
+    #   \return List of (x, y) of the placed copies.
+    def _packCopies(self, arranger, offset_shape_arr, hull_shape_arr, count):
+        spots = arranger.latticeSpots(offset_shape_arr, hull_shape_arr, count)
+        for x, y in spots:
+            arranger.place(x, y, hull_shape_arr)
+
+        # Fill the gaps around the lattice, for instance near the edges.
+        while spots and len(spots) < count:
+            best_spot = arranger.bestSpot(offset_shape_arr)
+            if best_spot.x is None:
+                break
+            arranger.place(best_spot.x, best_spot.y, hull_shape_arr)
+            spots.append((best_spot.x, best_spot.y))
+        return spots
+
+    ##  The number of cells that a shape array covers.
+    @staticmethod
+    def _area(shape_arr):
+        return int(numpy.count_nonzero(shape_arr.arr == 1))
@@ -1,5 +1,6 @@
 import numpy
 import copy
+from collections import OrderedDict
 
 from UM.Math.Polygon import Polygon
 from UM.Preferences import Preferences
@@ -7,6 +8,12 @@ from UM.Preferences import Preferences
 
 ##  Polygon representation as an array for use with Arrange
 class ShapeArray:
+    ##  Maximum number of footprints that fromNode keeps.
+    MaxCachedFootprints = 256
+
+    # Offset and hull ShapeArrays made by fromNode, least recently used first.
+    __footprint_cache = OrderedDict()
+
     def __init__(self, arr, offset_x, offset_y, scale = 1):
         self.arr = arr
         self.offset_x = offset_x
@@ -63,36 +70,76 @@ class ShapeArray:
                 # For one_at_a_time printing you need the convex hull head.
             polygon = node.callDecoration("getConvexHullHead") or hull_verts
 
+        hull_points = copy.deepcopy(polygon._points)
+        hull_points[:, 0] = numpy.add(hull_points[:, 0], -transform_x)
+        hull_points[:, 1] = numpy.add(hull_points[:, 1], -transform_y)
+
+        # Nodes with the same footprint, like the copies of a multiplied object, or a node that is arranged again
+        # without being rotated or scaled, get the same arrays.
+        cache_key = (numpy.round(hull_points, 3).tobytes(), hull_points.shape, min_offset, scale)
+        if cache_key in cls.__footprint_cache:
+            cls.__footprint_cache.move_to_end(cache_key)
+            return cls.__footprint_cache[cache_key]
+
         offset_verts = polygon.getMinkowskiHull(Polygon.approximatedCircle(min_offset))
         offset_points = copy.deepcopy(offset_verts._points)  # x, y
         offset_points[:, 0] = numpy.add(offset_points[:, 0], -transform_x)
         offset_points[:, 1] = numpy.add(offset_points[:, 1], -transform_y)
         offset_shape_arr = ShapeArray.fromPolygon(offset_points, scale=scale)
 
-        hull_points = copy.deepcopy(polygon._points)
-        hull_points[:, 0] = numpy.add(hull_points[:, 0], -transform_x)
-        hull_points[:, 1] = numpy.add(hull_points[:, 1], -transform_y)
         hull_shape_arr = ShapeArray.fromPolygon(hull_points, scale=scale)
 
+        cls.__footprint_cache[cache_key] = (offset_shape_arr, hull_shape_arr)
+        if len(cls.__footprint_cache) > cls.MaxCachedFootprints:
+            cls.__footprint_cache.popitem(last = False)
         return offset_shape_arr, hull_shape_arr
 
+    ##  Forget the footprints that fromNode made.
+    @classmethod
+    def clearFootprintCache(cls):
+        cls.__footprint_cache.clear()
+
     ##  Create np.array with dimensions defined by shape
     #   Fills polygon defined by vertices with ones, all other values zero
     #   Only works correctly for convex hull vertices
-    #   Originally from: http://stackoverflow.com/questions/37117878/generating-a-filled-polygon-inside-a-numpy-array
+    #
+    #   Every edge limits the columns that are filled in each row, on one
+    #   side, like _check does. So instead of checking every cell against every
+    #   edge, the first and last filled column of each row are computed for all
+    #   edges at once, and the rows are filled between those.
     #   \param shape  numpy format shape, [x-size, y-size]
     #   \param vertices
     @classmethod
     def arrayFromPolygon(cls, shape, vertices):
         base_array = numpy.zeros(shape, dtype=float)  # Initialize your array of zeros
-
-        fill = numpy.ones(base_array.shape) * True  # Initialize boolean array defining shape fill
-
-        # Create check array for each edge segment, combine into fill array
-        for k in range(vertices.shape[0]):
-            fill = numpy.all([fill, cls._check(vertices[k - 1], vertices[k], base_array)], axis=0)
+        rows, columns = base_array.shape
+
+        p1 = vertices[numpy.arange(len(vertices)) - 1].astype(float)  # Edge k goes from vertex k - 1 to vertex k.
+        p2 = vertices.astype(float)
+        equal_rows = p1[:, 0] == p2[:, 0]
+        equal_columns = p1[:, 1] == p2[:, 1]
+
+        # Edges along a row or column only leave out column 0, like _check does. Edges of length 0 are skipped.
+        first_column = numpy.full(rows, 1 if numpy.any(numpy.logical_xor(equal_rows, equal_columns)) else 0, dtype = float)
+        last_column = numpy.full(rows, columns - 1, dtype = float)
+
+        # The column of every other edge in each row, interpolated like in _check so the result is exactly the same.
+        sloped = numpy.logical_not(numpy.logical_or(equal_rows, equal_columns))
+        p1 = p1[sloped]
+        p2 = p2[sloped]
+        row_indices = numpy.arange(rows, dtype = float)
+        edge_columns = (row_indices[numpy.newaxis, :] - p1[:, 0:1]) / (p2[:, 0:1] - p1[:, 0:1]) * (p2[:, 1:2] - p1[:, 1:2]) + p1[:, 1:2]
+
+        # Edges going down limit the last column, edges going up the first.
+        down = p2[:, 0] > p1[:, 0]
+        if numpy.any(down):
+            last_column = numpy.minimum(last_column, numpy.floor(edge_columns[down].min(axis = 0)))
+        if numpy.any(numpy.logical_not(down)):
+            first_column = numpy.maximum(first_column, numpy.ceil(edge_columns[numpy.logical_not(down)].max(axis = 0)))
 
         # Set all values inside polygon to one
+        column_indices = numpy.arange(columns)
+        fill = numpy.logical_and(column_indices[numpy.newaxis, :] >= first_column[:, numpy.newaxis], column_indices[numpy.newaxis, :] <= last_column[:, numpy.newaxis])
         base_array[fill] = 1
 
         return base_array
@@ -2,8 +2,9 @@ from PyQt5.QtCore import QObject, pyqtSlot, pyqtProperty, pyqtSignal
 
 from UM.Message import Message
 
+from .DataApiService import DataApiService
 from .SessionManager import SessionManager
-from .http_helper import get, post
+from .http_helper import get, post, run_async
 
 
 class AuthApiService(QObject):
@@ -21,11 +22,8 @@ class AuthApiService(QObject):
         self._session_manager.initialize()
 
         if self._session_manager.getAccessToken():
-            if self.isValidtoken():
-                current_user = self.getCurrentUser()
-                self._email = current_user["email"]
-                self._is_logged_in = True
-                self.authStateChanged.emit(True)
+            # Check the stored session in the background, to not wait for the network on start up.
+            run_async(self._restoreSession, self._onSessionRestored)
 
     @pyqtProperty(str, notify=authStateChanged)
     def email(self):
@@ -43,6 +41,21 @@ class AuthApiService(QObject):
         else:
             return {}
 
+    ##  Check the stored session.
+    #   \return The current user, or None if the session is not valid anymore.
+    def _restoreSession(self):
+        if self.isValidtoken():
+            current_user = self.getCurrentUser()
+            if "email" in current_user:
+                return current_user
+        return None
+
+    def _onSessionRestored(self, current_user):
+        if current_user is not None:
+            self._email = current_user["email"]
+            self._is_logged_in = True
+            self.authStateChanged.emit(True)
+
     def isValidtoken(self):
         headers = {"Authorization": "Bearer {}".format(self._session_manager.getAccessToken())}
         response = post(self.api_url + "/check_token", {}, headers)
@@ -68,6 +81,7 @@ class AuthApiService(QObject):
             response_message = response.json()
             self._session_manager.setAccessToken(response_message["accessToken"])
             self._session_manager.setRefreshToken(response_message["refreshToken"])
+            DataApiService.getInstance().clearCache()
             self._is_logged_in = True
             self.authStateChanged.emit(True)
             message = Message("Go to Add Printer to see your printers registered to the cloud", title="Sign In successfully")
@@ -83,6 +97,7 @@ class AuthApiService(QObject):
         response = post(self.api_url + "/sign_out", {}, headers)
         if 200 <= response.status_code < 300:
             self._session_manager.clearSession()
+            DataApiService.getInstance().clearCache()
             self._email = None
             self.authStateChanged.emit(False)
             return True
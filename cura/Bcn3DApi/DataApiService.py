@@ -1,11 +1,16 @@
 from UM.Message import Message
 
+from .MultipartStream import MultipartStream
 from .SessionManager import SessionManager
-from .http_helper import get, post
+from .TtlCache import TtlCache
+from .http_helper import get, post, post_stream, run_async
 
 
 class DataApiService:
     data_api_url = "https://api.bcn3d.com/data"
+    # Seconds that the list of printers and the state of a printer are remembered.
+    printers_ttl = 60
+    printer_ttl = 10
 
     def __init__(self):
         super().__init__()
@@ -14,43 +19,88 @@ class DataApiService:
 
         DataApiService._instance = self
         self._session_manager = SessionManager.getInstance()
+        self._printers_cache = TtlCache(self.printers_ttl)
+        self._printer_cache = TtlCache(self.printer_ttl)
 
-    def sendGcode(self, gcode_path, gcode_name, serial_number):
+    ##  Ask where to upload a g-code for a printer.
+    #   \return The URL and the form fields to post the file with, or None if
+    #   the g-code can't be sent.
+    def requestGcodeUpload(self, gcode_name, serial_number):
         headers = {"Authorization": "Bearer {}".format(self._session_manager.getAccessToken())}
-        files = {"file": (gcode_path, open(gcode_path, "rb"))}
         data = {"serialNumber": serial_number, "fileName": gcode_name}
         response = post(self.data_api_url + "/gcodes", data, headers)
         if 200 <= response.status_code < 300:
+            # The state of the printer changes when it gets the g-code.
+            self._printer_cache.invalidate(serial_number)
             response_message = response.json()
-            presigned_url = response_message["url"]
-            fields = response_message["fields"]
-            response2 = post(presigned_url, fields, files=files)
-            if 200 <= response2.status_code < 300:
-                message = Message("The gcode has been sent to the cloud successfully", title="Gcode sent")
-                message.show()
-            else:
-                message = Message("There was an error sending the gcode to the cloud", title="Gcode sent error")
-                message.show()
+            return response_message["url"], response_message["fields"]
+        else:
+            return None
+
+    ##  Upload a g-code to the URL of requestGcodeUpload.
+    #   \param body MultipartStream with the fields and the file.
+    #   \return Whether the upload succeeded.
+    def uploadGcode(self, url, body):
+        response = post_stream(url, body)
+        return 200 <= response.status_code < 300
+
+    def sendGcode(self, gcode_path, gcode_name, serial_number):
+        upload = self.requestGcodeUpload(gcode_name, serial_number)
+        success = False
+        if upload:
+            url, fields = upload
+            with open(gcode_path, "rb") as gcode_file:
+                success = self.uploadGcode(url, MultipartStream(fields, "file", gcode_path, gcode_file))
+        if success:
+            message = Message("The gcode has been sent to the cloud successfully", title="Gcode sent")
+            message.show()
         else:
             message = Message("There was an error sending the gcode to the cloud", title="Gcode sent error")
             message.show()
 
     def getPrinters(self):
+        printers = self._printers_cache.get("printers")
+        if printers is not None:
+            return printers
         headers = {"Authorization": "Bearer {}".format(self._session_manager.getAccessToken())}
         response = get(self.data_api_url + "/printers", headers=headers)
         if 200 <= response.status_code < 300:
-            return response.json()
+            printers = response.json()
+            self._printers_cache.put("printers", printers)
+            return printers
         else:
             return []
 
     def getPrinter(self, serial_number: str):
+        printer = self._printer_cache.get(serial_number)
+        if printer is not None:
+            return printer
         headers = {"Authorization": "Bearer {}".format(self._session_manager.getAccessToken())}
         response = get(self.data_api_url + "/printers/" + serial_number, headers=headers)
         if 200 <= response.status_code < 300:
-            return response.json()
+            printer = response.json()
+            self._printer_cache.put(serial_number, printer)
+            return printer
         else:
             return {}
 
+    ##  Get the printers in the background.
+    #   \param callback Function that is called with the printers on the main
+    #   thread.
+    def getPrintersAsync(self, callback):
+        return run_async(self.getPrinters, callback)
+
+    ##  Get a printer in the background.
+    #   \param callback Function that is called with the printer on the main
+    #   thread.
+    def getPrinterAsync(self, serial_number: str, callback=None):
+        return run_async(lambda: self.getPrinter(serial_number), callback)
+
+    ##  Forget the printers, for instance when another user signs in.
+    def clearCache(self):
+        self._printers_cache.invalidate()
+        self._printer_cache.invalidate()
+
     @classmethod
     def getInstance(cls):
         if not DataApiService.__instance:
@@ -0,0 +1,76 @@
+import io
+import uuid
+
+
+##  Raised while sending a MultipartStream that was cancelled.
+class UploadCancelledError(Exception):
+    pass
+
+
+##  A multipart/form-data request body that reads its file while it is sent.
+#
+#   Only the form fields are kept in memory, so uploading a large file takes
+#   no more memory than a small one. The size of the body is known up front,
+#   so it is sent with a Content-Length instead of in chunks.
+class MultipartStream:
+    ChunkSize = 64 * 1024
+
+    ##  \param fields Dict with the form fields that go before the file.
+    #   \param file_field The name of the form field of the file.
+    #   \param file_name The name of the file, as the server sees it.
+    #   \param file Binary file object to send, from its start to its end.
+    #   \param progress_callback Function that is called with the number of
+    #   bytes that were sent and the size of the body.
+    def __init__(self, fields, file_field, file_name, file, content_type="application/octet-stream", progress_callback=None):
+        self._boundary = uuid.uuid4().hex
+        self._progress_callback = progress_callback
+        self._cancelled = False
+
+        head = io.BytesIO()
+        for name, value in fields.items():
+            head.write("--{0}\r\nContent-Disposition: form-data; name=\"{1}\"\r\n\r\n{2}\r\n".format(self._boundary, name, value).encode("utf-8"))
+        head.write("--{0}\r\nContent-Disposition: form-data; name=\"{1}\"; filename=\"{2}\"\r\nContent-Type: {3}\r\n\r\n".format(self._boundary, file_field, file_name, content_type).encode("utf-8"))
+        head.seek(0)
+        tail = io.BytesIO("\r\n--{0}--\r\n".format(self._boundary).encode("utf-8"))
+
+        file.seek(0, io.SEEK_END)
+        file_size = file.tell()
+        file.seek(0)
+
+        self._parts = [head, file, tail]
+        self._length = len(head.getvalue()) + file_size + len(tail.getvalue())
+        self._bytes_read = 0
+
+    def getContentType(self):
+        return "multipart/form-data; boundary={0}".format(self._boundary)
+
+    ##  Stop sending the body. The next read raises UploadCancelledError.
+    def cancel(self):
+        self._cancelled = True
+
+    def read(self, size=-1):
+        if self._cancelled:
+            raise UploadCancelledError()
+        if size is None or size < 0:
+            size = self._length
+        data = b""
+        while self._parts and len(data) < size:
+            chunk = self._parts[0].read(size - len(data))
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            data += chunk
+        self._bytes_read += len(data)
+        if self._progress_callback and data:
+            self._progress_callback(self._bytes_read, self._length)
+        return data
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.ChunkSize)
+            if not data:
+                return
+            yield data
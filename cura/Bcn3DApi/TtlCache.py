@@ -0,0 +1,36 @@
+import threading
+import time
+
+
+##  Remembers values for a while, like the answers of the API that don't
+#   change often.
+class TtlCache:
+    ##  \param ttl The number of seconds that a value is remembered.
+    def __init__(self, ttl, clock=time.monotonic):
+        self._ttl = ttl
+        self._clock = clock
+        self._values = {}  # Key -> (time at which the value expires, value).
+        self._lock = threading.Lock()
+
+    ##  Get a value that hasn't expired yet, or default.
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= self._clock():
+                del self._values[key]
+                return default
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._values[key] = (self._clock() + self._ttl, value)
+
+    ##  Forget a value, or all values if no key is given.
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._values.clear()
+            else:
+                self._values.pop(key, None)
@@ -1,29 +1,123 @@
 import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.exceptions import NewConnectionError
+import time
 from types import SimpleNamespace
 
+from UM.Job import Job
+
+
+# Seconds to wait for a connection and for the response.
+TIMEOUT = (5, 30)
+# Number of times that a request is tried again when it fails because of the network or the server.
+RETRIES = 3
+# Seconds to wait before trying again, doubled with every try.
+RETRY_BACKOFF = 0.5
+# Responses of a server that is temporarily unavailable.
+RETRY_STATUS_CODES = (502, 503, 504)
+# Number of connections to keep open to a host.
+POOL_SIZE = 8
+
+_session = None
+
+
+##  The session that all requests go through, so that connections to the
+#   same host are kept open and reused.
+def get_session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
 
-def get(url, headers=None):
-    try:
-        response = requests.get(url, headers=headers)
-    except requests.exceptions.ConnectionError:
-        response = SimpleNamespace(status_code=-1)
-    except Exception as e:
-        response = SimpleNamespace(status_code=0)
 
-    return response
+def get(url, headers=None):
+    return _request("GET", url, headers=headers)
 
 
 def post(url, body, headers=None, files=None):
     if headers is None:
         headers = {}
-    try:
-        if not files:
-            response = requests.post(url, json=body, headers=headers, files=files)
-        else:
-            response = requests.post(url, data=body, headers=headers, files=files)
-    except requests.exceptions.ConnectionError:
-        response = SimpleNamespace(status_code=-1)
-    except Exception as e:
-        response = SimpleNamespace(status_code=0)
-
-    return response
+    if not files:
+        return _request("POST", url, json=body, headers=headers, files=files)
+    else:
+        return _request("POST", url, data=body, headers=headers, files=files)
+
+
+##  Post a MultipartStream, which is read while it is sent.
+def post_stream(url, stream, headers=None):
+    headers = dict(headers) if headers else {}
+    headers["Content-Type"] = stream.getContentType()
+    # The stream can only be read once, so it is never sent again.
+    return _request("POST", url, retries=0, data=stream, headers=headers)
+
+
+##  Run a function in the background and call back with its result on the
+#   main thread, to not block the interface while waiting for the network.
+#   \return The started job.
+def run_async(function, callback=None):
+    job = _AsyncJob(function, callback)
+    job.start()
+    return job
+
+
+def get_async(url, callback, headers=None):
+    return run_async(lambda: get(url, headers=headers), callback)
+
+
+def post_async(url, body, callback, headers=None):
+    return run_async(lambda: post(url, body, headers=headers), callback)
+
+
+##  Send a request with the shared session, trying again with an
+#   exponential backoff when the network or the server fails.
+#
+#   GET requests are tried again on connection errors, timeouts and when
+#   the server is unavailable. Other requests are only tried again when the
+#   connection couldn't be made (it timed out or was refused), so they are
+#   never handled twice.
+#   \return The response, or an object with status_code -1 if the server
+#   couldn't be reached and 0 for other errors.
+def _request(method, url, retries=None, **kwargs):
+    if retries is None:
+        retries = RETRIES
+    idempotent = method == "GET"
+    attempt = 0
+    while True:
+        try:
+            response = get_session().request(method, url, timeout=TIMEOUT, **kwargs)
+            if not (idempotent and response.status_code in RETRY_STATUS_CODES) or attempt >= retries:
+                return response
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if not (idempotent or _is_connect_error(e)) or attempt >= retries:
+                return SimpleNamespace(status_code=-1)
+        except Exception as e:
+            return SimpleNamespace(status_code=0)
+        time.sleep(RETRY_BACKOFF * 2 ** attempt)
+        attempt += 1
+
+
+##  Whether a request failed before it was sent, because the connection
+#   couldn't be made.
+def _is_connect_error(error):
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    return isinstance(getattr(reason, "reason", reason), NewConnectionError)
+
+
+class _AsyncJob(Job):
+    def __init__(self, function, callback):
+        super().__init__()
+        self._function = function
+        self._callback = callback
+        if callback is not None:
+            self.finished.connect(self._onFinished)
+
+    def run(self):
+        self.setResult(self._function())
+
+    def _onFinished(self, job):
+        self._callback(self.getResult())
@@ -2,6 +2,7 @@
 # Cura is released under the terms of the LGPLv3 or higher.
 
 from cura.PrintModeManager import PrintModeManager
+from cura.Scene.ConvexHullGrid import ConvexHullGrid
 from cura.Settings.ExtruderManager import ExtruderManager
 
 from UM.i18n import i18nCatalog
@@ -63,6 +64,10 @@ class BuildVolume(SceneNode):
 
         self._disallowed_areas = []
         self._disallowed_area_mesh = None
+        # The disallowed areas by where they are, so that nodes are only checked against the areas near them.
+        self._disallowed_area_grid = ConvexHullGrid()
+        # Whether all nodes need to be checked again, because the build volume or its disallowed areas changed.
+        self._check_all_nodes = True
 
         self._error_areas = []
         self._error_mesh = None
@@ -171,6 +176,20 @@ class BuildVolume(SceneNode):
 
     def setDisallowedAreas(self, areas: List[Polygon]):
         self._disallowed_areas = areas
+        self._indexDisallowedAreas()
+
+    ##  Put the disallowed areas in the grid, by the bounding rectangles of
+    #   their polygons.
+    def _indexDisallowedAreas(self):
+        self._disallowed_area_grid.clear()
+        for index, area in enumerate(self._disallowed_areas):
+            points = area.getPoints()
+            if len(points) == 0:
+                continue
+            minimum = points.min(axis = 0)
+            maximum = points.max(axis = 0)
+            self._disallowed_area_grid.update(index, None, (float(minimum[0]), float(minimum[1]), float(maximum[0]), float(maximum[1])))
+        self._check_all_nodes = True
 
     def render(self, renderer):
         if not self.getMeshData():
@@ -198,6 +217,8 @@ class BuildVolume(SceneNode):
 
     ##  For every sliceable node, update node._outside_buildarea
     #
+    #   Only the nodes of which the convex hull may have changed since they
+    #   were last checked are checked again, unless the build volume changed.
     def updateNodeBoundaryCheck(self):
         root = Application.getInstance().getController().getScene().getRoot()
         nodes = list(BreadthFirstIterator(root))
@@ -212,32 +233,26 @@ class BuildVolume(SceneNode):
             # In that situation there is a model, but no machine (and therefore no build volume.
             return
 
+        check_all_nodes = self._check_all_nodes
+        self._check_all_nodes = False
+
         for node in nodes:
             # Need to check group nodes later
             if node.callDecoration("isGroup"):
                 group_nodes.append(node)  # Keep list of affected group_nodes
 
             if node.callDecoration("isSliceable") or node.callDecoration("isGroup"):
-                node._outside_buildarea = False
-                bbox = node.getBoundingBox()
-
-                # Mark the node as outside the build volume if the bounding box test fails.
-                if build_volume_bounding_box.intersectsBox(bbox) != AxisAlignedBox.IntersectionResult.FullIntersection:
-                    node._outside_buildarea = True
-                    continue
-
-                convex_hull = node.callDecoration("getConvexHull")
-                if convex_hull:
-                    if not convex_hull.isValid():
-                        return
-                    # Check for collisions between disallowed areas and the object
-                    for area in self.getDisallowedAreas():
-                        overlap = convex_hull.intersectsPolygon(area)
-                        if overlap is None:
-                            continue
-                        node._outside_buildarea = True
+                # Nodes without a convex hull decorator don't know whether they changed, so they are always checked.
+                if not check_all_nodes and node.callDecoration("isConvexHullDirty") is False:
+                    # The convex hull of a group depends on its children, which come after it and aren't checked yet.
+                    if not node.callDecoration("isGroup") or all(child.callDecoration("isConvexHullDirty") is False for child in node.getAllChildren()):
                         continue
 
+                if not self._checkNodeBoundary(node, build_volume_bounding_box):
+                    self._check_all_nodes = check_all_nodes  # Check the remaining nodes next time.
+                    return
+                node.callDecoration("clearConvexHullDirty")
+
         print_mode = self._global_container_stack.getProperty("print_mode", "value")
         if print_mode != "regular":
             duplicated_nodes = PrintModeManager.getInstance().getDuplicatedNodes()
@@ -249,6 +264,34 @@ class BuildVolume(SceneNode):
             for child_node in group_node.getAllChildren():
                 child_node._outside_buildarea = group_node._outside_buildarea
 
+    ##  Update whether a node is outside the build volume.
+    #   \param node The node to check.
+    #   \param build_volume_bounding_box The bounding box of the build volume.
+    #   \return False if the convex hull of the node is not valid, so that it
+    #   can't be checked.
+    def _checkNodeBoundary(self, node, build_volume_bounding_box):
+        node._outside_buildarea = False
+        bbox = node.getBoundingBox()
+
+        # Mark the node as outside the build volume if the bounding box test fails.
+        if build_volume_bounding_box.intersectsBox(bbox) != AxisAlignedBox.IntersectionResult.FullIntersection:
+            node._outside_buildarea = True
+            return True
+
+        convex_hull = node.callDecoration("getConvexHull")
+        if convex_hull:
+            if not convex_hull.isValid():
+                return False
+            points = convex_hull.getPoints()
+            minimum = points.min(axis = 0)
+            maximum = points.max(axis = 0)
+            # Check for collisions between the disallowed areas near the object and the object
+            for index in self._disallowed_area_grid.findNodes(None, (float(minimum[0]), float(minimum[1]), float(maximum[0]), float(maximum[1]))):
+                if convex_hull.intersectsPolygon(self._disallowed_areas[index]) is not None:
+                    node._outside_buildarea = True
+                    break
+        return True
+
     ##  Recalculates the build volume & disallowed areas.
     def rebuild(self):
         if not self._width or not self._height or not self._depth:
@@ -432,6 +475,7 @@ class BuildVolume(SceneNode):
 
         Application.getInstance().getController().getScene()._maximum_bounds = scale_to_max_bounds
 
+        self._check_all_nodes = True
         self.updateNodeBoundaryCheck()
 
     def getBoundingBox(self) -> AxisAlignedBox:
@@ -681,6 +725,7 @@ class BuildVolume(SceneNode):
         self._disallowed_areas = []
         for extruder_id in result_areas:
             self._disallowed_areas.extend(result_areas[extruder_id])
+        self._indexDisallowedAreas()
 
     ##  Computes the disallowed areas for objects that are printed with print
     #   features.
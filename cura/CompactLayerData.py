@@ -0,0 +1,243 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import bisect
+
+import numpy
+
+from .Layer import Layer
+from .LayerData import LayerData
+from .LayerPolygon import LayerPolygon
+
+
+##  Layer data that is stored in a compact form, to save memory on large
+#   prints.
+#
+#   Instead of float32 arrays for everything, coordinates are stored in
+#   micrometers as integers (the height relative to the layer), line types
+#   and extruders as uint8 and line dimensions and feedrates as float16. The
+#   colors are not stored at all but looked up from the line types and
+#   extruders, and since every line goes from a vertex to the next one only
+#   the first vertex of each line is stored, relative to the first vertex of
+#   its layer. This takes less than a third of the memory of LayerData.
+#
+#   The polygons of the layers are not kept either. getLayer() creates them
+#   again from the compact arrays when they are needed. The ranges of their
+#   feedrates and thicknesses are kept, so those don't need the polygons.
+#
+#   The mesh that is rendered is created with decompress(), for only the
+#   layers that are shown. Use LayerDataBuilder with compact = True to create
+#   one of these.
+class CompactLayerData:
+    ##  \param buffers The compact arrays, see createBuffers().
+    #   \param layers The Layer objects without their polygons, by layer
+    #   number.
+    #   \param element_counts The number of elements of each layer, by layer
+    #   number.
+    #   \param layer_numbers The layers that are in the buffers, in the order
+    #   of the buffers.
+    #   \param vertex_ends The end of each of those layers in the vertex
+    #   buffers.
+    #   \param index_ends The end of each of those layers in the index buffer.
+    #   \param heights The height that the heights of each of those layers are
+    #   relative to.
+    #   \param polygon_line_counts The number of lines of each polygon of each
+    #   of those layers.
+    #   \param line_ranges The ranges of the feedrates and thicknesses of the
+    #   lines of each of those layers, see Layer.getLineRanges().
+    #   \param line_type_colors [r, g, b, a] for each line type.
+    #   \param material_color_map [r, g, b, a] for each extruder row.
+    def __init__(self, buffers, layers, element_counts, layer_numbers, vertex_ends, index_ends, heights, polygon_line_counts, line_ranges, line_type_colors, material_color_map):
+        self._buffers = buffers
+        self._layers = layers
+        self._element_counts = element_counts
+        self._layer_numbers = layer_numbers
+        self._vertex_ends = vertex_ends
+        self._index_ends = index_ends
+        self._heights = heights
+        self._polygon_line_counts = polygon_line_counts
+        self._line_ranges = line_ranges
+        self._line_type_colors = line_type_colors
+        self._material_color_map = material_color_map
+        self._last_layer = (None, None)  # The layer that was created last, as (layer number, Layer).
+
+    ##  Get a layer with its polygons.
+    #
+    #   The polygons are created from the compact arrays, so they have the
+    #   precision of those. The last layer is kept, since the same layer is
+    #   usually asked for many times in a row.
+    def getLayer(self, layer):
+        if layer not in self._layers:
+            return None
+        layer_number, result = self._last_layer
+        if layer_number != layer:
+            result = self._createLayer(layer)
+            self._last_layer = (layer, result)
+        return result
+
+    ##  The layers by layer number, without their polygons. Use getLayer() to
+    #   get a layer with its polygons.
+    def getLayers(self):
+        return self._layers
+
+    def getElementCounts(self):
+        return self._element_counts
+
+    ##  The range of the feedrates and the range of the thicknesses of the
+    #   lines of a layer, see Layer.getLineRanges().
+    #
+    #   These are kept from when the layer was compressed, so unlike
+    #   getLayer() this doesn't create the polygons of the layer.
+    def getLineRanges(self, layer):
+        position = bisect.bisect_left(self._layer_numbers, layer)
+        if position == len(self._layer_numbers) or self._layer_numbers[position] != layer:  # Not built.
+            return None
+        return self._line_ranges[position]
+
+    ##  The memory used by the mesh, in bytes.
+    def getByteSize(self):
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    ##  Create the mesh to render.
+    #
+    #   \param end_layer The last layer to include in the mesh, or None to
+    #   include all layers.
+    #   \return LayerData with the mesh of the layers up to end_layer.
+    def decompress(self, end_layer = None):
+        layer_count = len(self._layer_numbers) if end_layer is None else bisect.bisect_right(self._layer_numbers, end_layer)
+        vertex_count = self._vertex_ends[layer_count - 1] if layer_count > 0 else 0
+        index_count = self._index_ends[layer_count - 1] if layer_count > 0 else 0
+        vertex_starts = numpy.array([0] + self._vertex_ends[:layer_count], dtype = numpy.int32)
+        vertex_counts = numpy.diff(vertex_starts)
+        index_counts = numpy.diff(numpy.array([0] + self._index_ends[:layer_count], dtype = numpy.int32))
+
+        coordinates = self._buffers["coordinates"][:vertex_count]
+        vertices = numpy.empty((vertex_count, 3), numpy.float32)
+        vertices[:, 0] = coordinates[:, 0] / 1000
+        vertices[:, 1] = self._buffers["heights"][:vertex_count] / 1000 + numpy.repeat(numpy.array(self._heights[:layer_count], dtype = numpy.float32), vertex_counts)
+        vertices[:, 2] = coordinates[:, 1] / 1000
+
+        line_types = self._buffers["line_types"][:vertex_count]
+        extruders = self._buffers["extruders"][:vertex_count]
+        colors = self._line_type_colors[line_types]
+
+        # Extruders that have no color get black, like LayerDataBuilder does.
+        material_palette = numpy.zeros((256, 4), dtype = numpy.float32)
+        material_palette[:len(self._material_color_map)] = self._material_color_map
+        material_colors = material_palette[extruders]
+        moves = numpy.logical_or(line_types == LayerPolygon.MoveCombingType, line_types == LayerPolygon.MoveRetractionType)
+        material_colors[moves] = colors[moves]
+
+        attributes = {
+            "line_dimensions": {
+                "value": self._buffers["line_dimensions"][:vertex_count].astype(numpy.float32),
+                "opengl_name": "a_line_dim",
+                "opengl_type": "vector2f"
+                },
+            "extruders": {
+                "value": extruders.astype(numpy.float32),
+                "opengl_name": "a_extruder",
+                "opengl_type": "float"  # Strangely enough, the type has to be float while it is actually an int.
+                },
+            "colors": {
+                "value": material_colors,
+                "opengl_name": "a_material_color",
+                "opengl_type": "vector4f"
+                },
+            "line_types": {
+                "value": line_types.astype(numpy.float32),
+                "opengl_name": "a_line_type",
+                "opengl_type": "float"
+                },
+            "feedrates": {
+                "value": self._buffers["feedrates"][:vertex_count].astype(numpy.float32),
+                "opengl_name": "a_feedrate",
+                "opengl_type": "float"
+                }
+            }
+
+        indices = numpy.empty((index_count, 2), numpy.int32)
+        indices[:, 0] = self._buffers["line_starts"][:index_count]
+        indices[:, 0] += numpy.repeat(vertex_starts[:-1], index_counts)
+        indices[:, 1] = indices[:, 0] + 1
+
+        return LayerData(vertices = vertices, indices = indices.reshape(-1), colors = colors,
+                         layers = self._layers, element_counts = self._element_counts, attributes = attributes)
+
+    ##  Create a layer with its polygons from the compact arrays.
+    def _createLayer(self, layer_number):
+        result = Layer(layer_number)
+        layer = self._layers[layer_number]
+        result.setHeight(layer.height)
+        result.setThickness(layer.thickness)
+        position = bisect.bisect_left(self._layer_numbers, layer_number)
+        if position == len(self._layer_numbers) or self._layer_numbers[position] != layer_number:  # Not built.
+            return result
+
+        vertex_start = self._vertex_ends[position - 1] if position > 0 else 0
+        index_start = self._index_ends[position - 1] if position > 0 else 0
+        line_starts = self._buffers["line_starts"][index_start:self._index_ends[position]].astype(numpy.int32) + vertex_start
+        # The end vertex of a line always belongs to that line, the start vertex may be shared with the previous line.
+        line_ends = line_starts + 1
+        line_types = self._buffers["line_types"][line_ends].reshape((-1, 1))
+        line_dimensions = self._buffers["line_dimensions"][line_ends].astype(numpy.float32)
+        line_feedrates = self._buffers["feedrates"][line_ends].astype(numpy.float32).reshape((-1, 1))
+        extruders = self._buffers["extruders"][line_ends]
+
+        line_start = 0
+        for line_count in self._polygon_line_counts[position]:
+            line_end = line_start + line_count
+            vertices = numpy.concatenate((line_starts[line_start:line_end], line_ends[line_end - 1:line_end])) if line_count > 0 else line_starts[:0]
+            points = numpy.empty((len(vertices), 3), numpy.float32)
+            points[:, 0] = self._buffers["coordinates"][vertices, 0] / 1000
+            points[:, 1] = self._buffers["heights"][vertices] / 1000 + self._heights[position]
+            points[:, 2] = self._buffers["coordinates"][vertices, 1] / 1000
+            extruder = int(extruders[line_start]) if line_count > 0 else 0
+            polygon = LayerPolygon(extruder, line_types[line_start:line_end], points, line_dimensions[line_start:line_end, 0:1], line_dimensions[line_start:line_end, 1:2], line_feedrates[line_start:line_end])
+            polygon.buildCache()
+            result.polygons.append(polygon)
+            line_start = line_end
+        return result
+
+    ##  Create the compact arrays for a number of vertices and indices.
+    @staticmethod
+    def createBuffers(vertex_count, index_count):
+        return {
+            "coordinates": numpy.empty((vertex_count, 2), numpy.int32),  # X and Z in micrometers.
+            "heights": numpy.empty((vertex_count), numpy.int16),  # Y in micrometers, relative to the layer.
+            "line_dimensions": numpy.empty((vertex_count, 2), numpy.float16),
+            "feedrates": numpy.empty((vertex_count), numpy.float16),
+            "extruders": numpy.empty((vertex_count), numpy.uint8),
+            "line_types": numpy.empty((vertex_count), numpy.uint8),
+            "line_starts": numpy.empty((index_count), numpy.uint16)  # The first vertex of each line, relative to its layer.
+        }
+
+    ##  Store the mesh of a layer in the compact arrays.
+    #
+    #   \param mesh The float32 arrays of the layer, as created by
+    #   LayerDataBuilder.
+    #   \param buffers The compact arrays to store the layer in. The heights
+    #   and line starts are replaced by a larger type if they don't fit.
+    #   \param vertex_offset Where the layer starts in the vertex buffers.
+    #   \param index_offset Where the layer starts in the index buffer.
+    #   \return The height that the heights of the layer are relative to.
+    @staticmethod
+    def compressLayer(mesh, buffers, vertex_offset, index_offset):
+        vertices = mesh["vertices"]
+        vertex_end = vertex_offset + len(vertices)
+        height = float(vertices[:, 1].min()) if len(vertices) > 0 else 0.0
+
+        buffers["coordinates"][vertex_offset:vertex_end, 0] = numpy.round(vertices[:, 0] * 1000)
+        buffers["coordinates"][vertex_offset:vertex_end, 1] = numpy.round(vertices[:, 2] * 1000)
+        heights = numpy.round((vertices[:, 1] - height) * 1000)
+        if len(heights) > 0 and heights.max() > numpy.iinfo(buffers["heights"].dtype).max:  # Very tall layer, for instance with a big Z hop.
+            buffers["heights"] = buffers["heights"].astype(numpy.int32)
+        buffers["heights"][vertex_offset:vertex_end] = heights
+        buffers["line_dimensions"][vertex_offset:vertex_end] = mesh["line_dimensions"]
+        buffers["feedrates"][vertex_offset:vertex_end] = mesh["feedrates"]
+        buffers["extruders"][vertex_offset:vertex_end] = mesh["extruders"]
+        buffers["line_types"][vertex_offset:vertex_end] = mesh["line_types"]
+        if len(vertices) > numpy.iinfo(buffers["line_starts"].dtype).max:  # Very large layer.
+            buffers["line_starts"] = buffers["line_starts"].astype(numpy.int32)
+        buffers["line_starts"][index_offset:index_offset + len(mesh["indices"])] = mesh["indices"][:, 0]
+        return height
@@ -0,0 +1,249 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import tempfile
+import threading
+
+
+##  Storage for the g-code of one build plate, one entry per layer.
+#
+#   The g-code is kept in a temporary file that stays in memory while it is small and is spilled to disk once it
+#   grows larger than max_memory. Only the offset and length of every layer are kept in memory, so writers can
+#   stream a job of hundreds of megabytes one layer at a time without materializing it.
+#
+#   For compatibility it behaves like the list of strings that was used before: it can be indexed, iterated,
+#   appended to and layers can be replaced. Replacing a layer with a shorter one happens in place, longer layers are
+#   appended to the end of the file. The file is compacted when too much of it is no longer used.
+#
+#   A snapshot() of the store shares its file, so it costs nothing to make. While a file is shared, nothing in it is
+#   overwritten: all layers that are replaced are appended.
+class GCodeStore:
+    ##  Layers are kept in memory until the file grows larger than this.
+    DefaultMaxMemory = 16 * 1024 * 1024
+
+    def __init__(self, layers = None, max_memory = DefaultMaxMemory):
+        self._max_memory = max_memory
+        self._file = tempfile.SpooledTemporaryFile(max_size = max_memory)
+        self._index = []  # Offset and length in bytes of each layer.
+        self._end = 0  # Where the next layer is written.
+        self._unused = 0  # Number of bytes in the file that no layer refers to anymore.
+        self._lock = threading.RLock()
+        self._shared_files = {}  # Number of snapshots that read from each file.
+
+        if layers is not None:
+            self.extend(layers)
+
+    ##  Get the text of a layer.
+    def layer(self, index):
+        return self.rawLayer(index).decode("utf-8", "replace")
+
+    ##  Get the UTF-8 encoded text of a layer.
+    def rawLayer(self, index):
+        with self._lock:
+            offset, length = self._index[index]
+            self._file.seek(offset)
+            return self._file.read(length)
+
+    ##  Iterate over the text of the layers, reading one layer at a time.
+    #
+    #   Layers that are replaced while iterating are seen with their new content when they are reached.
+    def layers(self, start = 0):
+        index = start
+        while index < len(self._index):
+            yield self.layer(index)
+            index += 1
+
+    ##  Iterate over the UTF-8 encoded text of the layers, reading one layer at a time.
+    def rawLayers(self, start = 0):
+        index = start
+        while index < len(self._index):
+            yield self.rawLayer(index)
+            index += 1
+
+    ##  The total size of the g-code in bytes.
+    def byteSize(self):
+        with self._lock:
+            return sum(length for offset, length in self._index)
+
+    ##  The size of each layer in bytes.
+    def layerSizes(self):
+        with self._lock:
+            return [length for offset, length in self._index]
+
+    ##  Write all g-code to a binary stream, one layer at a time.
+    def writeTo(self, stream):
+        for data in self.rawLayers():
+            stream.write(data)
+
+    ##  Get a copy of the g-code as it is now, that doesn't change when this store is changed.
+    #
+    #   Close the snapshot when it's no longer needed, so that this store can overwrite its file again.
+    def snapshot(self):
+        with self._lock:
+            self._shared_files[self._file] = self._shared_files.get(self._file, 0) + 1
+            return GCodeStoreSnapshot(self, self._file, list(self._index))
+
+    ##  Called by a snapshot that no longer reads from a file.
+    def _releaseFile(self, file):
+        with self._lock:
+            self._shared_files[file] -= 1
+            if self._shared_files[file] > 0:
+                return
+            del self._shared_files[file]
+            if file is not self._file:  # This store doesn't use it anymore either.
+                file.close()
+
+    def append(self, layer):
+        with self._lock:
+            self._index.append(self._write(self._encode(layer)))
+
+    def extend(self, layers):
+        for layer in layers:
+            self.append(layer)
+
+    def insert(self, index, layer):
+        with self._lock:
+            self._index.insert(index, self._write(self._encode(layer)))
+
+    def clear(self):
+        with self._lock:
+            self._index = []
+            if self._file in self._shared_files:
+                self._file = tempfile.SpooledTemporaryFile(max_size = self._max_memory)
+            else:
+                self._file.seek(0)
+                self._file.truncate()
+            self._end = 0
+            self._unused = 0
+
+    ##  Find the index of the first layer with exactly this text.
+    def index(self, layer):
+        for index, stored_layer in enumerate(self.layers()):
+            if stored_layer == layer:
+                return index
+        raise ValueError("Layer is not in the g-code store")
+
+    ##  Close the underlying file. The store can't be used anymore afterwards.
+    def close(self):
+        with self._lock:
+            self._index = []
+            if self._file not in self._shared_files:  # Otherwise the last snapshot closes it.
+                self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return self.layers()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.layer(i) for i in range(*index.indices(len(self._index)))]
+        return self.layer(index)
+
+    def __setitem__(self, index, layer):
+        data = self._encode(layer)
+        with self._lock:
+            offset, length = self._index[index]
+            if len(data) <= length and self._file not in self._shared_files:
+                self._file.seek(offset)
+                self._file.write(data)
+                self._index[index] = (offset, len(data))
+                self._unused += length - len(data)
+            else:
+                self._index[index] = self._write(data)
+                self._unused += length
+            if self._unused > max(self._end - self._unused, self._max_memory):
+                self._compact()
+
+    def __deepcopy__(self, memo):
+        copy = GCodeStore(max_memory = self._max_memory)
+        for data in self.rawLayers():
+            copy.append(data)
+        return copy
+
+    @staticmethod
+    def _encode(layer):
+        if isinstance(layer, bytes):
+            return layer
+        return layer.encode("utf-8")
+
+    ##  Write data at the end of the file.
+    #
+    #   \return The offset and length of the data.
+    def _write(self, data):
+        offset = self._end
+        self._file.seek(offset)
+        self._file.write(data)
+        self._end += len(data)
+        return offset, len(data)
+
+    ##  Copy all layers to a new file, dropping the space of replaced layers.
+    def _compact(self):
+        old_file = self._file
+        old_index = self._index
+        self._file = tempfile.SpooledTemporaryFile(max_size = self._max_memory)
+        self._index = []
+        self._end = 0
+        self._unused = 0
+        for offset, length in old_index:
+            old_file.seek(offset)
+            self._index.append(self._write(old_file.read(length)))
+        if old_file not in self._shared_files:  # Otherwise the last snapshot closes it.
+            old_file.close()
+
+
+##  A copy of the g-code of a GCodeStore at one moment, that shares the file of the store.
+#
+#   It can be read like the store, but not changed.
+class GCodeStoreSnapshot:
+    def __init__(self, store, file, index):
+        self._store = store
+        self._file = file
+        self._index = index
+
+    def layer(self, index):
+        return self.rawLayer(index).decode("utf-8", "replace")
+
+    def rawLayer(self, index):
+        with self._store._lock:  # The file is shared with the store.
+            offset, length = self._index[index]
+            self._file.seek(offset)
+            return self._file.read(length)
+
+    def layers(self, start = 0):
+        for index in range(start, len(self._index)):
+            yield self.layer(index)
+
+    def rawLayers(self, start = 0):
+        for index in range(start, len(self._index)):
+            yield self.rawLayer(index)
+
+    def byteSize(self):
+        return sum(length for offset, length in self._index)
+
+    def layerSizes(self):
+        return [length for offset, length in self._index]
+
+    def writeTo(self, stream):
+        for data in self.rawLayers():
+            stream.write(data)
+
+    ##  Stop reading from the file of the store. The snapshot can't be used anymore afterwards.
+    def close(self):
+        if self._file is not None:
+            self._store._releaseFile(self._file)
+            self._file = None
+            self._index = []
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return self.layers()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.layer(i) for i in range(*index.indices(len(self._index)))]
+        return self.layer(index)
@@ -33,6 +33,21 @@ class Layer:
     def setThickness(self, thickness):
         self._thickness = thickness
 
+    ##  The range of the feedrates and the range of the thicknesses of the lines.
+    #
+    #   \return (min feedrate, max feedrate, min thickness, max thickness), or
+    #   None if the layer has no lines. Lines without a thickness are left out
+    #   of the min thickness, which is None if no line has a thickness.
+    def getLineRanges(self):
+        polygons = [polygon for polygon in self._polygons if len(polygon.lineFeedrates) > 0]
+        if not polygons:
+            return None
+        feedrates = numpy.concatenate([polygon.lineFeedrates.ravel() for polygon in polygons])
+        thicknesses = numpy.concatenate([polygon.lineThicknesses.ravel() for polygon in polygons])
+        nonzero_thicknesses = thicknesses[numpy.nonzero(thicknesses)]
+        min_thickness = float(nonzero_thicknesses.min()) if len(nonzero_thicknesses) > 0 else None
+        return (float(feedrates.min()), float(feedrates.max()), min_thickness, float(thicknesses.max()))
+
     def lineMeshVertexCount(self):
         result = 0
         for polygon in self._polygons:
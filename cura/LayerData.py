@@ -22,5 +22,13 @@ class LayerData(MeshData):
     def getLayers(self):
         return self._layers
 
+    ##  The range of the feedrates and the range of the thicknesses of the
+    #   lines of a layer, see Layer.getLineRanges().
+    def getLineRanges(self, layer):
+        if layer in self._layers:
+            return self._layers[layer].getLineRanges()
+        else:
+            return None
+
     def getElementCounts(self):
         return self._element_counts
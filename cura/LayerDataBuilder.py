@@ -5,16 +5,39 @@ from .Layer import Layer
 from .LayerPolygon import LayerPolygon
 from UM.Mesh.MeshBuilder import MeshBuilder
 from .LayerData import LayerData
+from .CompactLayerData import CompactLayerData
 
 import numpy
 
 
 ## Builder class for constructing a LayerData object
 class LayerDataBuilder(MeshBuilder):
-    def __init__(self):
+    ##  The buffers of the mesh grow by at least this many vertices at a time.
+    MinimumChunkSize = 64 * 1024
+
+    ##  \param compact Whether to build CompactLayerData instead of LayerData,
+    #   which uses less memory.
+    def __init__(self, compact = False):
         super().__init__()
         self._layers = {}
         self._element_counts = {}
+        self._compact = compact
+
+        # The mesh is built into these buffers one layer at a time, see buildLayer().
+        self._buffers = None
+        self._vertex_count = 0
+        self._index_count = 0
+        self._built_layers = {}
+
+        # Where each layer is in the buffers of compact layer data, and the colors to decompress it with.
+        self._layer_numbers = []
+        self._vertex_ends = []
+        self._index_ends = []
+        self._heights = []
+        self._polygon_line_counts = []
+        self._line_ranges = []
+        self._line_type_colors = None
+        self._material_color_map = None
 
     def addLayer(self, layer):
         if layer not in self._layers:
@@ -49,74 +72,190 @@ class LayerDataBuilder(MeshBuilder):
 
         self._layers[layer].setThickness(thickness)
 
-    ##  Return the layer data as LayerData.
+    ##  Make room for this many more vertices and indices in the mesh.
+    #
+    #   The mesh grows by itself when layers are built, but reserving the space
+    #   up front avoids copying the buffers when they grow.
+    def reserve(self, vertex_count, index_count):
+        vertex_count += self._vertex_count
+        index_count += self._index_count
+        if self._buffers is None:
+            self._buffers = CompactLayerData.createBuffers(vertex_count, index_count) if self._compact else self._createBuffers(vertex_count, index_count)
+            return
+        if vertex_count <= len(self._buffers["line_types"]) and index_count <= len(self._buffers[self._indexBufferName()]):
+            return
+
+        buffers = {}
+        for name, buffer in self._buffers.items():
+            count = self._index_count if name == self._indexBufferName() else self._vertex_count
+            buffers[name] = numpy.empty((index_count if name == self._indexBufferName() else vertex_count, ) + buffer.shape[1:], buffer.dtype)
+            buffers[name][:count] = buffer[:count]
+        self._buffers = buffers
+
+    ##  The buffer that has an entry per index instead of per vertex.
+    def _indexBufferName(self):
+        return "line_starts" if self._compact else "indices"
+
+    ##  Create the float32 arrays of the mesh for a number of vertices and
+    #   indices.
+    def _createBuffers(self, vertex_count, index_count):
+        return {
+            "vertices": numpy.empty((vertex_count, 3), numpy.float32),
+            "line_dimensions": numpy.empty((vertex_count, 2), numpy.float32),
+            "colors": numpy.empty((vertex_count, 4), numpy.float32),
+            "material_colors": numpy.empty((vertex_count, 4), numpy.float32),
+            "feedrates": numpy.empty((vertex_count), numpy.float32),
+            "extruders": numpy.empty((vertex_count), numpy.float32),
+            "line_types": numpy.empty((vertex_count), numpy.float32),
+            "indices": numpy.empty((index_count, 2), numpy.int32)
+        }
+
+    ##  Add a layer to the mesh.
+    #
+    #   This allows showing the layers while the rest is still being
+    #   processed. The layers have to be built from the bottom up, and each
+    #   layer can only be built once.
     #
+    #   \param layer The number of the layer to build.
     #   \param material_color_map: [r, g, b, a] for each extruder row.
     #   \param line_type_brightness: compatibility layer view uses line type brightness of 0.5
-    def build(self, material_color_map, line_type_brightness = 1.0):
-        vertex_count = 0
-        index_count = 0
-        for layer, data in self._layers.items():
-            vertex_count += data.lineMeshVertexCount()
-            index_count += data.lineMeshElementCount()
-
-        vertices = numpy.empty((vertex_count, 3), numpy.float32)
-        line_dimensions = numpy.empty((vertex_count, 2), numpy.float32)
-        colors = numpy.empty((vertex_count, 4), numpy.float32)
-        indices = numpy.empty((index_count, 2), numpy.int32)
-        feedrates = numpy.empty((vertex_count), numpy.float32)
-        extruders = numpy.empty((vertex_count), numpy.float32)
-        line_types = numpy.empty((vertex_count), numpy.float32)
-
-        vertex_offset = 0
-        index_offset = 0
-        for layer, data in sorted(self._layers.items()):
-            ( vertex_offset, index_offset ) = data.build( vertex_offset, index_offset, vertices, colors, line_dimensions, feedrates, extruders, line_types, indices)
-            self._element_counts[layer] = data.elementCount
-
-        self.addVertices(vertices)
+    def buildLayer(self, layer, material_color_map, line_type_brightness = 1.0):
+        data = self._layers[layer]
+        vertex_count = data.lineMeshVertexCount()
+        index_count = data.lineMeshElementCount()
+        if self._buffers is None or self._vertex_count + vertex_count > len(self._buffers["line_types"]) or self._index_count + index_count > len(self._buffers[self._indexBufferName()]):
+            # Grow in chunks, so the buffers aren't copied for every layer.
+            capacity = len(self._buffers["line_types"]) if self._buffers is not None else 0
+            self.reserve(max(vertex_count, capacity // 2, self.MinimumChunkSize), max(index_count, capacity // 2, self.MinimumChunkSize))
+
+        if self._compact:
+            self._buildCompactLayer(layer, material_color_map, line_type_brightness)
+            return
+
+        buffers = self._buffers
+        vertex_offset = self._vertex_count
+        ( self._vertex_count, self._index_count ) = data.build(self._vertex_count, self._index_count, buffers["vertices"], buffers["colors"], buffers["line_dimensions"], buffers["feedrates"], buffers["extruders"], buffers["line_types"], buffers["indices"])
+        self._element_counts[layer] = data.elementCount
+        self._built_layers[layer] = data
+
+        colors = buffers["colors"][vertex_offset:self._vertex_count]
         colors[:, 0:3] *= line_type_brightness
-        self.addColors(colors)
-        self.addIndices(indices.flatten())
 
         # Note: we're using numpy indexing here.
         # See also: https://docs.scipy.org/doc/numpy/reference/arrays.indexing.html
-        material_colors = numpy.zeros((line_dimensions.shape[0], 4), dtype=numpy.float32)
+        extruders = buffers["extruders"][vertex_offset:self._vertex_count]
+        line_types = buffers["line_types"][vertex_offset:self._vertex_count]
+        material_colors = buffers["material_colors"][vertex_offset:self._vertex_count]
+        material_colors[:] = 0
         for extruder_nr in range(material_color_map.shape[0]):
             material_colors[extruders == extruder_nr] = material_color_map[extruder_nr]
         # Set material_colors with indices where line_types (also numpy array) == MoveCombingType
         material_colors[line_types == LayerPolygon.MoveCombingType] = colors[line_types == LayerPolygon.MoveCombingType]
         material_colors[line_types == LayerPolygon.MoveRetractionType] = colors[line_types == LayerPolygon.MoveRetractionType]
 
+    ##  Add a layer to the mesh of compact layer data.
+    #
+    #   The layer is built with float32 arrays like normal and then compressed.
+    #   Its polygons are dropped after that, since the compact layer data can
+    #   create them again.
+    def _buildCompactLayer(self, layer, material_color_map, line_type_brightness):
+        data = self._layers[layer]
+        mesh = self._createBuffers(data.lineMeshVertexCount(), data.lineMeshElementCount())
+        data.build(0, 0, mesh["vertices"], mesh["colors"], mesh["line_dimensions"], mesh["feedrates"], mesh["extruders"], mesh["line_types"], mesh["indices"])
+        self._element_counts[layer] = data.elementCount
+        self._built_layers[layer] = data
+
+        self._heights.append(CompactLayerData.compressLayer(mesh, self._buffers, self._vertex_count, self._index_count))
+        self._vertex_count += len(mesh["vertices"])
+        self._index_count += len(mesh["indices"])
+        self._layer_numbers.append(layer)
+        self._vertex_ends.append(self._vertex_count)
+        self._index_ends.append(self._index_count)
+        self._polygon_line_counts.append([len(polygon.types) for polygon in data.polygons])
+        self._line_ranges.append(data.getLineRanges())
+        data.polygons.clear()
+
+        # The colors aren't stored, but looked up from the line types and extruders when decompressing.
+        self._line_type_colors = numpy.array(LayerPolygon.getColorMap(), dtype = numpy.float32)
+        self._line_type_colors[:, 0:3] *= line_type_brightness
+        self._material_color_map = material_color_map
+
+    ##  Return the layers that have been built with buildLayer() so far as
+    #   LayerData.
+    #
+    #   The layer data refers to the mesh that is still being built, so no
+    #   data is copied.
+    def buildPartial(self):
+        return self._createLayerData(dict(self._built_layers), dict(self._element_counts), copy = False)
+
+    ##  Return the layer data as LayerData, or CompactLayerData if the
+    #   builder is compact.
+    #
+    #   \param material_color_map: [r, g, b, a] for each extruder row.
+    #   \param line_type_brightness: compatibility layer view uses line type brightness of 0.5
+    def build(self, material_color_map, line_type_brightness = 1.0):
+        remaining_layers = [layer for layer in sorted(self._layers) if layer not in self._built_layers]
+        vertex_count = 0
+        index_count = 0
+        for layer in remaining_layers:
+            vertex_count += self._layers[layer].lineMeshVertexCount()
+            index_count += self._layers[layer].lineMeshElementCount()
+        self.reserve(vertex_count, index_count)
+
+        for layer in remaining_layers:
+            self.buildLayer(layer, material_color_map, line_type_brightness)
+
+        return self._createLayerData(self._layers, self._element_counts, copy = True)
+
+    ##  Create the layer data from the mesh that was built.
+    #
+    #   \param copy Whether to copy the mesh if the buffers are larger than
+    #   the mesh, so the memory of the unused part is freed.
+    def _createLayerData(self, layers, element_counts, copy):
+        if self._buffers is None:
+            self.reserve(0, 0)
+        buffers = {}
+        for name, buffer in self._buffers.items():
+            buffer = buffer[:self._index_count if name == self._indexBufferName() else self._vertex_count]
+            if copy and buffer.base is not None and buffer.base.size != buffer.size:
+                buffer = buffer.copy()
+            buffers[name] = buffer
+
+        if self._compact:
+            if self._line_type_colors is None:  # No layers were built.
+                self._line_type_colors = numpy.array(LayerPolygon.getColorMap(), dtype = numpy.float32)
+                self._material_color_map = numpy.zeros((0, 4), dtype = numpy.float32)
+            return CompactLayerData(buffers, layers, element_counts, list(self._layer_numbers), list(self._vertex_ends), list(self._index_ends), list(self._heights), list(self._polygon_line_counts), list(self._line_ranges), self._line_type_colors, self._material_color_map)
+
         attributes = {
             "line_dimensions": {
-                "value": line_dimensions,
+                "value": buffers["line_dimensions"],
                 "opengl_name": "a_line_dim",
                 "opengl_type": "vector2f"
                 },
             "extruders": {
-                "value": extruders,
+                "value": buffers["extruders"],
                 "opengl_name": "a_extruder",
                 "opengl_type": "float"  # Strangely enough, the type has to be float while it is actually an int.
                 },
             "colors": {
-                "value": material_colors,
+                "value": buffers["material_colors"],
                 "opengl_name": "a_material_color",
                 "opengl_type": "vector4f"
                 },
             "line_types": {
-                "value": line_types,
+                "value": buffers["line_types"],
                 "opengl_name": "a_line_type",
                 "opengl_type": "float"
                 },
             "feedrates": {
-                "value": feedrates,
+                "value": buffers["feedrates"],
                 "opengl_name": "a_feedrate",
                 "opengl_type": "float"
                 }
             }
 
-        return LayerData(vertices=self.getVertices(), normals=self.getNormals(), indices=self.getIndices(),
-                        colors=self.getColors(), uvs=self.getUVCoordinates(), file_name=self.getFileName(),
-                        center_position=self.getCenterPosition(), layers=self._layers,
-                        element_counts=self._element_counts, attributes=attributes)
+        return LayerData(vertices=buffers["vertices"], normals=self.getNormals(), indices=buffers["indices"].reshape(-1),
+                        colors=buffers["colors"], uvs=self.getUVCoordinates(), file_name=self.getFileName(),
+                        center_position=self.getCenterPosition(), layers=layers,
+                        element_counts=element_counts, attributes=attributes)
@@ -1,20 +1,90 @@
+from UM.Application import Application
+from UM.Job import Job
 from UM.Scene.SceneNodeDecorator import SceneNodeDecorator
 from copy import deepcopy
 
+from .CompactLayerData import CompactLayerData
+
 
 ## Simple decorator to indicate a scene node holds layer data.
 class LayerDataDecorator(SceneNodeDecorator):
+    ##  Compact layer data is decompressed this many layers at a time.
+    LayerMeshChunkSize = 32
+
     def __init__(self):
         super().__init__()
         self._layer_data = None
+        self._layer_mesh = None  # Decompressed mesh of compact layer data.
+        self._layer_mesh_end = None  # Last layer in the decompressed mesh.
+        self._layer_mesh_job = None  # Job that is decompressing a mesh.
+        self._wanted_layer_mesh_end = None  # Last layer of the mesh that is asked for last.
         
     def getLayerData(self):
         return self._layer_data
     
     def setLayerData(self, layer_data):
         self._layer_data = layer_data
+        self._layer_mesh = None
+        self._layer_mesh_end = None
+
+    ##  Get the mesh to render the layers up to and including end_layer.
+    #
+    #   For compact layer data only those layers are decompressed, in chunks
+    #   of layers so that moving through the layers doesn't decompress all the
+    #   time. Only the last mesh is kept. The layers are decompressed in a
+    #   job, not while rendering, so until the job is done this returns the
+    #   previous mesh, which may have other layers, or None. The scene is
+    #   changed when the job is done, so that the new mesh gets rendered.
+    def getLayerMesh(self, end_layer = None):
+        layer_data = self._layer_data
+        if not isinstance(layer_data, CompactLayerData):
+            return layer_data
+
+        if end_layer is not None:
+            end_layer = (end_layer // self.LayerMeshChunkSize + 1) * self.LayerMeshChunkSize - 1
+        self._wanted_layer_mesh_end = end_layer
+        if (self._layer_mesh is None or self._layer_mesh_end != end_layer) and self._layer_mesh_job is None:
+            self._startLayerMeshJob(layer_data, end_layer)
+        return self._layer_mesh
+
+    def _startLayerMeshJob(self, layer_data, end_layer):
+        self._layer_mesh_job = _DecompressLayerDataJob(layer_data, end_layer)
+        self._layer_mesh_job.finished.connect(self._onLayerMeshJobFinished)
+        self._layer_mesh_job.start()
+
+    def _onLayerMeshJobFinished(self, job):
+        self._layer_mesh_job = None
+        layer_data = self._layer_data
+        if job.getLayerData() is layer_data:  # Not replaced in the meantime.
+            self._layer_mesh = job.getResult()
+            self._layer_mesh_end = job.getEndLayer()
+        if not isinstance(layer_data, CompactLayerData):
+            return
+
+        if self._layer_mesh is None or self._layer_mesh_end != self._wanted_layer_mesh_end:  # Moved on to other layers in the meantime.
+            self._startLayerMeshJob(layer_data, self._wanted_layer_mesh_end)
+        else:
+            scene = Application.getInstance().getController().getScene()
+            scene.sceneChanged.emit(scene.getRoot())
 
     def __deepcopy__(self, memo):
         copy = LayerDataDecorator()
         copy.setLayerData(self._layer_data)
-        return copy
\ No newline at end of file
+        return copy
+
+
+##  Decompresses the layers of compact layer data up to a layer.
+class _DecompressLayerDataJob(Job):
+    def __init__(self, layer_data, end_layer):
+        super().__init__()
+        self._layer_data = layer_data
+        self._end_layer = end_layer
+
+    def getLayerData(self):
+        return self._layer_data
+
+    def getEndLayer(self):
+        return self._end_layer
+
+    def run(self):
+        self.setResult(self._layer_data.decompress(self._end_layer))
@@ -21,6 +21,10 @@ class LayerPolygon:
     __number_of_types = 11
 
     __jump_map = numpy.logical_or(numpy.logical_or(numpy.arange(__number_of_types) == NoneType, numpy.arange(__number_of_types) == MoveCombingType), numpy.arange(__number_of_types) == MoveRetractionType)
+
+    # When type is used as index returns true if type == LayerPolygon.InfillType or type == LayerPolygon.SkinType or type == LayerPolygon.SupportInfillType
+    # Should be generated in better way, not hardcoded.
+    __is_infill_or_skin_type_map = numpy.array([0, 0, 0, 1, 0, 0, 1, 1, 0, 0, 1], dtype=bool)
     
     ##  LayerPolygon, used in ProcessSlicedLayersJob
     #   \param extruder
@@ -32,9 +36,10 @@ class LayerPolygon:
     def __init__(self, extruder, line_types, data, line_widths, line_thicknesses, line_feedrates):
         self._extruder = extruder
         self._types = line_types
-        for i in range(len(self._types)):
-            if self._types[i] >= self.__number_of_types: #Got faulty line data from the engine.
-                self._types[i] = self.NoneType
+        faulty_types = self._types >= self.__number_of_types
+        if faulty_types.any(): #Got faulty line data from the engine.
+            # The types may be a read-only view on the data of the engine, so don't change them in place.
+            self._types = numpy.where(faulty_types, self.NoneType, self._types).astype(self._types.dtype)
         self._data = data
         self._line_widths = line_widths
         self._line_thicknesses = line_thicknesses
@@ -55,10 +60,6 @@ class LayerPolygon:
         self._color_map = LayerPolygon.getColorMap()
         self._colors = self._color_map[self._types]
         
-        # When type is used as index returns true if type == LayerPolygon.InfillType or type == LayerPolygon.SkinType or type == LayerPolygon.SupportInfillType
-        # Should be generated in better way, not hardcoded.
-        self._isInfillOrSkinTypeMap = numpy.array([0, 0, 0, 1, 0, 0, 1, 1, 0, 0, 1], dtype=numpy.bool)
-        
         self._build_cache_line_mesh_mask = None
         self._build_cache_needed_points = None
         
@@ -69,7 +70,7 @@ class LayerPolygon:
         self._index_begin = 0
         self._index_end = mesh_line_count
         
-        self._build_cache_needed_points = numpy.ones((len(self._types), 2), dtype=numpy.bool)
+        self._build_cache_needed_points = numpy.ones((len(self._types), 2), dtype=bool)
         # Only if the type of line segment changes do we need to add an extra vertex to change colors
         self._build_cache_needed_points[1:, 0][:, numpy.newaxis] = self._types[1:] != self._types[:-1]
         # Mark points as unneeded if they are of types we don't want in the line mesh according to the calculated mask
@@ -145,7 +146,7 @@ class LayerPolygon:
         return self._color_map[line_types]
 
     def isInfillOrSkinType(self, line_types):
-        return self._isInfillOrSkinTypeMap[line_types]
+        return self.__is_infill_or_skin_type_map[line_types]
 
     def lineMeshVertexCount(self):
         return (self._vertex_end - self._vertex_begin)
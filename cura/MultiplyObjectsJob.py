@@ -2,19 +2,24 @@
 # Cura is released under the terms of the LGPLv3 or higher.
 
 from UM.Job import Job
+from UM.Math.Vector import Vector
 from UM.Operations.GroupedOperation import GroupedOperation
 from UM.Message import Message
 from UM.i18n import i18nCatalog
 i18n_catalog = i18nCatalog("cura")
 
 from cura.Arranging.Arrange import Arrange
+from cura.Arranging.BatchPacker import BatchPacker
 from cura.Arranging.ShapeArray import ShapeArray
+from cura.Scene.ZOffsetDecorator import ZOffsetDecorator
 from cura.Scene.DuplicatedNode import DuplicatedNode
 from cura.Operations.AddNodesOperation import AddNodesOperation
 
 from UM.Application import Application
 from UM.Operations.AddSceneNodeOperation import AddSceneNodeOperation
 
+import copy
+
 
 class MultiplyObjectsJob(Job):
     def __init__(self, objects, count, min_offset = 4):
@@ -34,29 +39,34 @@ class MultiplyObjectsJob(Job):
 
         root = scene.getRoot()
         arranger = Arrange.create(scene_root=root)
+        packer = BatchPacker(arranger)
         nodes = []
+        found_solution_for_all = True
         for node in self._objects:
             # If object is part of a group, multiply group
             current_node = node
             while current_node.getParent() and current_node.getParent().callDecoration("isGroup"):
                 current_node = current_node.getParent()
 
-            node_too_big = False
+            # All copies are placed at once, which is a lot faster than finding a place for them one by one.
             if node.getBoundingBox().width < 300 or node.getBoundingBox().depth < 300:
-                offset_shape_arr, hull_shape_arr = ShapeArray.fromNode(current_node, min_offset=self._min_offset)
-            else:
-                node_too_big = True
-
-            found_solution_for_all = True
-            for i in range(self._count):
-                # We do place the nodes one by one, as we want to yield in between.
-                if not node_too_big:
-                    node, solution_found = arranger.findNodePlacement(current_node, offset_shape_arr, hull_shape_arr)
-                if node_too_big or not solution_found:
+                placements = packer.pack([ShapeArray.fromNode(current_node, min_offset=self._min_offset)] * self._count)
+            else:  # Too big
+                placements = [None] * self._count
+
+            for i, placement in enumerate(placements):
+                node = copy.deepcopy(current_node)
+                # Ensure that the object is above the build platform
+                node.removeDecorator(ZOffsetDecorator)
+                if node.getBoundingBox():
+                    center_y = node.getWorldPosition().y - node.getBoundingBox().bottom
+                else:
+                    center_y = 0
+                if placement is not None and placement.x is not None:
+                    node.setPosition(Vector(placement.x, center_y, placement.y))
+                else:
                     found_solution_for_all = False
-                    new_location = node.getPosition()
-                    new_location = new_location.set(z = 100 - i * 20)
-                    node.setPosition(new_location)
+                    node.setPosition(Vector(200, center_y, 100 - i * 20))
 
                 # Same build plate
                 build_plate_number = current_node.callDecoration("getBuildPlateNumber")
@@ -11,10 +11,12 @@ from UM.Scene.Selection import Selection
 from UM.Preferences import Preferences
 
 from cura.Scene.ConvexHullDecorator import ConvexHullDecorator
+from cura.Scene.ConvexHullGrid import ConvexHullGrid
 from cura.Scene.DuplicatedNode import DuplicatedNode
 from cura.Operations import PlatformPhysicsOperation
 from cura.Scene import ZOffsetDecorator
 
+import numpy
 import random  # used for list shuffling
 
 
@@ -36,6 +38,10 @@ class PlatformPhysics:
         self._max_overlap_checks = 10  # How many times should we try to find a new spot per tick?
         self._minimum_gap = 2  # It is a minimum distance (in mm) between two models, applicable for small models
 
+        # The nodes that other nodes can be pushed away from, to only check the nodes near a node for collisions.
+        self._hull_grid = ConvexHullGrid()
+        self._hull_grid_hulls = {}  # The hulls that the bounds in the grid were computed from, per node.
+
         Preferences.getInstance().addPreference("physics/automatic_push_free", True)
         Preferences.getInstance().addPreference("physics/automatic_drop_down", True)
 
@@ -55,6 +61,7 @@ class PlatformPhysics:
         # We try to shuffle all the nodes to prevent "locked" situations, where iteration B inverts iteration A.
         # By shuffling the order of the nodes, this might happen a few times, but at some point it will resolve.
         nodes = list(BreadthFirstIterator(root))
+        self._updateHullGrid(root, nodes)
 
         # Only check nodes inside build area.
         nodes = [node for node in nodes if (hasattr(node, "_outside_buildarea") and not node._outside_buildarea)]
@@ -76,26 +83,15 @@ class PlatformPhysics:
             # If there is no convex hull for the node, start calculating it and continue.
             if not node.getDecorator(ConvexHullDecorator):
                 node.addDecorator(ConvexHullDecorator())
+                self._updateHullGridNode(root, node)
 
             # only push away objects if this node is a printing mesh
             if not node.callDecoration("isNonPrintingMesh") and Preferences.getInstance().getValue("physics/automatic_push_free") and type(node) != DuplicatedNode:
-                # Check for collisions between convex hulls
-                for other_node in BreadthFirstIterator(root):
-                    # Ignore root, ourselves and anything that is not a normal SceneNode.
-                    if other_node is root or not issubclass(type(other_node), SceneNode) or other_node is node or other_node.callDecoration("getBuildPlateNumber") != node.callDecoration("getBuildPlateNumber"):
-                        continue
-                    
+                # Check for collisions between convex hulls, only with the nodes near the hull as it is moved.
+                for other_node in self._iterateNearbyNodes(node, lambda: move_vector):
                     # Ignore collisions of a group with it's own children
                     if other_node in node.getAllChildren() or node in other_node.getAllChildren():
                         continue
-                    
-                    # Ignore collisions within a group
-                    if other_node.getParent() and node.getParent() and (other_node.getParent().callDecoration("isGroup") is not None or node.getParent().callDecoration("isGroup") is not None):
-                        continue
-                    
-                    # Ignore nodes that do not have the right properties set.
-                    if not other_node.callDecoration("getConvexHull") or not other_node.getBoundingBox():
-                        continue
 
                     if other_node in transformed_nodes:
                         continue  # Other node is already moving, wait for next pass.
@@ -152,11 +148,92 @@ class PlatformPhysics:
                 transformed_nodes.append(node)
                 op = PlatformPhysicsOperation.PlatformPhysicsOperation(node, move_vector)
                 op.push()
+                self._updateHullGridNode(root, node)
 
         # After moving, we have to evaluate the boundary checks for nodes
         build_volume = Application.getInstance().getBuildVolume()
         build_volume.updateNodeBoundaryCheck()
 
+    ##  Iterate over the nodes that the convex hull of a node may collide with.
+    #
+    #   When the node is moved while iterating, the nodes near its new position
+    #   are iterated over as well. Every node is only returned once.
+    #   \param node The node to find the nearby nodes of.
+    #   \param get_move_vector Function that returns how far the node is moved.
+    def _iterateNearbyNodes(self, node, get_move_vector):
+        bounds = self._hull_grid.getBounds(node)
+        if bounds is None:
+            return
+        build_plate = self._hull_grid.getBuildPlate(node)
+
+        checked_nodes = {node}
+        while True:
+            move_vector = get_move_vector()
+            moved_bounds = (bounds[0] + move_vector.x, bounds[1] + move_vector.z, bounds[2] + move_vector.x, bounds[3] + move_vector.z)
+            other_nodes = [other_node for other_node in self._hull_grid.findNodes(build_plate, moved_bounds) if other_node not in checked_nodes]
+            if not other_nodes:
+                return
+            for other_node in other_nodes:
+                checked_nodes.add(other_node)
+                yield other_node
+
+    ##  Bring the grid of convex hulls up to date with the scene.
+    #
+    #   Only the nodes of which the convex hull changed are moved in the grid.
+    def _updateHullGrid(self, root, nodes):
+        for node in nodes:
+            self._updateHullGridNode(root, node)
+
+        # Forget the nodes that were removed from the scene.
+        scene_nodes = set(nodes)
+        for node in list(self._hull_grid_hulls):
+            if node not in scene_nodes:
+                self._hull_grid.remove(node)
+                del self._hull_grid_hulls[node]
+
+    def _updateHullGridNode(self, root, node):
+        bounds = self._getHullBounds(root, node)
+        if bounds is None:
+            self._hull_grid.remove(node)
+            self._hull_grid_hulls.pop(node, None)
+        else:
+            self._hull_grid.update(node, node.callDecoration("getBuildPlateNumber"), bounds)
+
+    ##  Get the area in which a node can collide with other nodes.
+    #   \return The bounding rectangle of the convex hull and head hull of the
+    #   node, or None if other nodes can't be pushed away from it.
+    def _getHullBounds(self, root, node):
+        # Ignore root and anything that is not a normal SceneNode.
+        if node is root or not isinstance(node, SceneNode):
+            return None
+
+        # Ignore collisions within a group
+        parent = node.getParent()
+        if parent is None or parent.callDecoration("isGroup") is not None:
+            return None
+
+        # Ignore nodes that do not have the right properties set.
+        hull = node.callDecoration("getConvexHull")
+        if not hull or not node.getBoundingBox():
+            return None
+        head_hull = node.callDecoration("getConvexHullHead")
+
+        # The convex hull decorator keeps its hulls while the node doesn't change.
+        previous = self._hull_grid_hulls.get(node)
+        if previous is not None and previous[0] is hull and previous[1] is head_hull:
+            return previous[2]
+
+        points = hull.getPoints()
+        if len(points) == 0:
+            return None
+        if head_hull and len(head_hull.getPoints()) > 0:
+            points = numpy.concatenate([points, head_hull.getPoints()])
+        minimum = points.min(axis = 0)
+        maximum = points.max(axis = 0)
+        bounds = (float(minimum[0]), float(minimum[1]), float(maximum[0]), float(maximum[1]))
+        self._hull_grid_hulls[node] = (hull, head_hull, bounds)
+        return bounds
+
     def _onToolOperationStarted(self, tool):
         self._enabled = False
 
@@ -2,6 +2,7 @@
 # Cura is released under the terms of the LGPLv3 or higher.
 
 from UM.Application import Application
+from UM.Math.Matrix import Matrix
 from UM.Math.Polygon import Polygon
 from UM.Scene.SceneNodeDecorator import SceneNodeDecorator
 from UM.Settings.ContainerRegistry import ContainerRegistry
@@ -20,6 +21,14 @@ class ConvexHullDecorator(SceneNodeDecorator):
         self._convex_hull_node = None
         self._init2DConvexHullCache()
 
+        # The convex hull of the mesh seen from above, in the coordinates of the mesh. It doesn't depend on the
+        # settings, so it is kept until the mesh changes.
+        self._2d_convex_hull_local_mesh = None
+        self._2d_convex_hull_local_points = None
+
+        # Whether the convex hull may have changed since the build volume last checked it.
+        self._convex_hull_dirty = True
+
         self._global_stack = None
 
         self._raft_thickness = 0.0
@@ -39,11 +48,13 @@ class ConvexHullDecorator(SceneNodeDecorator):
         if previous_node is not None and node is not previous_node:
             previous_node.transformationChanged.disconnect(self._onChanged)
             previous_node.parentChanged.disconnect(self._onChanged)
+            previous_node.meshDataChanged.disconnect(self._onMeshDataChanged)
 
         super().setNode(node)
 
         self._node.transformationChanged.connect(self._onChanged)
         self._node.parentChanged.connect(self._onChanged)
+        self._node.meshDataChanged.connect(self._onMeshDataChanged)
 
         self._onChanged()
 
@@ -99,6 +110,17 @@ class ConvexHullDecorator(SceneNodeDecorator):
                 return self._compute2DConvexHull()
         return None
 
+    ##  Whether the convex hull may have changed since clearConvexHullDirty()
+    #   was last called, because the node was moved or changed, or because of
+    #   a change in the settings.
+    def isConvexHullDirty(self):
+        return self._convex_hull_dirty
+
+    ##  Mark the current convex hull as checked. It becomes dirty again when
+    #   it may have changed.
+    def clearConvexHullDirty(self):
+        self._convex_hull_dirty = False
+
     def recomputeConvexHull(self):
         controller = Application.getInstance().getController()
         root = controller.getScene().getRoot()
@@ -132,6 +154,8 @@ class ConvexHullDecorator(SceneNodeDecorator):
         # Cache for the mesh code path in _compute2DConvexHull()
         self._2d_convex_hull_mesh = None
         self._2d_convex_hull_mesh_world_transform = None
+        self._2d_convex_hull_mesh_rotation_scale = None
+        self._2d_convex_hull_mesh_translation = None
         self._2d_convex_hull_mesh_result = None
 
     def _compute2DConvexHull(self):
@@ -160,56 +184,107 @@ class ConvexHullDecorator(SceneNodeDecorator):
             return offset_hull
 
         else:
-            offset_hull = None
-            mesh = None
-            world_transform = None
-            if self._node.getMeshData():
-                mesh = self._node.getMeshData()
-                world_transform = self._node.getWorldTransformation()
-
-                # Check the cache
-                if mesh is self._2d_convex_hull_mesh and world_transform == self._2d_convex_hull_mesh_world_transform:
-                    return self._2d_convex_hull_mesh_result
-
-                vertex_data = mesh.getConvexHullTransformedVertices(world_transform)
-                # Don't use data below 0.
-                # TODO; We need a better check for this as this gives poor results for meshes with long edges.
-                # Do not throw away vertices: the convex hull may be too small and objects can collide.
-                # vertex_data = vertex_data[vertex_data[:,1] >= -0.01]
-
-                if len(vertex_data) >= 4:
-                    # Round the vertex data to 1/10th of a mm, then remove all duplicate vertices
-                    # This is done to greatly speed up further convex hull calculations as the convex hull
-                    # becomes much less complex when dealing with highly detailed models.
-                    vertex_data = numpy.round(vertex_data, 1)
-
-                    vertex_data = vertex_data[:, [0, 2]]  # Drop the Y components to project to 2D.
-
-                    # Grab the set of unique points.
-                    #
-                    # This basically finds the unique rows in the array by treating them as opaque groups of bytes
-                    # which are as long as the 2 float64s in each row, and giving this view to numpy.unique() to munch.
-                    # See http://stackoverflow.com/questions/16970982/find-unique-rows-in-numpy-array
-                    vertex_byte_view = numpy.ascontiguousarray(vertex_data).view(
-                        numpy.dtype((numpy.void, vertex_data.dtype.itemsize * vertex_data.shape[1])))
-                    _, idx = numpy.unique(vertex_byte_view, return_index=True)
-                    vertex_data = vertex_data[idx]  # Select the unique rows by index.
-
-                    hull = Polygon(vertex_data)
-
-                    if len(vertex_data) >= 3:
-                        convex_hull = hull.getConvexHull()
-                        offset_hull = self._offsetHull(convex_hull)
-            else:
+            if not self._node.getMeshData():
                 return Polygon([])  # Node has no mesh data, so just return an empty Polygon.
 
+            mesh = self._node.getMeshData()
+            world_transform = self._node.getWorldTransformation()
+
+            # Check the cache
+            if mesh is self._2d_convex_hull_mesh and world_transform == self._2d_convex_hull_mesh_world_transform:
+                return self._2d_convex_hull_mesh_result
+
+            transform_data = world_transform.getData()
+            rotation_scale = transform_data[0:3, 0:3]
+            translation = transform_data[[0, 2], 3]  # Only X and Z matter for the hull on the build plate.
+
+            if mesh is self._2d_convex_hull_mesh and numpy.array_equal(rotation_scale, self._2d_convex_hull_mesh_rotation_scale):
+                # The node was only translated, so the convex hull moves along.
+                offset_hull = self._2d_convex_hull_mesh_result
+                if offset_hull is not None:
+                    offset = translation - self._2d_convex_hull_mesh_translation
+                    offset_hull = offset_hull.translate(offset[0], offset[1])
+            elif numpy.all(numpy.abs(rotation_scale[[0, 2], 1]) < 1e-6):
+                # The height of the vertices doesn't affect where they end up on the build plate, so the convex hull
+                # is the convex hull of the mesh seen from above, transformed. Only its points need to be transformed.
+                offset_hull = self._transformLocal2DConvexHull(mesh, rotation_scale[[0, 2]][:, [0, 2]], translation)
+            else:
+                offset_hull = self._computeMesh2DConvexHull(mesh, world_transform)
+
             # Store the result in the cache
             self._2d_convex_hull_mesh = mesh
             self._2d_convex_hull_mesh_world_transform = world_transform
+            self._2d_convex_hull_mesh_rotation_scale = rotation_scale.copy()
+            self._2d_convex_hull_mesh_translation = translation.copy()
             self._2d_convex_hull_mesh_result = offset_hull
 
             return offset_hull
 
+    ##  Compute the convex hull of a mesh on the build plate from all vertices
+    #   of the 3D convex hull of the mesh.
+    #
+    #   \param mesh The mesh data of the node.
+    #   \param world_transform The world transformation of the node.
+    #   \return The offset convex hull, or None if the mesh is too small.
+    def _computeMesh2DConvexHull(self, mesh, world_transform):
+        vertex_data = mesh.getConvexHullTransformedVertices(world_transform)
+        # Don't use data below 0.
+        # TODO; We need a better check for this as this gives poor results for meshes with long edges.
+        # Do not throw away vertices: the convex hull may be too small and objects can collide.
+        # vertex_data = vertex_data[vertex_data[:,1] >= -0.01]
+
+        if vertex_data is None or len(vertex_data) < 4:
+            return None
+
+        # Round the vertex data to 1/10th of a mm, then remove all duplicate vertices
+        # This is done to greatly speed up further convex hull calculations as the convex hull
+        # becomes much less complex when dealing with highly detailed models.
+        vertex_data = numpy.round(vertex_data, 1)
+
+        vertex_data = vertex_data[:, [0, 2]]  # Drop the Y components to project to 2D.
+
+        # Grab the set of unique points.
+        #
+        # This basically finds the unique rows in the array by treating them as opaque groups of bytes
+        # which are as long as the 2 float64s in each row, and giving this view to numpy.unique() to munch.
+        # See http://stackoverflow.com/questions/16970982/find-unique-rows-in-numpy-array
+        vertex_byte_view = numpy.ascontiguousarray(vertex_data).view(
+            numpy.dtype((numpy.void, vertex_data.dtype.itemsize * vertex_data.shape[1])))
+        _, idx = numpy.unique(vertex_byte_view, return_index=True)
+        vertex_data = vertex_data[idx]  # Select the unique rows by index.
+
+        if len(vertex_data) < 3:
+            return None
+        return self._offsetHull(Polygon(vertex_data).getConvexHull())
+
+    ##  Compute the convex hull of a mesh on the build plate by transforming
+    #   the convex hull of the mesh seen from above in its own coordinates.
+    #
+    #   This is only correct if the transformation doesn't tilt the mesh, so
+    #   that the X and Z coordinates of the transformed vertices don't depend
+    #   on their Y coordinates.
+    #
+    #   \param mesh The mesh data of the node.
+    #   \param rotation_scale 2x2 matrix with the rotation and scale of the
+    #   node in the X and Z directions.
+    #   \param translation The X and Z coordinates of the node.
+    #   \return The offset convex hull, or None if the mesh is too small.
+    def _transformLocal2DConvexHull(self, mesh, rotation_scale, translation):
+        if mesh is not self._2d_convex_hull_local_mesh:
+            self._2d_convex_hull_local_mesh = mesh
+            self._2d_convex_hull_local_points = None
+            vertex_data = mesh.getConvexHullTransformedVertices(Matrix())
+            if vertex_data is not None and len(vertex_data) >= 4:
+                hull = Polygon(numpy.ascontiguousarray(vertex_data[:, [0, 2]], dtype = numpy.float64)).getConvexHull()
+                if len(hull.getPoints()) >= 3:
+                    self._2d_convex_hull_local_points = hull.getPoints()
+
+        if self._2d_convex_hull_local_points is None:
+            return None
+        points = self._2d_convex_hull_local_points.dot(rotation_scale.T) + translation
+        points = numpy.round(points, 1)  # Round to 1/10th of a mm, like the vertices of the complete computation.
+        return self._offsetHull(Polygon(points).getConvexHull())
+
     def _getHeadAndFans(self):
         return Polygon(numpy.array(self._global_stack.getProperty("machine_head_with_fans_polygon", "value"), numpy.float32))
 
@@ -277,7 +352,11 @@ class ConvexHullDecorator(SceneNodeDecorator):
         else:
             return convex_hull
 
+    def _onMeshDataChanged(self, *args):
+        self._convex_hull_dirty = True
+
     def _onChanged(self, *args):
+        self._convex_hull_dirty = True
         self._raft_thickness = self._build_volume.getRaftThickness()
         self.recomputeConvexHull()
 
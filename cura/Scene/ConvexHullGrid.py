@@ -0,0 +1,136 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import math
+
+
+##  A uniform grid over the build plates, to quickly find the scene nodes whose
+#   convex hulls may overlap an area.
+#
+#   Each node is kept with the bounding rectangle of its convex hull, in every
+#   cell of the grid of its build plate that the rectangle touches. Updating a
+#   node only changes its own cells, so the grid can be kept up to date as the
+#   nodes move instead of being built again for every search.
+#
+#   The nodes can be anything that can be a key in a dict, such as the
+#   indices of polygons. The bounds are tuples of (min_x, min_y, max_x, max_y).
+class ConvexHullGrid:
+    ##  Nodes that would be in more cells than this are kept apart and are
+    #   found by every search on their build plate.
+    MaxCellsPerNode = 256
+
+    ##  \param cell_size The width and depth of a cell, in millimetres.
+    def __init__(self, cell_size = 20.0):
+        self._cell_size = cell_size
+
+        self._cells = {}  # (build plate, column, row) -> dict with the nodes in that cell, as an ordered set.
+        self._large_nodes = {}  # Build plate -> dict with the nodes that are too large for the cells.
+        self._entries = {}  # Node -> (build plate, bounds, cell keys or None for large nodes).
+
+    ##  Add a node to the grid or move it to new bounds.
+    #   \param node The node to keep in the grid.
+    #   \param build_plate The build plate that the node is on.
+    #   \param bounds The bounding rectangle of the convex hull of the node.
+    #   \return True if the node was added or moved, or False if it already
+    #   was in the grid with the same bounds.
+    def update(self, node, build_plate, bounds):
+        entry = self._entries.get(node)
+        if entry is not None and entry[0] == build_plate and entry[1] == bounds:
+            return False
+        self.remove(node)
+
+        keys = self._getCellKeys(build_plate, bounds)
+        if keys is None:
+            self._large_nodes.setdefault(build_plate, {})[node] = None
+        else:
+            for key in keys:
+                self._cells.setdefault(key, {})[node] = None
+        self._entries[node] = (build_plate, bounds, keys)
+        return True
+
+    ##  Remove a node from the grid, if it is in it.
+    def remove(self, node):
+        entry = self._entries.pop(node, None)
+        if entry is None:
+            return
+        build_plate, _, keys = entry
+        if keys is None:
+            large_nodes = self._large_nodes[build_plate]
+            del large_nodes[node]
+            if not large_nodes:
+                del self._large_nodes[build_plate]
+            return
+        for key in keys:
+            cell = self._cells[key]
+            del cell[node]
+            if not cell:
+                del self._cells[key]
+
+    def clear(self):
+        self._cells.clear()
+        self._large_nodes.clear()
+        self._entries.clear()
+
+    ##  Get the bounds that a node was last added with.
+    #   \return The bounds, or None if the node is not in the grid.
+    def getBounds(self, node):
+        entry = self._entries.get(node)
+        if entry is None:
+            return None
+        return entry[1]
+
+    ##  Get the build plate that a node was last added with.
+    #   \return The build plate, or None if the node is not in the grid.
+    def getBuildPlate(self, node):
+        entry = self._entries.get(node)
+        if entry is None:
+            return None
+        return entry[0]
+
+    ##  Find the nodes on a build plate of which the bounds overlap or touch an
+    #   area.
+    #   \param build_plate The build plate to search.
+    #   \param bounds The area to search, as a bounding rectangle.
+    #   \return List of the nodes.
+    def findNodes(self, build_plate, bounds):
+        candidates = dict(self._large_nodes.get(build_plate, {}))
+        keys = self._getCellKeys(build_plate, bounds)
+        if keys is None:  # Checking all cells would take longer than checking all nodes.
+            candidates.update((node, None) for node, entry in self._entries.items() if entry[0] == build_plate)
+        else:
+            for key in keys:
+                cell = self._cells.get(key)
+                if cell:
+                    candidates.update(cell)
+
+        min_x, min_y, max_x, max_y = bounds
+        result = []
+        for node in candidates:
+            other_min_x, other_min_y, other_max_x, other_max_y = self._entries[node][1]
+            if other_min_x <= max_x and min_x <= other_max_x and other_min_y <= max_y and min_y <= other_max_y:
+                result.append(node)
+        return result
+
+    def __contains__(self, node):
+        return node in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    ##  Get the keys of the cells that bounds touch.
+    #   \return List of the keys, or None if there would be more than
+    #   MaxCellsPerNode of them.
+    def _getCellKeys(self, build_plate, bounds):
+        if not all(math.isfinite(value) for value in bounds):
+            return None
+        min_x, min_y, max_x, max_y = bounds
+        min_column = math.floor(min_x / self._cell_size)
+        max_column = math.floor(max_x / self._cell_size)
+        min_row = math.floor(min_y / self._cell_size)
+        max_row = math.floor(max_y / self._cell_size)
+        if (max_column - min_column + 1) * (max_row - min_row + 1) > self.MaxCellsPerNode:
+            return None
+        return [(build_plate, column, row) for column in range(min_column, max_column + 1) for row in range(min_row, max_row + 1)]
@@ -0,0 +1,137 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import concurrent.futures
+import hashlib
+import os
+
+import numpy
+
+from UM.Scene.SceneNodeDecorator import SceneNodeDecorator
+
+
+##  Keeps the vertices of a node as they were last sent to CuraEngine, so that
+#   they don't have to be computed again while the node doesn't change.
+#
+#   The vertices are in the coordinates of the engine and have three vertices
+#   for every face, also for meshes with indices. They are kept together with
+#   the mesh data and world transformation they were computed for, and are
+#   only used as long as the node still has those.
+class SliceVerticesDecorator(SceneNodeDecorator):
+    def __init__(self):
+        super().__init__()
+        self._mesh_data = None
+        self._transformation = None  # The data of the world transformation, as bytes.
+        self._vertices = None
+        self._digest = None
+
+    ##  Get the vertices that were computed for a mesh and transformation.
+    #   \param mesh_data The current mesh data of the node.
+    #   \param transformation The current world transformation of the node.
+    #   \return The vertices, or None if they were computed for another mesh
+    #   or transformation.
+    def getSliceVertices(self, mesh_data, transformation):
+        if mesh_data is not self._mesh_data or transformation.getData().tobytes() != self._transformation:
+            return None
+        return self._vertices
+
+    ##  Get a hash of the vertices, to compare them without hashing them again.
+    #   \return The SHA-1 digest of the vertices, or None if there are no
+    #   vertices.
+    def getSliceVerticesDigest(self):
+        return self._digest
+
+    ##  Keep the vertices computed for a mesh and transformation.
+    #
+    #   The vertices are made read-only, since they are shared with later
+    #   slices.
+    def setSliceVertices(self, mesh_data, transformation, vertices):
+        vertices.flags.writeable = False
+        self._mesh_data = mesh_data
+        self._transformation = transformation.getData().tobytes()
+        self._vertices = vertices
+        self._digest = hashlib.sha1(numpy.ascontiguousarray(vertices).data).digest()
+
+    ##  Force that a new (empty) object is created upon copy.
+    def __deepcopy__(self, memo):
+        return SliceVerticesDecorator()
+
+
+##  Get the vertices to send to CuraEngine for nodes.
+#
+#   The vertices are kept in a slice vertices decorator of each node, which is
+#   added if the node doesn't have one yet. Only the vertices of nodes that
+#   changed since they were last computed are computed again, in worker
+#   threads, one mesh at a time, so that the copies of a mesh share the work.
+#   \param nodes The nodes that will be sliced.
+#   \return Dictionary from the ID of each node to a tuple of its vertices and
+#   the SHA-1 digest of the vertices.
+def collectSliceVertices(nodes):
+    result = {}
+    changed_meshes = {}  # ID of mesh data -> (mesh data, [(node, world transformation)])
+    for node in nodes:
+        decorator = node.getDecorator(SliceVerticesDecorator)
+        if decorator is None:
+            decorator = SliceVerticesDecorator()
+            node.addDecorator(decorator)
+        mesh_data = node.getMeshData()
+        transformation = node.getWorldTransformation()
+        vertices = decorator.getSliceVertices(mesh_data, transformation)
+        if vertices is not None:
+            result[id(node)] = (vertices, decorator.getSliceVerticesDigest())
+        else:
+            changed_meshes.setdefault(id(mesh_data), (mesh_data, []))[1].append((node, transformation))
+    if not changed_meshes:
+        return result
+
+    # NumPy releases the GIL while transforming, so threads can work at the same time.
+    with concurrent.futures.ThreadPoolExecutor(max_workers = min(len(changed_meshes), os.cpu_count() or 1)) as executor:
+        futures = []
+        for mesh_data, copies in changed_meshes.values():
+            futures.append((mesh_data, copies, executor.submit(createSliceVertices, mesh_data, [transformation for _, transformation in copies])))
+        for mesh_data, copies, future in futures:
+            for (node, transformation), vertices in zip(copies, future.result()):
+                decorator = node.getDecorator(SliceVerticesDecorator)
+                decorator.setSliceVertices(mesh_data, transformation, vertices)
+                result[id(node)] = (vertices, decorator.getSliceVerticesDigest())
+    return result
+
+##  Compute the vertices to send to CuraEngine for copies of a mesh.
+#
+#   Copies that are only moved relative to each other share the rotation and
+#   scaling of the vertices, so that every further copy only costs a
+#   translation and the expansion of its faces.
+#   \param mesh_data The mesh data of the copies.
+#   \param transformations The world transformations of the copies.
+#   \return List with the vertices for each transformation.
+def createSliceVertices(mesh_data, transformations):
+    vertices = mesh_data.getVertices()
+    indices = mesh_data.getIndices()
+    if indices is not None:
+        indices = indices.flatten()
+
+    result = []
+    rotated_vertices = {}  # Rotation and scale matrix as bytes -> the vertices rotated and scaled with it.
+    for transformation in transformations:
+        rot_scale, translate = _getEngineTransformation(transformation)
+        key = rot_scale.tobytes()
+        if key not in rotated_vertices:
+            rotated_vertices[key] = vertices.dot(rot_scale)
+        transformed_vertices = rotated_vertices[key] + translate
+        if indices is not None:
+            transformed_vertices = numpy.take(transformed_vertices, indices, axis = 0)
+        result.append(transformed_vertices)
+    return result
+
+##  Get the rotation and scale matrix and the translation of a world
+#   transformation that also converts from Y up axes to Z up axes, which
+#   equals a 90 degree rotation.
+#   \return Tuple of a 3x3 matrix to multiply row vectors with and a
+#   translation vector.
+def _getEngineTransformation(transformation):
+    data = transformation.getData()
+    rot_scale = numpy.ascontiguousarray(data[0:3, 0:3].T[:, [0, 2, 1]])
+    rot_scale[:, 1] *= -1
+    translate = data[:3, 3][[0, 2, 1]]
+    translate[1] *= -1
+    return rot_scale, translate
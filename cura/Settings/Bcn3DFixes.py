@@ -1,4 +1,5 @@
 import re
+import time
 
 from cura.Settings import GCodeUtils
 
@@ -109,6 +110,8 @@ class Bcn3DFixes(Job):
         self._MEXPrint =  not self._IDEXPrint and self._container.getProperty("print_mode", "value") == 'regular'
         self._MirrorOrDuplicationPrint = not self._IDEXPrint and self._container.getProperty("print_mode", "value") != 'regular'
 
+        self._stage_times = []
+
         self._message = None
         self.progress.connect(self._onProgress)
         self.finished.connect(self._onFinished)
@@ -116,35 +119,24 @@ class Bcn3DFixes(Job):
     def run(self):
         Job.yieldThread()
 
-        self._handleFixStartGcode()
-        self._handleFixAccelerationJerkCommands()
-        self._handleChangeLiftHeadMovement()
-        self._handleFixToolChangeTravel()
-        self._handleTemperatureCommandsRightAfterToolChange()
-        self._handleAvoidGrindingFilament()
-        self._handleZHopAtLayerChange()
-        self._handleZHopAfterPrimeTower()
+        # All fixes are applied in a single pass over the g-code. Every fix is a stage that gets the lines of one
+        # layer at a time, so each layer is read, split and joined only once instead of once for every fix.
+        stages = self._createStages()
+        for index in range(len(self._gcode_list)):
+            layer = self._gcode_list[index]
+            lines = layer.split("\n")
+            fixed_layer = layer
+            for stage in stages:
+                lines, fixed_layer = stage.process(lines, fixed_layer)
+            if fixed_layer != layer:
+                self._gcode_list[index] = fixed_layer
+            Job.yieldThread()
 
         # self._handleFixTemperatureOscilation() # Changes to proper temperatures if auto temperature is on. Auto temperature is not on and it's an experimental feature, this will be probably solved from the engine perspective. Therefore it's temporary commented
 
-        # Add build chamber temperature gcode
-        layer = self._gcode_list[1]
-        lines = layer.split("\n")
-        lines[0] += "\nM141 S" + str(self._container.getProperty("build_volume_temperature", "value"))
-        self._gcode_list[1] = "\n".join(lines)
-
-        # Write BCN3DFixes info
-        written_info = False
-        for index, layer in enumerate(self._gcode_list):
-            lines = layer.split("\n")
-            for temp_index in range(len(lines)):
-                if layer.startswith(";Generated with Cura_SteamEngine ") and lines[temp_index].startswith(";Sigma ProGen"):
-                    lines[temp_index] = lines[temp_index] + "\n" + "\n".join(self._startGcodeInfo)
-                    written_info = True
-            layer = "\n".join(lines)
-            self._gcode_list[index] = layer
-            if written_info:
-                break
+        self._stage_times = [(stage.name, stage.time) for stage in stages]
+        for name, stage_time in self._stage_times:
+            Logger.log("d", "%s applied in %.3f s", name, stage_time)
 
         # Get info of used extruders
         materials = []
@@ -170,13 +162,75 @@ class Bcn3DFixes(Job):
         setattr(scene, "gcode_list", self._gcode_list)
         self.setResult(self._gcode_list)
 
+    ##  Get the time in seconds that each fix took in the last run, as a list of (name, seconds) in the order in which
+    #   the fixes were applied.
+    def getStageTimes(self):
+        return self._stage_times
+
+    ##  Create the stages for all fixes, in the order in which they have to be applied.
+    #
+    #   Fixes that are disabled with the current settings are left out. Fixes that only change the layers that have
+    #   certain lines get a pattern for these lines, so the other layers don't have to be searched line by line.
+    def _createStages(self):
+        acceleration_jerk_commands = re.compile(r"^(M204 S|M205 X)", re.MULTILINE)
+        tool_changes = re.compile(r"^T[01]", re.MULTILINE)
+        tool_changes_or_layer_start_travels = re.compile(r"^T[01]|" + re.escape("X" + str(int(self._container.getProperty("layer_start_x", "value"))) + " Y" + str(int(self._container.getProperty("layer_start_y", "value")))), re.MULTILINE)
+        stages = [
+            _FixStage("fix_start_gcode", self._handleFixStartGcode()),
+            _FixStage("fix_start_gcode_temperatures", self._handleFixStartGcodeTemperatures()),
+            _FixStage("remove_unused_acceleration_jerk_commands", self._handleRemoveUnusedAccelerationJerkCommands(), acceleration_jerk_commands),
+            _FixStage("remove_repeated_acceleration_jerk_commands", self._handleRemoveRepeatedAccelerationJerkCommands(), acceleration_jerk_commands),
+            _FixStage("change_lift_head_movement", self._handleChangeLiftHeadMovement()),
+            _FixStage("fix_tool_change_travel", self._handleFixToolChangeTravel(), tool_changes_or_layer_start_travels),
+            _FixStage("temperature_commands_right_after_tool_change", self._handleTemperatureCommandsRightAfterToolChange(), tool_changes),
+            _FixStage("avoid_grinding_filament", self._handleAvoidGrindingFilament()),
+            _FixStage("hop_at_layer_change", self._handleZHopAtLayerChange()),
+            _FixStage("retraction_hop_after_prime_tower", self._handleZHopAfterPrimeTower()),
+            _FixStage("build_volume_temperature", self._handleBuildVolumeTemperature()),
+            _FixStage("write_fixes_info", self._handleWriteFixesInfo())
+        ]
+        return [stage for stage in stages if not stage.finished]
+
+    # The fixes below are generators that are sent the lines of one layer after another and yield the fixed lines of
+    # that layer. Everything that has to be remembered from one layer to the next is kept in local variables. A fix
+    # that has nothing left to do returns, which leaves the remaining layers untouched.
+
     def _handleFixStartGcode(self):
         '''
             Default behavior:
                 Hotends are heated up at print start.
                 If one hotend takes more than cooldown window to start printing (usual scenario in DUAL prints) then it will be heated up to Standby temperature.
                 -> [Fix 1] if Purge at Start is enabled the Hotend must be heated up to layer 0 temperature 
+        '''
+        # Fix 1: first temperature. Change standby to start if Purge Before Start enabled
+        if self._IDEXPrint:
+            countingForTool = 0
+            startTemperatures = self._materialPrintTemperatureLayer0[:]
+            lines = yield
+            while not lines[0].startswith(";LAYER:"):
+                temp_index = 0
+                while temp_index < len(lines):
+                    line = lines[temp_index]
+                    if line.startswith("T0") or line.startswith("T1"):
+                        if "T0" in line:
+                            countingForTool = 0
+                        else:
+                            countingForTool = 1
+                    if line.startswith("M104 S") or line.startswith("M109 S"):
+                        if self._purgeBeforeStart[countingForTool]:
+                            startTemperatures[countingForTool] = GCodeUtils.getValue(line, "S")
+                            lines[temp_index] = "M104 S"+str(self._materialPrintTemperatureLayer0[countingForTool]) if line.startswith("M104 S") else "M109 S"+str(self._materialPrintTemperatureLayer0[countingForTool])
+                    elif line.startswith("M104 T") or line.startswith("M109 T"):
+                        toolNumber = int(GCodeUtils.getValue(line, "T"))
+                        if self._purgeBeforeStart[toolNumber]:
+                            startTemperatures[toolNumber] = GCodeUtils.getValue(line, "S")
+                            lines[temp_index] = "M104 T" + str(toolNumber) + " S"+str(self._materialPrintTemperatureLayer0[toolNumber]) if line.startswith("M104 T") else "M109 T" + str(toolNumber) + " S" + str(self._materialPrintTemperatureLayer0[toolNumber])
+                    temp_index += 1
+                lines = yield lines
 
+    def _handleFixStartGcodeTemperatures(self):
+        '''
+            Default behavior:
                 Mirror/Duplication prints are internally taken as single extruder prints.
                 Cura only heats up left hotend
                 -> [Fix 2] Must be added the t1 heat up command 
@@ -184,42 +238,12 @@ class Bcn3DFixes(Job):
                 In Dual prints there may be some cases where hotends are heated up to printing temperature
                 -> [Fix 3] Must be heated up to layer 0 temperature instead 
         '''
-        # Fix 1: first temperature. Change standby to start if Purge Before Start enabled
-        if self._IDEXPrint:
-            countingForTool = 0
-            startTemperatures = self._materialPrintTemperatureLayer0[:]
-            for index, layer in enumerate(self._gcode_list):
-                lines = layer.split("\n")
-                if not layer.startswith(";LAYER:"):
-                    temp_index = 0
-                    while temp_index < len(lines):
-                        line = lines[temp_index]
-                        if line.startswith("T0") or line.startswith("T1"):
-                            if "T0" in line:
-                                countingForTool = 0
-                            else:
-                                countingForTool = 1
-                        if line.startswith("M104 S") or line.startswith("M109 S"):
-                            if self._purgeBeforeStart[countingForTool]:
-                                startTemperatures[countingForTool] = GCodeUtils.getValue(line, "S")
-                                lines[temp_index] = "M104 S"+str(self._materialPrintTemperatureLayer0[countingForTool]) if line.startswith("M104 S") else "M109 S"+str(self._materialPrintTemperatureLayer0[countingForTool])
-                        elif line.startswith("M104 T") or line.startswith("M109 T"):
-                            toolNumber = int(GCodeUtils.getValue(line, "T"))
-                            if self._purgeBeforeStart[toolNumber]:
-                                startTemperatures[toolNumber] = GCodeUtils.getValue(line, "S")
-                                lines[temp_index] = "M104 T" + str(toolNumber) + " S"+str(self._materialPrintTemperatureLayer0[toolNumber]) if line.startswith("M104 T") else "M109 T" + str(toolNumber) + " S" + str(self._materialPrintTemperatureLayer0[toolNumber])
-                        temp_index += 1
-                    layer = "\n".join(lines)
-                    self._gcode_list[index] = layer
-                else:
-                    break
-            Logger.log("d", "fix_start_gcode applied")
         # Fix 2: temperatures for Mirror/Duplication print modes
         if self._MirrorOrDuplicationPrint:
             self._startGcodeInfo.append("; - Fix start GCode")
-            startGcodeCorrected = False
-            for index, layer in enumerate(self._gcode_list):
-                lines = layer.split("\n")
+            lines = yield
+            while True:
+                startGcodeCorrected = False
                 temp_index = 0
                 while temp_index < len(lines):
                     try:
@@ -233,17 +257,16 @@ class Bcn3DFixes(Job):
                         temp_index += 1
                     except:
                         break
-                layer = "\n".join(lines)
-                self._gcode_list[index] = layer
                 if startGcodeCorrected:
-                    break
-            Logger.log("d", "fix_start_gcode applied")
+                    yield lines
+                    return
+                lines = yield lines
         # Fix 3: temperatures for DUAL extruder prints
         elif self._IDEXPrint:
             self._startGcodeInfo.append("; - Fix start GCode")
-            startGcodeCorrected = False
-            for index, layer in enumerate(self._gcode_list):
-                lines = layer.split("\n")
+            lines = yield
+            while True:
+                startGcodeCorrected = False
                 temp_index = 0
                 while temp_index < len(lines):
                     try:
@@ -257,11 +280,10 @@ class Bcn3DFixes(Job):
                         temp_index += 1
                     except:
                         break
-                layer = "\n".join(lines)
-                self._gcode_list[index] = layer
                 if startGcodeCorrected:
-                    break
-            Logger.log("d", "fix_start_gcode applied")
+                    yield lines
+                    return
+                lines = yield lines
 
     def _handleFixToolChangeTravel(self):
         '''
@@ -276,8 +298,10 @@ class Bcn3DFixes(Job):
         # Fix 1: Allows the new tool to go straight to the position where it has to print, instead of going to the last position before tool change and then travel to the position where it has to print
         if self._fixToolChangeTravel and self._IDEXPrint:
             self._startGcodeInfo.append("; - Fix Tool Change Travel")
-            for index, layer in enumerate(self._gcode_list):
-                lines = layer.split("\n")
+            regex = re.compile(r"\n.*X" + str(int(self._container.getProperty("layer_start_x", "value"))) + " Y" + str(int(self._container.getProperty("layer_start_y", "value"))) + ".*")
+            lines = yield
+            while True:
+                layer = "\n".join(lines)
                 temp_index = 0
                 apply = True
                 while temp_index < len(lines):
@@ -311,10 +335,7 @@ class Bcn3DFixes(Job):
                 if apply:
                     layer = "\n".join(lines)
                 # Fix 2: Fix strange travel to X105 Y297
-                regex = r"\n.*X" + str(int(self._container.getProperty("layer_start_x", "value"))) + " Y" + str(int(self._container.getProperty("layer_start_y", "value"))) + ".*"
-                layer = re.sub(regex, "", layer)
-                self._gcode_list[index] = layer
-            Logger.log("d", "fix_tool_change_travel applied")
+                lines = yield regex.sub("", layer).split("\n")
 
     def _handleTemperatureCommandsRightAfterToolChange(self):
         '''
@@ -327,9 +348,9 @@ class Bcn3DFixes(Job):
         # Fix 1: Places M109 temperature commands right after toolchange, before Extruder gcode is executed, to improve all purge commands and machine reliability
         if self._IDEXPrint:
             self._startGcodeInfo.append("; - Temperature Commands Right After Tool Change")
-            for index, layer in enumerate(self._gcode_list):
-                if layer.startswith(";LAYER:"):
-                    lines = layer.split("\n")
+            lines = yield
+            while True:
+                if lines[0].startswith(";LAYER:"):
                     temp_index = 0
                     while temp_index < len(lines):
                         try:
@@ -351,9 +372,7 @@ class Bcn3DFixes(Job):
                             temp_index += lineCount
                         except:
                             break
-                    layer = "\n".join(lines)
-                    self._gcode_list[index] = layer
-            Logger.log("d", "_handleTemperatureCommandsRightAfterToolChange() applied")            
+                lines = yield lines
 
     def _handleAvoidGrindingFilament(self):
         '''
@@ -365,31 +384,35 @@ class Bcn3DFixes(Job):
             countingForTool = 0
             purgedOffset = [0, 0]
             printArea = ''
-            for index, layer in enumerate(self._gcode_list):
-                lines = layer.split("\n")
+            previousELine, previousEValue = None, None
+            lines = yield
+            while True:
                 temp_index = 0
-                if layer.startswith(";LAYER:"):
+                if lines[0].startswith(";LAYER:"):
+                    firstLayer = lines[0].startswith(";LAYER:0") or lines[0].startswith(";LAYER:-")
                     while temp_index < len(lines):
                         line = lines[temp_index]
                         if line.startswith("T0"):
                             countingForTool = 0
-                            if not (layer.startswith(";LAYER:0") or layer.startswith(";LAYER:-")) and self._smartPurge[countingForTool]:
+                            if not firstLayer and self._smartPurge[countingForTool]:
                                 purgedOffset[countingForTool] += self._smartPurgePParameter[countingForTool]
                         elif line.startswith("T1"):
                             countingForTool = 1
-                            if not (layer.startswith(";LAYER:0") or layer.startswith(";LAYER:-")) and self._smartPurge[countingForTool]:
+                            if not firstLayer and self._smartPurge[countingForTool]:
                                 purgedOffset[countingForTool] += self._smartPurgePParameter[countingForTool]
                         elif line.startswith(';TYPE:'):
                             printArea = line
                         elif " E" in line and "G92" not in line:
                             eValue = GCodeUtils.getValue(line, "E")
+                            eLine = line
                             lineCount = temp_index - 1
                             try:
                                 if not lines[temp_index + 1].startswith("G92"):
                                     while lineCount >= 0:
                                         line = lines[lineCount]
                                         if " E" in line and "G92" not in line:
-                                            if eValue < GCodeUtils.getValue(line, "E") and self._avoidGrindingFilament[countingForTool]:
+                                            # Usually this is the previous extrusion, which was already parsed
+                                            if eValue < (previousEValue if line == previousELine else GCodeUtils.getValue(line, "E")) and self._avoidGrindingFilament[countingForTool]:
                                                 purgeLength = self._retractionExtrusionWindow[countingForTool]
                                                 retractionsPerExtruder[countingForTool].append(eValue)
                                                 if len(retractionsPerExtruder[countingForTool]) > self._maxRetracts[countingForTool]:
@@ -430,10 +453,9 @@ class Bcn3DFixes(Job):
                                         lineCount -= 1
                             except:
                                 break
+                            previousELine, previousEValue = eLine, eValue
                         temp_index += 1
-                layer = "\n".join(lines)
-                self._gcode_list[index] = layer
-            Logger.log("d", "avoid_grinding_filament applied")
+                lines = yield lines
 
     def _handleZHopAtLayerChange(self):
         '''
@@ -442,12 +464,15 @@ class Bcn3DFixes(Job):
         if self._ZHopAtLayerChange[0] or self._ZHopAtLayerChange[1]:
             self._startGcodeInfo.append("; - Z Hop At Layer Change")
             countingForTool = 0
-            for index, layer in enumerate(self._gcode_list):
-                lines = layer.split("\n")
+            lines = yield
+            while True:
                 temp_index = 0
                 while temp_index < len(lines):
                     line = lines[temp_index]
                     temp_index_2 = 1
+                    if not line.startswith((";LAYER:", "T0", "T1")):
+                        temp_index += temp_index_2
+                        continue
                     if self._ZHopAtLayerChange[countingForTool] and line.startswith(";LAYER:") and not (line.startswith(";LAYER:0") or line.startswith(";LAYER:-")):
                         if not line.startswith(";LAYER:1") or self._container.getProperty("print_mode", "value") == "regular":
                             lines[temp_index] += "\nG91" + \
@@ -464,9 +489,7 @@ class Bcn3DFixes(Job):
                     elif line.startswith("T1"):
                         countingForTool = 1
                     temp_index += temp_index_2
-                layer = "\n".join(lines)
-                self._gcode_list[index] = layer
-            Logger.log("d", "hop_at_layer_change applied")
+                lines = yield lines
 
     def _handleChangeLiftHeadMovement(self):
         '''
@@ -478,9 +501,10 @@ class Bcn3DFixes(Job):
             self._startGcodeInfo.append("; - Change Lift Head Movement")
             fixMovementInNextLayer = False
             countingForTool = 0
-            for index, layer in enumerate(self._gcode_list):
+            lines = yield
+            while True:
                 # Fix movement coming back to the part
-                lines = layer.split("\n")
+                smallLayer = any(';Small layer, adding delay' in line for line in lines)
                 if fixMovementInNextLayer:
                     temp_index = 0
                     while temp_index < len(lines):
@@ -491,7 +515,7 @@ class Bcn3DFixes(Job):
                             break
                         temp_index += 1
                 # fix movement leaving the part
-                if ';Small layer, adding delay' in layer:
+                if smallLayer:
                     temp_index = 0
                     while temp_index < len(lines):
                         line = lines[temp_index]
@@ -511,9 +535,7 @@ class Bcn3DFixes(Job):
                                 temp_index_2 += 1
                         temp_index += 1
                     fixMovementInNextLayer = True
-                layer = "\n".join(lines)
-                self._gcode_list[index] = layer
-            Logger.log("d", "_handleChangeLiftHeadMovement() applied")
+                lines = yield lines
 
     def _handleZHopAfterPrimeTower(self):
         '''
@@ -523,12 +545,15 @@ class Bcn3DFixes(Job):
         if (self._ZHopAfterPrimeTower[0] or self._ZHopAfterPrimeTower[1]) and self._IDEXPrint and self._primeTowerEnabled:
             self._startGcodeInfo.append("; - Z Hop After Prime Tower")
             countingForTool = 0
-            for index, layer in enumerate(self._gcode_list):
-                lines = layer.split("\n")
-                if layer.startswith(";LAYER:") and not (layer.startswith(";LAYER:0") or layer.startswith(";LAYER:-")):
+            lines = yield
+            while True:
+                if lines[0].startswith(";LAYER:") and not (lines[0].startswith(";LAYER:0") or lines[0].startswith(";LAYER:-")):
                     temp_index = 0
                     while temp_index < len(lines):
                         line = lines[temp_index]
+                        if not line.startswith(("T0", "T1", ";TYPE:SUPPORT")):
+                            temp_index += 1
+                            continue
                         if line.startswith("T0"):
                             countingForTool = 0
                         elif line.startswith("T1"):
@@ -558,20 +583,17 @@ class Bcn3DFixes(Job):
                                         temp_index_3 -= 1
                                 temp_index_2 += 1
                         temp_index += 1
-                layer = "\n".join(lines)
-                self._gcode_list[index] = layer
-            Logger.log("d", "retraction_hop_after_prime_tower applied")
+                lines = yield lines
 
-    def _handleFixAccelerationJerkCommands(self):
+    def _handleRemoveUnusedAccelerationJerkCommands(self):
         '''
-            Removes acceleration/jerk (M204/M205) commands if the acceleration/jerk is already set to that value
+            Removes acceleration/jerk (M204/M205) commands which have no X/Y movement after
         '''
         if self._accelerationEnabled[0] or self._accelerationEnabled[1] or self._jerkEnabled[0] or self._jerkEnabled[1]:
             self._startGcodeInfo.append("; - Fix Acceleration/Jerk commands")
-            # remove commands which have no X/Y movement after
-            for index, layer in enumerate(self._gcode_list):
-                lines = layer.split("\n")
-                if layer.startswith(";LAYER:"):
+            lines = yield
+            while True:
+                if lines[0].startswith(";LAYER:"):
                     temp_index = 0
                     while temp_index < len(lines):
                         line = lines[temp_index]
@@ -600,14 +622,18 @@ class Bcn3DFixes(Job):
                                 del lines[temp_index]
                                 temp_index -= 1
                         temp_index += 1
-                    layer = "\n".join(lines)
-                    self._gcode_list[index] = layer
-            # remove commands which imply no acceleration/jerk variations
+                lines = yield lines
+
+    def _handleRemoveRepeatedAccelerationJerkCommands(self):
+        '''
+            Removes acceleration/jerk (M204/M205) commands if the acceleration/jerk is already set to that value
+        '''
+        if self._accelerationEnabled[0] or self._accelerationEnabled[1] or self._jerkEnabled[0] or self._jerkEnabled[1]:
             acceleration = None
             xJerk, yJerk = None, None
-            for index, layer in enumerate(self._gcode_list):
-                lines = layer.split("\n")
-                if layer.startswith(";LAYER:"):
+            lines = yield
+            while True:
+                if lines[0].startswith(";LAYER:"):
                     temp_index = 0
                     while temp_index < len(lines):
                         line = lines[temp_index]
@@ -626,9 +652,28 @@ class Bcn3DFixes(Job):
                                 xJerk = GCodeUtils.getValue(line, "X")
                                 yJerk = GCodeUtils.getValue(line, "Y")
                         temp_index += 1
-                    layer = "\n".join(lines)
-                    self._gcode_list[index] = layer
-            Logger.log("d", "_handleFixAccelerationJerkCommands() applied")
+                lines = yield lines
+
+    def _handleBuildVolumeTemperature(self):
+        # Add build chamber temperature gcode
+        lines = yield
+        lines = yield lines
+        lines[0] += "\nM141 S" + str(self._container.getProperty("build_volume_temperature", "value"))
+        yield lines
+
+    def _handleWriteFixesInfo(self):
+        # Write BCN3DFixes info
+        lines = yield
+        while True:
+            written_info = False
+            for temp_index in range(len(lines)):
+                if lines[0].startswith(";Generated with Cura_SteamEngine ") and lines[temp_index].startswith(";Sigma ProGen"):
+                    lines[temp_index] = lines[temp_index] + "\n" + "\n".join(self._startGcodeInfo)
+                    written_info = True
+            if written_info:
+                yield lines
+                return
+            lines = yield lines
     
     # def _handleFixTemperatureOscilation(self):
     #     if self._fixTemperatureOscilation and self._IDEXPrint:
@@ -777,4 +822,46 @@ class Bcn3DFixes(Job):
 
     def _onProgress(self, job, amount):
         if self == job and self._message:
-            self._message.setProgress(amount)
\ No newline at end of file
+            self._message.setProgress(amount)
+
+##  A fix of Bcn3DFixes that is applied to the g-code one layer at a time.
+#
+#   The fix is a generator that is sent the lines of every layer and yields the fixed lines of that layer. A fix that
+#   is disabled returns before it asks for the first layer, a fix that is done returns on the next layer it gets.
+class _FixStage:
+    ##  \param name The name of the fix, for logging.
+    #   \param fix The generator that applies the fix.
+    #   \param trigger Optional compiled pattern. Layers in which it isn't found are not sent to the fix, because the
+    #   fix wouldn't change them.
+    def __init__(self, name, fix, trigger = None):
+        self.name = name
+        self.time = 0.0  # Time in seconds spent in this fix.
+        self.finished = False
+        self._fix = fix
+        self._trigger = trigger
+        try:
+            next(fix)
+        except StopIteration:
+            self.finished = True
+
+    ##  Apply the fix to the next layer.
+    #
+    #   \param lines The lines of the layer.
+    #   \param layer The text of the layer, the same lines joined with newlines.
+    #   \return The fixed lines and text of the layer.
+    def process(self, lines, layer):
+        if self.finished:
+            return lines, layer
+        start_time = time.time()
+        if self._trigger is None or self._trigger.search(layer):
+            try:
+                lines = self._fix.send(lines)
+            except StopIteration:
+                self.finished = True
+            else:
+                # Fixes add lines by appending them to an existing line. The next fix has to see them as separate lines.
+                layer = "\n".join(lines)
+                if layer.count("\n") != len(lines) - 1:
+                    lines = layer.split("\n")
+        self.time += time.time() - start_time
+        return lines, layer
@@ -27,13 +27,15 @@ def charsInLine(characters, line):
             return False
     return True
 
+_value_regex = re.compile(r'^-?[0-9]+\.?[0-9]*')
+
 ##  Convenience function that finds the value in a line of g-code.
 #   When requesting key = x from line "G1 X100" the value 100 is returned.
 def getValue(line, key, default=None):
     if not key in line or (';' in line and line.find(key) > line.find(';')):
         return default
     sub_part = line[line.find(key) + 1:]
-    m = re.search('^-?[0-9]+\.?[0-9]*', sub_part)
+    m = _value_regex.search(sub_part)
     if m is None:
         return default
     try:
@@ -11,13 +11,20 @@ class PrintersModel(DefinitionContainersModel):
     def __init__(self, parent=None):
         super().__init__(parent)
         self._data_api_service = DataApiService.getInstance()
+        self._update_count = 0  # To only add the printers of the last update.
 
     @pyqtSlot()
     def updateNetworkPrinters(self):
         self.clear()
         self._update()
+        self._update_count += 1
         if AuthApiService.getInstance().isLoggedIn:
-            printers = self._data_api_service.getPrinters()
+            # Add the network printers when they are known, without waiting for the network.
+            update_count = self._update_count
+            self._data_api_service.getPrintersAsync(lambda printers: self._addNetworkPrinters(printers, update_count))
+
+    def _addNetworkPrinters(self, printers, update_count):
+        if update_count == self._update_count and AuthApiService.getInstance().isLoggedIn:
             for printer in printers:
                 item = {
                     "name": printer["printerName"],
@@ -0,0 +1,47 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+
+##  A path segment of a sliced layer, kept as plain Python data.
+#
+#   It has the same fields as the PathSegment message of the engine, so the
+#   layer processing can't tell the difference.
+class SlicedPathSegment:
+    def __init__(self, extruder, point_type, points, line_type, line_width, line_thickness, line_feedrate):
+        self.extruder = extruder
+        self.point_type = point_type
+        self.points = points
+        self.line_type = line_type
+        self.line_width = line_width
+        self.line_thickness = line_thickness
+        self.line_feedrate = line_feedrate
+
+    @classmethod
+    def fromMessage(cls, message):
+        return cls(message.extruder, message.point_type, bytes(message.points), bytes(message.line_type),
+                   bytes(message.line_width), bytes(message.line_thickness), bytes(message.line_feedrate))
+
+
+##  A sliced layer with the same fields as the LayerOptimized message of the
+#   engine, kept as plain Python data.
+#
+#   Messages belong to the socket they came from and can't be used any more
+#   once that socket is closed, so layers that have to outlive the socket are
+#   copied into these.
+class SlicedLayer:
+    def __init__(self, id, height, thickness, path_segments):
+        self.id = id
+        self.height = height
+        self.thickness = thickness
+        self._path_segments = path_segments
+
+    def repeatedMessageCount(self, field_name):
+        return len(self._path_segments)
+
+    def getRepeatedMessage(self, field_name, index):
+        return self._path_segments[index]
+
+    @classmethod
+    def fromMessage(cls, message):
+        path_segments = [SlicedPathSegment.fromMessage(message.getRepeatedMessage("path_segment", index)) for index in range(message.repeatedMessageCount("path_segment"))]
+        return cls(message.id, message.height, message.thickness, path_segments)
@@ -0,0 +1,62 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import struct
+import time
+import zlib
+
+
+##  Writes a zip file with one member to a binary stream, compressing the
+#   data as it is written.
+#
+#   The sizes and checksum of the member follow its data, like zip files that
+#   are written by a program that streams them, so the stream doesn't need to
+#   be seekable and nothing but the compressor state is kept in memory. Zip64
+#   is not supported, so the member has to be smaller than 4 GiB.
+class ZipStreamWriter:
+    ##  \param stream The binary stream to write the zip file to.
+    #   \param name The name of the file in the zip file.
+    def __init__(self, stream, name, compress_level = zlib.Z_DEFAULT_COMPRESSION):
+        self._stream = stream
+        self._name = name.encode("utf-8")
+        self._compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._crc = 0
+        self._size = 0
+        self._compressed_size = 0
+        self._offset = 0  # Number of bytes written to the stream.
+
+        local_time = time.localtime()
+        self._dos_time = local_time.tm_hour << 11 | local_time.tm_min << 5 | local_time.tm_sec // 2
+        self._dos_date = (local_time.tm_year - 1980) << 9 | local_time.tm_mon << 5 | local_time.tm_mday
+
+        # Flag 0x08: the sizes and checksum follow the data. Flag 0x800: the name is UTF-8.
+        self._flags = 0x08 | 0x800
+        self._write(struct.pack("<IHHHHHIIIHH", 0x04034b50, 20, self._flags, zlib.DEFLATED, self._dos_time, self._dos_date, 0, 0, 0, len(self._name), 0) + self._name)
+
+    ##  Add data to the member.
+    def write(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self._compressed_size += len(compressed)
+            self._write(compressed)
+
+    ##  Finish the member and write the central directory. The stream is not
+    #   closed.
+    def close(self):
+        compressed = self._compressor.flush()
+        self._compressed_size += len(compressed)
+        self._write(compressed)
+        if self._size >= 0xffffffff or self._offset >= 0xffffffff:
+            raise ValueError("The file is too large to be zipped without Zip64.")
+
+        self._write(struct.pack("<IIII", 0x08074b50, self._crc, self._compressed_size, self._size))
+        directory_offset = self._offset
+        self._write(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014b50, 20, 20, self._flags, zlib.DEFLATED, self._dos_time, self._dos_date,
+                                self._crc, self._compressed_size, self._size, len(self._name), 0, 0, 0, 0, 0, 0) + self._name)
+        self._write(struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, 1, 1, self._offset - directory_offset, directory_offset, 0))
+
+    def _write(self, data):
+        self._stream.write(data)
+        self._offset += len(data)
@@ -1,6 +1,7 @@
 # Copyright (c) 2015 Ultimaker B.V.
 # Cura is released under the terms of the LGPLv3 or higher.
 
+import concurrent.futures
 import os.path
 import zipfile
 
@@ -34,6 +35,39 @@ except ImportError:
     Logger.log("w", "Unable to load cElementTree, switching to slower version")
     import xml.etree.ElementTree as ET
 
+##  A mesh that was decoded from a 3MF file.
+class _Mesh:
+    def __init__(self, mesh_data, vertices, center):
+        self.mesh_data = mesh_data
+        self.vertices = vertices
+        self.center = center  # The center of the extents of the vertices.
+
+    ##  Get the smallest coordinate along an axis of the vertices, when they are
+    #   transformed with a 4x4 matrix.
+    def getMinimum(self, transformation, axis):
+        return self.vertices.dot(transformation[axis, 0:3]).min() + transformation[axis, 3]
+
+
+##  Decode the vertices of a mesh and build its mesh data.
+#
+#   This is done for all meshes of a file at once in worker threads, as NumPy
+#   releases the GIL while it works on the vertices. The extents of the
+#   vertices are computed here, once.
+#   \param vertex_bytes The vertices as given by libSavitar, 3 floats each.
+#   \return A _Mesh, or None if there are no vertices.
+def _buildMesh(vertex_bytes):
+    data = numpy.frombuffer(vertex_bytes, dtype = numpy.float32)
+    if data.size < 3:
+        return None
+    vertices = data[0:data.size // 3 * 3].reshape((-1, 3))
+
+    mesh_builder = MeshBuilder()
+    mesh_builder.setVertices(vertices)
+    mesh_builder.calculateNormals(fast = True)
+    center = (vertices.min(axis = 0).astype(numpy.float64) + vertices.max(axis = 0)) / 2
+    return _Mesh(mesh_builder.build(), vertices, center)
+
+
 ##    Base implementation for reading 3MF files. Has no support for textures. Only loads meshes!
 class ThreeMFReader(MeshReader):
     def __init__(self):
@@ -47,65 +81,69 @@ class ThreeMFReader(MeshReader):
         self._base_name = ""
         self._unit = None
         self._object_count = 0  # Used to name objects as there is no node name yet.
+        self._active_build_plate = 0
 
     def _createMatrixFromTransformationString(self, transformation):
         if transformation == "":
             return Matrix()
 
-        splitted_transformation = transformation.split()
         ## Transformation is saved as:
         ## M00 M01 M02 0.0
         ## M10 M11 M12 0.0
         ## M20 M21 M22 0.0
         ## M30 M31 M32 1.0
         ## We switch the row & cols as that is how everyone else uses matrices!
-        temp_mat = Matrix()
-        # Rotation & Scale
-        temp_mat._data[0, 0] = splitted_transformation[0]
-        temp_mat._data[1, 0] = splitted_transformation[1]
-        temp_mat._data[2, 0] = splitted_transformation[2]
-        temp_mat._data[0, 1] = splitted_transformation[3]
-        temp_mat._data[1, 1] = splitted_transformation[4]
-        temp_mat._data[2, 1] = splitted_transformation[5]
-        temp_mat._data[0, 2] = splitted_transformation[6]
-        temp_mat._data[1, 2] = splitted_transformation[7]
-        temp_mat._data[2, 2] = splitted_transformation[8]
-
-        # Translation
-        temp_mat._data[0, 3] = splitted_transformation[9]
-        temp_mat._data[1, 3] = splitted_transformation[10]
-        temp_mat._data[2, 3] = splitted_transformation[11]
-
-        return temp_mat
+        data = numpy.identity(4)
+        data[0:3, :] = numpy.array(transformation.split()[0:12], dtype = numpy.float64).reshape((4, 3)).transpose()
+        return Matrix(data)
+
+    ##  Create the transformation that converts from 3mf worldspace into ours.
+    def _createConversionTransformation(self, global_container_stack):
+        # First step: flip the y and z axis.
+        conversion = numpy.identity(4)
+        conversion[1:3, 1:3] = [[0, 1], [-1, 0]]
+
+        # Second step: 3MF defines the left corner of the machine as center, whereas cura uses the center of the
+        # build volume.
+        if global_container_stack:
+            translation = numpy.identity(4)
+            translation[0, 3] = -global_container_stack.getProperty("machine_width", "value") / 2
+            translation[1, 3] = -global_container_stack.getProperty("machine_depth", "value") / 2
+            conversion = conversion.dot(translation)
+
+        # Third step: 3MF also defines a unit, whereas Cura always assumes mm.
+        scale = self._getScaleFromUnit(self._unit)
+        return conversion.dot(numpy.diag([scale.x, scale.y, scale.z, 1.0]))
+
+    ##  Get the vertices of a node and its children, in the order in which
+    #   _convertSavitarNodeToUMNode uses them.
+    def _collectVertexData(self, savitar_node, vertex_data):
+        vertex_data.append(savitar_node.getMeshData().getFlatVerticesAsBytes())
+        for child in savitar_node.getChildren():
+            self._collectVertexData(child, vertex_data)
+        return vertex_data
 
     ##  Convenience function that converts a SceneNode object (as obtained from libSavitar) to a Uranium scene node.
+    #   \param meshes Iterator over the results of _buildMesh for this node
+    #   and its children.
     #   \returns Uranium scene node.
-    def _convertSavitarNodeToUMNode(self, savitar_node):
+    def _convertSavitarNodeToUMNode(self, savitar_node, meshes):
         self._object_count += 1
         node_name = "Object %s" % self._object_count
 
-        active_build_plate = Application.getInstance().getBuildPlateModel().activeBuildPlate
-
         um_node = CuraSceneNode()
-        um_node.addDecorator(BuildPlateDecorator(active_build_plate))
+        um_node.addDecorator(BuildPlateDecorator(self._active_build_plate))
         um_node.addDecorator(ConvexHullDecorator())
         um_node.setName(node_name)
         transformation = self._createMatrixFromTransformationString(savitar_node.getTransformation())
         um_node.setTransformation(transformation)
-        mesh_builder = MeshBuilder()
-
-        data = numpy.fromstring(savitar_node.getMeshData().getFlatVerticesAsBytes(), dtype=numpy.float32)
 
-        vertices = numpy.resize(data, (int(data.size / 3), 3))
-        mesh_builder.setVertices(vertices)
-        mesh_builder.calculateNormals(fast=True)
-        mesh_data = mesh_builder.build()
-
-        if len(mesh_data.getVertices()):
-            um_node.setMeshData(mesh_data)
+        mesh = next(meshes)
+        if mesh is not None:
+            um_node.setMeshData(mesh.mesh_data)
 
         for child in savitar_node.getChildren():
-            child_node = self._convertSavitarNodeToUMNode(child)
+            child_node = self._convertSavitarNodeToUMNode(child, meshes)
             if child_node:
                 um_node.addChild(child_node)
 
@@ -167,57 +205,43 @@ class ThreeMFReader(MeshReader):
             parser = Savitar.ThreeMFParser()
             scene_3mf = parser.parse(archive.open("3D/3dmodel.model").read())
             self._unit = scene_3mf.getUnit()
-            for node in scene_3mf.getSceneNodes():
-                um_node = self._convertSavitarNodeToUMNode(node)
+            savitar_nodes = scene_3mf.getSceneNodes()
+
+            global_container_stack = Application.getInstance().getGlobalContainerStack()
+            self._active_build_plate = Application.getInstance().getBuildPlateModel().activeBuildPlate
+            conversion = self._createConversionTransformation(global_container_stack)
+            print_mode_enabled = global_container_stack is not None and global_container_stack.getProperty("print_mode", "enabled")
+
+            # Decode the meshes of all objects at once, in worker threads.
+            vertex_data = [self._collectVertexData(node, []) for node in savitar_nodes]
+            with concurrent.futures.ThreadPoolExecutor(max_workers = os.cpu_count() or 1) as executor:
+                meshes = list(executor.map(_buildMesh, [data for node_vertex_data in vertex_data for data in node_vertex_data]))
+
+            first_mesh = 0
+            for node, node_vertex_data in zip(savitar_nodes, vertex_data):
+                node_meshes = meshes[first_mesh:first_mesh + len(node_vertex_data)]
+                first_mesh += len(node_vertex_data)
+                um_node = self._convertSavitarNodeToUMNode(node, iter(node_meshes))
                 if um_node is None:
                     continue
-                # compensate for original center position, if object(s) is/are not around its zero position
-
-                transform_matrix = Matrix()
-                mesh_data = um_node.getMeshData()
-                if mesh_data is not None:
-                    extents = mesh_data.getExtents()
-                    center_vector = Vector(extents.center.x, extents.center.y, extents.center.z)
-                    transform_matrix.setByTranslation(center_vector)
-                transform_matrix.multiply(um_node.getLocalTransformation())
-                um_node.setTransformation(transform_matrix)
-
-                global_container_stack = Application.getInstance().getGlobalContainerStack()
-
-                # Create a transformation Matrix to convert from 3mf worldspace into ours.
-                # First step: flip the y and z axis.
-                transformation_matrix = Matrix()
-                transformation_matrix._data[1, 1] = 0
-                transformation_matrix._data[1, 2] = 1
-                transformation_matrix._data[2, 1] = -1
-                transformation_matrix._data[2, 2] = 0
-
-                # Second step: 3MF defines the left corner of the machine as center, whereas cura uses the center of the
-                # build volume.
-                if global_container_stack:
-                    translation_vector = Vector(x=-global_container_stack.getProperty("machine_width", "value") / 2,
-                                                y=-global_container_stack.getProperty("machine_depth", "value") / 2,
-                                                z=0)
-                    translation_matrix = Matrix()
-                    translation_matrix.setByTranslation(translation_vector)
-                    transformation_matrix.multiply(translation_matrix)
-
-                # Third step: 3MF also defines a unit, whereas Cura always assumes mm.
-                scale_matrix = Matrix()
-                scale_matrix.setByScaleVector(self._getScaleFromUnit(self._unit))
-                transformation_matrix.multiply(scale_matrix)
-
-                # Pre multiply the transformation with the loaded transformation, so the data is handled correctly.
-                um_node.setTransformation(um_node.getLocalTransformation().preMultiply(transformation_matrix))
+
+                # Compensate for original center position, if object(s) is/are not around its zero position, and
+                # convert from 3mf worldspace into ours, in one transformation.
+                mesh = node_meshes[0]
+                transformation = um_node.getLocalTransformation().getData().copy()
+                if mesh is not None:
+                    transformation[0:3, 3] += mesh.center
+                transformation = conversion.dot(transformation)
+                um_node.setTransformation(Matrix(transformation))
 
                 # Check if the model is positioned below the build plate and honor that when loading project files.
-                if um_node.getMeshData() is not None:
-                    minimum_z_value = um_node.getMeshData().getExtents(um_node.getWorldTransformation()).minimum.y  # y is z in transformation coordinates
+                if mesh is not None:
+                    minimum_z_value = mesh.getMinimum(transformation, 1)  # y is z in transformation coordinates
                     if minimum_z_value < 0:
                         um_node.addDecorator(ZOffsetDecorator())
                         um_node.callDecoration("setZOffset", minimum_z_value)
 
-                if Application.getInstance().getGlobalContainerStack().getProperty("print_mode", "enabled"):
+                if print_mode_enabled:
                     node_dup = DuplicatedNode(um_node)
                     PrintModeManager.getInstance().addDuplicatedNode(node_dup)
 
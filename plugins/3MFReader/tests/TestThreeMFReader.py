@@ -0,0 +1,112 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import time
+import unittest.mock #To fake the application.
+import zipfile
+
+import numpy
+import pytest
+
+from UM.Application import Application
+
+from cura.Scene.ZOffsetDecorator import ZOffsetDecorator
+from ThreeMFReader import ThreeMFReader #The module we're testing.
+
+##  The corners and faces of a cube from (0, 0, 0) to (size, size, size).
+def cube(size = 10):
+    corners = numpy.array([[x, y, z] for x in (0, size) for y in (0, size) for z in (0, size)], dtype = numpy.float32)
+    faces = [[0, 1, 3], [0, 3, 2], [4, 6, 7], [4, 7, 5], [0, 4, 5], [0, 5, 1], [2, 3, 7], [2, 7, 6], [0, 2, 6], [0, 6, 4], [1, 5, 7], [1, 7, 3]]
+    return corners, faces
+
+##  Write a 3MF file with an object on the build plate for every transformation.
+#
+#   \param transformations For every object the 12 numbers of its 3MF
+#   transformation.
+def write3MF(file_name, transformations, unit = "millimeter", size = 10):
+    corners, faces = cube(size)
+    model = ['<?xml version="1.0" encoding="UTF-8"?>\n<model unit="%s" xml:lang="en-US" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n<resources>\n' % unit]
+    model.append('<object id="1" type="model"><mesh><vertices>')
+    model.extend('<vertex x="%g" y="%g" z="%g" />' % tuple(corner) for corner in corners)
+    model.append("</vertices><triangles>")
+    model.extend('<triangle v1="%d" v2="%d" v3="%d" />' % tuple(face) for face in faces)
+    model.append("</triangles></mesh></object>\n</resources>\n<build>\n")
+    model.extend('<item objectid="1" transform="%s" />\n' % " ".join("%g" % number for number in transformation) for transformation in transformations)
+    model.append("</build>\n</model>\n")
+    with zipfile.ZipFile(file_name, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("3D/3dmodel.model", "".join(model))
+
+##  A translation in the order of the numbers in a 3MF file.
+def translation(x, y, z):
+    return [1, 0, 0, 0, 1, 0, 0, 0, 1, x, y, z]
+
+##  The transformation of a node as the reader computed it before it was
+#   batched: first the center of the mesh, then the transformation in the
+#   file, then the flip of y and z, the offset of the build plate and the unit.
+def expectedTransformation(transformation, center, scale = 1, machine_width = 200, machine_depth = 100):
+    file_transformation = numpy.identity(4)
+    file_transformation[0:3, :] = numpy.array(transformation, dtype = numpy.float64).reshape((4, 3)).transpose()
+    file_transformation[0:3, 3] += center
+    flip = numpy.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, -1, 0, 0], [0, 0, 0, 1]], dtype = numpy.float64)
+    build_plate = numpy.identity(4)
+    build_plate[0:2, 3] = [-machine_width / 2, -machine_depth / 2]
+    return flip.dot(build_plate).dot(numpy.diag([scale, scale, scale, 1])).dot(file_transformation)
+
+@pytest.fixture(autouse = True)
+def application():
+    properties = {"machine_width": 200, "machine_depth": 100}
+    global_stack = unittest.mock.MagicMock()
+    global_stack.getProperty = lambda key, property_name: properties.get(key, False)
+    application = unittest.mock.MagicMock()
+    application.getGlobalContainerStack = unittest.mock.MagicMock(return_value = global_stack)
+    application.getBuildPlateModel().activeBuildPlate = 0
+    with unittest.mock.patch.object(Application, "getInstance", unittest.mock.MagicMock(return_value = application)):
+        with unittest.mock.patch("ThreeMFReader.ConvexHullDecorator"):
+            yield application
+
+def test_read(tmpdir):
+    file_name = str(tmpdir.join("objects.3mf"))
+    transformations = [translation(0, 0, 0), translation(50, 20, 0), [0, 1, 0, -1, 0, 0, 0, 0, 1, 100, 50, 0]]
+    write3MF(file_name, transformations)
+
+    nodes = ThreeMFReader().read(file_name)
+
+    assert [node.getName() for node in nodes] == ["Object 1", "Object 2", "Object 3"]
+    corners, faces = cube()
+    vertices = corners[numpy.array(faces).ravel()]
+    for node, transformation in zip(nodes, transformations):
+        assert numpy.array_equal(node.getMeshData().getVertices(), vertices)
+        assert numpy.allclose(node.getLocalTransformation().getData(), expectedTransformation(transformation, [5, 5, 5]))
+        assert node.getDecorator(ZOffsetDecorator) is None
+
+def test_unit(tmpdir):
+    file_name = str(tmpdir.join("inch.3mf"))
+    write3MF(file_name, [translation(1, 2, 0)], unit = "inch")
+
+    node, = ThreeMFReader().read(file_name)
+
+    assert numpy.allclose(node.getLocalTransformation().getData(), expectedTransformation(translation(1, 2, 0), [5, 5, 5], scale = 25.4))
+
+##  Objects that stick through the build plate keep their height.
+def test_belowBuildPlate(tmpdir):
+    file_name = str(tmpdir.join("below.3mf"))
+    write3MF(file_name, [translation(0, 0, -12)])
+
+    node, = ThreeMFReader().read(file_name)
+
+    assert node.callDecoration("getZOffset") == pytest.approx(-7)
+
+##  Read a project with many parts and report how long it took.
+@pytest.mark.benchmark
+def test_benchmarkRead(tmpdir, benchmark_report):
+    object_count = 500
+    file_name = str(tmpdir.join("objects.3mf"))
+    write3MF(file_name, [translation(index % 25 * 8, index // 25 * 8, 0) for index in range(object_count)], size = 5)
+    reader = ThreeMFReader()
+
+    start_time = time.time()
+    nodes = reader.read(file_name)
+    read_time = time.time() - start_time
+
+    assert len(nodes) == object_count
+    benchmark_report("Read %d objects in %.2f s, %.2f ms per object" % (object_count, read_time, read_time / object_count * 1000))
@@ -5,9 +5,7 @@ from UM.Message import Message
 from cura.Bcn3DApi.DataApiService import DataApiService
 from cura.Settings.ExtruderManager import ExtruderManager
 
-import tempfile
-import os
-from zipfile import ZipFile
+from .UploadGCodeJob import UploadGCodeJob
 
 from UM.i18n import i18nCatalog
 catalog = i18nCatalog("cura")
@@ -24,13 +22,18 @@ class CloudOutputDevice(OutputDevice):
 
         self._data_api_service = DataApiService.getInstance()
 
-        self._gcode = []
         self._writing = False
-        self._compressing_gcode = False
+        self._upload_job = None
         self._progress_message = Message("Sending the gcode to the printer",
                                          title="Send to Printer", dismissable=False, progress=-1)
+        self._progress_message.addAction("cancel", catalog.i18nc("@action:button", "Cancel"), None, "")
+        self._progress_message.actionTriggered.connect(self._onActionTriggered)
 
     def requestWrite(self, nodes, file_name=None, limit_mimetypes=False, file_handler=None, **kwargs):
+        if self._writing:
+            Message("The previous gcode is still being sent.", title="Can't send gcode to printer").show()
+            return
+        self._progress_message.setProgress(-1)
         self._progress_message.show()
         serial_number = Application.getInstance().getGlobalContainerStack().getMetaDataEntry("serial_number")
         if not serial_number:
@@ -55,29 +58,35 @@ class CloudOutputDevice(OutputDevice):
                 material = extruder_stack.material.getMetaData()["material"]
                 nozzle = extruder_stack.getProperty("machine_nozzle_size", "value")
                 if not materials["T" + position] in [material, ""] or not nozzles["T" + position] in [str(nozzle), ""]:
+                    self._progress_message.hide()
                     Message("The selected printer has a different configuration.", title="Configuration mismatch").show()
                     return
 
         self.writeStarted.emit(self)
+        self._writing = True
         active_build_plate = Application.getInstance().getBuildPlateModel().activeBuildPlate
-        self._gcode = getattr(Application.getInstance().getController().getScene(), "gcode_dict")[active_build_plate]
-        gcode = self._joinGcode()
-        temp_file = tempfile.NamedTemporaryFile(delete=False)
-        temp_file.write(gcode.encode())
-        temp_file_name = temp_file.name
-        temp_file.close()
-        file_name_with_extension = file_name + ".gcode.zip"
-        gcode_path = os.path.join(tempfile.gettempdir(), file_name_with_extension)
-        with ZipFile(gcode_path, "w") as gcode_zip:
-            gcode_zip.write(temp_file_name, arcname=file_name + ".gcode")
-        self._data_api_service.sendGcode(gcode_path, file_name_with_extension, serial_number)
-        os.remove(temp_file_name)
-        os.remove(gcode_path)
-        self.writeFinished.emit()
+        gcode_list = getattr(Application.getInstance().getController().getScene(), "gcode_dict")[active_build_plate]
+        self._upload_job = UploadGCodeJob(gcode_list, file_name, serial_number)
+        self._upload_job.progress.connect(self._onProgress)
+        self._upload_job.finished.connect(self._onFinished)
+        self._upload_job.start()
+
+    def _onProgress(self, job, progress):
+        self._progress_message.setProgress(progress)
+        self.writeProgress.emit(self, progress)
+
+    def _onFinished(self, job):
+        self._writing = False
+        self._upload_job = None
         self._progress_message.hide()
+        if job.getResult():
+            Message("The gcode has been sent to the cloud successfully", title="Gcode sent").show()
+            self.writeSuccess.emit(self)
+        elif not job.isCancelled():
+            Message("There was an error sending the gcode to the cloud", title="Gcode sent error").show()
+            self.writeError.emit(self)
+        self.writeFinished.emit(self)
 
-    def _joinGcode(self):
-        gcode = ""
-        for line in self._gcode:
-            gcode += line
-        return gcode
+    def _onActionTriggered(self, message, action):
+        if action == "cancel" and self._upload_job is not None:
+            self._upload_job.cancel()
@@ -3,6 +3,7 @@ from UM.OutputDevice.OutputDevicePlugin import OutputDevicePlugin
 from UM import Util
 
 from cura.Bcn3DApi.AuthApiService import AuthApiService
+from cura.Bcn3DApi.DataApiService import DataApiService
 
 from .CloudOutputDevice import CloudOutputDevice
 
@@ -17,6 +18,7 @@ class CloudOutputDevicePlugin(OutputDevicePlugin):
         self._global_stack = None
         self._supports_cloud_connection = False
         self._is_logged_in = AuthApiService.getInstance().isLoggedIn
+        self._output_device = None
 
     def start(self):
         AuthApiService.getInstance().authStateChanged.connect(self._authStateChanged)
@@ -28,7 +30,7 @@ class CloudOutputDevicePlugin(OutputDevicePlugin):
     def _authStateChanged(self, logged_in):
         self._is_logged_in = logged_in
         if self._is_logged_in and self._supports_cloud_connection:
-            self.getOutputDeviceManager().addOutputDevice(CloudOutputDevice())
+            self._addOutputDevice()
         else:
             self.stop()
 
@@ -39,6 +41,16 @@ class CloudOutputDevicePlugin(OutputDevicePlugin):
             self._supports_cloud_connection = Util.parseBool(self._global_stack.getMetaDataEntry("is_network_machine"))
 
             if self._supports_cloud_connection and self._is_logged_in:
-                self.getOutputDeviceManager().addOutputDevice(CloudOutputDevice())
+                self._addOutputDevice()
             else:
                 self.stop()
+
+    ##  Add the output device, and get the state of the printer in the
+    #   background so that it is known when the g-code is sent.
+    def _addOutputDevice(self):
+        if self._output_device is None:
+            self._output_device = CloudOutputDevice()
+        self.getOutputDeviceManager().addOutputDevice(self._output_device)
+        serial_number = self._global_stack.getMetaDataEntry("serial_number") if self._global_stack else None
+        if serial_number:
+            DataApiService.getInstance().getPrinterAsync(serial_number)
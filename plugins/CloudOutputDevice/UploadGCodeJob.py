@@ -0,0 +1,81 @@
+from UM.Job import Job
+from UM.Logger import Logger
+
+from cura.Bcn3DApi.DataApiService import DataApiService
+from cura.Bcn3DApi.MultipartStream import MultipartStream
+from cura.GCodeStore import GCodeStore
+from cura.ZipStreamWriter import ZipStreamWriter
+
+import tempfile
+
+
+##  Zips the g-code of a build plate and uploads it to the cloud, in the
+#   background.
+#
+#   The layers are compressed one at a time into a temporary file that stays
+#   in memory while it is small, and the upload reads that file while it is
+#   sent, so the memory that is used doesn't grow with the size of the job.
+#   The progress goes up to 50 while zipping and up to 100 while uploading.
+class UploadGCodeJob(Job):
+    ##  The zipped g-code is kept in memory up to this size.
+    MaxMemory = 8 * 1024 * 1024
+
+    def __init__(self, gcode_list, file_name, serial_number):
+        super().__init__()
+        self._gcode_list = gcode_list
+        self._file_name = file_name
+        self._serial_number = serial_number
+        self._data_api_service = DataApiService.getInstance()
+        self._body = None
+        self._cancelled = False
+
+    def getFileName(self):
+        return self._file_name + ".gcode.zip"
+
+    ##  Stop zipping or uploading. The result of the job is False then.
+    def cancel(self):
+        self._cancelled = True
+        if self._body is not None:
+            self._body.cancel()
+
+    def isCancelled(self):
+        return self._cancelled
+
+    def run(self):
+        self.setResult(False)
+        upload = self._data_api_service.requestGcodeUpload(self.getFileName(), self._serial_number)
+        if not upload:
+            return
+        url, fields = upload
+
+        with tempfile.SpooledTemporaryFile(max_size=self.MaxMemory) as zip_file:
+            if not self._writeZip(zip_file):
+                return
+            self._body = MultipartStream(fields, "file", self.getFileName(), zip_file, "application/zip", self._onUploadProgress)
+            if self._cancelled:
+                return
+            self.setResult(self._data_api_service.uploadGcode(url, self._body))
+        if self._cancelled:
+            Logger.log("i", "Upload of %s was cancelled", self.getFileName())
+            self.setResult(False)
+
+    ##  Compress the layers one by one.
+    #   \return False if the job was cancelled.
+    def _writeZip(self, stream):
+        writer = ZipStreamWriter(stream, self._file_name + ".gcode")
+        if isinstance(self._gcode_list, GCodeStore):
+            layers = self._gcode_list.rawLayers()
+        else:
+            layers = (layer.encode() for layer in self._gcode_list)
+        layer_count = max(len(self._gcode_list), 1)
+        for index, layer in enumerate(layers):
+            if self._cancelled:
+                return False
+            writer.write(layer)
+            self.progress.emit(self, (index + 1) / layer_count * 50)
+            Job.yieldThread()
+        writer.close()
+        return True
+
+    def _onUploadProgress(self, bytes_sent, bytes_total):
+        self.progress.emit(self, 50 + bytes_sent / bytes_total * 50)
@@ -0,0 +1,90 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import io
+import zipfile
+
+import pytest
+
+from cura.Bcn3DApi.DataApiService import DataApiService
+from cura.GCodeStore import GCodeStore
+from UploadGCodeJob import UploadGCodeJob #The module we're testing.
+from UploadServer import UploadServer
+
+##  G-code that doesn't compress too well, so it takes some reads to send it.
+def createGCode(layer_count = 10, move_count = 2000):
+    gcode_list = [";FLAVOR:Marlin\nG28\n"]
+    for layer_number in range(layer_count):
+        gcode_list.append(";LAYER:%d\n" % layer_number + "".join("G1 X%.3f Y%.3f E%.5f\n" % (index * 7 % 199, index * 13 % 211, index * 0.0137) for index in range(move_count)))
+    return gcode_list
+
+@pytest.fixture
+def server(monkeypatch):
+    server = UploadServer()
+    monkeypatch.setattr(DataApiService, "data_api_url", server.url + "/data")
+    yield server
+    server.close()
+
+##  Cancels the job halfway through the upload.
+class CancellingJob(UploadGCodeJob):
+    def _onUploadProgress(self, bytes_sent, bytes_total):
+        super()._onUploadProgress(bytes_sent, bytes_total)
+        if bytes_sent > bytes_total / 2:
+            self.cancel()
+
+@pytest.mark.parametrize("store", [False, True])
+def test_upload(server, store):
+    gcode_list = createGCode()
+    if store:
+        gcode_list = GCodeStore(gcode_list)
+    job = UploadGCodeJob(gcode_list, "print", "SN123")
+
+    job.run()
+
+    assert job.getResult()
+    assert server.gcode_requests == [{"serialNumber": "SN123", "fileName": "print.gcode.zip"}]
+    upload = server.uploads[0]
+    assert upload["key"] == b"gcodes/1"
+    assert upload["policy"] == b"secret"
+    with zipfile.ZipFile(io.BytesIO(upload["file"])) as zip_file:
+        assert zip_file.read("print.gcode") == "".join(gcode_list).encode("utf-8")
+    assert "Transfer-Encoding" not in server.upload_headers[0]
+
+##  The zip file is spilled to disk when it is large.
+def test_uploadFromDisk(server, monkeypatch):
+    monkeypatch.setattr(UploadGCodeJob, "MaxMemory", 1024)
+    gcode_list = createGCode()
+
+    job = UploadGCodeJob(gcode_list, "print", "SN123")
+    job.run()
+
+    assert job.getResult()
+    with zipfile.ZipFile(io.BytesIO(server.uploads[0]["file"])) as zip_file:
+        assert zip_file.read("print.gcode") == "".join(gcode_list).encode("utf-8")
+
+def test_noUploadAllowed(server):
+    server.gcode_status = 403
+    job = UploadGCodeJob(createGCode(layer_count = 1), "print", "SN123")
+
+    job.run()
+
+    assert not job.getResult()
+    assert server.uploads == []
+
+def test_uploadFailed(server):
+    server.upload_status = 403
+    job = UploadGCodeJob(createGCode(layer_count = 1), "print", "SN123")
+
+    job.run()
+
+    assert not job.getResult()
+    assert not job.isCancelled()
+
+def test_cancel(server):
+    job = CancellingJob(createGCode(), "print", "SN123")
+
+    job.run()
+
+    assert not job.getResult()
+    assert job.isCancelled()
+    assert server.uploads == []
@@ -0,0 +1,73 @@
+import email.parser
+import http.server
+import json
+import threading
+
+
+##  A local stand-in for the data API and the storage that g-codes are
+#   uploaded to, to test uploading without a network.
+#
+#   POST /data/gcodes answers with the URL and form fields to upload to, like
+#   the data API does. POST /upload takes a multipart form like the storage
+#   does, and needs a Content-Length.
+class UploadServer(http.server.HTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _UploadRequestHandler)
+        self.url = "http://127.0.0.1:%d" % self.server_address[1]
+        self.gcode_requests = []  # The JSON bodies of the requests for an upload.
+        self.uploads = []  # Dicts with the form fields of the uploads, and the file as bytes.
+        self.upload_headers = []
+        self.gcode_status = 200
+        self.upload_status = 204
+
+        self._thread = threading.Thread(target = self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _UploadRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        if "Content-Length" not in self.headers:
+            self._respond(411)
+            return
+        length = int(self.headers["Content-Length"])
+        try:
+            body = self.rfile.read(length)
+        except OSError:
+            body = b""
+        if len(body) < length:  # The client stopped sending.
+            self.close_connection = True
+            return
+
+        if self.path == "/data/gcodes":
+            self.server.gcode_requests.append(json.loads(body.decode("utf-8")))
+            if self.server.gcode_status != 200:
+                self._respond(self.server.gcode_status)
+                return
+            self._respond(200, json.dumps({"url": self.server.url + "/upload", "fields": {"key": "gcodes/1", "policy": "secret"}}).encode("utf-8"))
+        elif self.path == "/upload":
+            if self.server.upload_status >= 300:
+                self._respond(self.server.upload_status)
+                return
+            message = email.parser.BytesParser().parsebytes(b"Content-Type: " + self.headers["Content-Type"].encode("utf-8") + b"\r\n\r\n" + body)
+            form = {}
+            for part in message.get_payload():
+                form[part.get_param("name", header = "content-disposition")] = part.get_payload(decode = True)
+            self.server.uploads.append(form)
+            self.server.upload_headers.append(dict(self.headers))
+            self._respond(self.server.upload_status)
+        else:
+            self._respond(404)
+
+    def _respond(self, status, body = b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -17,10 +17,14 @@ from UM.Qt.Duration import DurationFormat
 from PyQt5.QtCore import QObject, pyqtSlot
 
 from collections import defaultdict
+from cura.GCodeStore import GCodeStore
 from cura.Settings.ExtruderManager import ExtruderManager
 from . import ProcessSlicedLayersJob
 from . import StartSliceJob
+from .EngineWorker import EngineWorker
+from .SliceCache import SliceCache, SliceResult, WriteSliceCacheJob
 
+import hashlib
 import os
 import sys
 from time import time
@@ -74,6 +78,8 @@ class CuraEngineBackend(QObject, Backend):
         self._onActiveViewChanged()
         self._stored_layer_data = []
         self._stored_optimized_layer_data = {}  # key is build plate number, then arrays are stored until they go to the ProcessSlicesLayersJob
+        # The settings that were sent to the engine, so that the next slice only has to evaluate the changed settings.
+        self._settings_message_cache = StartSliceJob.SettingsMessageCache()
 
         self._scene = Application.getInstance().getController().getScene()
         self._scene.sceneChanged.connect(self._onSceneChanged)
@@ -130,6 +136,22 @@ class CuraEngineBackend(QObject, Backend):
 
         self._slice_start_time = None
 
+        # Results of earlier slices, so going back to a configuration that was sliced before doesn't need the engine.
+        Preferences.getInstance().addPreference("backend/slice_cache_size", 512)  # In MB. 0 disables the cache.
+        self._slice_cache = None
+        self._slice_cache_key = None  # Key to store the result of the current slice under.
+        self._slice_estimates = None  # Print times and material amounts of the current slice.
+        self._updateSliceCache()
+
+        # Engines that slice several build plates at the same time, each with a socket of its own.
+        Preferences.getInstance().addPreference("backend/engine_pool_size", 1)  # 1 slices one build plate at a time with the main engine.
+        self._engine_workers = {}  # Build plate number -> EngineWorker that slices it.
+        self._engine_worker_jobs = {}  # StartSliceJob -> EngineWorker that gets its slice message.
+        self._build_plate_progress = {}  # Build plate number -> slicing progress, for the build plates sliced by the engine pool.
+        self._failed_build_plates = []  # Build plates of which the engine failed, to slice again later.
+        self._engine_pool_error = False  # Did preparing the slice fail for one of the build plates?
+        self._engine_pool_retries = 0  # How many times in a row build plates were sliced again because their engine failed.
+
         Preferences.getInstance().addPreference("general/auto_slice", False)
 
         self._use_timer = False
@@ -152,10 +174,14 @@ class CuraEngineBackend(QObject, Backend):
 
     ##  Get the command that is used to call the engine.
     #   This is useful for debugging and used to actually start the engine.
+    #   \param port The port the engine connects to, or None for the port of
+    #   the main engine.
     #   \return list of commands and args / parameters.
-    def getEngineCommand(self):
+    def getEngineCommand(self, port = None):
+        if port is None:
+            port = self._port
         json_path = Resources.getPath(Resources.DefinitionContainers, "fdmprinter.def.json")
-        return [Preferences.getInstance().getValue("backend/location"), "connect", "127.0.0.1:{0}".format(self._port), "-j", json_path, ""]
+        return [Preferences.getInstance().getValue("backend/location"), "connect", "127.0.0.1:{0}".format(port), "-j", json_path, ""]
 
     ##  Emitted when we get a message containing print duration and material amount.
     #   This also implies the slicing has finished.
@@ -169,6 +195,12 @@ class CuraEngineBackend(QObject, Backend):
     ##  Emitted when the slicing process is aborted forcefully.
     slicingCancelled = Signal()
 
+    ##  Emitted when the slicing progress of a build plate changes, while
+    #   several build plates are sliced at the same time.
+    #   \param build_plate The number of the build plate.
+    #   \param amount The progress of the slice, between 0 and 1.
+    buildPlateProgressChanged = Signal()
+
     @pyqtSlot()
     def stopSlicing(self):
         self.backendStateChange.emit(BackendState.NotStarted)
@@ -210,13 +242,20 @@ class CuraEngineBackend(QObject, Backend):
         if not hasattr(self._scene, "gcode_dict"):
             self._scene.gcode_dict = {}
 
+        if self._engine_workers:
+            Logger.log("d", "  ## Engine pool still busy, it continues with the next build plate itself")
+            return
+        if len(self._build_plates_to_be_sliced) > 1 and self._getEnginePoolSize() > 1:
+            self._startEnginePool()
+            return
+
         # see if we really have to slice
         active_build_plate = Application.getInstance().getBuildPlateModel().activeBuildPlate
         build_plate_to_be_sliced = self._build_plates_to_be_sliced.pop(0)
         Logger.log("d", "Going to slice build plate [%s]!" % build_plate_to_be_sliced)
         num_objects = self._numObjects()
         if build_plate_to_be_sliced not in num_objects or num_objects[build_plate_to_be_sliced] == 0:
-            self._scene.gcode_dict[build_plate_to_be_sliced] = []
+            self._scene.gcode_dict[build_plate_to_be_sliced] = GCodeStore()
             Logger.log("d", "Build plate %s has no objects to be sliced, skipping", build_plate_to_be_sliced)
             if self._build_plates_to_be_sliced:
                 self.slice()
@@ -231,19 +270,18 @@ class CuraEngineBackend(QObject, Backend):
         if self._process is None:
             self._createSocket()
         self.stopSlicing()
-        self._engine_is_fresh = False  # Yes we're going to use the engine
 
         self.processingProgress.emit(0.0)
         self.backendStateChange.emit(BackendState.NotStarted)
 
-        self._scene.gcode_dict[build_plate_to_be_sliced] = []  #[] indexed by build plate number
+        self._scene.gcode_dict[build_plate_to_be_sliced] = GCodeStore()  # GCodeStore indexed by build plate number
         self._slicing = True
         self.slicingStarted.emit()
 
         self.determineAutoSlicing()  # Switch timer on or off if appropriate
 
         slice_message = self._socket.createMessage("cura.proto.Slice")
-        self._start_slice_job = StartSliceJob.StartSliceJob(slice_message)
+        self._start_slice_job = StartSliceJob.StartSliceJob(slice_message, self._settings_message_cache)
         self._start_slice_job_build_plate = build_plate_to_be_sliced
         self._start_slice_job.setBuildPlate(self._start_slice_job_build_plate)
         self._start_slice_job.start()
@@ -253,11 +291,13 @@ class CuraEngineBackend(QObject, Backend):
     #   Start the engine process by calling _createSocket()
     def _terminate(self):
         self._slicing = False
+        self._slice_cache_key = None
         self._stored_layer_data = []
         if self._start_slice_job_build_plate in self._stored_optimized_layer_data:
             del self._stored_optimized_layer_data[self._start_slice_job_build_plate]
         if self._start_slice_job is not None:
             self._start_slice_job.cancel()
+        self._stopEngineWorkers()
 
         self.slicingCancelled.emit()
         self.processingProgress.emit(0)
@@ -285,16 +325,45 @@ class CuraEngineBackend(QObject, Backend):
     #
     #   \param job The start slice job that was just finished.
     def _onStartSliceCompleted(self, job):
-        if self._error_message:
-            self._error_message.hide()
-
         # Note that cancelled slice jobs can still call this method.
         if self._start_slice_job is job:
             self._start_slice_job = None
 
-        if job.isCancelled() or job.getError() or job.getResult() == StartSliceJob.StartJobResult.Error:
+        if self._error_message:
+            self._error_message.hide()
+        if self._handleStartSliceError(job):
             return
 
+        # Preparation completed. If this configuration was sliced before, use that result instead of the engine.
+        if self._slice_cache is not None:
+            cache_key = self._getSliceCacheKey(job)
+            cached_result = self._slice_cache.get(cache_key)
+            if cached_result is not None:
+                Logger.log("d", "Using the cached result of an earlier slice for build plate %s", self._start_slice_job_build_plate)
+                self._onSliceResultRestored(cached_result)
+                return
+            self._slice_cache_key = cache_key
+            self._slice_estimates = None
+
+        # Send it to the backend.
+        self._engine_is_fresh = False  # Yes we're going to use the engine
+        self._socket.sendMessage(job.getSliceMessage())
+
+        # Notify the user that it's now up to the backend to do it's job
+        self.backendStateChange.emit(BackendState.Processing)
+
+        Logger.log("d", "Sending slice message took %s seconds", time() - self._slice_start_time )
+
+    ##  Show the errors that occurred while preparing a slice.
+    #
+    #   The error of an earlier slice is not hidden here, since the engine pool
+    #   prepares several build plates of the same slice one after another.
+    #   \param job The start slice job that was just finished.
+    #   \return True if the slice message can't be sent to the engine.
+    def _handleStartSliceError(self, job):
+        if job.isCancelled() or job.getError() or job.getResult() == StartSliceJob.StartJobResult.Error:
+            return True
+
         if job.getResult() == StartSliceJob.StartJobResult.MaterialIncompatible:
             if Application.getInstance().platformActivity:
                 self._error_message = Message(catalog.i18nc("@info:status",
@@ -303,7 +372,7 @@ class CuraEngineBackend(QObject, Backend):
                 self.backendStateChange.emit(BackendState.Error)
             else:
                 self.backendStateChange.emit(BackendState.NotStarted)
-            return
+            return True
 
         if job.getResult() == StartSliceJob.StartJobResult.SettingError:
             if Application.getInstance().platformActivity:
@@ -331,7 +400,7 @@ class CuraEngineBackend(QObject, Backend):
                 self.backendStateChange.emit(BackendState.Error)
             else:
                 self.backendStateChange.emit(BackendState.NotStarted)
-            return
+            return True
 
         elif job.getResult() == StartSliceJob.StartJobResult.ObjectSettingError:
             errors = {}
@@ -351,7 +420,7 @@ class CuraEngineBackend(QObject, Backend):
                                           title = catalog.i18nc("@info:title", "Unable to slice"))
             self._error_message.show()
             self.backendStateChange.emit(BackendState.Error)
-            return
+            return True
 
         if job.getResult() == StartSliceJob.StartJobResult.BuildPlateError:
             if Application.getInstance().platformActivity:
@@ -372,15 +441,222 @@ class CuraEngineBackend(QObject, Backend):
                 self.backendStateChange.emit(BackendState.NotStarted)
                 pass
             self._invokeSlice()
+            return True
+
+        return False
+
+    ##  Get how many engines may slice build plates at the same time.
+    #
+    #   This is the engine pool size preference, but no more than the number
+    #   of cores. An external backend can only slice one build plate at a time.
+    def _getEnginePoolSize(self):
+        if Application.getInstance().getCommandLineOption("external-backend", False):
+            return 1
+        pool_size = int(Preferences.getInstance().getValue("backend/engine_pool_size"))
+        return max(1, min(pool_size, os.cpu_count() or 1))
+
+    ##  Slice all build plates that need slicing with a pool of engines.
+    #
+    #   Every engine slices one build plate with a socket and start slice job
+    #   of its own. When an engine is finished, the next build plate is given
+    #   to a new engine, until all build plates are sliced.
+    def _startEnginePool(self):
+        Logger.log("d", "Going to slice build plates %s with %s engines", self._build_plates_to_be_sliced, self._getEnginePoolSize())
+        self.stopSlicing()
+
+        self._build_plate_progress = {build_plate: 0.0 for build_plate in self._build_plates_to_be_sliced}
+        self._failed_build_plates = []
+        self._engine_pool_error = False
+        self.processingProgress.emit(0.0)
+        self.backendStateChange.emit(BackendState.NotStarted)
+
+        self._slicing = True
+        self.slicingStarted.emit()
+
+        self.determineAutoSlicing()  # Switch timer on or off if appropriate
+        self._fillEnginePool()
+
+    ##  Start engines for the next build plates, until the pool is full or all
+    #   build plates are being sliced.
+    def _fillEnginePool(self):
+        pool_size = self._getEnginePoolSize()
+        active_build_plate = Application.getInstance().getBuildPlateModel().activeBuildPlate
+        num_objects = self._numObjects()
+        while self._build_plates_to_be_sliced and len(self._engine_workers) < pool_size:
+            build_plate = self._build_plates_to_be_sliced.pop(0)
+            if num_objects[build_plate] == 0:
+                self._scene.gcode_dict[build_plate] = GCodeStore()
+                Logger.log("d", "Build plate %s has no objects to be sliced, skipping", build_plate)
+                self._setBuildPlateProgress(build_plate, 1.0)
+                continue
+
+            self._stored_optimized_layer_data[build_plate] = []
+            self._scene.gcode_dict[build_plate] = GCodeStore()
+            if Application.getInstance().getPrintInformation() and build_plate == active_build_plate:
+                Application.getInstance().getPrintInformation().setToZeroPrintInformation(build_plate)
+
+            # Every engine connects to a port of its own, just above the port of the main engine.
+            used_ports = {worker.getPort() for worker in self._engine_workers.values()}
+            port = next(port for port in range(self._port + 1, self._port + 1 + pool_size) if port not in used_ports)
+            worker = EngineWorker(build_plate, self.getEngineCommand(port), port, self._getProtocolFile())
+            worker.progressChanged.connect(self._onEngineWorkerProgress)
+            worker.finished.connect(self._onEngineWorkerFinished)
+            worker.failed.connect(self._onEngineWorkerFailed)
+            if not worker.start():
+                worker.stop()
+                self._failed_build_plates.append(build_plate)
+                continue
+            self._engine_workers[build_plate] = worker
+
+            # The slice message is built while the engine starts.
+            job = StartSliceJob.StartSliceJob(worker.createSliceMessage(), self._settings_message_cache)
+            job.setBuildPlate(build_plate)
+            self._engine_worker_jobs[job] = worker
+            job.finished.connect(self._onEngineWorkerStartSliceCompleted)
+            job.start()
+
+        if not self._engine_workers:
+            self._onEnginePoolFinished()
+
+    ##  Called when all build plates given to the engine pool are done.
+    #
+    #   Build plates of which the engine failed are sliced again. If their
+    #   engines fail again, an error is shown instead.
+    def _onEnginePoolFinished(self):
+        self._slicing = False
+        Logger.log("d", "Slicing took %s seconds", time() - self._slice_start_time)
+
+        failed_build_plates = self._failed_build_plates
+        self._failed_build_plates = []
+        for build_plate in failed_build_plates:
+            if build_plate not in self._build_plates_to_be_sliced:
+                self._build_plates_to_be_sliced.append(build_plate)
+
+        if failed_build_plates and self._engine_pool_retries < 1:
+            Logger.log("w", "The engines of build plates %s failed, slicing them again", failed_build_plates)
+            self._engine_pool_retries += 1
+            self.backendStateChange.emit(BackendState.NotStarted)
+            self._invokeSlice()
             return
+        self._engine_pool_retries = 0
 
-        # Preparation completed, send it to the backend.
-        self._socket.sendMessage(job.getSliceMessage())
+        if failed_build_plates:
+            self._error_message = Message(catalog.i18nc("@info:status", "Unable to slice build plate {0}, because the engine stopped unexpectedly.").format(", ".join(str(build_plate) for build_plate in failed_build_plates)),
+                                          title = catalog.i18nc("@info:title", "Unable to slice"))
+            self._error_message.show()
+            self.backendStateChange.emit(BackendState.Error)
+        elif self._engine_pool_error:  # The error message is already shown.
+            self.backendStateChange.emit(BackendState.Error)
+        else:
+            self.backendStateChange.emit(BackendState.Done)
+            self.processingProgress.emit(1.0)
 
-        # Notify the user that it's now up to the backend to do it's job
+    ##  Called when the slice message for an engine of the pool is built.
+    #
+    #   \param job The start slice job that was just finished.
+    def _onEngineWorkerStartSliceCompleted(self, job):
+        worker = self._engine_worker_jobs.pop(job, None)
+        if worker is None:  # The engine pool was stopped.
+            return
+        build_plate = worker.getBuildPlate()
+
+        if self._handleStartSliceError(job):
+            if not job.isCancelled():
+                self._engine_pool_error = True
+            self._removeEngineWorker(worker)
+            self._setBuildPlateProgress(build_plate, 1.0)
+            self._fillEnginePool()
+            return
+
+        if self._slice_cache is not None:
+            cache_key = self._getSliceCacheKey(job)
+            cached_result = self._slice_cache.get(cache_key)
+            if cached_result is not None:
+                Logger.log("d", "Using the cached result of an earlier slice for build plate %s", build_plate)
+                self._removeEngineWorker(worker)
+                self._onBuildPlateSliced(build_plate, cached_result.gcode_list, cached_result.layers, cached_result.times, cached_result.material_amounts)
+                self._fillEnginePool()
+                return
+            worker.setSliceCacheKey(cache_key)
+
+        worker.sendSliceMessage(job.getSliceMessage())
         self.backendStateChange.emit(BackendState.Processing)
 
-        Logger.log("d", "Sending slice message took %s seconds", time() - self._slice_start_time )
+    ##  Called when an engine of the pool reports progress.
+    def _onEngineWorkerProgress(self, worker, amount):
+        if self._engine_workers.get(worker.getBuildPlate()) is not worker:
+            return
+        self._setBuildPlateProgress(worker.getBuildPlate(), amount)
+        self.backendStateChange.emit(BackendState.Processing)
+
+    ##  Called when an engine of the pool finished slicing its build plate.
+    def _onEngineWorkerFinished(self, worker):
+        build_plate = worker.getBuildPlate()
+        if self._engine_workers.get(build_plate) is not worker:
+            return
+
+        # The estimates are a message of the socket of the worker, so they have to be read before it is stopped.
+        times, material_amounts = {}, []
+        cache_key = None
+        estimates = worker.getEstimates()
+        if estimates is not None:  # Without estimates, the result can't be restored from the slice cache.
+            times, material_amounts = self._parsePrintTimeMaterialEstimates(estimates)
+            cache_key = worker.getSliceCacheKey()
+        self._removeEngineWorker(worker)
+        self._onBuildPlateSliced(build_plate, worker.getGCodeList(), worker.getLayers(), times, material_amounts, cache_key)
+        self._fillEnginePool()
+
+    ##  Called when the connection with an engine of the pool failed. The
+    #   build plate is sliced again next time.
+    def _onEngineWorkerFailed(self, worker):
+        build_plate = worker.getBuildPlate()
+        if self._engine_workers.get(build_plate) is not worker:
+            return
+        self._removeEngineWorker(worker)
+        self._stored_optimized_layer_data.pop(build_plate, None)
+        self._failed_build_plates.append(build_plate)
+        self._fillEnginePool()
+
+    ##  Use the g-code and layers of a build plate that was sliced by the
+    #   engine pool.
+    #
+    #   \param cache_key Key to store the result under in the slice cache, or
+    #   None if it must not be stored.
+    def _onBuildPlateSliced(self, build_plate, gcode_list, layers, times, material_amounts, cache_key = None):
+        self._scene.gcode_dict[build_plate] = gcode_list
+        self._stored_optimized_layer_data[build_plate] = layers
+        self.printDurationMessage.emit(build_plate, times, material_amounts)
+        if cache_key is not None:
+            self._storeSliceResult(cache_key, build_plate, times, material_amounts)
+        self._fillInPrintInformation(gcode_list)
+        self._setBuildPlateProgress(build_plate, 1.0)
+
+        active_build_plate = Application.getInstance().getBuildPlateModel().activeBuildPlate
+        if self._layer_view_active and (self._process_layers_job is None or not self._process_layers_job.isRunning()) and active_build_plate == build_plate:
+            self._startProcessSlicedLayersJob(active_build_plate)
+
+    ##  Report the progress of one build plate of the engine pool, and the
+    #   progress of all of them together.
+    def _setBuildPlateProgress(self, build_plate, amount):
+        self._build_plate_progress[build_plate] = amount
+        self.buildPlateProgressChanged.emit(build_plate, amount)
+        self.processingProgress.emit(sum(self._build_plate_progress.values()) / len(self._build_plate_progress))
+
+    ##  Stop an engine of the pool and forget about it.
+    def _removeEngineWorker(self, worker):
+        del self._engine_workers[worker.getBuildPlate()]
+        worker.stop()
+
+    ##  Stop all engines of the pool, and the jobs that build their slice
+    #   messages.
+    def _stopEngineWorkers(self):
+        for job in self._engine_worker_jobs:
+            job.cancel()
+        self._engine_worker_jobs = {}
+        for build_plate, worker in self._engine_workers.items():
+            worker.stop()
+            self._stored_optimized_layer_data.pop(build_plate, None)
+        self._engine_workers = {}
 
     ##  Determine enable or disable auto slicing. Return True for enable timer and False otherwise.
     #   It disables when
@@ -519,6 +795,9 @@ class CuraEngineBackend(QObject, Backend):
     # \param instance The setting instance that has changed.
     # \param property The property of the setting instance that has changed.
     def _onSettingChanged(self, instance, property):
+        if property in StartSliceJob.SettingsMessageCache.CachedProperties:
+            self._settings_message_cache.invalidate(instance, self._global_container_stack)
+
         if property == "value":  # Only reslice if the value has changed.
             self.needsSlicing()
             self._onChanged()
@@ -569,16 +848,14 @@ class CuraEngineBackend(QObject, Backend):
     def _onSlicingFinishedMessage(self, message):
         self.backendStateChange.emit(BackendState.Done)
         self.processingProgress.emit(1.0)
+        self._engine_pool_retries = 0
 
-        gcode_list = self._scene.gcode_dict[self._start_slice_job_build_plate]
-        for index, line in enumerate(gcode_list):
-            replaced = line.replace("{print_time}", str(Application.getInstance().getPrintInformation().currentPrintTime.getDisplayString(DurationFormat.Format.ISO8601)))
-            replaced = replaced.replace("{filament_amount}", str(Application.getInstance().getPrintInformation().materialLengths))
-            replaced = replaced.replace("{filament_weight}", str(Application.getInstance().getPrintInformation().materialWeights))
-            replaced = replaced.replace("{filament_cost}", str(Application.getInstance().getPrintInformation().materialCosts))
-            replaced = replaced.replace("{jobname}", str(Application.getInstance().getPrintInformation().jobName))
+        if self._slice_cache_key is not None and self._slice_estimates is not None:
+            times, material_amounts = self._slice_estimates
+            self._storeSliceResult(self._slice_cache_key, self._start_slice_job_build_plate, times, material_amounts)
+        self._slice_cache_key = None
 
-            gcode_list[index] = replaced
+        self._fillInPrintInformation(self._scene.gcode_dict[self._start_slice_job_build_plate])
 
         self._slicing = False
         Logger.log("d", "Slicing took %s seconds", time() - self._slice_start_time )
@@ -598,6 +875,25 @@ class CuraEngineBackend(QObject, Backend):
             self.enableTimer()  # manually enable timer to be able to invoke slice, also when in manual slice mode
             self._invokeSlice()
 
+    ##  Replace the print information placeholders in sliced g-code.
+    #
+    #   \param gcode_list The g-code of a build plate, which is changed.
+    def _fillInPrintInformation(self, gcode_list):
+        print_information = Application.getInstance().getPrintInformation()
+        replacements = [
+            ("{print_time}", str(print_information.currentPrintTime.getDisplayString(DurationFormat.Format.ISO8601))),
+            ("{filament_amount}", str(print_information.materialLengths)),
+            ("{filament_weight}", str(print_information.materialWeights)),
+            ("{filament_cost}", str(print_information.materialCosts)),
+            ("{jobname}", str(print_information.jobName))
+        ]
+        for index, line in enumerate(gcode_list):
+            replaced = line
+            for key, value in replacements:
+                replaced = replaced.replace(key, value)
+            if replaced != line:  # Only layers that change need to be stored again.
+                gcode_list[index] = replaced
+
     ##  Called when a g-code message is received from the engine.
     #
     #   \param message The protobuf message containing g-code, encoded as UTF-8.
@@ -613,9 +909,14 @@ class CuraEngineBackend(QObject, Backend):
 
     ##  Creates a new socket connection.
     def _createSocket(self):
-        super()._createSocket(os.path.abspath(os.path.join(PluginRegistry.getInstance().getPluginPath(self.getPluginId()), "Cura.proto")))
+        super()._createSocket(self._getProtocolFile())
         self._engine_is_fresh = True
 
+    ##  Get the path to the protocol buffer definitions of the messages that
+    #   are sent to and from the engine.
+    def _getProtocolFile(self):
+        return os.path.abspath(os.path.join(PluginRegistry.getInstance().getPluginPath(self.getPluginId()), "Cura.proto"))
+
     ##  Called when anything has changed to the stuff that needs to be sliced.
     #
     #   This indicates that we should probably re-slice soon.
@@ -629,17 +930,32 @@ class CuraEngineBackend(QObject, Backend):
             else:
                 self._change_timer.start()
 
+    ##  Called when the containers in the global stack or an extruder stack
+    #   changed, which may change any setting.
+    def _onStackContainersChanged(self, *args, **kwargs):
+        self._settings_message_cache.clear()
+        self._onChanged()
+
     ##  Called when a print time message is received from the engine.
     #
     #   \param message The protobuf message containing the print time per feature and
     #   material amount per extruder
     def _onPrintTimeMaterialEstimates(self, message):
+        times, material_amounts = self._parsePrintTimeMaterialEstimates(message)
+        self._slice_estimates = (times, material_amounts)
+        self.printDurationMessage.emit(self._start_slice_job_build_plate, times, material_amounts)
+
+    ##  Get the print times and material amounts from a print time message.
+    #
+    #   \param message The protobuf message containing the print time per
+    #   feature and material amount per extruder.
+    #   \return Tuple of the print time per feature and the list of material
+    #   amounts.
+    def _parsePrintTimeMaterialEstimates(self, message):
         material_amounts = []
         for index in range(message.repeatedMessageCount("materialEstimates")):
             material_amounts.append(message.getRepeatedMessage("materialEstimates", index).material_amount)
-
-        times = self._parseMessagePrintTimes(message)
-        self.printDurationMessage.emit(self._start_slice_job_build_plate, times, material_amounts)
+        return self._parseMessagePrintTimes(message), material_amounts
 
     ##  Called for parsing message to retrieve estimated time per feature
     #
@@ -660,6 +976,52 @@ class CuraEngineBackend(QObject, Backend):
         }
         return result
 
+    ##  Get the key of a slice in the slice cache.
+    #
+    #   This combines the fingerprint of the slice message with the version of
+    #   the engine, which is identified by the size and modification time of
+    #   the executable.
+    def _getSliceCacheKey(self, job):
+        engine_location = Preferences.getInstance().getValue("backend/location")
+        try:
+            engine_stat = os.stat(engine_location)
+            engine_version = "%s:%s:%s" % (engine_location, engine_stat.st_size, engine_stat.st_mtime)
+        except OSError:
+            engine_version = engine_location
+        return hashlib.sha1((job.getFingerprint() + engine_version).encode("utf-8")).hexdigest()
+
+    ##  Store the result of a slice that just finished in the slice cache.
+    #
+    #   The g-code is changed when the print information is filled in, so a
+    #   snapshot of it is stored. That copies nothing here; the g-code is only
+    #   read when it's written to disk in the background.
+    def _storeSliceResult(self, cache_key, build_plate, times, material_amounts):
+        result = SliceResult(self._scene.gcode_dict[build_plate].snapshot(), times, material_amounts, list(self._stored_optimized_layer_data.get(build_plate, [])))
+        WriteSliceCacheJob(self._slice_cache, cache_key, result).start()
+
+    ##  Use a result from the slice cache as if the engine just sent it.
+    def _onSliceResultRestored(self, result):
+        build_plate = self._start_slice_job_build_plate
+        self._scene.gcode_dict[build_plate] = result.gcode_list
+        self._stored_optimized_layer_data[build_plate] = result.layers
+        self.printDurationMessage.emit(build_plate, result.times, result.material_amounts)
+        self._onSlicingFinishedMessage(None)
+
+    ##  Create, resize or remove the slice cache to match the preference.
+    def _updateSliceCache(self):
+        max_size = int(Preferences.getInstance().getValue("backend/slice_cache_size")) * 1024 * 1024
+        if max_size <= 0:
+            if self._slice_cache is not None:
+                self._slice_cache.clear()
+            self._slice_cache = None
+        elif self._slice_cache is None:
+            try:
+                self._slice_cache = SliceCache(os.path.join(Resources.getCacheStoragePath(), "slice_cache"), max_size)
+            except OSError:
+                Logger.logException("w", "Unable to create the slice cache")
+        else:
+            self._slice_cache.setMaxSize(max_size)
+
     ##  Called when the back-end connects to the front-end.
     def _onBackendConnected(self):
         if self._restart:
@@ -728,22 +1090,23 @@ class CuraEngineBackend(QObject, Backend):
     def _onGlobalStackChanged(self):
         if self._global_container_stack:
             self._global_container_stack.propertyChanged.disconnect(self._onSettingChanged)
-            self._global_container_stack.containersChanged.disconnect(self._onChanged)
+            self._global_container_stack.containersChanged.disconnect(self._onStackContainersChanged)
             extruders = list(self._global_container_stack.extruders.values())
 
             for extruder in extruders:
                 extruder.propertyChanged.disconnect(self._onSettingChanged)
-                extruder.containersChanged.disconnect(self._onChanged)
+                extruder.containersChanged.disconnect(self._onStackContainersChanged)
 
         self._global_container_stack = Application.getInstance().getGlobalContainerStack()
+        self._settings_message_cache.clear()
 
         if self._global_container_stack:
             self._global_container_stack.propertyChanged.connect(self._onSettingChanged)  # Note: Only starts slicing when the value changed.
-            self._global_container_stack.containersChanged.connect(self._onChanged)
+            self._global_container_stack.containersChanged.connect(self._onStackContainersChanged)
             extruders = list(self._global_container_stack.extruders.values())
             for extruder in extruders:
                 extruder.propertyChanged.connect(self._onSettingChanged)
-                extruder.containersChanged.connect(self._onChanged)
+                extruder.containersChanged.connect(self._onStackContainersChanged)
             self._onChanged()
 
     def _onProcessLayersFinished(self, job):
@@ -766,6 +1129,9 @@ class CuraEngineBackend(QObject, Backend):
             self._change_timer.timeout.disconnect(self.slice)
 
     def _onPreferencesChanged(self, preference):
+        if preference == "backend/slice_cache_size":
+            self._updateSliceCache()
+            return
         if preference != "general/auto_slice":
             return
         auto_slice = self.determineAutoSlicing()
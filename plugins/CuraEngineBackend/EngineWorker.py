@@ -0,0 +1,231 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import subprocess
+import sys
+import threading
+
+import Arcus
+
+from UM.Backend.SignalSocket import SignalSocket
+from UM.Logger import Logger
+from UM.Signal import Signal, signalemitter
+
+from cura.GCodeStore import GCodeStore
+from cura.SlicedLayer import SlicedLayer
+
+
+##  One engine process that slices one build plate, with a socket of its own.
+#
+#   The backend runs several workers at the same time to slice several build
+#   plates at once. A worker listens on its own port and starts the engine as
+#   soon as it listens. The slice message is sent when both the engine is
+#   connected and the message is built, so that building the message and
+#   starting the engine happen at the same time. Everything the engine sends
+#   is kept in the worker until slicing is finished. The layers are copied out
+#   of their messages when they arrive, since the messages can't be used any
+#   more once the worker is stopped and its socket is closed.
+@signalemitter
+class EngineWorker:
+    ##  Emitted when the engine reports progress.
+    #   \param worker The worker that slices.
+    #   \param amount The progress of the slice, between 0 and 1.
+    progressChanged = Signal()
+
+    ##  Emitted when the engine finished slicing.
+    #   \param worker The worker that sliced.
+    finished = Signal()
+
+    ##  Emitted when the engine could not be started or the connection with it
+    #   failed before slicing was finished. The worker should then be stopped.
+    #   \param worker The worker that failed.
+    failed = Signal()
+
+    ##  \param build_plate The number of the build plate to slice.
+    #   \param command The command to start the engine with, connecting to the
+    #   port of the worker.
+    #   \param port The port to listen on for the engine.
+    #   \param protocol_file The path to the protocol buffer definitions.
+    def __init__(self, build_plate, command, port, protocol_file):
+        self._build_plate = build_plate
+        self._command = command
+        self._port = port
+        self._protocol_file = protocol_file
+
+        self._socket = None
+        self._process = None
+        self._slice_message = None  # Slice message waiting for the engine to connect.
+        self._slice_message_lock = threading.Lock()  # The engine may connect while the message is handed over.
+        self._slice_cache_key = None
+        self._stopped = False
+
+        self._gcode_list = GCodeStore()
+        self._layers = []
+        self._estimates = None  # The PrintTimeMaterialEstimates message.
+
+        self._message_handlers = {
+            "cura.proto.LayerOptimized": self._onOptimizedLayerMessage,
+            "cura.proto.Progress": self._onProgressMessage,
+            "cura.proto.GCodeLayer": self._onGCodeLayerMessage,
+            "cura.proto.GCodePrefix": self._onGCodePrefixMessage,
+            "cura.proto.PrintTimeMaterialEstimates": self._onPrintTimeMaterialEstimates,
+            "cura.proto.SlicingFinished": self._onSlicingFinishedMessage
+        }
+
+    def getBuildPlate(self):
+        return self._build_plate
+
+    def getPort(self):
+        return self._port
+
+    ##  Get the g-code the engine sent, without the print information filled
+    #   in.
+    def getGCodeList(self):
+        return self._gcode_list
+
+    ##  Get the layers the engine sent, as SlicedLayers. They stay valid after
+    #   the worker is stopped.
+    def getLayers(self):
+        return self._layers
+
+    ##  Get the PrintTimeMaterialEstimates message the engine sent. It can only
+    #   be used until the worker is stopped.
+    #   \return The message, or None if the engine didn't send it (yet).
+    def getEstimates(self):
+        return self._estimates
+
+    ##  Key to store the result of this slice under in the slice cache.
+    def setSliceCacheKey(self, cache_key):
+        self._slice_cache_key = cache_key
+
+    def getSliceCacheKey(self):
+        return self._slice_cache_key
+
+    ##  Create the socket for the engine, so that the slice message can be
+    #   created.
+    #
+    #   The engine is not started yet, but only once the slice message is sent.
+    #   That way no engine is started for a slice that is found in the slice
+    #   cache.
+    #   \return True if the worker started, or False if the protocol could not
+    #   be loaded.
+    def start(self):
+        self._socket = SignalSocket()
+        self._socket.stateChanged.connect(self._onSocketStateChanged)
+        self._socket.messageReceived.connect(self._onMessageReceived)
+        self._socket.error.connect(self._onSocketError)
+
+        if not self._socket.registerAllMessageTypes(self._protocol_file):
+            Logger.log("e", "Could not register the protocol of the engine: %s", self._socket.getLastError())
+            return False
+        return True
+
+    ##  Create an empty slice message for the StartSliceJob to fill.
+    def createSliceMessage(self):
+        return self._socket.createMessage("cura.proto.Slice")
+
+    ##  Send the slice message to the engine, as soon as it is connected.
+    #
+    #   The engine is started when the socket listens.
+    def sendSliceMessage(self, message):
+        self._slice_message = message
+        if self._socket.getState() == Arcus.SocketState.Initial:
+            self._socket.listen("127.0.0.1", self._port)
+        self._sendSliceMessageIfConnected()
+
+    ##  Close the socket and stop the engine.
+    def stop(self):
+        self._stopped = True
+        self._slice_message = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+        if self._process is not None:
+            try:
+                self._process.terminate()
+                Logger.log("d", "Engine process of build plate %s is killed. Received return code %s", self._build_plate, self._process.wait())
+            except Exception as e:  # Terminating a process that is already terminating causes an exception, silently ignore this.
+                Logger.log("d", "Exception occurred while trying to kill the engine of build plate %s: %s", self._build_plate, str(e))
+            self._process = None
+
+    ##  Stop reacting to the engine and report that it failed. The socket is
+    #   closed by stop(), not here, since this is called from the socket.
+    def _failed(self):
+        self._stopped = True
+        self._slice_message = None
+        self.failed.emit(self)
+
+    def _sendSliceMessageIfConnected(self):
+        with self._slice_message_lock:
+            if self._slice_message is None or self._socket is None or self._socket.getState() != Arcus.SocketState.Connected:
+                return
+            self._socket.sendMessage(self._slice_message)
+            self._slice_message = None
+
+    def _onSocketStateChanged(self, state):
+        if self._stopped:
+            return
+        if state == Arcus.SocketState.Listening:
+            if self._process is None:
+                self._startEngine()
+        elif state == Arcus.SocketState.Connected:
+            Logger.log("d", "Engine of build plate %s connected on port %s", self._build_plate, self._port)
+            self._sendSliceMessageIfConnected()
+
+    def _onSocketError(self, error):
+        if self._stopped or error.getErrorCode() == Arcus.ErrorCode.Debug:
+            return
+        Logger.log("w", "Engine of build plate %s failed: %s", self._build_plate, str(error))
+        self._failed()
+
+    def _onMessageReceived(self):
+        if self._stopped:
+            return
+        message = self._socket.takeNextMessage()
+        while message is not None:
+            handler = self._message_handlers.get(message.getTypeName())
+            if handler is not None:
+                handler(message)
+            if self._stopped:  # Stopped by a handler.
+                return
+            message = self._socket.takeNextMessage()
+
+    def _startEngine(self):
+        Logger.log("d", "Starting the engine for build plate %s on port %s", self._build_plate, self._port)
+        kwargs = {}
+        if sys.platform == "win32":
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            startupinfo.wShowWindow = subprocess.SW_HIDE
+            kwargs["startupinfo"] = startupinfo
+            kwargs["creationflags"] = 0x00004000  # BELOW_NORMAL_PRIORITY_CLASS
+        try:
+            self._process = subprocess.Popen(self._command, stdin = subprocess.DEVNULL, stdout = subprocess.PIPE, stderr = subprocess.STDOUT, **kwargs)
+        except OSError as e:
+            Logger.log("e", "Unable to start the engine for build plate %s: %s", self._build_plate, str(e))
+            self._failed()
+            return
+        threading.Thread(target = self._logOutput, args = (self._process.stdout, ), daemon = True).start()
+
+    def _logOutput(self, handle):
+        for line in iter(handle.readline, b""):
+            Logger.log("d", "[Engine %s] %s", self._build_plate, line.decode("utf-8", "replace").rstrip())
+
+    def _onOptimizedLayerMessage(self, message):
+        self._layers.append(SlicedLayer.fromMessage(message))
+
+    def _onProgressMessage(self, message):
+        self.progressChanged.emit(self, message.amount)
+
+    def _onGCodeLayerMessage(self, message):
+        self._gcode_list.append(message.data.decode("utf-8", "replace"))
+
+    def _onGCodePrefixMessage(self, message):
+        self._gcode_list.insert(0, message.data.decode("utf-8", "replace"))
+
+    def _onPrintTimeMaterialEstimates(self, message):
+        self._estimates = message
+
+    def _onSlicingFinishedMessage(self, message):
+        self.finished.emit(self)
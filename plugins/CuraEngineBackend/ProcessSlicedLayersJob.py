@@ -42,7 +42,68 @@ def colorCodeToRGBA(color_code):
         1.0]
 
 
+##  Convert the path segments of a layer message of the engine to layer
+#   polygons.
+#
+#   The data of all segments is decoded at once into one set of arrays for
+#   the whole layer, and each polygon gets a slice of those arrays.
+#
+#   \param layer The LayerOptimized message.
+#   \return A list of LayerPolygons.
+def createLayerPolygons(layer):
+    path_segments = [layer.getRepeatedMessage("path_segment", index) for index in range(layer.repeatedMessageCount("path_segment"))]
+    if not path_segments:
+        return []
+
+    # Number of lines and points of every segment. Points are 2D (x, y) or 3D (x, y, z).
+    line_counts = numpy.array([len(path_segment.line_type) for path_segment in path_segments])
+    point_sizes = numpy.array([2 if path_segment.point_type == 0 else 3 for path_segment in path_segments])
+    point_counts = numpy.array([len(path_segment.points) for path_segment in path_segments]) // (4 * point_sizes)
+    point_ends = numpy.cumsum(point_counts)
+    if line_counts.sum() == 0:  # Nothing to show.
+        return []
+
+    # The points are copied once, joined for the whole layer, so that they are converted to 3D in one go below. The
+    # line data isn't copied: the polygons get views on the data of the engine. Faulty line types are fixed by the
+    # polygons.
+    points = numpy.frombuffer(b"".join(path_segment.points for path_segment in path_segments), dtype = "f4")
+
+    # Create a new 3D-array and insert the right height for 2D points.
+    # Our Y is the height and the Y of the engine points to the back of the build plate.
+    new_points = numpy.empty((point_ends[-1], 3), numpy.float32)
+    if (point_sizes == 2).all():
+        points = points.reshape((-1, 2))
+        new_points[:, 0] = points[:, 0]
+        new_points[:, 1] = layer.height / 1000  # layer height value is in backend representation
+        new_points[:, 2] = -points[:, 1]
+    elif (point_sizes == 3).all():
+        points = points.reshape((-1, 3))
+        new_points[:, 0] = points[:, 0]
+        new_points[:, 1] = points[:, 2]
+        new_points[:, 2] = -points[:, 1]
+    else:  # A mix of 2D and 3D segments, which has to be done per segment.
+        for path_segment_points, point_size, point_end, point_count in zip(numpy.split(points, numpy.cumsum(point_counts * point_sizes)[:-1]), point_sizes, point_ends, point_counts):
+            segment = new_points[point_end - point_count:point_end]
+            path_segment_points = path_segment_points.reshape((-1, point_size))
+            segment[:, 0] = path_segment_points[:, 0]
+            segment[:, 1] = path_segment_points[:, 2] if point_size == 3 else layer.height / 1000
+            segment[:, 2] = -path_segment_points[:, 1]
+
+    polygons = []
+    for path_segment, point_end, point_count in zip(path_segments, point_ends, point_counts):
+        line_types = numpy.frombuffer(path_segment.line_type, dtype = "u1").reshape((-1, 1))
+        line_widths = numpy.frombuffer(path_segment.line_width, dtype = "f4").reshape((-1, 1))
+        line_thicknesses = numpy.frombuffer(path_segment.line_thickness, dtype = "f4").reshape((-1, 1))
+        line_feedrates = numpy.frombuffer(path_segment.line_feedrate, dtype = "f4").reshape((-1, 1))
+        polygons.append(LayerPolygon.LayerPolygon(path_segment.extruder, line_types, new_points[point_end - point_count:point_end], line_widths, line_thicknesses, line_feedrates))
+        polygons[-1].buildCache()
+    return polygons
+
+
 class ProcessSlicedLayersJob(Job):
+    ##  Time in seconds between showing the layers that are processed so far.
+    PartialUpdateInterval = 1.0
+
     def __init__(self, layers):
         super().__init__()
         self._layers = layers
@@ -84,14 +145,24 @@ class ProcessSlicedLayersJob(Job):
         new_node = CuraSceneNode()
         new_node.addDecorator(BuildPlateDecorator(self._build_plate_number))
 
+        # Add LayerDataDecorator to scene node to indicate that the node has layer data
+        decorator = LayerDataDecorator.LayerDataDecorator()
+        new_node.addDecorator(decorator)
+
+        mesh = MeshData()
+        new_node.setMeshData(mesh)
+
+        settings = Application.getInstance().getGlobalContainerStack()
+        if not settings.getProperty("machine_center_is_zero", "value"):
+            new_node.setPosition(Vector(-settings.getProperty("machine_width", "value") / 2, 0.0, settings.getProperty("machine_depth", "value") / 2))
+
         # Force garbage collection.
         # For some reason, Python has a tendency to keep the layer data
         # in memory longer than needed. Forcing the GC to run here makes
         # sure any old layer data is really cleaned up before adding new.
         gc.collect()
 
-        mesh = MeshData()
-        layer_data = LayerDataBuilder.LayerDataBuilder()
+        layer_data = LayerDataBuilder.LayerDataBuilder(compact = bool(Preferences.getInstance().getValue("view/compact_layer_data")))
         layer_count = len(self._layers)
 
         # Find the minimum layer number
@@ -100,15 +171,26 @@ class ProcessSlicedLayersJob(Job):
         # the first raft layer has value -8 but there are just 4 raft (negative) layers.
         min_layer_number = 0
         negative_layers = 0
+        line_count = 0
         for layer in self._layers:
             if layer.id < min_layer_number:
                 min_layer_number = layer.id
             if layer.id < 0:
                 negative_layers += 1
+            for p in range(layer.repeatedMessageCount("path_segment")):
+                line_count += len(layer.getRepeatedMessage("path_segment", p).line_type)
+
+        # The mesh is built layer by layer from the bottom up, so the layers that are done can be shown while the rest
+        # is processed. Every line needs at least one vertex, so reserve that much to begin with.
+        layer_data.reserve(line_count, line_count)
+        material_color_map = self._getMaterialColorMap()
+        line_type_brightness = self._getLineTypeBrightness()
+        first_layer_time = None
+        last_update_time = None
 
         current_layer = 0
 
-        for layer in self._layers:
+        for layer in sorted(self._layers, key = lambda layer: layer.id):
             # Negative layers are offset by the minimum layer number, but the positive layers are just
             # offset by the number of negative layers so there is no layer gap between raft and model
             abs_layer_number = layer.id + abs(min_layer_number) if layer.id < 0 else layer.id + negative_layers
@@ -118,64 +200,79 @@ class ProcessSlicedLayersJob(Job):
             layer_data.setLayerHeight(abs_layer_number, layer.height)
             layer_data.setLayerThickness(abs_layer_number, layer.thickness)
 
-            for p in range(layer.repeatedMessageCount("path_segment")):
-                polygon = layer.getRepeatedMessage("path_segment", p)
-
-                extruder = polygon.extruder
-
-                line_types = numpy.fromstring(polygon.line_type, dtype="u1")  # Convert bytearray to numpy array
-                line_types = line_types.reshape((-1,1))
-
-                points = numpy.fromstring(polygon.points, dtype="f4")  # Convert bytearray to numpy array
-                if polygon.point_type == 0: # Point2D
-                    points = points.reshape((-1,2))  # We get a linear list of pairs that make up the points, so make numpy interpret them correctly.
-                else:  # Point3D
-                    points = points.reshape((-1,3))
-
-                line_widths = numpy.fromstring(polygon.line_width, dtype="f4")  # Convert bytearray to numpy array
-                line_widths = line_widths.reshape((-1,1))  # We get a linear list of pairs that make up the points, so make numpy interpret them correctly.
-
-                line_thicknesses = numpy.fromstring(polygon.line_thickness, dtype="f4")  # Convert bytearray to numpy array
-                line_thicknesses = line_thicknesses.reshape((-1,1))  # We get a linear list of pairs that make up the points, so make numpy interpret them correctly.
-
-                line_feedrates = numpy.fromstring(polygon.line_feedrate, dtype="f4")  # Convert bytearray to numpy array
-                line_feedrates = line_feedrates.reshape((-1,1))  # We get a linear list of pairs that make up the points, so make numpy interpret them correctly.
-
-                # Create a new 3D-array, copy the 2D points over and insert the right height.
-                # This uses manual array creation + copy rather than numpy.insert since this is
-                # faster.
-                new_points = numpy.empty((len(points), 3), numpy.float32)
-                if polygon.point_type == 0:  # Point2D
-                    new_points[:, 0] = points[:, 0]
-                    new_points[:, 1] = layer.height / 1000  # layer height value is in backend representation
-                    new_points[:, 2] = -points[:, 1]
-                else: # Point3D
-                    new_points[:, 0] = points[:, 0]
-                    new_points[:, 1] = points[:, 2]
-                    new_points[:, 2] = -points[:, 1]
-
-                this_poly = LayerPolygon.LayerPolygon(extruder, line_types, new_points, line_widths, line_thicknesses, line_feedrates)
-                this_poly.buildCache()
-
-                this_layer.polygons.append(this_poly)
-
-                Job.yieldThread()
+            for polygon in createLayerPolygons(layer):
+                this_layer.polygons.append(polygon)
+            layer_data.buildLayer(abs_layer_number, material_color_map, line_type_brightness)
             Job.yieldThread()
             current_layer += 1
             progress = (current_layer / layer_count) * 99
-            # TODO: Rebuild the layer data mesh once the layer has been processed.
-            # This needs some work in LayerData so we can add the new layers instead of recreating the entire mesh.
 
             if self._abort_requested:
                 if self._progress_message:
                     self._progress_message.hide()
+                self._removeLayerData(new_node)
                 return
             if self._progress_message:
                 self._progress_message.setProgress(progress)
 
+            # Show the layers that are done while the rest is processed.
+            if first_layer_time is None or time() - last_update_time > self.PartialUpdateInterval:
+                if first_layer_time is None:
+                    first_layer_time = time() - start_time
+                if Application.getInstance().getController().getActiveView().getPluginId() == "SimulationView":
+                    self._showLayerData(new_node, decorator, layer_data.buildPartial())
+                last_update_time = time()
+
         # We are done processing all the layers we got from the engine, now create a mesh out of the data
+        layer_mesh = layer_data.build(material_color_map, line_type_brightness)
+
+        if self._abort_requested:
+            if self._progress_message:
+                self._progress_message.hide()
+            self._removeLayerData(new_node)
+            return
+
+        self._showLayerData(new_node, decorator, layer_mesh)  # Note: After this we can no longer abort!
 
-        # Find out colors per extruder
+        if self._progress_message:
+            self._progress_message.setProgress(100)
+
+        if self._progress_message:
+            self._progress_message.hide()
+
+        # Clear the unparsed layers. This saves us a bunch of memory if the Job does not get destroyed.
+        self._layers = None
+
+        if first_layer_time is not None:
+            Logger.log("d", "Showing the first layer took %s seconds", first_layer_time)
+        Logger.log("d", "Processing layers took %s seconds", time() - start_time)
+
+    ##  Put layer data in the scene, or update the layer data that is shown.
+    #
+    #   The scene may only be changed on the main thread, so this is done
+    #   later, in the order in which it is asked for.
+    def _showLayerData(self, node, decorator, layer_data):
+        Application.getInstance().callLater(self._setLayerData, node, decorator, layer_data)
+
+    ##  Take the layer data out of the scene again, after it is shown.
+    def _removeLayerData(self, node):
+        Application.getInstance().callLater(self._removeNode, node)
+
+    def _setLayerData(self, node, decorator, layer_data):
+        decorator.setLayerData(layer_data)
+        if node.getParent() is None:
+            # Set build volume as parent, the build volume can move as a result of raft settings.
+            # It makes sense to set the build volume as parent: the print is actually printed on it.
+            node.setParent(Application.getInstance().getBuildVolume())
+        else:
+            node.childrenChanged.emit(node)  # Let the views know there are more layers.
+
+    def _removeNode(self, node):
+        if node.getParent():
+            node.getParent().removeChild(node)
+
+    ##  Find out colors per extruder.
+    def _getMaterialColorMap(self):
         global_container_stack = Application.getInstance().getGlobalContainerStack()
         manager = ExtruderManager.getInstance()
         extruders = list(manager.getMachineExtruders(global_container_stack.getId()))
@@ -196,44 +293,14 @@ class ProcessSlicedLayersJob(Job):
             color_code = global_container_stack.material.getMetaDataEntry("color_code", default="#e0e000")
             color = colorCodeToRGBA(color_code)
             material_color_map[0, :] = color
+        return material_color_map
 
-        # We have to scale the colors for compatibility mode
+    ##  We have to scale the colors for compatibility mode.
+    def _getLineTypeBrightness(self):
         if OpenGLContext.isLegacyOpenGL() or bool(Preferences.getInstance().getValue("view/force_layer_view_compatibility_mode")):
-            line_type_brightness = 0.5  # for compatibility mode
+            return 0.5  # for compatibility mode
         else:
-            line_type_brightness = 1.0
-        layer_mesh = layer_data.build(material_color_map, line_type_brightness)
-
-        if self._abort_requested:
-            if self._progress_message:
-                self._progress_message.hide()
-            return
-
-        # Add LayerDataDecorator to scene node to indicate that the node has layer data
-        decorator = LayerDataDecorator.LayerDataDecorator()
-        decorator.setLayerData(layer_mesh)
-        new_node.addDecorator(decorator)
-
-        new_node.setMeshData(mesh)
-        # Set build volume as parent, the build volume can move as a result of raft settings.
-        # It makes sense to set the build volume as parent: the print is actually printed on it.
-        new_node_parent = Application.getInstance().getBuildVolume()
-        new_node.setParent(new_node_parent)  # Note: After this we can no longer abort!
-
-        settings = Application.getInstance().getGlobalContainerStack()
-        if not settings.getProperty("machine_center_is_zero", "value"):
-            new_node.setPosition(Vector(-settings.getProperty("machine_width", "value") / 2, 0.0, settings.getProperty("machine_depth", "value") / 2))
-
-        if self._progress_message:
-            self._progress_message.setProgress(100)
-
-        if self._progress_message:
-            self._progress_message.hide()
-
-        # Clear the unparsed layers. This saves us a bunch of memory if the Job does not get destroyed.
-        self._layers = None
-
-        Logger.log("d", "Processing layers took %s seconds", time() - start_time)
+            return 1.0
 
     def _onActiveViewChanged(self):
         if self.isRunning():
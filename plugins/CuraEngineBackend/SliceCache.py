@@ -0,0 +1,214 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import collections
+import json
+import os
+import struct
+import threading
+
+from UM.Job import Job
+from UM.Logger import Logger
+
+from cura.GCodeStore import GCodeStore
+from cura.SlicedLayer import SlicedLayer, SlicedPathSegment
+
+
+##  Everything the engine sends for a slice of one build plate.
+class SliceResult:
+    ##  \param gcode_list GCodeStore with the g-code, before the print
+    #   information is filled in. A snapshot of it is enough to store it.
+    #   \param times Print time per feature.
+    #   \param material_amounts Material amount per extruder.
+    #   \param layers The optimized layer messages, or sliced layers.
+    def __init__(self, gcode_list, times, material_amounts, layers):
+        self.gcode_list = gcode_list
+        self.times = times
+        self.material_amounts = material_amounts
+        self.layers = layers
+
+
+##  Cache of slice results on disk, so a configuration that was sliced before
+#   doesn't need to be sliced again.
+#
+#   Results are stored by a key that identifies everything that is sent to the
+#   engine. When the files together grow larger than the maximum size, the
+#   results that were used least recently are removed.
+#
+#   Every file starts with a fixed header with the length of a JSON header.
+#   The JSON header has the estimates and the sizes of the buffers of the
+#   layers and of the g-code layers, which follow it in that order. Nothing
+#   in the file is ever executed when it's read.
+class SliceCache:
+    FileExtension = ".slice"
+    FileMagic = b"CSLC"
+    FileVersion = 1
+    FileHeader = struct.Struct("<4sII")  # Magic, version and length of the JSON header.
+    BufferFields = ["points", "line_type", "line_width", "line_thickness", "line_feedrate"]  # The buffers of a path segment, in the order they are stored.
+
+    ##  \param directory The directory to store the results in. It is created
+    #   if it doesn't exist.
+    #   \param max_size The maximum size of all results together, in bytes.
+    def __init__(self, directory, max_size):
+        self._directory = directory
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # File size of each key, least recently used first.
+
+        os.makedirs(self._directory, exist_ok = True)
+        files = []
+        for file_name in os.listdir(self._directory):
+            if not file_name.endswith(self.FileExtension):
+                continue
+            stat = os.stat(os.path.join(self._directory, file_name))
+            files.append((stat.st_mtime, file_name[:-len(self.FileExtension)], stat.st_size))
+        for modified_time, key, size in sorted(files):
+            self._entries[key] = size
+
+        self._evict()
+
+    def getMaxSize(self):
+        return self._max_size
+
+    def setMaxSize(self, max_size):
+        self._max_size = max_size
+        self._evict()
+
+    ##  The size of all results together, in bytes.
+    def getSize(self):
+        with self._lock:
+            return sum(self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    ##  Get a result from the cache.
+    #
+    #   \return The SliceResult, or None if there is no result for this key.
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        file_path = self._getPath(key)
+        try:
+            with open(file_path, "rb") as f:
+                magic, version, header_length = self.FileHeader.unpack(f.read(self.FileHeader.size))
+                if magic != self.FileMagic or version != self.FileVersion:
+                    raise ValueError("Not a slice result of this version")
+                header = json.loads(f.read(header_length).decode("utf-8"))
+                layers = []
+                for layer in header["layers"]:
+                    path_segments = []
+                    for path_segment in layer["path_segments"]:
+                        buffers = [self._read(f, size) for size in path_segment["sizes"]]
+                        path_segments.append(SlicedPathSegment(path_segment["extruder"], path_segment["point_type"], *buffers))
+                    layers.append(SlicedLayer(layer["id"], layer["height"], layer["thickness"], path_segments))
+                gcode_list = GCodeStore()
+                for length in header["gcode_lengths"]:
+                    gcode_list.append(self._read(f, length))
+            os.utime(file_path)  # Keeps the order of use when the cache is loaded again.
+        except Exception:
+            Logger.logException("w", "Unable to read slice result %s from the cache", key)
+            self.remove(key)
+            return None
+        return SliceResult(gcode_list, header["times"], header["material_amounts"], layers)
+
+    ##  Store a result in the cache.
+    #
+    #   The optimized layer messages are converted to sliced layers, so this can
+    #   be called from a job while the engine sends the next slice.
+    def put(self, key, result):
+        layers = [layer if isinstance(layer, SlicedLayer) else SlicedLayer.fromMessage(layer) for layer in result.layers]
+        buffers = []
+        layer_headers = []
+        for layer in layers:
+            path_segment_headers = []
+            for index in range(layer.repeatedMessageCount("path_segment")):
+                path_segment = layer.getRepeatedMessage("path_segment", index)
+                path_segment_buffers = [bytes(getattr(path_segment, field)) for field in self.BufferFields]
+                buffers.extend(path_segment_buffers)
+                path_segment_headers.append({
+                    "extruder": path_segment.extruder,
+                    "point_type": path_segment.point_type,
+                    "sizes": [len(buffer) for buffer in path_segment_buffers]
+                })
+            layer_headers.append({"id": layer.id, "height": layer.height, "thickness": layer.thickness, "path_segments": path_segment_headers})
+        header = json.dumps({
+            "times": result.times,
+            "material_amounts": result.material_amounts,
+            "layers": layer_headers,
+            "gcode_lengths": result.gcode_list.layerSizes()
+        }).encode("utf-8")
+        file_path = self._getPath(key)
+        temporary_path = file_path + ".tmp"
+        try:
+            with open(temporary_path, "wb") as f:
+                f.write(self.FileHeader.pack(self.FileMagic, self.FileVersion, len(header)))
+                f.write(header)
+                for buffer in buffers:
+                    f.write(buffer)
+                result.gcode_list.writeTo(f)
+            os.replace(temporary_path, file_path)
+        except Exception:
+            Logger.logException("w", "Unable to store slice result %s in the cache", key)
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            return
+        with self._lock:
+            self._entries[key] = os.path.getsize(file_path)
+            self._entries.move_to_end(key)
+        self._evict()
+
+    def remove(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        try:
+            os.remove(self._getPath(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for key in list(self._entries.keys()):
+            self.remove(key)
+
+    def _getPath(self, key):
+        return os.path.join(self._directory, key + self.FileExtension)
+
+    ##  Read exactly size bytes, or raise an error if the file is too short.
+    @staticmethod
+    def _read(f, size):
+        data = f.read(size)
+        if len(data) != size:
+            raise EOFError("The slice result is cut off")
+        return data
+
+    ##  Remove the least recently used results until the cache fits in its
+    #   maximum size.
+    def _evict(self):
+        while True:
+            with self._lock:
+                if not self._entries or sum(self._entries.values()) <= self._max_size:
+                    return
+                key = next(iter(self._entries))
+            Logger.log("d", "Removing slice result %s from the cache", key)
+            self.remove(key)
+
+
+##  Job that stores a slice result in the cache in the background.
+#
+#   The g-code of the result is a snapshot of the g-code of the scene, so it's
+#   only copied here, into the file, while the scene's g-code can be changed.
+class WriteSliceCacheJob(Job):
+    def __init__(self, cache, key, result):
+        super().__init__()
+        self._cache = cache
+        self._key = key
+        self._result = result
+
+    def run(self):
+        self._cache.put(self._key, self._result)
+        self._result.gcode_list.close()  # It's a snapshot that was only made to be stored.
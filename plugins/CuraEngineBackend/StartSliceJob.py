@@ -1,11 +1,12 @@
 # Copyright (c) 2017 Ultimaker B.V.
 # Cura is released under the terms of the LGPLv3 or higher.
 
-import numpy
+import hashlib
 from string import Formatter
 from enum import IntEnum
 import time
 import re
+import threading
 
 from UM.Job import Job
 from UM.Application import Application
@@ -17,12 +18,16 @@ from UM.Settings.Validator import ValidatorState
 from UM.Settings.SettingRelation import RelationType
 
 from cura.Scene.CuraSceneNode import CuraSceneNode
+from cura.Scene.SliceVerticesDecorator import collectSliceVertices
 from cura.OneAtATimeIterator import OneAtATimeIterator
 from cura.Settings.ExtruderManager import ExtruderManager
 
 
 NON_PRINTING_MESH_SETTINGS = ["anti_overhang_mesh", "infill_mesh", "cutting_mesh"]
 
+# Settings that change every time a slice is started, but don't change the result. They are left out of the fingerprint.
+VOLATILE_SETTINGS = ["time", "date", "day"]
+
 
 class StartJobResult(IntEnum):
     Finished = 1
@@ -71,21 +76,154 @@ class GcodeStartEndFormatter(Formatter):
             return "{" + str(key) + "}"
 
 
+##  Cache of the setting properties that are sent to CuraEngine, so that a
+#   slice only needs to evaluate the settings that changed since the last one.
+#
+#   The cache is kept by the backend over many slices. The backend
+#   invalidates a setting when the stacks report that it changed, together
+#   with all settings whose value depends on it, and clears the cache when the
+#   containers in the stacks change. The slice jobs read from the cache on
+#   their own thread.
+class SettingsMessageCache:
+    ##  The properties that are cached. Other properties are always taken from
+    #   the stack.
+    CachedProperties = {"value", "limit_to_extruder", "settable_per_extruder"}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._properties = {}  # Setting key -> {(stack ID, property name): property value}
+        self._keys = {}  # Stack ID -> list of all setting keys in the stack.
+        self._dependent_keys = {}  # Setting key -> set of the keys of the settings of which the value depends on it.
+        # Incremented whenever something is invalidated, so that a property that was evaluated while it was
+        # invalidated isn't stored.
+        self._generation = 0
+
+        self._hits = 0
+        self._misses = 0
+
+    ##  Get a property of a setting in a stack.
+    #
+    #   This yields the thread of the job after evaluating a property that
+    #   wasn't in the cache.
+    def getProperty(self, stack, key, property_name):
+        if property_name not in self.CachedProperties:
+            return stack.getProperty(key, property_name)
+
+        cache_key = (stack.getId(), property_name)
+        with self._lock:
+            properties = self._properties.get(key)
+            if properties is not None and cache_key in properties:
+                self._hits += 1
+                return properties[cache_key]
+            self._misses += 1
+            generation = self._generation
+
+        value = stack.getProperty(key, property_name)
+        with self._lock:
+            if generation == self._generation:
+                self._properties.setdefault(key, {})[cache_key] = value
+        Job.yieldThread()
+        return value
+
+    ##  Get the keys of all settings in a stack.
+    def getAllKeys(self, stack):
+        stack_id = stack.getId()
+        with self._lock:
+            keys = self._keys.get(stack_id)
+            if keys is not None:
+                return keys
+            generation = self._generation
+
+        keys = list(stack.getAllKeys())
+        with self._lock:
+            if generation == self._generation:
+                self._keys[stack_id] = keys
+        return keys
+
+    ##  Get the keys of all settings of which the value or extruder depends on
+    #   a setting, directly or through other settings.
+    #   \param definition The setting definition of the setting.
+    #   \return Set of setting keys.
+    def getDependentKeys(self, definition):
+        dependent_keys = self._dependent_keys.get(definition.key)
+        if dependent_keys is None:
+            dependent_keys = set()
+            self._addRelations(dependent_keys, definition.relations)
+            self._dependent_keys[definition.key] = dependent_keys
+        return dependent_keys
+
+    ##  Forget the properties of a setting in all stacks, and of all settings
+    #   that depend on it.
+    #   \param key The key of the setting that changed.
+    #   \param stack A stack to find the definition of the setting in, or None
+    #   to only forget the setting itself.
+    def invalidate(self, key, stack = None):
+        keys = {key}
+        if stack is not None:
+            definition = stack.getSettingDefinition(key)
+            if definition is not None:
+                keys |= self.getDependentKeys(definition)
+
+        with self._lock:
+            self._generation += 1
+            for dependent_key in keys:
+                self._properties.pop(dependent_key, None)
+
+    ##  Forget everything, for when the containers in the stacks changed.
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._properties.clear()
+            self._keys.clear()
+            self._dependent_keys.clear()
+
+    ##  Get how many properties were taken from the cache and how many had to
+    #   be evaluated.
+    #   \return Tuple of the number of hits and misses.
+    def getStatistics(self):
+        return self._hits, self._misses
+
+    ##  Recursive function to put all settings that require each other for value changes in a set
+    #   \param relations_set \type{set} Set of keys (strings) of settings that are influenced
+    #   \param relations list of relation objects that need to be checked.
+    def _addRelations(self, relations_set, relations):
+        for relation in filter(lambda r: r.role == "value" or r.role == "limit_to_extruder", relations):
+            if relation.type == RelationType.RequiresTarget:
+                continue
+            if relation.target.key in relations_set:  # Its relations are already added.
+                continue
+
+            relations_set.add(relation.target.key)
+            self._addRelations(relations_set, relation.target.relations)
+
+
 ##  Job class that builds up the message of scene data to send to CuraEngine.
 class StartSliceJob(Job):
-    def __init__(self, slice_message):
+    ##  \param slice_message The message to fill in.
+    #   \param settings_cache Cache of the setting properties that is kept
+    #   between slices, or None to evaluate all settings.
+    def __init__(self, slice_message, settings_cache = None):
         super().__init__()
 
         self._scene = Application.getInstance().getController().getScene()
         self._slice_message = slice_message
+        self._settings_cache = settings_cache if settings_cache is not None else SettingsMessageCache()
         self._is_cancelled = False
         self._build_plate_number = None
 
         self._all_extruders_settings = None # cache for all setting values from all stacks (global & extruder) for the current machine
+        self._fingerprint = hashlib.sha1()  # hash of everything in the slice message
 
     def getSliceMessage(self):
         return self._slice_message
 
+    ##  Get a fingerprint of the slice message: a hash of the meshes and all
+    #   settings that are sent to the engine.
+    #
+    #   Two slices with the same fingerprint give the same result.
+    def getFingerprint(self):
+        return self._fingerprint.hexdigest()
+
     def setBuildPlate(self, build_plate_number):
         self._build_plate_number = build_plate_number
 
@@ -218,34 +356,21 @@ class StartSliceJob(Job):
                 for extruder_stack in ExtruderManager.getInstance().getMachineExtruders(stack.getId()):
                     self._buildExtruderMessage(main_extruder_stack, int(extruder_stack.getMetaDataEntry("position")))
 
+            slice_vertices = collectSliceVertices([object for group in object_groups for object in group])
+
             for group in object_groups:
                 group_message = self._slice_message.addRepeatedMessage("object_lists")
+                self._fingerprint.update(b"group")
                 if group[0].getParent().callDecoration("isGroup"):
                     self._handlePerObjectSettings(group[0].getParent(), group_message)
                 for object in group:
-                    mesh_data = object.getMeshData()
-                    rot_scale = object.getWorldTransformation().getTransposed().getData()[0:3, 0:3]
-                    translate = object.getWorldTransformation().getData()[:3, 3]
-
-                    # This effectively performs a limited form of MeshData.getTransformed that ignores normals.
-                    verts = mesh_data.getVertices()
-                    verts = verts.dot(rot_scale)
-                    verts += translate
-
-                    # Convert from Y up axes to Z up axes. Equals a 90 degree rotation.
-                    verts[:, [1, 2]] = verts[:, [2, 1]]
-                    verts[:, 1] *= -1
+                    vertices, digest = slice_vertices[id(object)]
 
                     obj = group_message.addRepeatedMessage("objects")
                     obj.id = id(object)
-
-                    indices = mesh_data.getIndices()
-                    if indices is not None:
-                        flat_verts = numpy.take(verts, indices.flatten(), axis=0)
-                    else:
-                        flat_verts = numpy.array(verts)
-
-                    obj.vertices = flat_verts
+                    obj.vertices = vertices
+                    self._fingerprint.update(b"object")
+                    self._fingerprint.update(digest)
 
                     self._handlePerObjectSettings(object, obj)
 
@@ -269,14 +394,13 @@ class StartSliceJob(Job):
     #   replaced with.
     def _buildReplacementTokens(self, stack) -> dict:
         result = {}
-        for key in stack.getAllKeys():
-            result[key] = stack.getProperty(key, "value")
-            if key == "adhesion_extruder_nr" and int(stack.getProperty(key, "value")) == -1:
+        for key in self._settings_cache.getAllKeys(stack):
+            result[key] = self._settings_cache.getProperty(stack, key, "value")
+            if key == "adhesion_extruder_nr" and int(result[key]) == -1:
                 used_extruders = ExtruderManager.getUsedExtruders()
                 if len(used_extruders) == 0:
                     used_extruders = [0]
                 result[key] = str(min(used_extruders))
-            Job.yieldThread()
 
         result["print_bed_temperature"] = result["material_bed_temperature"] # Renamed settings.
         result["print_temperature"] = result["material_print_temperature"]
@@ -334,14 +458,16 @@ class StartSliceJob(Job):
         settings["machine_extruder_start_code"] = self._expandGcodeTokens(settings["machine_extruder_start_code"], extruder_nr)
         settings["machine_extruder_end_code"] = self._expandGcodeTokens(settings["machine_extruder_end_code"], extruder_nr)
 
+        sent_settings = []
         for key, value in settings.items():
             # Do not send settings that are not settable_per_extruder.
-            if not stack.getProperty(key, "settable_per_extruder"):
+            if not self._settings_cache.getProperty(stack, key, "settable_per_extruder"):
                 continue
             setting = message.getMessage("settings").addRepeatedMessage("settings")
             setting.name = key
             setting.value = str(value).encode("utf-8")
-            Job.yieldThread()
+            sent_settings.append((key, value))
+        self._addToFingerprint("extruder %s" % message.id, sent_settings)
 
     ##  Sends all global settings to the engine.
     #
@@ -368,11 +494,13 @@ class StartSliceJob(Job):
         settings["machine_end_gcode"] = self._expandGcodeTokens(settings["machine_end_gcode"], initial_extruder_nr)
 
         # Add all sub-messages for each individual setting.
+        sent_settings = []
         for key, value in settings.items():
             setting_message = self._slice_message.getMessage("global_settings").addRepeatedMessage("settings")
             setting_message.name = key
             setting_message.value = str(value).encode("utf-8")
-            Job.yieldThread()
+            sent_settings.append((key, value))
+        self._addToFingerprint("global", sent_settings)
 
     ##  Sends for some settings which extruder they should fallback to if not
     #   set.
@@ -383,9 +511,10 @@ class StartSliceJob(Job):
     #   \param stack The global stack with all settings, from which to read the
     #   limit_to_extruder property.
     def _buildGlobalInheritsStackMessage(self, stack):
-        for key in stack.getAllKeys():
-            extruder = int(round(float(stack.getProperty(key, "limit_to_extruder"))))
-            if key == "adhesion_extruder_nr" and int(stack.getProperty(key, "value")) == -1:
+        limits = []
+        for key in self._settings_cache.getAllKeys(stack):
+            extruder = int(round(float(self._settings_cache.getProperty(stack, key, "limit_to_extruder"))))
+            if key == "adhesion_extruder_nr" and int(self._settings_cache.getProperty(stack, key, "value")) == -1:
                 used_extruders = ExtruderManager.getUsedExtruders()
                 if len(used_extruders) == 0:
                     used_extruders = [0]
@@ -394,7 +523,8 @@ class StartSliceJob(Job):
                 setting_extruder = self._slice_message.addRepeatedMessage("limit_to_extruder")
                 setting_extruder.name = key
                 setting_extruder.extruder = extruder
-            Job.yieldThread()
+                limits.append((key, extruder))
+        self._addToFingerprint("limit_to_extruder", limits)
 
     ##  Check if a node has per object settings and ensure that they are set correctly in the message
     #   \param node \type{SceneNode} Node to check.
@@ -413,14 +543,14 @@ class StartSliceJob(Job):
         # Add all relations to changed settings as well.
         for key in top_of_stack.getAllKeys():
             instance = top_of_stack.getInstance(key)
-            self._addRelations(changed_setting_keys, instance.definition.relations)
-            Job.yieldThread()
+            changed_setting_keys |= self._settings_cache.getDependentKeys(instance.definition)
 
         # Ensure that the engine is aware what the build extruder is.
         if stack.getProperty("machine_extruder_count", "value") > 1:
             changed_setting_keys.add("extruder_nr")
 
         # Get values for all changed settings
+        sent_settings = []
         for key in changed_setting_keys:
             setting = message.addRepeatedMessage("settings")
             setting.name = key
@@ -432,18 +562,23 @@ class StartSliceJob(Job):
             else:
                 limited_stack = stack
 
-            setting.value = str(limited_stack.getProperty(key, "value")).encode("utf-8")
+            value = limited_stack.getProperty(key, "value")
+            setting.value = str(value).encode("utf-8")
+            sent_settings.append((key, value))
 
             Job.yieldThread()
+        self._addToFingerprint("per_object", sent_settings)
 
-    ##  Recursive function to put all settings that require each other for value changes in a list
-    #   \param relations_set \type{set} Set of keys (strings) of settings that are influenced
-    #   \param relations list of relation objects that need to be checked.
-    def _addRelations(self, relations_set, relations):
-        for relation in filter(lambda r: r.role == "value" or r.role == "limit_to_extruder", relations):
-            if relation.type == RelationType.RequiresTarget:
+    ##  Add settings that are sent to the engine to the fingerprint of the
+    #   slice.
+    #
+    #   The settings are sorted, so the fingerprint doesn't depend on the order
+    #   in which they were sent.
+    #   \param section Name of the part of the message the settings are in.
+    #   \param settings List of (key, value) pairs.
+    def _addToFingerprint(self, section, settings):
+        self._fingerprint.update(section.encode("utf-8"))
+        for key, value in sorted(settings):
+            if key in VOLATILE_SETTINGS:
                 continue
-
-            relations_set.add(relation.target.key)
-            self._addRelations(relations_set, relation.target.relations)
-
+            self._fingerprint.update(("\n%s=%s" % (key, value)).encode("utf-8"))
@@ -0,0 +1,196 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import pickle
+
+import numpy
+
+from cura.SlicedLayer import SlicedLayer, SlicedPathSegment
+
+##  The fields of the messages in Cura.proto that are recorded and replayed.
+#
+#   Every field is either None for a plain value, ("repeated", fields) for a
+#   repeated message or ("message", fields) for a message in the message.
+_SettingFields = {"name": None, "value": None}
+MessageFields = {
+    "cura.proto.Slice": {
+        "object_lists": ("repeated", {
+            "objects": ("repeated", {"id": None, "vertices": None, "normals": None, "indices": None, "settings": ("repeated", _SettingFields)}),
+            "settings": ("repeated", _SettingFields)
+        }),
+        "global_settings": ("message", {"settings": ("repeated", _SettingFields)}),
+        "extruders": ("repeated", {"id": None, "settings": ("message", {"settings": ("repeated", _SettingFields)})}),
+        "limit_to_extruder": ("repeated", {"name": None, "extruder": None})
+    },
+    "cura.proto.Progress": {"amount": None},
+    "cura.proto.Layer": {
+        "id": None, "height": None, "thickness": None,
+        "polygons": ("repeated", {"type": None, "points": None, "line_width": None, "line_thickness": None, "line_feedrate": None})
+    },
+    "cura.proto.LayerOptimized": {
+        "id": None, "height": None, "thickness": None,
+        "path_segment": ("repeated", {"extruder": None, "point_type": None, "points": None, "line_type": None, "line_width": None, "line_thickness": None, "line_feedrate": None})
+    },
+    "cura.proto.GCodeLayer": {"data": None},
+    "cura.proto.GCodePrefix": {"data": None},
+    "cura.proto.PrintTimeMaterialEstimates": {
+        "time_none": None, "time_inset_0": None, "time_inset_x": None, "time_skin": None, "time_support": None, "time_skirt": None,
+        "time_infill": None, "time_support_infill": None, "time_travel": None, "time_retract": None, "time_support_interface": None,
+        "materialEstimates": ("repeated", {"id": None, "material_amount": None})
+    },
+    "cura.proto.SlicingFinished": {}
+}
+
+##  Get the recorded fields of a message as a dictionary.
+#
+#   \param message A message from Arcus, or anything with the same fields.
+#   \param fields The fields of the message, from MessageFields.
+def messageToDict(message, fields):
+    result = {}
+    for name, kind in fields.items():
+        if kind is None:
+            value = getattr(message, name)
+            result[name] = bytes(value) if isinstance(value, (bytes, bytearray, memoryview)) else value
+        elif kind[0] == "repeated":
+            result[name] = [messageToDict(message.getRepeatedMessage(name, index), kind[1]) for index in range(message.repeatedMessageCount(name))]
+        else:
+            result[name] = messageToDict(message.getMessage(name), kind[1])
+    return result
+
+##  Fill an empty message with recorded fields.
+#
+#   \param message A message from Arcus, as created by a socket.
+#   \param data The fields as given by messageToDict.
+def fillMessage(message, data):
+    for name, value in data.items():
+        if isinstance(value, list):
+            for item in value:
+                fillMessage(message.addRepeatedMessage(name), item)
+        elif isinstance(value, dict):
+            fillMessage(message.getMessage(name), value)
+        else:
+            setattr(message, name, value)
+
+
+def _byteSize(fields):
+    size = 0
+    for value in fields.values():
+        if isinstance(value, bytes):
+            size += len(value)
+        elif isinstance(value, list):
+            size += sum(_byteSize(item) for item in value)
+        elif isinstance(value, dict):
+            size += _byteSize(value)
+    return size
+
+
+##  The messages an engine sent for a slice, in order, to send them again
+#   without the engine.
+#
+#   Recordings are kept as a list of tuples of the type name and the fields of
+#   each message, and are stored on disk with pickle.
+class EngineRecording:
+    def __init__(self, messages = None):
+        self._messages = messages if messages is not None else []
+
+    ##  Add a message that the engine sent.
+    def add(self, message):
+        type_name = message.getTypeName()
+        self._messages.append((type_name, messageToDict(message, MessageFields[type_name])))
+
+    ##  Add a message from its type name and fields.
+    def addFields(self, type_name, **fields):
+        self._messages.append((type_name, fields))
+
+    ##  Get the messages as tuples of their type name and fields.
+    def getMessages(self):
+        return self._messages
+
+    def getMessageCount(self):
+        return len(self._messages)
+
+    def getLayerCount(self):
+        return sum(1 for type_name, fields in self._messages if type_name in ("cura.proto.LayerOptimized", "cura.proto.Layer"))
+
+    ##  Get the number of bytes in the binary fields of all messages, like the
+    #   points of the layers and the g-code.
+    def getByteSize(self):
+        return sum(_byteSize(fields) for type_name, fields in self._messages)
+
+    ##  Get the number of lines in the path segments of all layers.
+    def getLineCount(self):
+        return sum(len(segment["line_type"]) for type_name, fields in self._messages if type_name == "cura.proto.LayerOptimized" for segment in fields["path_segment"])
+
+    ##  Get the layers the engine sent, as an engine worker keeps them.
+    def getLayers(self):
+        layers = []
+        for type_name, fields in self._messages:
+            if type_name == "cura.proto.LayerOptimized":
+                path_segments = [SlicedPathSegment(**segment) for segment in fields["path_segment"]]
+                layers.append(SlicedLayer(fields["id"], fields["height"], fields["thickness"], path_segments))
+        return layers
+
+    ##  Get the g-code the engine sent, in the order the backend keeps it:
+    #   the prefix first and then the g-code of the layers.
+    def getGCodeList(self):
+        prefix = [fields["data"].decode("utf-8", "replace") for type_name, fields in self._messages if type_name == "cura.proto.GCodePrefix"]
+        layers = [fields["data"].decode("utf-8", "replace") for type_name, fields in self._messages if type_name == "cura.proto.GCodeLayer"]
+        return prefix + layers
+
+    def save(self, file_path):
+        with open(file_path, "wb") as f:
+            pickle.dump(self._messages, f, protocol = pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, "rb") as f:
+            return cls(pickle.load(f))
+
+
+##  Make up the messages of an engine for a slice.
+#
+#   The layers have path segments with random lines, like the engine sends
+#   them. The g-code of the layers is sent together with them, and the prefix
+#   and estimates at the end, in the order of the engine.
+#   \param layer_count The number of layers.
+#   \param segment_count The number of path segments in every layer.
+#   \param line_count The number of lines in every path segment.
+#   \param gcode_list The g-code to send, like the backend keeps it: the
+#   prefix, then the start g-code, the layers and the end g-code. When None,
+#   a line of g-code is made up for every layer, with a prefix that tells how
+#   many objects were sliced.
+#   \param object_count The number of objects to tell in the made up prefix.
+#   \param seed The seed of the random lines, to make the same recording again.
+def createRecording(layer_count, segment_count = 4, line_count = 100, gcode_list = None, object_count = 1, seed = 0):
+    random = numpy.random.RandomState(seed)
+    if gcode_list is None:
+        gcode_list = [";FLAVOR:Marlin\n;TIME:{print_time}\n;OBJECTS:%d\n" % object_count]
+        gcode_list += [";LAYER:%d\nG1 Z%.1f\n" % (layer_number, 0.2 * (layer_number + 1)) for layer_number in range(layer_count)]
+
+    recording = EngineRecording()
+    layer_gcode = list(gcode_list[1:])
+    for layer_number in range(layer_count):
+        path_segments = []
+        for segment_number in range(segment_count):
+            path_segments.append({
+                "extruder": segment_number % 2,
+                "point_type": 0,
+                "points": random.uniform(0, 200, (line_count + 1) * 2).astype(numpy.float32).tobytes(),
+                "line_type": random.randint(1, 11, line_count).astype(numpy.uint8).tobytes(),
+                "line_width": numpy.full(line_count, 0.4, dtype = numpy.float32).tobytes(),
+                "line_thickness": numpy.full(line_count, 0.2, dtype = numpy.float32).tobytes(),
+                "line_feedrate": random.uniform(20, 150, line_count).astype(numpy.float32).tobytes()
+            })
+        recording.addFields("cura.proto.LayerOptimized", id = layer_number, height = 0.2 * (layer_number + 1), thickness = 0.2, path_segment = path_segments)
+        if layer_gcode:
+            recording.addFields("cura.proto.GCodeLayer", data = layer_gcode.pop(0).encode("utf-8"))
+        recording.addFields("cura.proto.Progress", amount = (layer_number + 1) / layer_count)
+    for gcode in layer_gcode:  # The end g-code.
+        recording.addFields("cura.proto.GCodeLayer", data = gcode.encode("utf-8"))
+
+    recording.addFields("cura.proto.GCodePrefix", data = gcode_list[0].encode("utf-8"))
+    estimates = {name: 0.0 for name, kind in MessageFields["cura.proto.PrintTimeMaterialEstimates"].items() if kind is None}
+    estimates.update(time_infill = 60.0 * layer_count, time_travel = 10.0 * layer_count, materialEstimates = [{"id": 0, "material_amount": 100.0 * object_count}])
+    recording.addFields("cura.proto.PrintTimeMaterialEstimates", **estimates)
+    recording.addFields("cura.proto.SlicingFinished")
+    return recording
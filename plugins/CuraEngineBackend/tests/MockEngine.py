@@ -0,0 +1,192 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+##  A mock of CuraEngine, to test and measure the backend without the engine.
+#
+#   It is started like the engine, connects to the given port, waits for a
+#   slice message and answers it with the messages the engine would send.
+#   These are replayed from a recording made with EngineRecording, at a
+#   configurable number of layers per second. Without a recording, it makes
+#   up a slice with random layers, of which the g-code tells how many objects
+#   were in the slice message, so a test can see which slice it belongs to.
+#
+#   Recordings of the real engine are made by putting the mock between Cura
+#   and the engine: it passes the slice message on to the engine and records
+#   everything the engine sends back, while passing it on to Cura.
+#
+#   Usage:
+#       MockEngine.py connect 127.0.0.1:<port> [--recording FILE] [--layers N] [--layer-rate LAYERS_PER_SECOND] [--delay SECONDS]
+#       MockEngine.py record 127.0.0.1:<port> --recording FILE --engine PATH/TO/CuraEngine [-j fdmprinter.def.json]
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import Arcus
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from EngineRecording import EngineRecording, MessageFields, createRecording, fillMessage, messageToDict
+
+protocol_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Cura.proto")
+
+##  Wait until the socket is in a state, or give up.
+#   \return True if the socket got into the state.
+def waitForState(socket, state, timeout = 10):
+    end_time = time.monotonic() + timeout
+    while socket.getState() != state:
+        if socket.getState() == Arcus.SocketState.Error or time.monotonic() > end_time:
+            return False
+        time.sleep(0.01)
+    return True
+
+##  Wait for the next message of a type, or give up.
+#   \return The message, or None if it didn't arrive.
+def waitForMessage(socket, type_name, timeout = 30):
+    end_time = time.monotonic() + timeout
+    while time.monotonic() < end_time:
+        message = socket.takeNextMessage()
+        if message is None:
+            time.sleep(0.01)
+        elif message.getTypeName() == type_name:
+            return message
+    return None
+
+def countObjects(slice_message):
+    count = 0
+    for index in range(slice_message.repeatedMessageCount("object_lists")):
+        count += slice_message.getRepeatedMessage("object_lists", index).repeatedMessageCount("objects")
+    return count
+
+def createSocket():
+    socket = Arcus.Socket()
+    if not socket.registerAllMessageTypes(protocol_file):
+        raise RuntimeError("Unable to register the messages: %s" % socket.getLastError())
+    return socket
+
+def connect(address):
+    host, port = address.rsplit(":", 1)
+    socket = createSocket()
+    socket.connect(host, int(port))
+    if not waitForState(socket, Arcus.SocketState.Connected):
+        raise RuntimeError("Unable to connect to %s" % address)
+    return socket
+
+##  Send the messages of a recording.
+#
+#   \param layer_rate The number of layers to send per second, or 0 to send
+#   them as fast as possible.
+#   \param delay The time that slicing takes before anything is sent, in
+#   seconds.
+def replay(socket, recording, layer_rate = 0.0, delay = 0.0):
+    time.sleep(delay)
+    start_time = time.monotonic()
+    layer_count = 0
+    for type_name, fields in recording.getMessages():
+        if type_name in ("cura.proto.LayerOptimized", "cura.proto.Layer"):
+            layer_count += 1
+            if layer_rate > 0:
+                wait_time = start_time + layer_count / layer_rate - time.monotonic()
+                if wait_time > 0:
+                    time.sleep(wait_time)
+        message = socket.createMessage(type_name)
+        fillMessage(message, fields)
+        socket.sendMessage(message)
+
+##  Answer the slice message of Cura with a recording.
+def runConnect(args):
+    socket = connect(args.address)
+    slice_message = waitForMessage(socket, "cura.proto.Slice")
+    if slice_message is None:
+        socket.close()
+        raise RuntimeError("No slice message arrived")
+
+    if args.recording:
+        recording = EngineRecording.load(args.recording)
+    else:
+        recording = createRecording(args.layers, object_count = countObjects(slice_message))
+    replay(socket, recording, args.layer_rate, args.delay)
+
+    # Like the engine, wait until Cura closes the connection.
+    waitForState(socket, Arcus.SocketState.Closed)
+    socket.close()
+
+##  Pass the slice message of Cura on to the engine, and record the messages
+#   that the engine sends back while passing them on to Cura.
+def runRecord(args):
+    if not args.recording or not args.engine:
+        raise RuntimeError("Recording needs --recording and --engine")
+    cura = connect(args.address)
+
+    engine = createSocket()
+    engine.listen("127.0.0.1", args.engine_port)
+    if not waitForState(engine, Arcus.SocketState.Listening):
+        raise RuntimeError("Unable to listen for the engine on port %s" % args.engine_port)
+    command = [args.engine, "connect", "127.0.0.1:%d" % args.engine_port]
+    if args.definition:
+        command += ["-j", args.definition]
+    process = subprocess.Popen(command, stdin = subprocess.DEVNULL)
+    try:
+        if not waitForState(engine, Arcus.SocketState.Connected, timeout = 30):
+            raise RuntimeError("The engine did not connect")
+
+        slice_message = waitForMessage(cura, "cura.proto.Slice")
+        if slice_message is None:
+            raise RuntimeError("No slice message arrived")
+        forwarded = engine.createMessage("cura.proto.Slice")
+        fillMessage(forwarded, messageToDict(slice_message, MessageFields["cura.proto.Slice"]))
+        engine.sendMessage(forwarded)
+
+        recording = EngineRecording()
+        while True:
+            message = engine.takeNextMessage()
+            if message is None:
+                if engine.getState() == Arcus.SocketState.Error:
+                    raise RuntimeError("The engine stopped before slicing was finished")
+                time.sleep(0.001)
+                continue
+            type_name = message.getTypeName()
+            if type_name not in MessageFields:
+                continue
+            recording.add(message)
+            forwarded = cura.createMessage(type_name)
+            fillMessage(forwarded, recording.getMessages()[-1][1])
+            cura.sendMessage(forwarded)
+            if type_name == "cura.proto.SlicingFinished":
+                break
+        recording.save(args.recording)
+        print("Recorded %d messages with %d layers to %s" % (recording.getMessageCount(), recording.getLayerCount(), args.recording))
+
+        waitForState(cura, Arcus.SocketState.Closed)
+    finally:
+        engine.close()
+        cura.close()
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description = "Mock of CuraEngine that answers a slice message with a recording.")
+    parser.add_argument("command", choices = ["connect", "record"])
+    parser.add_argument("address", help = "Host and port of Cura, like 127.0.0.1:49674.")
+    parser.add_argument("-j", dest = "definition", help = "Machine definition, passed on to the engine when recording.")
+    parser.add_argument("--recording", help = "File to replay, or to record to.")
+    parser.add_argument("--layers", type = int, default = 10, help = "Number of layers to make up without a recording.")
+    parser.add_argument("--layer-rate", type = float, default = 0.0, help = "Layers to send per second, or 0 for as fast as possible.")
+    parser.add_argument("--delay", type = float, default = 0.0, help = "Seconds that slicing takes before the first layer is sent.")
+    parser.add_argument("--engine", help = "The engine to record.")
+    parser.add_argument("--engine-port", type = int, default = 49690, help = "Port to listen on for the engine to record.")
+    args, _ = parser.parse_known_args()  # Ignore the other arguments of the engine.
+
+    try:
+        if args.command == "record":
+            runRecord(args)
+        else:
+            runConnect(args)
+    except RuntimeError as e:
+        print(e)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import importlib
+import unittest.mock #To fake the application, the engines and the start slice jobs.
+
+import pytest
+
+pytest.importorskip("PyQt5") #The backend is a QObject.
+pytest.importorskip("Arcus")
+
+#The backend uses relative imports, so it's imported as part of its plug-in.
+backend_module = importlib.import_module("plugins.CuraEngineBackend.CuraEngineBackend") #The module we're testing.
+BackendState = backend_module.BackendState
+CuraEngineBackend = backend_module.CuraEngineBackend
+StartJobResult = backend_module.StartSliceJob.StartJobResult
+
+##  An engine of the pool, which finishes or fails when the test says so.
+class FakeWorker:
+    def __init__(self, build_plate, command, port, protocol_file):
+        self._build_plate = build_plate
+        self._port = port
+        self.progressChanged = unittest.mock.MagicMock()
+        self.finished = unittest.mock.MagicMock()
+        self.failed = unittest.mock.MagicMock()
+        self.slice_message = None
+        self.stopped = False
+
+    def getBuildPlate(self):
+        return self._build_plate
+
+    def getPort(self):
+        return self._port
+
+    def start(self):
+        return True
+
+    def stop(self):
+        self.stopped = True
+
+    def createSliceMessage(self):
+        return unittest.mock.MagicMock()
+
+    def sendSliceMessage(self, message):
+        self.slice_message = message
+
+    def getGCodeList(self):
+        return [";LAYER:%d\n" % self._build_plate]
+
+    def getLayers(self):
+        return []
+
+    def getEstimates(self):
+        return None
+
+    def setSliceCacheKey(self, cache_key):
+        pass
+
+    def getSliceCacheKey(self):
+        return None
+
+##  A start slice job that finishes right away with a result.
+class FakeStartSliceJob:
+    results = {} #Build plate number -> result of its job. Finished if it's not in here.
+
+    def __init__(self, slice_message, settings_message_cache):
+        self._slice_message = slice_message
+        self._build_plate = None
+        self.finished = unittest.mock.MagicMock()
+
+    def setBuildPlate(self, build_plate):
+        self._build_plate = build_plate
+
+    def start(self):
+        callback = self.finished.connect.call_args[0][0]
+        callback(self)
+
+    def cancel(self):
+        pass
+
+    def isCancelled(self):
+        return False
+
+    def getError(self):
+        return None
+
+    def getResult(self):
+        return self.results.get(self._build_plate, StartJobResult.Finished)
+
+    def getSliceMessage(self):
+        return self._slice_message
+
+##  The parts of the backend that slice with the engine pool, with everything
+#   else faked.
+class PoolBackend:
+    stopSlicing = CuraEngineBackend.stopSlicing
+    _startEnginePool = CuraEngineBackend._startEnginePool
+    _fillEnginePool = CuraEngineBackend._fillEnginePool
+    _onEnginePoolFinished = CuraEngineBackend._onEnginePoolFinished
+    _onEngineWorkerStartSliceCompleted = CuraEngineBackend._onEngineWorkerStartSliceCompleted
+    _onEngineWorkerProgress = CuraEngineBackend._onEngineWorkerProgress
+    _onEngineWorkerFinished = CuraEngineBackend._onEngineWorkerFinished
+    _onEngineWorkerFailed = CuraEngineBackend._onEngineWorkerFailed
+    _onBuildPlateSliced = CuraEngineBackend._onBuildPlateSliced
+    _setBuildPlateProgress = CuraEngineBackend._setBuildPlateProgress
+    _removeEngineWorker = CuraEngineBackend._removeEngineWorker
+    _stopEngineWorkers = CuraEngineBackend._stopEngineWorkers
+    _handleStartSliceError = CuraEngineBackend._handleStartSliceError
+    _invokeSlice = CuraEngineBackend._invokeSlice
+
+    def __init__(self, build_plate_count, pool_size):
+        self._pool_size = pool_size
+        self._object_counts = {build_plate: 1 for build_plate in range(build_plate_count)}
+        self._build_plates_to_be_sliced = list(range(build_plate_count))
+        self._engine_workers = {}
+        self._engine_worker_jobs = {}
+        self._build_plate_progress = {}
+        self._failed_build_plates = []
+        self._engine_pool_error = False
+        self._engine_pool_retries = 0
+        self._stored_optimized_layer_data = {}
+        self._settings_message_cache = None
+        self._slice_cache = None
+        self._scene = unittest.mock.MagicMock()
+        self._scene.gcode_dict = {}
+        self._port = 49674
+        self._slice_start_time = 0
+        self._slicing = False
+        self._process_layers_job = None
+        self._error_message = None
+        self._layer_view_active = False
+        self._use_timer = True #Auto-slicing is on.
+        self._is_error_check_scheduled = False
+        self._change_timer = unittest.mock.MagicMock()
+
+        self.backendStateChange = unittest.mock.MagicMock()
+        self.processingProgress = unittest.mock.MagicMock()
+        self.slicingStarted = unittest.mock.MagicMock()
+        self.printDurationMessage = unittest.mock.MagicMock()
+        self.buildPlateProgressChanged = unittest.mock.MagicMock()
+        self.determineAutoSlicing = unittest.mock.MagicMock()
+        self._fillInPrintInformation = unittest.mock.MagicMock()
+
+    def _getEnginePoolSize(self):
+        return self._pool_size
+
+    def getEngineCommand(self, port = None):
+        return ["CuraEngine", "connect", "127.0.0.1:%d" % port]
+
+    def _getProtocolFile(self):
+        return "Cura.proto"
+
+    def _numObjects(self):
+        return self._object_counts
+
+    def getState(self):
+        return self.backendStateChange.emit.call_args[0][0]
+
+    def getWorker(self, build_plate):
+        return self._engine_workers[build_plate]
+
+    def _getSliceCacheKey(self, job):
+        return "key %d" % job._build_plate
+
+@pytest.fixture(autouse = True)
+def fakes():
+    FakeStartSliceJob.results = {}
+    with unittest.mock.patch.object(backend_module, "Application"), \
+         unittest.mock.patch.object(backend_module, "Message") as message, \
+         unittest.mock.patch.object(backend_module, "EngineWorker", FakeWorker), \
+         unittest.mock.patch.object(backend_module.StartSliceJob, "StartSliceJob", FakeStartSliceJob):
+        yield message
+
+def test_sliceAllBuildPlates():
+    backend = PoolBackend(3, pool_size = 2)
+    backend._startEnginePool()
+
+    assert sorted(backend._engine_workers) == [0, 1]
+    first_worker = backend.getWorker(0)
+    assert first_worker.slice_message is not None
+    backend._onEngineWorkerFinished(first_worker)
+    assert first_worker.stopped
+    assert sorted(backend._engine_workers) == [1, 2] #The next build plate got the free place in the pool.
+    backend._onEngineWorkerFinished(backend.getWorker(1))
+    backend._onEngineWorkerFinished(backend.getWorker(2))
+
+    assert backend._engine_workers == {}
+    assert backend._scene.gcode_dict == {0: [";LAYER:0\n"], 1: [";LAYER:1\n"], 2: [";LAYER:2\n"]}
+    assert backend.getState() == BackendState.Done
+    backend.processingProgress.emit.assert_called_with(1.0)
+
+##  When one engine fails, the other build plates are sliced anyway, and the
+#   build plate of the engine that failed is sliced again.
+def test_failedWorkerIsSlicedAgain(fakes):
+    backend = PoolBackend(3, pool_size = 3)
+    backend._startEnginePool()
+
+    backend._onEngineWorkerFailed(backend.getWorker(1))
+    backend._onEngineWorkerFinished(backend.getWorker(0))
+    backend._onEngineWorkerFinished(backend.getWorker(2))
+
+    assert sorted(backend._scene.gcode_dict) == [0, 1, 2]
+    assert len(backend._scene.gcode_dict[1]) == 0 #Not sliced.
+    assert backend._build_plates_to_be_sliced == [1]
+    assert backend.getState() == BackendState.NotStarted
+    backend._change_timer.start.assert_called_with() #Auto-slicing slices it again.
+    fakes.return_value.show.assert_not_called()
+
+    backend._startEnginePool() #Like the timer does through slice().
+    backend._onEngineWorkerFinished(backend.getWorker(1))
+
+    assert backend._build_plates_to_be_sliced == []
+    assert backend._scene.gcode_dict[1] == [";LAYER:1\n"]
+    assert backend.getState() == BackendState.Done
+
+##  When the engine of a build plate fails twice in a row, it's not sliced
+#   again automatically, but an error is shown.
+def test_failedWorkerTwice(fakes):
+    backend = PoolBackend(2, pool_size = 2)
+    backend._startEnginePool()
+    backend._onEngineWorkerFailed(backend.getWorker(1))
+    backend._onEngineWorkerFinished(backend.getWorker(0))
+    backend._change_timer.start.reset_mock()
+
+    backend._startEnginePool()
+    backend._onEngineWorkerFailed(backend.getWorker(1))
+
+    assert backend._build_plates_to_be_sliced == [1] #The user can still try again.
+    assert backend.getState() == BackendState.Error
+    fakes.return_value.show.assert_called_with()
+    backend._change_timer.start.assert_not_called()
+
+##  A build plate that was sliced before comes from the slice cache, and its
+#   engine is never sent the slice message, so it never starts.
+def test_cachedBuildPlate():
+    backend = PoolBackend(2, pool_size = 2)
+    backend._slice_cache = unittest.mock.MagicMock()
+    backend._slice_cache.get = lambda cache_key: backend_module.SliceResult([";LAYER:cached\n"], {}, [], []) if cache_key == "key 0" else None
+    workers = []
+    with unittest.mock.patch.object(FakeWorker, "stop", lambda worker: workers.append(worker)):
+        backend._startEnginePool()
+
+    assert [worker.getBuildPlate() for worker in workers] == [0]
+    assert workers[0].slice_message is None
+    assert backend._scene.gcode_dict[0] == [";LAYER:cached\n"]
+    assert sorted(backend._engine_workers) == [1]
+
+##  The error of one build plate stays visible while the others are sliced.
+def test_startSliceErrorStaysVisible(fakes):
+    FakeStartSliceJob.results = {0: StartJobResult.MaterialIncompatible}
+    backend = PoolBackend(3, pool_size = 2)
+    backend._startEnginePool()
+
+    assert 0 not in backend._engine_workers
+    fakes.return_value.show.assert_called_with()
+    backend._onEngineWorkerFinished(backend.getWorker(1))
+    backend._onEngineWorkerFinished(backend.getWorker(2))
+
+    fakes.return_value.hide.assert_not_called()
+    assert backend.getState() == BackendState.Error
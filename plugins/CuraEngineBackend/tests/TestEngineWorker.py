@@ -0,0 +1,141 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import os
+import queue
+import socket
+import sys
+import time
+
+import pytest
+
+Arcus = pytest.importorskip("Arcus") #The workers talk to the engine through Arcus.
+
+from EngineWorker import EngineWorker #The class we're testing.
+
+plugin_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+protocol_file = os.path.join(plugin_path, "Cura.proto")
+mock_engine = os.path.join(plugin_path, "tests", "MockEngine.py")
+
+##  Get a port that nothing listens on.
+def freePort():
+    with socket.socket() as free_socket:
+        free_socket.bind(("127.0.0.1", 0))
+        return free_socket.getsockname()[1]
+
+##  The command to start the mock engine with, like the backend starts
+#   the engine.
+def mockEngineCommand(port, delay = 0.0, layers = 10):
+    return [sys.executable, mock_engine, "connect", "127.0.0.1:{0}".format(port), "-j", "fdmprinter.def.json", "--delay", str(delay), "--layers", str(layers)]
+
+##  Keeps what the workers report.
+class Recorder:
+    def __init__(self):
+        self.done = queue.Queue()
+        self.progress = {}
+
+    def onProgress(self, worker, amount):
+        self.progress.setdefault(worker.getBuildPlate(), []).append(amount)
+
+    def onFinished(self, worker):
+        self.done.put((worker, True))
+
+    def onFailed(self, worker):
+        self.done.put((worker, False))
+
+##  Start a worker for a build plate with some objects in its slice message.
+def startWorker(recorder, build_plate, object_count, command = None, delay = 0.0):
+    port = freePort()
+    worker = EngineWorker(build_plate, command or mockEngineCommand(port, delay), port, protocol_file)
+    worker.progressChanged.connect(recorder.onProgress)
+    worker.finished.connect(recorder.onFinished)
+    worker.failed.connect(recorder.onFailed)
+    assert worker.start()
+
+    message = worker.createSliceMessage()
+    object_list = message.addRepeatedMessage("object_lists")
+    for index in range(object_count):
+        object_list.addRepeatedMessage("objects").id = index
+    worker.sendSliceMessage(message) #Before the engine is connected, so the worker has to wait for it.
+    return worker
+
+##  Slice build plates with a pool of workers, like the backend does.
+#   \return Dictionary of build plate to the worker that sliced it.
+def sliceBuildPlates(object_counts, pool_size, delay = 0.0):
+    recorder = Recorder()
+    waiting = list(enumerate(object_counts))
+    running = []
+    result = {}
+    while waiting or running:
+        while waiting and len(running) < pool_size:
+            build_plate, object_count = waiting.pop(0)
+            running.append(startWorker(recorder, build_plate, object_count, delay = delay))
+        worker, success = recorder.done.get(timeout = 30)
+        assert success
+        running.remove(worker)
+        worker.stop()
+        result[worker.getBuildPlate()] = worker
+    return result
+
+def gcodeOf(worker):
+    return "".join(worker.getGCodeList())
+
+def test_sliceBuildPlate():
+    recorder = Recorder()
+    worker = startWorker(recorder, 2, 3)
+
+    finished_worker, success = recorder.done.get(timeout = 30)
+    worker.stop()
+
+    assert finished_worker is worker and success
+    assert gcodeOf(worker).startswith(";FLAVOR:Marlin\n") #The prefix goes in front.
+    assert ";OBJECTS:3\n" in gcodeOf(worker)
+    assert len(worker.getGCodeList()) == 11
+    assert [layer.id for layer in worker.getLayers()] == list(range(10))
+    assert worker.getEstimates().getRepeatedMessage("materialEstimates", 0).material_amount == 300
+    assert recorder.progress[2][-1] == pytest.approx(1.0)
+
+##  Every worker gets the results of its own build plate, also when they
+#   slice at the same time.
+def test_severalWorkersAtOnce():
+    result = sliceBuildPlates([1, 2, 3, 4], pool_size = 3)
+
+    for build_plate, object_count in enumerate([1, 2, 3, 4]):
+        assert ";OBJECTS:%d\n" % object_count in gcodeOf(result[build_plate])
+
+def test_engineDoesNotStart():
+    recorder = Recorder()
+    worker = startWorker(recorder, 0, 1, command = [os.path.join(plugin_path, "NoEngineHere")])
+
+    failed_worker, success = recorder.done.get(timeout = 30)
+    worker.stop()
+
+    assert failed_worker is worker and not success
+
+##  The engine is only started once there is a slice message for it, so
+#   none is started for a slice that comes from the slice cache.
+def test_engineStartsWithSliceMessage():
+    port = freePort()
+    worker = EngineWorker(0, [os.path.join(plugin_path, "NoEngineHere")], port, protocol_file)
+    recorder = Recorder()
+    worker.failed.connect(recorder.onFailed)
+    assert worker.start()
+    worker.createSliceMessage()
+
+    time.sleep(0.5)
+    worker.stop()
+
+    assert recorder.done.empty() #It didn't try to start the engine.
+
+##  Slice eight build plates that take half a second each, and report how
+#   long it takes one after another and with a pool of engines.
+@pytest.mark.benchmark
+@pytest.mark.parametrize("pool_size", [1, 2, 4, 8])
+def test_benchmarkEnginePool(pool_size, benchmark_report):
+    object_counts = [index + 1 for index in range(8)]
+
+    start_time = time.perf_counter()
+    sliceBuildPlates(object_counts, pool_size, delay = 0.5)
+    pool_time = time.perf_counter() - start_time
+
+    benchmark_report("8 build plates of 0.5 s each with %d engines (%d cores): %.2f s" % (pool_size, os.cpu_count() or 1, pool_time))
@@ -0,0 +1,105 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import numpy
+import pytest
+import unittest.mock #To fake the messages of the engine.
+
+from cura.LayerPolygon import LayerPolygon
+from ProcessSlicedLayersJob import createLayerPolygons, ProcessSlicedLayersJob #The module we're testing.
+
+@pytest.fixture(autouse = True)
+def colorMap():
+    color_map = numpy.arange(11 * 4, dtype = numpy.float32).reshape((11, 4)) / 44
+    with unittest.mock.patch.object(LayerPolygon, "getColorMap", unittest.mock.MagicMock(return_value = color_map)):
+        yield
+
+##  Creates a fake PathSegment message with random lines.
+#
+#   \param point_type 0 for 2D points, 1 for 3D points.
+def createPathSegment(random, line_count, point_type = 0, extruder = 0, faulty_types = False):
+    path_segment = unittest.mock.MagicMock()
+    path_segment.extruder = extruder
+    path_segment.point_type = point_type
+    path_segment.points = random.uniform(-100, 100, (line_count + 1) * (2 if point_type == 0 else 3)).astype(numpy.float32).tobytes()
+    path_segment.line_type = random.randint(0, 15 if faulty_types else 11, line_count).astype(numpy.uint8).tobytes()
+    path_segment.line_width = random.uniform(0.2, 0.6, line_count).astype(numpy.float32).tobytes()
+    path_segment.line_thickness = random.uniform(0.1, 0.3, line_count).astype(numpy.float32).tobytes()
+    path_segment.line_feedrate = random.uniform(10, 150, line_count).astype(numpy.float32).tobytes()
+    return path_segment
+
+def createLayer(path_segments, height = 300, layer_id = 0):
+    layer = unittest.mock.MagicMock()
+    layer.id = layer_id
+    layer.height = height
+    layer.thickness = 200
+    layer.repeatedMessageCount = lambda field_name: len(path_segments)
+    layer.getRepeatedMessage = lambda field_name, index: path_segments[index]
+    return layer
+
+##  The polygons are the same as when every path segment is decoded on its own.
+@pytest.mark.parametrize("point_types", [[0, 0, 0], [1, 1], [0, 1, 0]])
+def test_createLayerPolygons(point_types):
+    random = numpy.random.RandomState(1337)
+    path_segments = [createPathSegment(random, 10 + 5 * index, point_type, index % 2) for index, point_type in enumerate(point_types)]
+
+    polygons = createLayerPolygons(createLayer(path_segments))
+
+    assert len(polygons) == len(path_segments)
+    for polygon, path_segment in zip(polygons, path_segments):
+        points = numpy.frombuffer(path_segment.points, dtype = "f4").reshape((-1, 2 if path_segment.point_type == 0 else 3))
+        assert polygon.extruder == path_segment.extruder
+        assert numpy.array_equal(polygon.data[:, 0], points[:, 0])
+        assert numpy.array_equal(polygon.data[:, 1], points[:, 2] if path_segment.point_type == 1 else numpy.full(len(points), 0.3, dtype = numpy.float32))
+        assert numpy.array_equal(polygon.data[:, 2], -points[:, 1])
+        assert numpy.array_equal(polygon.types.ravel(), numpy.frombuffer(path_segment.line_type, dtype = "u1"))
+        assert numpy.array_equal(polygon.lineWidths.ravel(), numpy.frombuffer(path_segment.line_width, dtype = "f4"))
+        assert numpy.array_equal(polygon.lineThicknesses.ravel(), numpy.frombuffer(path_segment.line_thickness, dtype = "f4"))
+        assert numpy.array_equal(polygon.lineFeedrates.ravel(), numpy.frombuffer(path_segment.line_feedrate, dtype = "f4"))
+        assert numpy.shares_memory(polygon.lineFeedrates, numpy.frombuffer(path_segment.line_feedrate, dtype = "f4")) #The line data is not copied.
+        assert polygon.lineMeshElementCount() == len(polygon.types)
+
+def test_faultyLineTypes():
+    random = numpy.random.RandomState(1337)
+    path_segment = createPathSegment(random, 100, faulty_types = True)
+
+    polygon, = createLayerPolygons(createLayer([path_segment]))
+
+    line_types = numpy.frombuffer(path_segment.line_type, dtype = "u1")
+    assert (line_types >= 11).any() #Otherwise this test is useless.
+    assert numpy.array_equal(polygon.types.ravel(), numpy.where(line_types >= 11, LayerPolygon.NoneType, line_types))
+
+def test_emptyLayer():
+    assert createLayerPolygons(createLayer([])) == []
+
+##  The layers are put in the scene on the main thread, in the order in which the job shows them.
+def test_sceneChangedLater():
+    random = numpy.random.RandomState(1337)
+    layers = [createLayer([createPathSegment(random, 10)], height = 200 * (layer_id + 1), layer_id = layer_id) for layer_id in range(3)]
+    scene_node = unittest.mock.MagicMock()
+    scene_node.getParent.return_value = None
+    scene_node.setParent.side_effect = lambda parent: setattr(scene_node.getParent, "return_value", parent)
+    later_calls = []
+    with unittest.mock.patch("ProcessSlicedLayersJob.Application") as application, \
+         unittest.mock.patch("ProcessSlicedLayersJob.CuraSceneNode", return_value = scene_node), \
+         unittest.mock.patch("ProcessSlicedLayersJob.Message"), \
+         unittest.mock.patch("ProcessSlicedLayersJob.Preferences"), \
+         unittest.mock.patch.object(ProcessSlicedLayersJob, "_getMaterialColorMap", return_value = numpy.ones((1, 4), dtype = numpy.float32)), \
+         unittest.mock.patch.object(ProcessSlicedLayersJob, "_getLineTypeBrightness", return_value = 1.0):
+        application.getInstance().getController().getActiveView().getPluginId.return_value = "SimulationView"
+        application.getInstance().getGlobalContainerStack().getProperty.return_value = True #Center is zero, so no position.
+        application.getInstance().callLater.side_effect = lambda function, *args: later_calls.append((function, args))
+        job = ProcessSlicedLayersJob(layers)
+        job.PartialUpdateInterval = 0
+        job.run()
+
+        assert scene_node.setParent.call_count == 0 #Not on the job thread.
+        assert scene_node.childrenChanged.emit.call_count == 0
+        assert len(later_calls) > 1 #The partial updates and the final layer data.
+        for function, args in later_calls:
+            function(*args)
+
+    scene_node.setParent.assert_called_once_with(application.getInstance().getBuildVolume())
+    assert scene_node.childrenChanged.emit.call_count == len(later_calls) - 1
+    layer_data = scene_node.addDecorator.call_args_list[-1][0][0].getLayerData()
+    assert sorted(layer_data.getLayers().keys()) == [0, 1, 2]
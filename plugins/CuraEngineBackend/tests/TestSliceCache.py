@@ -0,0 +1,166 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import os
+import pickle
+import unittest.mock #To fake the messages of the engine.
+
+import pytest
+
+from cura.GCodeStore import GCodeStore
+from cura.SlicedLayer import SlicedLayer
+from SliceCache import SliceCache, SliceResult, WriteSliceCacheJob #The module we're testing.
+
+@pytest.fixture
+def cache(tmpdir):
+    return SliceCache(str(tmpdir), 1024 * 1024)
+
+##  Creates a fake LayerOptimized message with one path segment.
+def createLayerMessage(layer_id):
+    path_segment = unittest.mock.MagicMock()
+    path_segment.extruder = 1
+    path_segment.point_type = 0
+    path_segment.points = b"\x00" * 16
+    path_segment.line_type = b"\x01"
+    path_segment.line_width = b"\x00\x00\x80\x3e"
+    path_segment.line_thickness = b"\x00\x00\x80\x3e"
+    path_segment.line_feedrate = b"\x00\x00\xc8\x42"
+
+    message = unittest.mock.MagicMock()
+    message.id = layer_id
+    message.height = 200 * (layer_id + 1)
+    message.thickness = 200
+    message.repeatedMessageCount = lambda field_name: 1
+    message.getRepeatedMessage = lambda field_name, index: path_segment
+    return message
+
+def createResult(layer_count = 3, layer_size = 10):
+    gcode_list = GCodeStore([";FLAVOR:Marlin\n"] + [";LAYER:%d\n" % index + "G1 X1 Y1 E1\n" * layer_size for index in range(layer_count)])
+    layers = [createLayerMessage(index) for index in range(layer_count)]
+    return SliceResult(gcode_list, {"infill": 12.5, "travel": 3.0}, [1250.0, 0.0], layers)
+
+def test_putAndGet(cache):
+    result = createResult()
+    cache.put("abc", result)
+
+    cached_result = cache.get("abc")
+    assert list(cached_result.gcode_list) == list(result.gcode_list)
+    assert cached_result.times == result.times
+    assert cached_result.material_amounts == result.material_amounts
+    assert len(cached_result.layers) == 3
+    for layer, message in zip(cached_result.layers, result.layers):
+        assert isinstance(layer, SlicedLayer)
+        assert (layer.id, layer.height, layer.thickness) == (message.id, message.height, message.thickness)
+        assert layer.repeatedMessageCount("path_segment") == 1
+        path_segment = layer.getRepeatedMessage("path_segment", 0)
+        assert path_segment.extruder == 1
+        assert path_segment.points == b"\x00" * 16
+        assert path_segment.line_feedrate == b"\x00\x00\xc8\x42"
+
+def test_getMissing(cache):
+    assert cache.get("abc") is None
+
+##  The cache is kept on disk, so results of an earlier session can be used.
+def test_persistent(tmpdir):
+    SliceCache(str(tmpdir), 1024 * 1024).put("abc", createResult())
+
+    cache = SliceCache(str(tmpdir), 1024 * 1024)
+    assert "abc" in cache
+    assert list(cache.get("abc").gcode_list)[1].startswith(";LAYER:0\n")
+
+def test_evictLeastRecentlyUsed(tmpdir):
+    cache = SliceCache(str(tmpdir), 1024 * 1024)
+    cache.put("first", createResult())
+    size = cache.getSize()
+    cache.setMaxSize(size * 2)
+    cache.put("second", createResult())
+    cache.get("first") #Now "second" is the least recently used.
+
+    cache.put("third", createResult())
+
+    assert "first" in cache
+    assert "second" not in cache
+    assert "third" in cache
+    assert cache.getSize() <= size * 2
+    assert not os.path.exists(os.path.join(str(tmpdir), "second" + SliceCache.FileExtension))
+
+##  A result that is larger than the whole cache is not kept.
+def test_resultLargerThanCache(tmpdir):
+    cache = SliceCache(str(tmpdir), 100)
+    cache.put("abc", createResult())
+
+    assert "abc" not in cache
+    assert os.listdir(str(tmpdir)) == []
+
+def test_shrinkRemovesResults(cache):
+    cache.put("first", createResult())
+    cache.put("second", createResult())
+
+    cache.setMaxSize(cache.getSize() - 1)
+
+    assert len(cache) == 1
+    assert "second" in cache
+
+def test_corruptFile(cache, tmpdir):
+    cache.put("abc", createResult())
+    with open(os.path.join(str(tmpdir), "abc" + SliceCache.FileExtension), "wb") as f:
+        f.write(b"not a slice result")
+
+    assert cache.get("abc") is None
+    assert "abc" not in cache
+
+##  Something that runs code when it's unpickled.
+class Unpickled:
+    ran = False
+
+    @staticmethod
+    def run():
+        Unpickled.ran = True
+
+    def __reduce__(self):
+        return (Unpickled.run, ())
+
+##  The files are never unpickled, since anyone that can write to the cache
+#   could then run code.
+def test_pickledFileIsNotLoaded(cache, tmpdir):
+    cache.put("abc", createResult())
+    with open(os.path.join(str(tmpdir), "abc" + SliceCache.FileExtension), "wb") as f:
+        pickle.dump({"layers": Unpickled()}, f)
+
+    assert cache.get("abc") is None
+    assert not Unpickled.ran
+
+##  A file that is cut off is not used.
+def test_truncatedFile(cache, tmpdir):
+    cache.put("abc", createResult())
+    file_path = os.path.join(str(tmpdir), "abc" + SliceCache.FileExtension)
+    with open(file_path, "rb") as f:
+        data = f.read()
+    with open(file_path, "wb") as f:
+        f.write(data[:-10])
+
+    assert cache.get("abc") is None
+
+##  A snapshot of the g-code is stored as it was, also when the g-code is
+#   changed before it's written.
+def test_putSnapshot(cache):
+    result = createResult()
+    gcode_list = result.gcode_list
+    result.gcode_list = gcode_list.snapshot()
+    gcode_list[0] = ";FLAVOR:Changed\n"
+    gcode_list.append(";LAYER:3\n")
+
+    WriteSliceCacheJob(cache, "abc", result).run()
+
+    assert cache.get("abc").gcode_list[0] == ";FLAVOR:Marlin\n"
+    assert len(cache.get("abc").gcode_list) == 4
+    assert gcode_list[0] == ";FLAVOR:Changed\n"
+
+def test_clear(cache, tmpdir):
+    cache.put("first", createResult())
+    cache.put("second", createResult())
+
+    cache.clear()
+
+    assert len(cache) == 0
+    assert os.listdir(str(tmpdir)) == []
@@ -0,0 +1,317 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import json
+import os
+import queue
+import socket
+import sys
+import tempfile
+import time
+import unittest.mock #To fake the application, the settings and the messages of the engine.
+
+import numpy
+import pytest
+
+from UM.Math.Vector import Vector
+from UM.Mesh.MeshData import MeshData
+from UM.Scene.SceneNode import SceneNode
+
+from cura.GCodeStore import GCodeStore
+from cura.LayerPolygon import LayerPolygon
+from cura.Scene.SliceVerticesDecorator import collectSliceVertices
+from cura.Settings.Bcn3DFixes import Bcn3DFixes
+
+from EngineRecording import EngineRecording, MessageFields, createRecording, fillMessage, messageToDict #The module we're testing.
+from ProcessSlicedLayersJob import ProcessSlicedLayersJob
+from StartSliceJob import SettingsMessageCache
+from TestStartSliceJob import FakeMachine, buildSettingsMessage
+
+try:
+    import Arcus #The engine worker talks to the mock engine through Arcus.
+    arcus_available = True
+except ImportError:
+    arcus_available = False
+
+plugin_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+protocol_file = os.path.join(plugin_path, "Cura.proto")
+mock_engine = os.path.join(plugin_path, "tests", "MockEngine.py")
+golden_file = os.path.join(plugin_path, "..", "..", "tests", "Settings", "gcode", "idex_all_fixes.json")
+
+##  The reference jobs for the benchmark: the number of layers, path segments
+#   per layer and lines per path segment that the engine sends, and the
+#   number of objects and settings that are sent to the engine.
+reference_jobs = [
+    ("small", 50, 4, 100, 1, 100),
+    ("medium", 500, 8, 200, 4, 1000),
+    ("huge", 2000, 8, 400, 16, 3000)
+]
+
+##  A message with the interface of the messages of Arcus, that keeps what is
+#   put in it.
+class FakeMessage:
+    def __init__(self, type_name = None):
+        self._type_name = type_name
+        self._repeated = {}
+        self._messages = {}
+
+    def getTypeName(self):
+        return self._type_name
+
+    def addRepeatedMessage(self, name):
+        message = FakeMessage()
+        self._repeated.setdefault(name, []).append(message)
+        return message
+
+    def repeatedMessageCount(self, name):
+        return len(self._repeated.get(name, []))
+
+    def getRepeatedMessage(self, name, index):
+        return self._repeated[name][index]
+
+    def getMessage(self, name):
+        return self._messages.setdefault(name, FakeMessage())
+
+##  The g-code of a golden file of the BCN3D fixes, with as many layers as the
+#   engine sends, like the benchmark of the fixes makes a large print.
+def goldenGCode(golden, layer_count):
+    layers = [layer for layer in golden["gcode"] if layer.startswith(";LAYER:") and not layer.startswith(";LAYER:0")]
+    return golden["gcode"][:2] + [layers[index % len(layers)] for index in range(layer_count)] + golden["gcode"][-1:]
+
+def test_recordMessages():
+    recording = createRecording(5, segment_count = 2, line_count = 10, object_count = 2)
+
+    copy = EngineRecording()
+    for type_name, fields in recording.getMessages():
+        message = FakeMessage(type_name)
+        fillMessage(message, fields)
+        copy.add(message)
+
+    assert copy.getMessages() == recording.getMessages()
+
+def test_saveAndLoad(tmpdir):
+    recording = createRecording(3)
+    file_path = str(tmpdir.join("slice.recording"))
+
+    recording.save(file_path)
+
+    assert EngineRecording.load(file_path).getMessages() == recording.getMessages()
+
+##  The messages are made up in the order that the engine sends them.
+def test_createRecording():
+    recording = createRecording(4, segment_count = 3, line_count = 7, object_count = 2)
+
+    type_names = [type_name for type_name, fields in recording.getMessages()]
+    assert type_names == ["cura.proto.LayerOptimized", "cura.proto.GCodeLayer", "cura.proto.Progress"] * 4 + ["cura.proto.GCodePrefix", "cura.proto.PrintTimeMaterialEstimates", "cura.proto.SlicingFinished"]
+    assert recording.getLayerCount() == 4
+    assert recording.getLineCount() == 4 * 3 * 7
+    assert recording.getGCodeList()[0] == ";FLAVOR:Marlin\n;TIME:{print_time}\n;OBJECTS:2\n"
+    assert recording.getGCodeList()[1:] == [";LAYER:%d\nG1 Z%.1f\n" % (layer_number, 0.2 * (layer_number + 1)) for layer_number in range(4)]
+
+def test_createRecordingWithGCode():
+    with open(golden_file, encoding = "utf-8") as f:
+        gcode_list = goldenGCode(json.load(f), 20)
+
+    recording = createRecording(20, gcode_list = gcode_list)
+
+    assert recording.getGCodeList() == gcode_list
+
+##  The slice message can be passed on to the engine when recording.
+def test_sliceMessageFields():
+    slice_message = FakeMessage("cura.proto.Slice")
+    mesh = slice_message.addRepeatedMessage("object_lists").addRepeatedMessage("objects")
+    mesh.id = 1
+    mesh.vertices = numpy.arange(9, dtype = numpy.float32).tobytes()
+    mesh.normals = b""
+    mesh.indices = b""
+    setting = mesh.addRepeatedMessage("settings")
+    setting.name = "infill_sparse_density"
+    setting.value = b"20"
+    setting = slice_message.getMessage("global_settings").addRepeatedMessage("settings")
+    setting.name = "layer_height"
+    setting.value = b"0.1"
+    extruder = slice_message.addRepeatedMessage("extruders")
+    extruder.id = 0
+    limit = slice_message.addRepeatedMessage("limit_to_extruder")
+    limit.name = "adhesion_type"
+    limit.extruder = 0
+    fields = messageToDict(slice_message, MessageFields["cura.proto.Slice"])
+
+    copy = FakeMessage("cura.proto.Slice")
+    fillMessage(copy, fields)
+
+    assert messageToDict(copy, MessageFields["cura.proto.Slice"]) == fields
+    assert fields["global_settings"]["settings"] == [{"name": "layer_height", "value": b"0.1"}]
+    assert fields["object_lists"][0]["objects"][0]["settings"] == [{"name": "infill_sparse_density", "value": b"20"}]
+
+##  The peak resident set size of this process so far, in MB, or None where
+#   it can't be measured.
+def peakRss():
+    try:
+        import resource
+    except ImportError: #Not on Windows.
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+def freePort():
+    with socket.socket() as free_socket:
+        free_socket.bind(("127.0.0.1", 0))
+        return free_socket.getsockname()[1]
+
+##  Build the slice message: the settings of a machine with a number of
+#   settings, and the vertices of a number of objects.
+def startSlice(object_count, setting_count):
+    random = numpy.random.RandomState(0)
+    nodes = []
+    for index in range(object_count):
+        node = SceneNode()
+        node.setMeshData(MeshData(vertices = random.uniform(-20, 20, (30000, 3)).astype(numpy.float32)))
+        node.setPosition(Vector(index * 5, 0, 0))
+        nodes.append(node)
+
+    machine = FakeMachine(setting_count)
+    try:
+        buildSettingsMessage(machine, SettingsMessageCache())
+        collectSliceVertices(nodes)
+    finally:
+        machine.close()
+
+##  Receive the replay of a recording by the mock engine with an engine
+#   worker, which handles the messages like the backend does.
+#
+#   The worker is not stopped, so that its results can be used like the
+#   backend uses them before it stops the worker.
+#   \return The worker with the results, the time until the first message
+#   arrived and the time that the rest of the messages took.
+def receiveSlice(recording_path, layer_rate):
+    from EngineWorker import EngineWorker #Only when Arcus is available.
+
+    port = freePort()
+    command = [sys.executable, mock_engine, "connect", "127.0.0.1:%d" % port, "--recording", recording_path, "--layer-rate", str(layer_rate)]
+    worker = EngineWorker(0, command, port, protocol_file)
+    first_message = queue.Queue()
+    done = queue.Queue()
+    class Listener: #The signals of the worker don't keep functions alive.
+        def onProgress(self, worker, amount):
+            if first_message.empty():
+                first_message.put(time.perf_counter())
+        def onFinished(self, worker):
+            done.put((time.perf_counter(), True))
+        def onFailed(self, worker):
+            done.put((time.perf_counter(), False))
+    listener = Listener()
+    worker.progressChanged.connect(listener.onProgress)
+    worker.finished.connect(listener.onFinished)
+    worker.failed.connect(listener.onFailed)
+
+    start_time = time.perf_counter()
+    assert worker.start()
+    worker.sendSliceMessage(worker.createSliceMessage())
+    end_time, success = done.get(timeout = 600)
+    if not success:
+        worker.stop()
+    assert success
+    first_message_time = first_message.get_nowait()
+    return worker, first_message_time - start_time, end_time - first_message_time
+
+##  Process the layers for the layer view, with a fake application.
+def processLayers(layers):
+    application = unittest.mock.MagicMock()
+    application.getGlobalContainerStack.return_value.getProperty.return_value = True
+    application.getGlobalContainerStack.return_value.material.getMetaDataEntry.return_value = "#e0e000"
+    extruder_manager = unittest.mock.MagicMock()
+    extruder_manager.getInstance.return_value.getMachineExtruders.return_value = []
+    preferences = unittest.mock.MagicMock()
+    preferences.getValue.return_value = False
+    opengl_context = unittest.mock.MagicMock()
+    opengl_context.isLegacyOpenGL.return_value = False
+    color_map = numpy.ones((11, 4), dtype = numpy.float32)
+
+    with unittest.mock.patch("UM.Application.Application.getInstance", return_value = application), \
+         unittest.mock.patch("UM.Preferences.Preferences.getInstance", return_value = preferences), \
+         unittest.mock.patch("ProcessSlicedLayersJob.ExtruderManager", extruder_manager), \
+         unittest.mock.patch("ProcessSlicedLayersJob.OpenGLContext", opengl_context), \
+         unittest.mock.patch("ProcessSlicedLayersJob.Message"), \
+         unittest.mock.patch.object(ProcessSlicedLayersJob, "_showLayerData"), \
+         unittest.mock.patch.object(LayerPolygon, "getColorMap", return_value = color_map):
+        ProcessSlicedLayersJob(layers).run()
+
+##  Apply the BCN3D fixes with the settings of a golden file of the fixes.
+#   \return The job that applied the fixes.
+def applyFixes(golden, gcode_list):
+    def createStack(settings, position = 0, material = None):
+        stack = unittest.mock.MagicMock()
+        stack.getProperty = lambda key, property_name: settings[key]
+        stack.getMetaData = unittest.mock.MagicMock(return_value = {"position": str(position)})
+        stack.material.getMetaData = unittest.mock.MagicMock(return_value = {"material": material})
+        return stack
+    extruder_stacks = [createStack(settings, position, golden["materials"][position]) for position, settings in enumerate(golden["extruders"])]
+    extruder_manager = unittest.mock.MagicMock()
+    extruder_manager.getExtruderStacks = lambda: extruder_stacks
+    extruder_manager.getExtruderStack = lambda position: extruder_stacks[position]
+    extruder_manager.getActiveExtruderStack = lambda: extruder_stacks[0]
+    extruder_manager.getUsedExtruderStacks = lambda: [extruder_stacks[position] for position in golden["used_extruders"]]
+
+    with unittest.mock.patch("cura.Settings.ExtruderManager.ExtruderManager.getInstance", return_value = extruder_manager), \
+         unittest.mock.patch("UM.Application.Application.getInstance"):
+        job = Bcn3DFixes(createStack(golden["global"]), gcode_list)
+        job.run()
+    return job
+
+##  Run a reference job through the Python side of the slicing pipeline, with
+#   the mock engine in place of the engine, and report how long every stage
+#   took, the peak memory use after it and how fast the messages of the
+#   engine were handled.
+#
+#   The stages are building the slice message, receiving the messages of the
+#   engine (when it sends them as fast as it can, and while it slices at a
+#   realistic pace of layers), processing the layers for the layer view and
+#   applying the BCN3D fixes to the g-code.
+@pytest.mark.benchmark
+@pytest.mark.parametrize("name, layer_count, segment_count, line_count, object_count, setting_count", reference_jobs)
+def test_benchmarkSlicingPipeline(name, layer_count, segment_count, line_count, object_count, setting_count, benchmark_report):
+    with open(golden_file, encoding = "utf-8") as f:
+        golden = json.load(f)
+    recording = createRecording(layer_count, segment_count, line_count, gcode_list = goldenGCode(golden, layer_count), object_count = object_count)
+    megabytes = recording.getByteSize() / 1024 / 1024
+    message_count = recording.getMessageCount()
+
+    stages = []
+    def measure(stage_name, function, *args):
+        start_time = time.perf_counter()
+        result = function(*args)
+        stages.append((stage_name, time.perf_counter() - start_time, peakRss()))
+        return result
+
+    measure("start slice job", startSlice, object_count, setting_count)
+    worker = None
+    try:
+        if arcus_available:
+            with tempfile.TemporaryDirectory() as directory:
+                recording_path = os.path.join(directory, name + ".recording")
+                recording.save(recording_path)
+                paced_worker, _, paced_time = receiveSlice(recording_path, 200) #Like an engine that slices 200 layers per second.
+                paced_worker.stop()
+                worker, start_time, receive_time = measure("engine messages", receiveSlice, recording_path, 0)
+            layers, gcode_list = worker.getLayers(), worker.getGCodeList()
+        else: #Without Arcus, the layers come straight from the recording, like the worker would keep them.
+            layers, gcode_list = recording.getLayers(), GCodeStore(recording.getGCodeList())
+        del recording
+
+        #The results are used before the worker is stopped, like the backend does.
+        measure("process sliced layers", processLayers, layers)
+        job = measure("BCN3D fixes", applyFixes, golden, gcode_list)
+    finally:
+        if worker is not None:
+            worker.stop()
+
+    benchmark_report("%s job: %d layers, %d lines, %d objects, %d settings, %.1f MB of messages" % (name, layer_count, layer_count * segment_count * line_count, object_count, setting_count, megabytes))
+    for stage_name, stage_time, rss in stages:
+        benchmark_report("    %-25s %8.3f s, peak RSS %s" % (stage_name, stage_time, "%.0f MB" % rss if rss is not None else "unknown"))
+    if worker is not None:
+        benchmark_report("    engine messages: %.3f s to start the mock engine, %d messages/s, %.1f MB/s, %.3f s at 200 layers/s" % (start_time, message_count / receive_time, megabytes / receive_time, paced_time))
+    else:
+        benchmark_report("    engine messages: not measured, Arcus is not available")
+    for fix_name, fix_time in job.getStageTimes():
+        benchmark_report("        %-45s %.3f s" % (fix_name, fix_time))
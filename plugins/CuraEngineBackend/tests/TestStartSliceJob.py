@@ -0,0 +1,253 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import time
+import unittest.mock #To fake the application and the extruders.
+
+import pytest
+
+from UM.Settings.SettingRelation import RelationType
+
+from StartSliceJob import SettingsMessageCache, StartSliceJob #The module we're testing.
+
+class FakeDefinition:
+    def __init__(self, key):
+        self.key = key
+        self.relations = []
+
+class FakeRelation:
+    def __init__(self, relation_type, role, target):
+        self.type = relation_type
+        self.role = role
+        self.target = target
+
+##  A stack of which the properties are looked up in a list of containers, and
+#   of which the values can be functions of other settings, like setting
+#   functions. It counts how many properties were evaluated.
+class FakeStack:
+    def __init__(self, stack_id, definitions, containers, next_stack = None, position = None):
+        self._id = stack_id
+        self._definitions = definitions
+        self.containers = containers
+        self._next_stack = next_stack
+        self._position = position
+        self.material = unittest.mock.MagicMock()
+        self.material.getMetaDataEntry.return_value = "some-guid"
+        self.evaluations = 0
+
+    def getId(self):
+        return self._id
+
+    def getMetaDataEntry(self, key, default = None):
+        return self._position if key == "position" else default
+
+    def getAllKeys(self):
+        return set(self._definitions)
+
+    def getSettingDefinition(self, key):
+        return self._definitions.get(key)
+
+    def getProperty(self, key, property_name):
+        self.evaluations += 1
+        for container in self.containers:
+            if (key, property_name) in container:
+                value = container[(key, property_name)]
+                return value(self) if callable(value) else value
+        if self._next_stack is not None:
+            return self._next_stack.getProperty(key, property_name)
+        if property_name == "limit_to_extruder":
+            return "-1"
+        if property_name == "settable_per_extruder":
+            return key.startswith("extruder_") or key.startswith("machine_extruder_") or key in ("material_guid", "extruder_nr")
+        return None
+
+##  A machine with a global stack and extruder stacks, in which some
+#   settings are formulas of "layer_height".
+class FakeMachine:
+    def __init__(self, setting_count = 20, extruder_count = 2):
+        self.definitions = {key: FakeDefinition(key) for key in ["machine_start_gcode", "machine_end_gcode", "material_bed_temperature", "material_print_temperature",
+                                                                 "machine_extruder_start_code", "machine_extruder_end_code", "extruder_nr", "adhesion_extruder_nr", "layer_height", "material_guid"]}
+        defaults = {
+            ("machine_start_gcode", "value"): "G28 ;Home\nM190 S{material_bed_temperature}",
+            ("machine_end_gcode", "value"): "M104 S0",
+            ("material_bed_temperature", "value"): 60,
+            ("material_print_temperature", "value"): 210,
+            ("machine_extruder_start_code", "value"): "T{extruder_nr}",
+            ("machine_extruder_end_code", "value"): "",
+            ("extruder_nr", "value"): 0,
+            ("adhesion_extruder_nr", "value"): 0,
+            ("layer_height", "value"): 0.2,
+            ("material_guid", "value"): ""
+        }
+        layer_height = self.definitions["layer_height"]
+        for index in range(setting_count):
+            key = ("extruder_setting_%d" if index % 2 else "setting_%d") % index
+            definition = FakeDefinition(key)
+            self.definitions[key] = definition
+            if index % 4 == 0: # A formula of the layer height.
+                defaults[(key, "value")] = lambda stack, factor = index: stack.getProperty("layer_height", "value") * factor
+                layer_height.relations.append(FakeRelation(RelationType.RequiredByTarget, "value", definition))
+                definition.relations.append(FakeRelation(RelationType.RequiresTarget, "value", layer_height))
+            else:
+                defaults[(key, "value")] = index
+        defaults[("setting_2", "limit_to_extruder")] = "1"
+
+        self.user_changes = {}
+        # Empty containers in between, like the quality and material profiles that don't have all settings.
+        self.global_stack = FakeStack("global", self.definitions, [self.user_changes, {}, {}, {}, {}, defaults])
+        self.extruder_stacks = []
+        for position in range(extruder_count):
+            extruder_nr = {("extruder_nr", "value"): position}
+            self.extruder_stacks.append(FakeStack("extruder_%d" % position, self.definitions, [{}, {}, {}, {}, extruder_nr], next_stack = self.global_stack, position = str(position)))
+
+        application = unittest.mock.MagicMock()
+        application.getGlobalContainerStack.return_value = self.global_stack
+        application.getExtruderManager.return_value.getUsedExtruderStacks.return_value = self.extruder_stacks
+        extruder_manager = unittest.mock.MagicMock()
+        extruder_manager.getInstance.return_value.getMachineExtruders.return_value = self.extruder_stacks
+        extruder_manager.getUsedExtruders.return_value = ["0"]
+        self._patches = [
+            unittest.mock.patch("UM.Application.Application.getInstance", return_value = application),
+            unittest.mock.patch("StartSliceJob.ExtruderManager", extruder_manager)
+        ]
+        for patch in self._patches:
+            patch.start()
+
+    def getEvaluations(self):
+        return sum(stack.evaluations for stack in [self.global_stack] + self.extruder_stacks)
+
+    def close(self):
+        for patch in self._patches:
+            patch.stop()
+
+##  Slice message that keeps what is put in it.
+class FakeMessage:
+    def __init__(self):
+        self.repeated = {}
+        self.messages = {}
+
+    def addRepeatedMessage(self, name):
+        message = FakeMessage()
+        self.repeated.setdefault(name, []).append(message)
+        return message
+
+    def getMessage(self, name):
+        return self.messages.setdefault(name, FakeMessage())
+
+    ##  The settings in the message, as a dictionary.
+    def getSettings(self, name = "global_settings"):
+        return {setting.name: setting.value for setting in self.getMessage(name).repeated.get("settings", [])}
+
+@pytest.fixture
+def machine():
+    machine = FakeMachine()
+    yield machine
+    machine.close()
+
+##  Build the settings part of the slice message for a machine.
+#   \return The job that built the message.
+def buildSettingsMessage(machine, cache):
+    job = StartSliceJob(FakeMessage(), cache)
+    job._buildGlobalSettingsMessage(machine.global_stack)
+    job._buildGlobalInheritsStackMessage(machine.global_stack)
+    for extruder_stack in machine.extruder_stacks:
+        job._buildExtruderMessage(extruder_stack)
+    return job
+
+##  Change a setting in the user changes of the global stack, and report it to
+#   the cache like the backend does.
+def changeSetting(machine, cache, key, value):
+    machine.user_changes[(key, "value")] = value
+    cache.invalidate(key, machine.global_stack)
+
+def test_getPropertyCached(machine):
+    cache = SettingsMessageCache()
+    assert cache.getProperty(machine.global_stack, "layer_height", "value") == 0.2
+    assert cache.getProperty(machine.global_stack, "layer_height", "value") == 0.2
+    assert cache.getProperty(machine.extruder_stacks[1], "extruder_nr", "value") == 1
+
+    assert machine.global_stack.evaluations == 1
+    assert cache.getStatistics() == (1, 2)
+
+def test_invalidateDependents(machine):
+    cache = SettingsMessageCache()
+    assert cache.getProperty(machine.global_stack, "setting_4", "value") == pytest.approx(0.8)
+    assert cache.getProperty(machine.global_stack, "setting_6", "value") == 6
+
+    changeSetting(machine, cache, "layer_height", 0.1)
+    evaluations = machine.global_stack.evaluations
+
+    assert cache.getProperty(machine.global_stack, "setting_4", "value") == pytest.approx(0.4)
+    assert cache.getProperty(machine.global_stack, "setting_6", "value") == 6
+    assert machine.global_stack.evaluations == evaluations + 2 #setting_4 and the layer_height it depends on.
+
+##  A setting that is changed while it is being evaluated is evaluated again
+#   next time, since the value that was being evaluated may be old.
+def test_invalidatedWhileEvaluating(machine):
+    cache = SettingsMessageCache()
+    machine.user_changes[("setting_3", "value")] = lambda stack: cache.invalidate("setting_3") or 3
+
+    cache.getProperty(machine.global_stack, "setting_3", "value")
+    cache.getProperty(machine.global_stack, "setting_3", "value")
+
+    assert cache.getStatistics() == (0, 2)
+
+def test_clear(machine):
+    cache = SettingsMessageCache()
+    cache.getProperty(machine.global_stack, "setting_3", "value")
+    cache.getAllKeys(machine.global_stack)
+    machine.global_stack.containers[0] = {("setting_3", "value"): 33} #Like switching to another profile.
+
+    cache.clear()
+
+    assert cache.getProperty(machine.global_stack, "setting_3", "value") == 33
+
+##  Building the message again after a change gives the same message as
+#   building it without a cache, while only evaluating the changed settings.
+def test_buildMessageAfterChange(machine):
+    cache = SettingsMessageCache()
+    buildSettingsMessage(machine, cache)
+
+    changeSetting(machine, cache, "layer_height", 0.1)
+    evaluations = machine.getEvaluations()
+    cached_job = buildSettingsMessage(machine, cache)
+    cached_evaluations = machine.getEvaluations() - evaluations
+
+    evaluations = machine.getEvaluations()
+    job = buildSettingsMessage(machine, SettingsMessageCache())
+    all_evaluations = machine.getEvaluations() - evaluations
+
+    assert cached_job.getFingerprint() == job.getFingerprint()
+    assert cached_job.getSliceMessage().getSettings()["setting_8"] == b"0.8"
+    assert [limit.name for limit in cached_job.getSliceMessage().repeated["limit_to_extruder"]] == ["setting_2"]
+    extruder_messages = cached_job.getSliceMessage().repeated["extruders"]
+    assert [message.getSettings("settings")["machine_extruder_start_code"] for message in extruder_messages] == [b"T0", b"T1"]
+    assert cached_evaluations < all_evaluations / 4
+
+##  Build the settings message for machines with more and more settings, and
+#   report how long it takes without a cache and with a cache after changing
+#   one setting.
+@pytest.mark.benchmark
+@pytest.mark.parametrize("setting_count", [100, 1000, 3000])
+def test_benchmarkBuildMessage(setting_count, benchmark_report):
+    machine = FakeMachine(setting_count)
+    try:
+        evaluations = machine.getEvaluations()
+        start_time = time.perf_counter()
+        buildSettingsMessage(machine, SettingsMessageCache())
+        uncached_time = time.perf_counter() - start_time
+        uncached_evaluations = machine.getEvaluations() - evaluations
+
+        cache = SettingsMessageCache()
+        buildSettingsMessage(machine, cache)
+        changeSetting(machine, cache, "setting_3", 4)
+        evaluations = machine.getEvaluations()
+        start_time = time.perf_counter()
+        buildSettingsMessage(machine, cache)
+        cached_time = time.perf_counter() - start_time
+        cached_evaluations = machine.getEvaluations() - evaluations
+    finally:
+        machine.close()
+
+    benchmark_report("%d settings, 2 extruders: %.4f s and %d evaluated properties without the cache, %.4f s and %d evaluated properties after changing one setting" % (
+        setting_count, uncached_time, uncached_evaluations, cached_time, cached_evaluations))
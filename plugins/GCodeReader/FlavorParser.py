@@ -15,13 +15,20 @@ from UM.Preferences import Preferences
 catalog = i18nCatalog("cura")
 
 from cura import LayerDataBuilder
+from cura.GCodeStore import GCodeStore
 from cura.LayerDataDecorator import LayerDataDecorator
 from cura.LayerPolygon import LayerPolygon
 from cura.Scene.GCodeListDecorator import GCodeListDecorator
 from cura.Settings.ExtruderManager import ExtruderManager
 
+try:
+    from . import GCodeColumns
+except (ImportError, SystemError): #Imported as a top-level module, like the tests do.
+    import GCodeColumns
+
 import numpy
 import math
+import mmap
 import re
 from collections import namedtuple
 
@@ -43,6 +50,8 @@ class FlavorParser:
         self._current_layer_thickness = 0.2  # default
 
         Preferences.getInstance().addPreference("gcodereader/show_caution", True)
+        # Parse the file in bulk with NumPy instead of line by line.
+        Preferences.getInstance().addPreference("gcodereader/columnar_parser", True)
 
     def _clearValues(self):
         self._filament_diameter = 2.85
@@ -55,6 +64,9 @@ class FlavorParser:
         self._center_is_zero = False
         self._is_absolute_positioning = True    # It can be absolute (G90) or relative (G91)
         self._is_absolute_extrusion = True  # It can become absolute (M82, default) or relative (M83)
+        self._min_layer_number = 0
+        self._negative_layers = 0
+        self._previous_layer = 0
 
     @staticmethod
     def _getValue(line, code):
@@ -95,44 +107,40 @@ class FlavorParser:
         return AxisAlignedBox(minimum=Vector(0, 0, 0), maximum=Vector(10, 10, 10))
 
     def _createPolygon(self, layer_thickness, path, extruder_offsets):
-        countvalid = 0
-        for point in path:
-            if point[5] > 0:
-                countvalid += 1
-                if countvalid >= 2:
-                    # we know what to do now, no need to count further
-                    continue
-        if countvalid < 2:
+        if len(path) == 0:
+            return False
+        columns = numpy.array(path, dtype = numpy.float64)
+        return self._createPolygonFromColumns(layer_thickness, columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3], columns[:, 4], columns[:, 5].astype(numpy.int32), extruder_offsets)
+
+    ##  Creates a polygon in the current layer from columns with one entry per point of the path.
+    #
+    #   \param f The feedrate of the move to each point.
+    #   \param e The total extruded length at each point.
+    #   \param types The line type of the move to each point.
+    #   \return Whether a polygon was created.
+    def _createPolygonFromColumns(self, layer_thickness, x, y, z, f, e, types, extruder_offsets):
+        if numpy.count_nonzero(types > 0) < 2:
             return False
         try:
             self._layer_data_builder.addLayer(self._layer_number)
-            self._layer_data_builder.setLayerHeight(self._layer_number, path[0][2])
+            self._layer_data_builder.setLayerHeight(self._layer_number, z[0])
             self._layer_data_builder.setLayerThickness(self._layer_number, layer_thickness)
             this_layer = self._layer_data_builder.getLayer(self._layer_number)
         except ValueError:
             return False
-        count = len(path)
-        line_types = numpy.empty((count - 1, 1), numpy.int32)
-        line_widths = numpy.empty((count - 1, 1), numpy.float32)
-        line_thicknesses = numpy.empty((count - 1, 1), numpy.float32)
-        line_feedrates = numpy.empty((count - 1, 1), numpy.float32)
-        line_widths[:, 0] = 0.35  # Just a guess
-        line_thicknesses[:, 0] = layer_thickness
+        count = len(types)
         points = numpy.empty((count, 3), numpy.float32)
-        extrusion_values = numpy.empty((count, 1), numpy.float32)
-        i = 0
-        for point in path:
-            points[i, :] = [point[0] + extruder_offsets[0], point[2], -point[1] - extruder_offsets[1]]
-            extrusion_values[i] = point[4]
-            if i > 0:
-                line_feedrates[i - 1] = point[3]
-                line_types[i - 1] = point[5]
-                if point[5] in [LayerPolygon.MoveCombingType, LayerPolygon.MoveRetractionType]:
-                    line_widths[i - 1] = 0.1
-                    line_thicknesses[i - 1] = 0.0 # Travels are set as zero thickness lines
-                else:
-                    line_widths[i - 1] = self._calculateLineWidth(points[i], points[i-1], extrusion_values[i], extrusion_values[i-1], layer_thickness)
-            i += 1
+        points[:, 0] = x + extruder_offsets[0]
+        points[:, 1] = z
+        points[:, 2] = -y - extruder_offsets[1]
+        extrusion_values = e.astype(numpy.float32)
+
+        line_types = types[1:].astype(numpy.int32).reshape((count - 1, 1))
+        line_feedrates = f[1:].astype(numpy.float32).reshape((count - 1, 1))
+        is_travel = (line_types == LayerPolygon.MoveCombingType) | (line_types == LayerPolygon.MoveRetractionType)
+        # Travels are set as thin, zero thickness lines
+        line_widths = numpy.where(is_travel, 0.1, self._calculateLineWidths(points, extrusion_values, layer_thickness).reshape((count - 1, 1))).astype(numpy.float32)
+        line_thicknesses = numpy.where(is_travel, 0.0, layer_thickness).astype(numpy.float32)
 
         this_poly = LayerPolygon(self._extruder_number, line_types, points, line_widths, line_thicknesses, line_feedrates)
         this_poly.buildCache()
@@ -140,32 +148,36 @@ class FlavorParser:
         this_layer.polygons.append(this_poly)
         return True
 
+    ##  Creates a polygon in the current layer from the moves in [begin, end).
+    def _createPolygonFromMoves(self, moves, begin, end, layer_thickness):
+        if end - begin == 0:
+            return False
+        return self._createPolygonFromColumns(layer_thickness, moves.x[begin:end], moves.y[begin:end], moves.z[begin:end], moves.f[begin:end],
+                                              moves.e[begin:end], moves.types[begin:end], self._extruder_offsets.get(self._extruder_number, [0, 0]))
+
     def _createEmptyLayer(self, layer_number):
         self._layer_data_builder.addLayer(layer_number)
         self._layer_data_builder.setLayerHeight(layer_number, 0)
         self._layer_data_builder.setLayerThickness(layer_number, 0)
 
-    def _calculateLineWidth(self, current_point, previous_point, current_extrusion, previous_extrusion, layer_thickness):
+    ##  Calculates the width of the line to each point from the extruded volume.
+    def _calculateLineWidths(self, points, extrusion_values, layer_thickness):
         # Area of the filament
         Af = (self._filament_diameter / 2) ** 2 * numpy.pi
         # Length of the extruded filament
-        de = current_extrusion - previous_extrusion
-        # Volumne of the extruded filament
+        de = numpy.diff(extrusion_values)
+        # Volume of the extruded filament
         dVe = de * Af
-        # Length of the printed line
-        dX = numpy.sqrt((current_point[0] - previous_point[0])**2 + (current_point[2] - previous_point[2])**2)
+        # Length of the printed lines
+        dX = numpy.sqrt(numpy.diff(points[:, 0]) ** 2 + numpy.diff(points[:, 2]) ** 2)
+        with numpy.errstate(divide = "ignore", invalid = "ignore"):
+            # Area of the printed line. This area is a rectangle with area equal to layer_thickness * layer_width
+            line_widths = dVe / dX / layer_thickness
+            # A threshold is set to avoid weird paths in the GCode
+            line_widths[line_widths > 1.2] = 0.35
         # When the extruder recovers from a retraction, we get zero distance
-        if dX == 0:
-            return 0.1
-        # Area of the printed line. This area is a rectangle
-        Ae = dVe / dX
-        # This area is a rectangle with area equal to layer_thickness * layer_width
-        line_width = Ae / layer_thickness
-
-        # A threshold is set to avoid weird paths in the GCode
-        if line_width > 1.2:
-            return 0.35
-        return line_width
+        line_widths[dX == 0] = 0.1
+        return line_widths
 
     def _gCode0(self, position, params, path):
         x, y, z, f, e = position
@@ -277,6 +289,16 @@ class FlavorParser:
     _type_keyword = ";TYPE:"
     _layer_keyword = ";LAYER:"
 
+    # Line types for the features in ;TYPE: comments.
+    _type_map = {
+        "WALL-INNER": LayerPolygon.InsetXType,
+        "WALL-OUTER": LayerPolygon.Inset0Type,
+        "SKIN": LayerPolygon.SkinType,
+        "SKIRT": LayerPolygon.SkirtType,
+        "SUPPORT": LayerPolygon.SupportType,
+        "FILL": LayerPolygon.InfillType
+    }
+
     ##  For showing correct x, y offsets for each extruder
     def _extruderOffsets(self):
         result = {}
@@ -286,52 +308,65 @@ class FlavorParser:
                 extruder.getProperty("machine_nozzle_offset_y", "value")]
         return result
 
-    def processGCodeFile(self, file_name):
-        Logger.log("d", "Preparing to load %s" % file_name)
-        self._cancelled = False
-        # We obtain the filament diameter from the selected printer to calculate line widths
-        self._filament_diameter = Application.getInstance().getGlobalContainerStack().getProperty("material_diameter", "value")
-
-        scene_node = CuraSceneNode()
-        # Override getBoundingBox function of the sceneNode, as this node should return a bounding box, but there is no
-        # real data to calculate it from.
-        scene_node.getBoundingBox = self._getNullBoundingBox
+    def _showParsingMessage(self):
+        self._message = Message(catalog.i18nc("@info:status", "Parsing G-code"),
+                                lifetime=0,
+                                title = catalog.i18nc("@info:title", "G-code Details"))
+
+        self._message.setProgress(0)
+        self._message.show()
+
+    ##  Handles a ;LAYER: comment. The polygons of the previous layer must have been created already.
+    def _startLayer(self, layer_number):
+        # When using a raft, the raft layers are stored as layers < 0, it mimics the same behavior
+        # as in ProcessSlicedLayersJob
+        if layer_number < self._min_layer_number:
+            self._min_layer_number = layer_number
+        if layer_number < 0:
+            layer_number += abs(self._min_layer_number)
+            self._negative_layers += 1
+        else:
+            layer_number += self._negative_layers
 
-        gcode_list = []
-        self._is_layers_in_file = False
+        # In case there is a gap in the layer count, empty layers are created
+        for empty_layer in range(self._previous_layer + 1, layer_number):
+            self._createEmptyLayer(empty_layer)
 
-        Logger.log("d", "Opening file %s" % file_name)
+        self._layer_number = layer_number
+        self._previous_layer = layer_number
 
-        self._extruder_offsets = self._extruderOffsets()  # dict with index the extruder number. can be empty
+    ##  Parses the file line by line.
+    #
+    #   \return A GCodeStore with the g-code (one entry per layer) or None if parsing was cancelled.
+    def _parseLines(self, file_name):
+        gcode_list = GCodeStore()
+        self._is_layers_in_file = False
 
         with open(file_name, "r") as file:
             file_lines = 0
             current_line = 0
+            layer_lines = []
             for line in file:
                 file_lines += 1
-                gcode_list.append(line)
-                if not self._is_layers_in_file and line[:len(self._layer_keyword)] == self._layer_keyword:
+                if line[:len(self._layer_keyword)] == self._layer_keyword:
                     self._is_layers_in_file = True
+                    if layer_lines:
+                        gcode_list.append("".join(layer_lines))
+                        layer_lines = []
+                layer_lines.append(line)
+            if layer_lines:
+                gcode_list.append("".join(layer_lines))
             file.seek(0)
 
             file_step = max(math.floor(file_lines / 100), 1)
 
             self._clearValues()
-
-            self._message = Message(catalog.i18nc("@info:status", "Parsing G-code"),
-                                    lifetime=0,
-                                    title = catalog.i18nc("@info:title", "G-code Details"))
-
-            self._message.setProgress(0)
-            self._message.show()
+            self._showParsingMessage()
 
             Logger.log("d", "Parsing %s..." % file_name)
 
             current_position = self._position(0, 0, 0, 0, [0])
             current_path = []
-            min_layer_number = 0
-            negative_layers = 0
-            previous_layer = 0
 
             for line in file:
                 if self._cancelled:
@@ -347,18 +382,8 @@ class FlavorParser:
 
                 if line.find(self._type_keyword) == 0:
                     type = line[len(self._type_keyword):].strip()
-                    if type == "WALL-INNER":
-                        self._layer_type = LayerPolygon.InsetXType
-                    elif type == "WALL-OUTER":
-                        self._layer_type = LayerPolygon.Inset0Type
-                    elif type == "SKIN":
-                        self._layer_type = LayerPolygon.SkinType
-                    elif type == "SKIRT":
-                        self._layer_type = LayerPolygon.SkirtType
-                    elif type == "SUPPORT":
-                        self._layer_type = LayerPolygon.SupportType
-                    elif type == "FILL":
-                        self._layer_type = LayerPolygon.InfillType
+                    if type in self._type_map:
+                        self._layer_type = self._type_map[type]
                     else:
                         Logger.log("w", "Encountered a unknown type (%s) while parsing g-code.", type)
 
@@ -368,23 +393,7 @@ class FlavorParser:
                         layer_number = int(line[len(self._layer_keyword):])
                         self._createPolygon(self._current_layer_thickness, current_path, self._extruder_offsets.get(self._extruder_number, [0, 0]))
                         current_path.clear()
-
-                        # When using a raft, the raft layers are stored as layers < 0, it mimics the same behavior
-                        # as in ProcessSlicedLayersJob
-                        if layer_number < min_layer_number:
-                            min_layer_number = layer_number
-                        if layer_number < 0:
-                            layer_number += abs(min_layer_number)
-                            negative_layers += 1
-                        else:
-                            layer_number += negative_layers
-
-                        # In case there is a gap in the layer count, empty layers are created
-                        for empty_layer in range(previous_layer + 1, layer_number):
-                            self._createEmptyLayer(empty_layer)
-
-                        self._layer_number = layer_number
-                        previous_layer = layer_number
+                        self._startLayer(layer_number)
                     except:
                         pass
 
@@ -418,6 +427,153 @@ class FlavorParser:
                     self._layer_number += 1
                     current_path.clear()
 
+        return gcode_list
+
+    ##  Parses the file in bulk: the whole file is tokenized into NumPy columns with GCodeColumns and the polygons
+    #   are created from slices of those columns, one per layer per extruder.
+    #
+    #   \return A GCodeStore with the g-code (one entry per layer) or None if parsing was cancelled.
+    def _parseColumns(self, file_name):
+        self._clearValues()
+        self._showParsingMessage()
+
+        Logger.log("d", "Parsing %s..." % file_name)
+
+        with open(file_name, "rb") as file:
+            try:
+                mapped_file = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+            except ValueError:  # Empty files can't be mapped.
+                mapped_file = None
+            try:
+                buffer = mapped_file if mapped_file is not None else b""
+                tokens = GCodeColumns.tokenize(buffer, self._onTokenizeProgress)
+                if tokens is None:
+                    Logger.log("d", "Parsing %s cancelled" % file_name)
+                    return None
+                gcode_list = self._splitLayers(buffer, tokens)  # Copies the g-code, so the file can be closed.
+            finally:
+                if mapped_file is not None:
+                    try:
+                        mapped_file.close()
+                    except BufferError:  # Tokenizing failed and the traceback still has a view on it.
+                        pass
+
+        self._is_layers_in_file = bool(numpy.any(tokens.kind == GCodeColumns.KIND_LAYER))
+
+        absolute_positioning, absolute_extrusion = self._resolveModes(tokens)
+        type_codes = []
+        for type_name in tokens.type_names:
+            if type_name not in self._type_map:
+                Logger.log("w", "Encountered a unknown type (%s) while parsing g-code.", type_name)
+            type_codes.append(self._type_map.get(type_name))
+        moves = GCodeColumns.resolveMoves(tokens, absolute_positioning, absolute_extrusion, type_codes, self._layer_type,
+                                          LayerPolygon.MoveRetractionType, LayerPolygon.MoveCombingType)
+
+        with numpy.errstate(invalid = "ignore"):
+            negative = (tokens.params[:, GCodeColumns.PARAM_X] < 0) | (tokens.params[:, GCodeColumns.PARAM_Y] < 0)
+        self._center_is_zero = bool(numpy.any((tokens.kind == GCodeColumns.KIND_G) & absolute_positioning & negative))
+
+        layer_thicknesses = self._resolveLayerThicknesses(tokens, moves)
+
+        # The paths are broken at every tool change and every layer change.
+        break_rows = numpy.flatnonzero((tokens.kind == GCodeColumns.KIND_T) | (tokens.kind == GCodeColumns.KIND_LAYER))
+        path_ends = numpy.searchsorted(moves.row, break_rows)
+        path_begin = 0
+        for row, path_end in zip(break_rows.tolist(), path_ends.tolist()):
+            if self._cancelled:
+                Logger.log("d", "Parsing %s cancelled" % file_name)
+                return None
+            self._createPolygonFromMoves(moves, path_begin, path_end, layer_thicknesses[row])
+            path_begin = path_end
+            if tokens.kind[row] == GCodeColumns.KIND_T:
+                self._extruder_number = int(tokens.code[row])
+            else:
+                self._startLayer(int(tokens.code[row]))
+
+        # "Flush" leftovers. Last layer paths are still stored
+        if len(moves) - path_begin > 1:
+            if self._createPolygonFromMoves(moves, path_begin, len(moves), self._current_layer_thickness):
+                self._layer_number += 1
+
+        return gcode_list
+
+    def _onTokenizeProgress(self, progress):
+        self._message.setProgress(math.floor(progress * 100))
+        Job.yieldThread()
+        return not self._cancelled
+
+    ##  Splits the file in one entry per layer, like the g-code that the backend creates.
+    def _splitLayers(self, buffer, tokens):
+        layer_offsets = tokens.offsets[tokens.kind == GCodeColumns.KIND_LAYER].tolist()
+        boundaries = [0] + [offset for offset in layer_offsets if offset > 0] + [len(buffer)]
+        gcode_list = GCodeStore()
+        for begin, end in zip(boundaries[:-1], boundaries[1:]):
+            if end > begin:
+                gcode_list.append(buffer[begin:end].replace(b"\r\n", b"\n"))
+        return gcode_list
+
+    ##  Replays the lines that change the positioning or extrusion mode through the handlers of this flavor, so the
+    #   columns are interpreted the same way as processGCode and processMCode would do.
+    #
+    #   \return Two boolean columns, whether the positioning and the extrusion are absolute for each row.
+    def _resolveModes(self, tokens):
+        is_mode_g = (tokens.kind == GCodeColumns.KIND_G) & ((tokens.code == 90) | (tokens.code == 91))
+        mode_rows = numpy.flatnonzero(is_mode_g | (tokens.kind == GCodeColumns.KIND_M))
+        positioning = numpy.empty(len(mode_rows), dtype = bool)
+        extrusion = numpy.empty(len(mode_rows), dtype = bool)
+        for index, row in enumerate(mode_rows):
+            if tokens.kind[row] == GCodeColumns.KIND_G:
+                getattr(self, "_gCode%s" % tokens.code[row])(None, None, None)
+            else:
+                self.processMCode(int(tokens.code[row]), "", None, None)
+            positioning[index] = self._is_absolute_positioning
+            extrusion[index] = self._is_absolute_extrusion
+        row_count = len(tokens)
+        return (GCodeColumns.forwardFill(row_count, mode_rows, positioning, True),
+                GCodeColumns.forwardFill(row_count, mode_rows, extrusion, True))
+
+    ##  Tracks the layer thickness the same way _gCode0 does, from the heights of the extruding moves.
+    #
+    #   \return The current layer thickness for each row.
+    def _resolveLayerThicknesses(self, tokens, moves):
+        initial_thickness = self._current_layer_thickness
+        rows = moves.row[moves.has_e]
+        heights = moves.z[moves.has_e]
+        # Consecutive moves at the same height can't change the thickness.
+        changes = numpy.concatenate(([True], heights[1:] != heights[:-1])) if len(heights) > 0 else numpy.zeros(0, dtype = bool)
+        thickness_rows = []
+        thicknesses = []
+        for row, z in zip(rows[changes].tolist(), heights[changes].tolist()):
+            # 1.5 is a heuristic for any priming or whatsoever, we skip those.
+            if z > self._previous_z and (z - self._previous_z < 1.5):
+                self._current_layer_thickness = z - self._previous_z
+                self._previous_z = z
+                thickness_rows.append(row)
+                thicknesses.append(self._current_layer_thickness)
+        return GCodeColumns.forwardFill(len(tokens), numpy.array(thickness_rows, dtype = numpy.int64), numpy.array(thicknesses), initial_thickness)
+
+    def processGCodeFile(self, file_name):
+        Logger.log("d", "Preparing to load %s" % file_name)
+        self._cancelled = False
+        # We obtain the filament diameter from the selected printer to calculate line widths
+        self._filament_diameter = Application.getInstance().getGlobalContainerStack().getProperty("material_diameter", "value")
+
+        scene_node = CuraSceneNode()
+        # Override getBoundingBox function of the sceneNode, as this node should return a bounding box, but there is no
+        # real data to calculate it from.
+        scene_node.getBoundingBox = self._getNullBoundingBox
+
+        Logger.log("d", "Opening file %s" % file_name)
+
+        self._extruder_offsets = self._extruderOffsets()  # dict with index the extruder number. can be empty
+
+        if Preferences.getInstance().getValue("gcodereader/columnar_parser"):
+            gcode_list = self._parseColumns(file_name)
+        else:
+            gcode_list = self._parseLines(file_name)
+        if gcode_list is None:
+            return None
+
         material_color_map = numpy.zeros((8, 4), dtype = numpy.float32)
         material_color_map[0, :] = [0.0, 0.7, 0.9, 1.0]
         material_color_map[1, :] = [0.7, 0.9, 0.0, 1.0]
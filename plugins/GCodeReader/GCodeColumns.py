@@ -0,0 +1,333 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import numpy
+
+# Bulk, NumPy based tokenizer for g-code files. Instead of looking at the file one line at a time, the buffer is
+# scanned in large chunks and every line that matters for the layer view is turned into a row of a few columns.
+# The rows are then resolved into absolute moves (x, y, z, e, f, type, extruder) without a Python loop per line.
+
+KIND_G = 0
+KIND_T = 1
+KIND_M = 2
+KIND_LAYER = 3
+KIND_TYPE = 4
+
+# Columns of GCodeTokens.params
+PARAM_X = 0
+PARAM_Y = 1
+PARAM_Z = 2
+PARAM_F = 3
+PARAM_E = 4
+
+_param_letters = b"XYZFE"
+
+# Only the G-codes that the parsers know about are kept. The others would be ignored anyway.
+_handled_g_codes = (0, 1, 28, 90, 91, 92)
+
+_layer_keyword = b";LAYER:"
+_type_keyword = b";TYPE:"
+
+_max_token_length = 24
+_default_chunk_size = 1 << 24
+
+
+##  The relevant lines of a g-code file, one row per line.
+#
+#   kind is one of the KIND_* constants, code is the number after the G/T/M or the value of the ;LAYER: comment (for
+#   ;TYPE: comments it is an index in type_names). params holds the X, Y, Z, F and E parameters of G-code lines, NaN
+#   when the parameter is not there. offsets holds the position in the file where the line starts.
+class GCodeTokens:
+    def __init__(self, kind, code, params, offsets, type_names, line_count):
+        self.kind = kind
+        self.code = code
+        self.params = params
+        self.offsets = offsets
+        self.type_names = type_names
+        self.line_count = line_count
+
+    def __len__(self):
+        return len(self.kind)
+
+
+##  All G0/G1 moves of a g-code file, in absolute coordinates.
+#
+#   row is the row in the GCodeTokens that the move came from. e is the total extruded length of the extruder
+#   (corrected for G92 resets), f is the feedrate in mm/s.
+class GCodeMoves:
+    def __init__(self, row, x, y, z, e, f, types, extruders, has_e):
+        self.row = row
+        self.x = x
+        self.y = y
+        self.z = z
+        self.e = e
+        self.f = f
+        self.types = types
+        self.extruders = extruders
+        self.has_e = has_e
+
+    def __len__(self):
+        return len(self.row)
+
+
+##  Parses numbers from a buffer. starts and ends are the positions of the first and one past the last character.
+#
+#   Tokens that are not a valid number become NaN.
+def _parseNumbers(data, starts, ends):
+    result = numpy.full(len(starts), numpy.nan)
+    if len(starts) == 0:
+        return result
+    lengths = numpy.minimum(ends - starts, _max_token_length)
+    width = max(int(lengths.max()), 1)
+    chars = numpy.zeros((len(starts), width), dtype = numpy.uint8)
+    last = len(data) - 1
+    for column in range(width):
+        in_token = lengths > column
+        chars[in_token, column] = data[numpy.minimum(starts[in_token] + column, last)]
+    strings = chars.view("S%d" % width).ravel()
+    valid = lengths > 0
+    try:
+        result[valid] = strings[valid].astype(numpy.float64)
+    except ValueError:
+        # Some garbage in the file, fall back to parsing them one by one.
+        for index in numpy.flatnonzero(valid):
+            try:
+                result[index] = float(strings[index])
+            except ValueError:
+                pass
+    return result
+
+
+##  Returns for every position the position of the first delimiter (whitespace, newline or comment) after it.
+def _tokenEnds(delimiters, positions, length):
+    index = numpy.searchsorted(delimiters, positions)
+    padded = numpy.append(delimiters, length)
+    return padded[index]
+
+
+##  Tokenizes a single chunk of the buffer. The chunk must end at the end of a line (or the end of the buffer).
+def _tokenizeChunk(data, base_offset, type_names):
+    length = len(data)
+    newlines = numpy.flatnonzero(data == ord("\n"))
+    starts = numpy.concatenate(([0], newlines + 1))
+    ends = numpy.append(newlines, length)
+    non_empty = starts < ends
+    starts = starts[non_empty]
+    ends = ends[non_empty]
+    line_count = len(starts)
+
+    first = data[starts]
+    is_t = first == ord("T")
+    is_m = first == ord("M")
+    is_comment = first == ord(";")
+
+    # Like FlavorParser._parseLines, G-codes may be indented. T and M codes and comments have to be at the start.
+    command_starts = starts.copy()
+    indented = numpy.flatnonzero((first == ord(" ")) | (first == ord("\t")))
+    while len(indented) > 0:
+        command_starts[indented] += 1
+        indented = indented[command_starts[indented] < ends[indented]]
+        character = data[command_starts[indented]]
+        indented = indented[(character == ord(" ")) | (character == ord("\t"))]
+    is_g = (command_starts < ends) & (data[numpy.minimum(command_starts, length - 1)] == ord("G"))
+
+    delimiters = numpy.flatnonzero((data == ord(" ")) | (data == ord("\t")) | (data == ord(";")) | (data == ord("\n")) | (data == ord("\r")))
+
+    # Everything after the first semicolon of a line is a comment.
+    semicolons = numpy.flatnonzero(data == ord(";"))
+    comment_starts = ends.copy()
+    if len(semicolons) > 0:
+        semicolon_lines = numpy.searchsorted(starts, semicolons, side = "right") - 1
+        lines_with_comment, first_semicolon = numpy.unique(semicolon_lines, return_index = True)
+        comment_starts[lines_with_comment] = semicolons[first_semicolon]
+
+    # The code number of G/T/M lines.
+    command_lines = numpy.flatnonzero(is_g | is_t | is_m)
+    code_starts = command_starts[command_lines] + 1
+    codes = _parseNumbers(data, code_starts, _tokenEnds(delimiters, code_starts, length))
+    valid_codes = numpy.isfinite(codes)
+    command_lines = command_lines[valid_codes]
+    codes = codes[valid_codes].astype(numpy.int32)
+    kinds = numpy.where(is_g[command_lines], KIND_G, numpy.where(is_t[command_lines], KIND_T, KIND_M))
+    keep = kinds != KIND_G
+    for handled_code in _handled_g_codes:
+        keep |= codes == handled_code
+    command_lines = command_lines[keep]
+    codes = codes[keep]
+    kinds = kinds[keep]
+
+    # ;LAYER: and ;TYPE: comments.
+    keyword_lines = {}
+    for keyword in (_layer_keyword, _type_keyword):
+        candidates = numpy.flatnonzero(is_comment & (ends - starts >= len(keyword)))
+        for index, character in enumerate(keyword[1:], start = 1):
+            candidates = candidates[data[starts[candidates] + index] == character]
+        keyword_lines[keyword] = candidates
+
+    layer_lines = keyword_lines[_layer_keyword]
+    layer_starts = starts[layer_lines] + len(_layer_keyword)
+    layer_numbers = _parseNumbers(data, layer_starts, _tokenEnds(delimiters, layer_starts, length))
+    valid_layers = numpy.isfinite(layer_numbers) & (layer_numbers == numpy.round(layer_numbers))
+    layer_lines = layer_lines[valid_layers]
+    layer_numbers = layer_numbers[valid_layers].astype(numpy.int32)
+
+    type_lines = keyword_lines[_type_keyword]
+    type_codes = numpy.empty(len(type_lines), dtype = numpy.int32)
+    for index, line in enumerate(type_lines):  # Only one per feature, so there are few of them.
+        name = bytes(data[starts[line] + len(_type_keyword):ends[line]]).strip().decode("utf-8", "replace")
+        if name not in type_names:
+            type_names.append(name)
+        type_codes[index] = type_names.index(name)
+
+    lines = numpy.concatenate((command_lines, layer_lines, type_lines))
+    order = numpy.argsort(lines, kind = "mergesort")
+    lines = lines[order]
+    kind = numpy.concatenate((kinds, numpy.full(len(layer_lines), KIND_LAYER), numpy.full(len(type_lines), KIND_TYPE)))[order].astype(numpy.uint8)
+    code = numpy.concatenate((codes, layer_numbers, type_codes))[order].astype(numpy.int32)
+
+    # The parameters of the G-code lines. A parameter is a letter after whitespace, before the comment.
+    params = numpy.full((len(lines), len(_param_letters)), numpy.nan)
+    row_of_line = numpy.full(line_count, -1, dtype = numpy.int64)
+    row_of_line[lines] = numpy.arange(len(lines))
+    accepts_params = numpy.zeros(line_count, dtype = bool)
+    accepts_params[lines[kind == KIND_G]] = True
+    folded = data | 0x20  # Parameters are not case sensitive
+    for column, letter in enumerate(_param_letters):
+        positions = numpy.flatnonzero(folded == (letter | 0x20))
+        positions = positions[positions > 0]
+        previous = data[positions - 1]
+        positions = positions[(previous == ord(" ")) | (previous == ord("\t"))]
+        position_lines = numpy.searchsorted(starts, positions, side = "right") - 1
+        in_line = (position_lines >= 0) & (positions < ends[position_lines])
+        positions = positions[in_line]
+        position_lines = position_lines[in_line]
+        relevant = accepts_params[position_lines] & (positions < comment_starts[position_lines])
+        positions = positions[relevant]
+        position_lines = position_lines[relevant]
+        values = _parseNumbers(data, positions + 1, _tokenEnds(delimiters, positions + 1, length))
+        params[row_of_line[position_lines], column] = values
+
+    return kind, code, params, starts[lines] + base_offset, line_count
+
+
+##  Tokenizes a g-code buffer (bytes, mmap or anything else that supports the buffer protocol).
+#
+#   The buffer is processed in chunks of chunk_size bytes, split at line ends, to keep the temporary arrays small.
+#   \param progress_callback Called with the fraction of the buffer that was processed after every chunk. If it
+#   returns False, tokenizing is aborted and None is returned.
+#   \return GCodeTokens for the buffer.
+def tokenize(buffer, progress_callback = None, chunk_size = _default_chunk_size):
+    total = len(buffer)
+    data = numpy.frombuffer(buffer, dtype = numpy.uint8) if total > 0 else numpy.zeros(0, dtype = numpy.uint8)
+    type_names = []
+    kinds, codes, params, offsets = [], [], [], []
+    line_count = 0
+    begin = 0
+    while begin < total:
+        end = begin + chunk_size
+        while end < total:  # Extend the chunk to the end of the line.
+            newline = numpy.flatnonzero(data[end:end + chunk_size] == ord("\n"))
+            if len(newline) > 0:
+                end += int(newline[0]) + 1
+                break
+            end += chunk_size
+        end = min(end, total)
+        kind, code, chunk_params, chunk_offsets, chunk_line_count = _tokenizeChunk(data[begin:end], begin, type_names)
+        kinds.append(kind)
+        codes.append(code)
+        params.append(chunk_params)
+        offsets.append(chunk_offsets)
+        line_count += chunk_line_count
+        begin = end
+        if progress_callback is not None and progress_callback(begin / total) is False:
+            return None
+
+    if not kinds:
+        return GCodeTokens(numpy.zeros(0, dtype = numpy.uint8), numpy.zeros(0, dtype = numpy.int32), numpy.zeros((0, len(_param_letters))), numpy.zeros(0, dtype = numpy.int64), type_names, 0)
+    return GCodeTokens(numpy.concatenate(kinds), numpy.concatenate(codes), numpy.concatenate(params), numpy.concatenate(offsets), type_names, line_count)
+
+
+##  For every row, the value of the last event at or before that row.
+#
+#   \param count The number of rows.
+#   \param rows The rows at which the events happen, ascending.
+#   \param values The value of each event.
+#   \param initial The value before the first event.
+def forwardFill(count, rows, values, initial):
+    index = numpy.zeros(count, dtype = numpy.int64)
+    index[rows] = numpy.arange(1, len(rows) + 1)
+    numpy.maximum.accumulate(index, out = index)
+    table = numpy.concatenate(([initial], values))
+    return table[index]
+
+
+##  Resolves a coordinate that can be set (absolute move, G92, G28) or incremented (relative move) per row.
+def _resolveAxis(values, set_mask, delta_mask):
+    deltas = numpy.cumsum(numpy.where(delta_mask, values, 0.0))
+    set_rows = numpy.flatnonzero(set_mask)
+    base = forwardFill(len(values), set_rows, values[set_rows], 0.0)
+    base_deltas = forwardFill(len(values), set_rows, deltas[set_rows], 0.0)
+    return base + deltas - base_deltas
+
+
+##  Turns tokens into absolute moves.
+#
+#   \param tokens GCodeTokens of the file.
+#   \param absolute_positioning Per row, whether X/Y/Z are absolute.
+#   \param absolute_extrusion Per row, whether E is absolute.
+#   \param type_codes The LayerPolygon type for every entry in tokens.type_names, or None for unknown types.
+#   \param default_type The LayerPolygon type until the first ;TYPE: comment.
+#   \param retraction_type The LayerPolygon type for moves that retract.
+#   \param travel_type The LayerPolygon type for moves that don't extrude.
+#   \return GCodeMoves with all G0/G1 moves.
+def resolveMoves(tokens, absolute_positioning, absolute_extrusion, type_codes, default_type, retraction_type, travel_type):
+    count = len(tokens)
+    kind = tokens.kind
+    code = tokens.code
+    params = tokens.params
+    is_g = kind == KIND_G
+    is_move = is_g & (code <= 1)
+    is_home = is_g & (code == 28)
+    is_reset = is_g & (code == 92)
+    has = ~numpy.isnan(params)
+
+    # The tool and the feature type that are active at each row.
+    t_rows = numpy.flatnonzero(kind == KIND_T)
+    extruders = forwardFill(count, t_rows, code[t_rows], 0)
+    type_rows = numpy.flatnonzero(kind == KIND_TYPE)
+    type_values = numpy.array([-1 if type_codes[name] is None else type_codes[name] for name in code[type_rows]], dtype = numpy.int64)
+    known_types = type_values >= 0  # Unknown types don't change the current type.
+    types = forwardFill(count, type_rows[known_types], type_values[known_types], default_type)
+
+    positions = []
+    for column in (PARAM_X, PARAM_Y, PARAM_Z):
+        set_mask = has[:, column] & ((is_move & absolute_positioning) | is_home | is_reset)
+        delta_mask = has[:, column] & is_move & ~absolute_positioning
+        positions.append(_resolveAxis(numpy.nan_to_num(params[:, column]), set_mask, delta_mask))
+
+    f_rows = numpy.flatnonzero(has[:, PARAM_F] & (is_move | is_reset))
+    feedrates = forwardFill(count, f_rows, params[f_rows, PARAM_F] / 60, 0.0)
+
+    # Every extruder has its own E axis. G92 resets it, but the total extruded length keeps counting.
+    e_values = numpy.nan_to_num(params[:, PARAM_E])
+    has_e = has[:, PARAM_E] & is_move
+    extrusion = numpy.zeros(count)
+    previous_extrusion = numpy.zeros(count)
+    total_extrusion = numpy.zeros(count)
+    for extruder_nr in numpy.unique(extruders):
+        on_extruder = extruders == extruder_nr
+        set_mask = on_extruder & has[:, PARAM_E] & ((is_move & absolute_extrusion) | is_reset)
+        delta_mask = on_extruder & has_e & ~absolute_extrusion
+        e = _resolveAxis(e_values, set_mask, delta_mask)
+        e_before = numpy.concatenate(([0.0], e[:-1]))
+        resets = on_extruder & has[:, PARAM_E] & is_reset
+        offset = numpy.cumsum(numpy.where(resets, e_before - e_values, 0.0))
+        extrusion[on_extruder] = e[on_extruder]
+        previous_extrusion[on_extruder] = e_before[on_extruder]
+        total_extrusion[on_extruder] = e[on_extruder] + offset[on_extruder]
+
+    move_types = numpy.where(has_e, numpy.where(extrusion > previous_extrusion, types, retraction_type), travel_type)
+
+    rows = numpy.flatnonzero(is_move)
+    return GCodeMoves(rows, positions[0][rows], positions[1][rows], positions[2][rows], total_extrusion[rows],
+                      feedrates[rows], move_types[rows].astype(numpy.int32), extruders[rows].astype(numpy.int32), has_e[rows])
@@ -0,0 +1,149 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import math
+import time
+import unittest.mock #To mock the application while parsing.
+
+import numpy
+import pytest
+
+import FlavorParser, GCodeColumns #The modules we're testing.
+
+test_gcode = """;FLAVOR:Marlin
+G28
+G92 E0
+;LAYER:-1
+;TYPE:SKIRT
+G0 F3000 X10 Y10 Z0.3
+G1 F1500 X20 Y10 E1
+G1 X20 Y20 E2 ; Not X30
+;LAYER:0
+;TYPE:WALL-OUTER
+G0 X10 Y10 Z0.5
+G1 X20 Y10 E3
+G1 E2.5
+G92 E0
+G1 X20 Y20 E1
+T1
+;TYPE:FILL
+G1 X30 Y20 E2
+G91
+G1 X-5 Y0 E0.5
+G90
+G1 x10 y10 E3
+"""
+
+##  The same g-code with indented lines, which the line parser only reads if they are G-codes.
+indented_gcode = test_gcode.replace("G1 F1500", "  G1 F1500").replace("G1 X20 Y10 E3", "\tG1 X20 Y10 E3") \
+                           .replace("G91", " G91").replace("\nT1", "\n T1").replace(";TYPE:FILL", "  ;TYPE:FILL") + "   \n"
+
+
+##  Creates a parser without an application around it.
+@pytest.fixture
+def parser():
+    with unittest.mock.patch("UM.Application.Application.getInstance"), unittest.mock.patch("UM.Preferences.Preferences.getInstance"):
+        flavor_parser = FlavorParser.FlavorParser()
+    flavor_parser._message = unittest.mock.MagicMock()
+    flavor_parser._showParsingMessage = unittest.mock.MagicMock()
+    flavor_parser._extruder_offsets = {1: [5, 0]}
+    return flavor_parser
+
+
+def test_tokenize():
+    tokens = GCodeColumns.tokenize(test_gcode.encode())
+    assert list(tokens.kind[:4]) == [GCodeColumns.KIND_G, GCodeColumns.KIND_G, GCodeColumns.KIND_LAYER, GCodeColumns.KIND_TYPE]
+    assert list(tokens.code[:3]) == [28, 92, -1]
+    assert tokens.type_names == ["SKIRT", "WALL-OUTER", "FILL"]
+    # Parameters in comments are not parameters.
+    row = numpy.flatnonzero(tokens.offsets == test_gcode.index("G1 X20 Y20 E2"))[0]
+    assert tokens.params[row, GCodeColumns.PARAM_X] == 20
+    # Lower case parameters are fine.
+    row = numpy.flatnonzero(tokens.offsets == test_gcode.index("G1 x10"))[0]
+    assert tokens.params[row, GCodeColumns.PARAM_Y] == 10
+
+
+def test_tokenizeChunks():
+    # Splitting the buffer in many chunks must give the same result.
+    tokens = GCodeColumns.tokenize(test_gcode.encode())
+    chunked_tokens = GCodeColumns.tokenize(test_gcode.encode(), chunk_size = 7)
+    assert numpy.array_equal(tokens.kind, chunked_tokens.kind)
+    assert numpy.array_equal(tokens.code, chunked_tokens.code)
+    assert numpy.array_equal(tokens.offsets, chunked_tokens.offsets)
+    assert numpy.allclose(tokens.params, chunked_tokens.params, equal_nan = True)
+
+
+def test_resolveMoves():
+    tokens = GCodeColumns.tokenize(test_gcode.encode())
+    always = numpy.ones(len(tokens), dtype = bool)
+    relative = (tokens.offsets > test_gcode.index("G91")) & (tokens.offsets < test_gcode.index("G90"))
+    moves = GCodeColumns.resolveMoves(tokens, ~relative, ~relative, [5, 1, 6], 1, 9, 8)
+
+    assert list(moves.x) == [10, 20, 20, 10, 20, 20, 20, 30, 25, 10]
+    assert list(moves.types) == [8, 5, 5, 8, 1, 9, 1, 6, 6, 6]
+    assert list(moves.extruders) == [0, 0, 0, 0, 0, 0, 0, 1, 1, 1]
+    # The total extrusion continues after G92 E0.
+    assert moves.e[6] == pytest.approx(3.5)
+    # Every extruder has its own E axis.
+    assert moves.e[7] == pytest.approx(2)
+    assert moves.e[8] == pytest.approx(2.5)
+    assert moves.f[0] == pytest.approx(50)
+
+
+##  The columnar parser must give the same layers as the line by line parser.
+@pytest.mark.parametrize("gcode", [test_gcode, indented_gcode], ids = ["plain", "indented"])
+def test_columnarParserMatchesLineParser(parser, tmpdir, gcode):
+    file_name = str(tmpdir.join("test.gcode"))
+    with open(file_name, "w") as f:
+        f.write(gcode)
+
+    parser._parseLines(file_name)
+    line_layers = parser._layer_data_builder.getLayers()
+    line_center_is_zero = parser._center_is_zero
+    gcode_list = parser._parseColumns(file_name)
+    column_layers = parser._layer_data_builder.getLayers()
+
+    assert "".join(gcode_list) == gcode
+    assert parser._center_is_zero == line_center_is_zero
+    assert sorted(line_layers.keys()) == sorted(column_layers.keys())
+    for layer_number, line_layer in line_layers.items():
+        column_layer = column_layers[layer_number]
+        assert column_layer.height == pytest.approx(line_layer.height)
+        assert column_layer.thickness == pytest.approx(line_layer.thickness)
+        assert len(column_layer.polygons) == len(line_layer.polygons)
+        for line_polygon, column_polygon in zip(line_layer.polygons, column_layer.polygons):
+            assert column_polygon.extruder == line_polygon.extruder
+            assert numpy.array_equal(column_polygon.types, line_polygon.types)
+            assert numpy.allclose(column_polygon.data, line_polygon.data)
+            assert numpy.allclose(column_polygon.lineWidths, line_polygon.lineWidths)
+            assert numpy.allclose(column_polygon.lineFeedrates, line_polygon.lineFeedrates)
+
+
+##  Writes a g-code file with the given number of lines, like a print of circles.
+def writeSyntheticGCode(file_name, line_count, lines_per_layer = 5000):
+    with open(file_name, "w") as f:
+        extrusion = 0.0
+        for line_number in range(line_count):
+            if line_number % lines_per_layer == 0:
+                layer_number = line_number // lines_per_layer
+                f.write(";LAYER:%d\n;TYPE:WALL-OUTER\nG0 F3000 X10 Y10 Z%.2f\n" % (layer_number, 0.2 * (layer_number + 1)))
+            angle = line_number * 0.01
+            extrusion += 0.05
+            f.write("G1 X%.3f Y%.3f E%.5f\n" % (100 + 50 * math.cos(angle), 100 + 50 * math.sin(angle), extrusion))
+
+
+@pytest.mark.benchmark
+def test_benchmarkParsers(parser, tmpdir, benchmark_report):
+    file_name = str(tmpdir.join("benchmark.gcode"))
+    writeSyntheticGCode(file_name, 10000000)
+
+    start_time = time.time()
+    parser._parseColumns(file_name)
+    columnar_time = time.time() - start_time
+
+    start_time = time.time()
+    parser._parseLines(file_name)
+    line_time = time.time() - start_time
+
+    benchmark_report("Parsing 10M lines: columnar {columnar:.1f}s, line by line {line:.1f}s".format(columnar = columnar_time, line = line_time))
+    assert columnar_time < line_time
@@ -0,0 +1,127 @@
+# Copyright (c) 2015 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import numpy
+
+from PyQt5.QtGui import QImage
+
+from UM.Mesh.MeshBuilder import MeshBuilder
+
+##  The corners of the two triangles of a texel, as (row, column) offsets.
+_QuadCorners = ((0, 0), (1, 0), (1, 1), (1, 1), (0, 1), (0, 0))
+
+##  Which vertices of the two triangles of a wall segment are at the end of
+#   the segment, and which are at the top of the wall.
+_WallEnds = numpy.array([0, 1, 1, 1, 0, 0])
+_WallTops = numpy.array([0, 0, 1, 1, 1, 0], dtype = numpy.float32)
+
+##  Get the brightness of every pixel of an image.
+#
+#   The pixels are read from the buffer of the image at once instead of one
+#   by one.
+#   \param image The QImage to read.
+#   \return Array of (height, width) with the average of the red, green and
+#   blue of each pixel, from 0 to 1.
+def imageToHeightData(image):
+    image = image.convertToFormat(QImage.Format_ARGB32)
+    width = image.width()
+    height = image.height()
+
+    bits = image.constBits()
+    bits.setsize(image.byteCount())
+    # Each pixel is a 0xAARRGGBB integer. Lines can be padded at their end.
+    pixels = numpy.frombuffer(bits, dtype = numpy.uint32).reshape((height, image.bytesPerLine() // 4))[:, :width]
+
+    brightness = ((pixels >> 16) & 0xff) + ((pixels >> 8) & 0xff) + (pixels & 0xff)
+    return (brightness / (3 * 255)).astype(numpy.float32)
+
+##  Blur height data once, by averaging every value with its 8 neighbours.
+#
+#   The 3x3 average is done as a sum over the rows followed by a sum over the
+#   columns. Values outside of the edges are the same as the value at the edge.
+#   \param height_data Array of (height, width), which is changed in place.
+#   \return The blurred height data.
+def blurHeightData(height_data):
+    padded = numpy.pad(height_data, ((1, 1), (1, 1)), mode = "edge")
+
+    rows = padded[:, :-2] + padded[:, 1:-1]
+    rows += padded[:, 2:]
+
+    height_data[:] = rows[:-2]
+    height_data += rows[1:-1]
+    height_data += rows[2:]
+    height_data /= 9
+    return height_data
+
+##  Create a closed mesh with the height data on top, walls at the sides and
+#   a flat bottom.
+#
+#   All vertices are written into the buffers of the mesh builder at once.
+#   \param height_data Array of (height, width) with the height of every
+#   texel, in millimetres.
+#   \param texel_width The distance between two columns, in millimetres.
+#   \param texel_height The distance between two rows, in millimetres.
+#   \return The MeshData of the height map.
+def createHeightMapMesh(height_data, texel_width, texel_height):
+    height, width = height_data.shape
+    height_minus_one = height - 1
+    width_minus_one = width - 1
+
+    heightmap_face_count = 2 * height_minus_one * width_minus_one
+    wall_face_count = 4 * width_minus_one + 4 * height_minus_one
+    total_face_count = heightmap_face_count + wall_face_count + 2
+
+    mesh = MeshBuilder()
+    mesh.reserveFaceCount(total_face_count)
+    vertices = mesh._vertices
+
+    xs = numpy.arange(width, dtype = numpy.float32) * texel_width
+    zs = numpy.arange(height, dtype = numpy.float32) * texel_height
+
+    # 6 vertices for each texel quad.
+    quads = vertices[:heightmap_face_count * 3].reshape((height_minus_one, width_minus_one, 6, 3))
+    for corner, (row, column) in enumerate(_QuadCorners):
+        quads[:, :, corner, 0] = xs[column:column + width_minus_one]
+        quads[:, :, corner, 1] = height_data[row:row + height_minus_one, column:column + width_minus_one]
+        quads[:, :, corner, 2] = zs[row:row + height_minus_one, numpy.newaxis]
+
+    geo_width = xs[-1]
+    geo_height = zs[-1]
+
+    start = heightmap_face_count * 3
+    # north and south walls
+    for z, heights in ((0, height_data[0]), (geo_height, height_data[height_minus_one])):
+        _writeWall(vertices[start:start + width_minus_one * 6], 0, 2, z, xs, heights)
+        start += width_minus_one * 6
+    # west and east walls
+    for x, heights in ((0, height_data[:, 0]), (geo_width, height_data[:, width_minus_one])):
+        _writeWall(vertices[start:start + height_minus_one * 6], 2, 0, x, zs, heights)
+        start += height_minus_one * 6
+
+    # bottom
+    vertices[start:start + 6] = [
+        [0, 0, 0], [0, 0, geo_height], [geo_width, 0, geo_height],
+        [geo_width, 0, geo_height], [geo_width, 0, 0], [0, 0, 0]
+    ]
+
+    mesh._indices[:] = numpy.arange(total_face_count * 3, dtype = numpy.int32).reshape((-1, 3))
+    mesh._vertex_count = total_face_count * 3
+    mesh._face_count = total_face_count
+
+    mesh.calculateNormals(fast = True)
+    return mesh.build()
+
+##  Write the triangles of a wall along one side of the height map.
+#   \param vertices The part of the vertex buffer to write the wall into.
+#   \param along_axis The axis along which the wall goes.
+#   \param fixed_axis The axis along which the position of the wall is fixed.
+#   \param fixed_value The position of the wall along the fixed axis.
+#   \param positions The positions of the texels along the wall.
+#   \param heights The heights of the texels along the wall.
+def _writeWall(vertices, along_axis, fixed_axis, fixed_value, positions, heights):
+    segments = vertices.reshape((-1, 6, 3))
+    texels = numpy.arange(len(positions) - 1)[:, numpy.newaxis] + _WallEnds
+
+    segments[:, :, along_axis] = positions[texels]
+    segments[:, :, 1] = heights[texels] * _WallTops
+    segments[:, :, fixed_axis] = fixed_value
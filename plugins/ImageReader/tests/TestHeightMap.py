@@ -0,0 +1,116 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import time
+
+import numpy
+import pytest
+
+from PyQt5.QtGui import QImage, qRed, qGreen, qBlue, qRgb
+
+from HeightMap import imageToHeightData, blurHeightData, createHeightMapMesh #The module we're testing.
+
+##  An image with random colours.
+def randomImage(width, height, image_format = QImage.Format_RGB32, seed = 0):
+    random = numpy.random.RandomState(seed)
+    image = QImage(width, height, QImage.Format_RGB32)
+    for y in range(height):
+        for x in range(width):
+            image.setPixel(x, y, qRgb(*random.randint(0, 256, 3)))
+    return image.convertToFormat(image_format)
+
+##  A large image with a gradient, which is quick to make.
+def gradientImage(size):
+    image = QImage(size, size, QImage.Format_RGB32)
+    image.fill(0)
+    for y in range(0, size, max(size // 16, 1)):
+        image.setPixel(y, y, qRgb(255, 255, 255))
+    return image.scaled(size, size)
+
+##  How the height data was read before, one pixel at a time.
+def slowHeightData(image):
+    height_data = numpy.zeros((image.height(), image.width()), dtype = numpy.float32)
+    for x in range(0, image.width()):
+        for y in range(0, image.height()):
+            qrgb = image.pixel(x, y)
+            height_data[y, x] = float(qRed(qrgb) + qGreen(qrgb) + qBlue(qrgb)) / (3 * 255)
+    return height_data
+
+##  How the height data was blurred before, one neighbour at a time.
+def slowBlur(height_data):
+    copy = numpy.pad(height_data, ((1, 1), (1, 1)), mode = "edge")
+    height_data = height_data.copy()
+    for rows, columns in ((slice(1, -1), slice(2, None)), (slice(1, -1), slice(None, -2)), (slice(2, None), slice(1, -1)), (slice(None, -2), slice(1, -1)),
+                          (slice(2, None), slice(2, None)), (slice(None, -2), slice(2, None)), (slice(2, None), slice(None, -2)), (slice(None, -2), slice(None, -2))):
+        height_data += copy[rows, columns]
+    return height_data / 9
+
+@pytest.mark.parametrize("image_format", [QImage.Format_RGB32, QImage.Format_ARGB32, QImage.Format_RGB888, QImage.Format_Grayscale8, QImage.Format_Indexed8])
+def test_imageToHeightData(image_format):
+    image = randomImage(13, 7, image_format) #An odd width, so that the lines of some formats are padded.
+
+    height_data = imageToHeightData(image)
+
+    assert height_data.dtype == numpy.float32
+    assert height_data.shape == (7, 13)
+    numpy.testing.assert_array_equal(height_data, slowHeightData(image))
+
+def test_blurHeightData():
+    height_data = numpy.random.RandomState(1).random_sample((9, 14)).astype(numpy.float32)
+    expected = slowBlur(height_data)
+
+    result = blurHeightData(height_data)
+
+    assert result is height_data
+    numpy.testing.assert_allclose(height_data, expected, rtol = 1e-6)
+
+##  A flat height map keeps its height.
+def test_blurHeightDataFlat():
+    height_data = numpy.full((5, 6), 0.25, dtype = numpy.float32)
+
+    blurHeightData(height_data)
+
+    numpy.testing.assert_allclose(height_data, 0.25)
+
+def test_createHeightMapMesh():
+    height_data = numpy.arange(12, dtype = numpy.float32).reshape((3, 4)) + 1
+
+    mesh = createHeightMapMesh(height_data, 2.0, 0.5)
+    vertices = mesh.getVertices()
+
+    # 12 faces on top, 2 for each texel at the sides and 2 at the bottom.
+    assert len(vertices) == (12 + 2 * (3 + 3 + 2 + 2) + 2) * 3
+    numpy.testing.assert_array_equal(vertices.min(axis = 0), [0, 0, 0])
+    numpy.testing.assert_array_equal(vertices.max(axis = 0), [6, 12, 1])
+    numpy.testing.assert_array_equal(mesh.getIndices().reshape(-1), numpy.arange(len(vertices)))
+
+    # Every vertex on top of the height map is at the height of its texel.
+    top = vertices[:12 * 3]
+    numpy.testing.assert_array_equal(top[:, 1], height_data[(top[:, 2] / 0.5).astype(int), (top[:, 0] / 2.0).astype(int)])
+
+##  Read the height data of large images and turn them into a mesh, and report
+#   how long that took. The old way of reading the pixels is shown for the
+#   smallest image, to compare with.
+@pytest.mark.benchmark
+@pytest.mark.parametrize("size", [512, 1024, 2048])
+def test_benchmarkHeightMap(size, benchmark_report):
+    image = gradientImage(size)
+
+    start_time = time.perf_counter()
+    height_data = imageToHeightData(image)
+    read_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for _ in range(10):
+        blurHeightData(height_data)
+    blur_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    mesh = createHeightMapMesh(height_data, 0.1, 0.1)
+    mesh_time = time.perf_counter() - start_time
+
+    benchmark_report("%d px: reading took %.3f s, 10 blurs took %.3f s, the mesh of %d vertices took %.3f s" % (size, read_time, blur_time, len(mesh.getVertices()), mesh_time))
+    if size == 512:
+        start_time = time.perf_counter()
+        slowHeightData(image)
+        benchmark_report("Reading one pixel at a time took %.3f s" % (time.perf_counter() - start_time))
@@ -0,0 +1,374 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# The PostProcessingPlugin is released under the terms of the AGPLv3 or higher.
+
+import re
+
+import numpy
+
+#   Finds the first letter of every line of a text and the number after it, like "G" and "1" for "G1 X10".
+_command_regex = re.compile(r"^[^;\nA-Z]*(?:([A-Z])(-?[0-9]+\.?[0-9]*)?)?.*$", re.MULTILINE)
+
+_parameter_regexes = {}
+
+
+##  Get a regular expression that finds the number after the first occurrence of a letter before the comment, for every
+#   line of a text. This is how Script.getValue reads a value, but for all lines at once.
+def _parameterRegex(key):
+    regex = _parameter_regexes.get(key)
+    if regex is None:
+        escaped_key = re.escape(key)
+        regex = re.compile(r"^[^;\n%s]*(?:%s(-?[0-9]+\.?[0-9]*)?)?.*$" % (escaped_key, escaped_key), re.MULTILINE)
+        _parameter_regexes[key] = regex
+    return regex
+
+
+##  Parse the commands of lines of g-code.
+#   \param text The lines, separated by newlines.
+#   \return The command of every line as it is written, like "G1", or None if the line has no command.
+def _parseCommands(text):
+    return [key + number if key else None for key, number in _command_regex.findall(text)]
+
+
+##  Parse the values of a parameter of lines of g-code.
+#   \param text The lines, separated by newlines.
+#   \param key The letter of the parameter.
+#   \return The value of every line, or None if the line doesn't have a value for the parameter.
+def _parseValues(text, key):
+    if key not in text:
+        return [None] * (text.count("\n") + 1)
+    return [float(number) if number else None for number in _parameterRegex(key).findall(text)]
+
+
+##  The g-code of a build plate as lines, shared by all post-processing scripts.
+#
+#   The g-code is kept as the layers it came in, like the list of strings that scripts got before, and a layer is only
+#   split into lines when it is read. The commands and parameters of the lines are kept as columns: the values of a
+#   parameter letter for all lines of a layer. A column is parsed once, with one regular expression for the whole
+#   layer, the first time a value of that parameter in that layer is asked for. Scripts read the g-code through this
+#   index instead of searching the text of every line again, and patch it by replacing, inserting and deleting lines.
+#   Only the lines that are patched are parsed again, and only the layers that were patched have to be joined into
+#   text again when all scripts are done.
+#
+#   Lines are numbered over all layers, starting with the first line of the first layer. The layer of a line is the
+#   index of its layer in the list of g-code, like the index in the list that scripts got before.
+class GCodeLines:
+    ##  \param layers The g-code, one string per layer, as a list or a GCodeStore. It is not changed.
+    def __init__(self, layers):
+        self._source = layers
+        self._changed = {}  # The layers that were patched, by layer: their text, or their lines once they are split.
+        self._replaced = False  # Whether all layers were replaced with a different number of layers.
+        self._clearIndex()
+
+    def getLayerCount(self):
+        return len(self._source)
+
+    def getLineCount(self):
+        return int(self._getStarts()[-1])
+
+    ##  Get the number of the first line of a layer.
+    def getLayerStart(self, layer):
+        return int(self._getStarts()[self._layerIndex(layer)])
+
+    ##  Get the number of the line after the last line of a layer.
+    def getLayerEnd(self, layer):
+        return int(self._getStarts()[self._layerIndex(layer) + 1])
+
+    ##  Get the text of a layer.
+    def getLayer(self, layer):
+        return self._getText(self._layerIndex(layer))
+
+    ##  Replace the text of a layer.
+    #
+    #   The text is only split into lines when they are read, unless the layer was parsed. Then the lines that are
+    #   different are patched like setLayerLines does, to keep the index of the others.
+    def setLayer(self, layer, text):
+        layer = self._layerIndex(layer)
+        if self._parsed.get(layer):
+            self.setLayerLines(layer, text.split("\n"))
+            return
+        delta = text.count("\n") + 1 - self._countLines(layer) if self._starts is not None else 0
+        self._changed[layer] = text
+        self._parsed.pop(layer, None)
+        self._columns.clear()
+        self._shiftLayers(layer, delta)
+
+    ##  Get the text of all layers, as the list of strings that scripts got before.
+    def getLayers(self):
+        return [self.getLayer(layer) for layer in range(self.getLayerCount())]
+
+    ##  Replace the text of all layers.
+    #
+    #   Only the layers whose text is different are replaced, so that the index of the others is kept. When the number
+    #   of layers is different, everything is replaced.
+    def setLayers(self, layers):
+        layers = list(layers)
+        if len(layers) != self.getLayerCount():
+            self._source = layers
+            self._changed = {}
+            self._replaced = True
+            self._clearIndex()
+            return
+        for layer, text in enumerate(layers):
+            if text != self.getLayer(layer):
+                self.setLayer(layer, text)
+
+    ##  Get the indices of the layers that are different from the g-code this was created with.
+    def getChangedLayers(self):
+        if self._replaced:
+            return list(range(self.getLayerCount()))
+        return sorted(self._changed)
+
+    def getLayerLines(self, layer):
+        return list(self._getLines(self._layerIndex(layer)))
+
+    ##  Replace the lines of a layer.
+    #
+    #   If the layer was parsed, only the lines between the lines that stay the same at the start and the end of the
+    #   layer are parsed again.
+    def setLayerLines(self, layer, lines):
+        layer = self._layerIndex(layer)
+        lines = list(lines)
+        old_lines = self._getLines(layer)
+        start = 0
+        end = len(old_lines)
+        new_end = len(lines)
+        if self._parsed.get(layer):
+            while start < end and start < new_end and old_lines[start] == lines[start]:
+                start += 1
+            while end > start and new_end > start and old_lines[end - 1] == lines[new_end - 1]:
+                end -= 1
+                new_end -= 1
+        self._splice(layer, start, end, lines[start:new_end])
+
+    def getLine(self, index):
+        layer, position = self._locate(index)
+        return self._getLines(layer)[position]
+
+    def setLine(self, index, line):
+        layer, position = self._locate(index)
+        self._splice(layer, position, position + 1, [line])
+
+    ##  Insert lines before a line, in the layer of that line.
+    #
+    #   \param index The number of the line to insert before, or the number of lines to add them to the end of the last
+    #   layer. To add lines to the end of another layer, use insertLayerLines.
+    #   \param lines The lines to insert, without newlines.
+    def insertLines(self, index, lines):
+        if index == self.getLineCount():
+            layer = self.getLayerCount() - 1
+            position = self.getLayerEnd(layer) - self.getLayerStart(layer)
+        else:
+            layer, position = self._locate(index)
+        self.insertLayerLines(layer, position, lines)
+
+    ##  Insert lines in a layer, like list.insert does.
+    #
+    #   \param layer The layer to insert the lines in.
+    #   \param position The position in the layer to insert the lines before.
+    #   \param lines The lines to insert, without newlines.
+    def insertLayerLines(self, layer, position, lines):
+        layer = self._layerIndex(layer)
+        position = slice(position, None).indices(len(self._getLines(layer)))[0]
+        self._splice(layer, position, position, list(lines))
+
+    ##  Delete lines, which may be in several layers.
+    def deleteLines(self, index, count = 1):
+        while count > 0:
+            layer, position = self._locate(index)
+            deleted = min(count, len(self._getLines(layer)) - position)
+            self._splice(layer, position, position + deleted, [])
+            count -= deleted
+
+    ##  Find the first line that contains a text.
+    #
+    #   \param text The text to find.
+    #   \param start The number of the line to start searching at.
+    #   \return The number of the line, or -1 if no line contains the text.
+    def find(self, text, start = 0):
+        if start >= self.getLineCount():
+            return -1
+        first_layer, position = self._locate(start)
+        for layer in range(first_layer, self.getLayerCount()):
+            if text in self._getText(layer):  # Only split layers that can contain it.
+                lines = self._getLines(layer)
+                for line_position in range(position, len(lines)):
+                    if text in lines[line_position]:
+                        return self.getLayerStart(layer) + line_position
+            position = 0
+        return -1
+
+    ##  Get the command of a line, which is its first parameter as it is written, like "G1" or "M104".
+    #   \return The command, or None if the line has no command.
+    def getCommand(self, index):
+        layer, position = self._locate(index)
+        return self._getColumn(layer, None)[position]
+
+    ##  Get the value of a parameter of a line, like Script.getValue but without searching the line.
+    #
+    #   When requesting key = "X" from line "G1 X100" the value 100 is returned.
+    #   \param index The number of the line.
+    #   \param key The letter of the parameter.
+    #   \param default The value to return if the line doesn't have the parameter.
+    def getValue(self, index, key, default = None):
+        located = self._located
+        if located is None or not located[1] <= index < located[2]:  # Looked up here, since scripts call this a lot.
+            located = self._locateLayer(index)
+        column = self._parsed.get(located[0], {}).get(key)
+        if column is None:
+            column = self._getColumn(located[0], key)
+        value = column[index - located[1]]
+        return default if value is None else value
+
+    ##  Get the values of a parameter of the lines of a layer.
+    #
+    #   This is faster than getting the values line by line, for scripts that go through all lines of a layer.
+    #   \param layer The layer to get the values of.
+    #   \param key The letter of the parameter.
+    #   \return A list with the value of every line of the layer, or None for lines that don't have the parameter. It
+    #   is the index itself, so it must not be changed.
+    def getLayerValues(self, layer, key):
+        return self._getColumn(self._layerIndex(layer), key)
+
+    ##  Get the values of a parameter of all lines, with NaN for lines that don't have it.
+    #
+    #   The column is made once and kept until the g-code is patched, so it cannot be changed.
+    #   \param key The letter of the parameter.
+    #   \return A numpy array with a value for every line.
+    def column(self, key):
+        column = self._columns.get(key)
+        if column is None:
+            parts = [numpy.array(self._getColumn(layer, key), dtype = numpy.float64) for layer in range(self.getLayerCount())]
+            column = numpy.concatenate(parts) if parts else numpy.empty(0)
+            column.flags.writeable = False
+            self._columns[key] = column
+        return column
+
+    @property
+    def x(self):
+        return self.column("X")
+
+    @property
+    def y(self):
+        return self.column("Y")
+
+    @property
+    def z(self):
+        return self.column("Z")
+
+    @property
+    def e(self):
+        return self.column("E")
+
+    @property
+    def f(self):
+        return self.column("F")
+
+    ##  The layer of every line.
+    @property
+    def layer(self):
+        starts = self._getStarts()
+        return numpy.repeat(numpy.arange(len(starts) - 1), numpy.diff(starts))
+
+    def _clearIndex(self):
+        self._parsed = {}  # The columns that were parsed, by layer and then by parameter, or None for the commands.
+        self._columns = {}  # The values of a parameter of all lines, by parameter.
+        self._starts = None  # The number of the first line of every layer, followed by the number of lines.
+        self._located = None  # The layer that a line was last looked up in, its first line and the line after its end.
+        self._split_layer = None  # The layer that was last split into lines without being patched, and its lines.
+        self._split_lines = None
+
+    def _layerIndex(self, layer):
+        return range(self.getLayerCount())[layer]  # Counts from the end for negative layers, like a list.
+
+    def _getStarts(self):
+        if self._starts is None:
+            lengths = [self._countLines(layer) for layer in range(self.getLayerCount())]
+            self._starts = numpy.zeros(len(lengths) + 1, dtype = numpy.int64)
+            numpy.cumsum(lengths, out = self._starts[1:])
+        return self._starts
+
+    ##  Find the layer of a line and its position in that layer.
+    def _locate(self, index):
+        located = self._located
+        if located is None or not located[1] <= index < located[2]:
+            located = self._locateLayer(index)
+        return located[0], index - located[1]
+
+    ##  Find the layer of a line.
+    #   \return Tuple of the layer, the number of its first line and the number of the line after its last line. It is
+    #   kept for the next line, since scripts mostly go through the lines of a layer one after another.
+    def _locateLayer(self, index):
+        starts = self._getStarts()
+        if not 0 <= index < starts[-1]:
+            raise IndexError("Line %s is out of range" % index)
+        layer = int(numpy.searchsorted(starts, index, side = "right")) - 1
+        self._located = (layer, int(starts[layer]), int(starts[layer + 1]))
+        return self._located
+
+    def _countLines(self, layer):
+        changed = self._changed.get(layer)
+        if isinstance(changed, list):
+            return len(changed)
+        return self._getText(layer).count("\n") + 1
+
+    def _getText(self, layer):
+        changed = self._changed.get(layer)
+        if changed is None:
+            return self._source[layer]
+        if isinstance(changed, list):
+            return "\n".join(changed)
+        return changed
+
+    def _getLines(self, layer):
+        changed = self._changed.get(layer)
+        if changed is not None:
+            if not isinstance(changed, list):
+                changed = self._changed[layer] = changed.split("\n")
+            return changed
+        if self._split_layer != layer:
+            self._split_layer = layer
+            self._split_lines = self._source[layer].split("\n")
+        return self._split_lines
+
+    ##  Get a column of a layer, parsing it if that wasn't done yet.
+    #   \param key The letter of the parameter, or None for the commands.
+    def _getColumn(self, layer, key):
+        columns = self._parsed.setdefault(layer, {})
+        column = columns.get(key)
+        if column is None:
+            text = self._getText(layer)
+            column = columns[key] = _parseCommands(text) if key is None else _parseValues(text, key)
+        return column
+
+    ##  Replace lines of a layer, and their values in the columns of the layer that were parsed.
+    #
+    #   When most of the layer is replaced, its columns are dropped instead, to be parsed again if they are read.
+    #   \param layer The layer to patch.
+    #   \param start The position in the layer of the first line to replace.
+    #   \param end The position in the layer after the last line to replace.
+    #   \param lines The lines to put in their place.
+    def _splice(self, layer, start, end, lines):
+        layer_lines = self._getLines(layer)
+        if layer not in self._changed:
+            layer_lines = self._changed[layer] = list(layer_lines)
+        layer_lines[start:end] = lines
+
+        if len(lines) * 2 > len(layer_lines):
+            self._parsed.pop(layer, None)
+        elif layer in self._parsed:
+            text = "\n".join(lines)
+            for key, column in self._parsed[layer].items():
+                if lines:
+                    column[start:end] = _parseCommands(text) if key is None else _parseValues(text, key)
+                else:
+                    del column[start:end]
+
+        self._columns.clear()
+        self._shiftLayers(layer, len(lines) - (end - start))
+
+    ##  Move the first lines of the layers after a layer, when lines were added to or removed from it.
+    def _shiftLayers(self, layer, delta):
+        if delta:
+            if self._starts is not None:
+                self._starts[layer + 1:] += delta
+            self._located = None
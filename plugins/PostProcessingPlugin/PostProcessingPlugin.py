@@ -8,6 +8,10 @@ from UM.Application import Application
 from UM.Extension import Extension
 from UM.Logger import Logger
 
+from cura.GCodeStore import GCodeStore
+
+from .GCodeLines import GCodeLines
+
 import os.path
 import pkgutil
 import sys
@@ -68,13 +72,20 @@ class PostProcessingPlugin(QObject, Extension):
             return
 
         if ";POSTPROCESSED" not in gcode_list[0]:
-            for script in self._script_list:
-                try:
-                    gcode_list = script.execute(gcode_list)
-                except Exception:
-                    Logger.logException("e", "Exception in post-processing script.")
-            if len(self._script_list):  # Add comment to g-code if any changes were made.
-                gcode_list[0] += ";POSTPROCESSED\n"
+            if len(self._script_list):
+                # The g-code is parsed once for all scripts, and only the layers they changed are stored again.
+                lines = GCodeLines(gcode_list)
+                for script in self._script_list:
+                    try:
+                        script.executeLines(lines)
+                    except Exception:
+                        Logger.logException("e", "Exception in post-processing script.")
+                if lines.getLayerCount() == len(gcode_list):
+                    for layer in lines.getChangedLayers():
+                        gcode_list[layer] = lines.getLayer(layer)
+                else:
+                    gcode_list = GCodeStore(lines.getLayers())
+                gcode_list[0] += ";POSTPROCESSED\n"  # Add comment to g-code if any changes were made.
             gcode_dict[active_build_plate_id] = gcode_list
             setattr(scene, "gcode_dict", gcode_dict)
         else:
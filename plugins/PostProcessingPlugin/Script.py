@@ -12,11 +12,15 @@ from UM.Settings.InstanceContainer import InstanceContainer
 from UM.Settings.DefinitionContainer import DefinitionContainer
 from UM.Settings.ContainerRegistry import ContainerRegistry
 
+from .GCodeLines import GCodeLines
+
 import re
 import json
 import collections
 i18n_catalog = i18nCatalog("cura")
 
+_number_regex = re.compile(r"^-?[0-9]+\.?[0-9]*")
+
 
 ## Base class for scripts. All scripts should inherit the script class.
 @signalemitter
@@ -97,7 +101,7 @@ class Script:
         if not key in line or (';' in line and line.find(key) > line.find(';')):
             return default
         sub_part = line[line.find(key) + 1:]
-        m = re.search('^-?[0-9]+\.?[0-9]*', sub_part)
+        m = _number_regex.search(sub_part)
         if m is None:
             return default
         try:
@@ -107,5 +111,18 @@ class Script:
 
     ##  This is called when the script is executed. 
     #   It gets a list of g-code strings and needs to return a (modified) list.
+    #   Scripts that implement executeLines instead don't need to implement this.
     def execute(self, data):
-        raise NotImplementedError()
+        if type(self).executeLines is Script.executeLines:
+            raise NotImplementedError()
+        lines = GCodeLines(data)
+        self.executeLines(lines)
+        return lines.getLayers()
+
+    ##  This is called when the script is executed by the plug-in.
+    #   It gets the g-code as GCodeLines, which are shared by all scripts, and patches them.
+    #   Scripts that only implement execute get the g-code as a list of strings.
+    def executeLines(self, lines):
+        if type(self).execute is Script.execute:
+            raise NotImplementedError()
+        lines.setLayers(self.execute(lines.getLayers()))
@@ -45,9 +45,7 @@ class ColorChange(Script):
             }
         }"""
 
-    def execute(self, data: list):
-
-        """data is a list. Each index contains a layer"""
+    def executeLines(self, lines):
         layer_nums = self.getSettingValueByKey("layer_number")
         initial_retract = self.getSettingValueByKey("initial_retract")
         later_retract = self.getSettingValueByKey("later_retract")
@@ -66,11 +64,5 @@ class ColorChange(Script):
         if len(layer_targets) > 0:
             for layer_num in layer_targets:
                 layer_num = int( layer_num.strip() )
-                if layer_num < len(data):
-                    layer = data[ layer_num - 1 ]
-                    lines = layer.split("\n")
-                    lines.insert(2, color_change )
-                    final_line = "\n".join( lines )
-                    data[ layer_num - 1 ] = final_line
-
-        return data
+                if layer_num < lines.getLayerCount():
+                    lines.insertLayerLines(layer_num - 1, 2, [color_change])
@@ -96,10 +96,7 @@ class PauseAtHeight(Script):
             }
         }"""
 
-    def execute(self, data: list):
-
-        """data is a list. Each index contains a layer"""
-
+    def executeLines(self, lines):
         x = 0.
         y = 0.
         current_z = 0.
@@ -122,39 +119,36 @@ class PauseAtHeight(Script):
         # use offset to calculate the current height: <current_height> = <current_z> - <layer_0_z>
         layer_0_z = 0.
         got_first_g_cmd_on_layer_0 = False
-        for layer in data:
-            lines = layer.split("\n")
-            for line in lines:
-                if ";LAYER:0" in line:
+        for layer_index in range(lines.getLayerCount()):
+            for index in range(lines.getLayerStart(layer_index), lines.getLayerEnd(layer_index)):
+                if ";LAYER:0" in lines.getLine(index):
                     layers_started = True
                     continue
 
                 if not layers_started:
                     continue
 
-                if self.getValue(line, 'G') == 1 or self.getValue(line, 'G') == 0:
-                    current_z = self.getValue(line, 'Z')
+                if lines.getValue(index, 'G') == 1 or lines.getValue(index, 'G') == 0:
+                    current_z = lines.getValue(index, 'Z')
                     if not got_first_g_cmd_on_layer_0:
                         layer_0_z = current_z
                         got_first_g_cmd_on_layer_0 = True
 
-                    x = self.getValue(line, 'X', x)
-                    y = self.getValue(line, 'Y', y)
+                    x = lines.getValue(index, 'X', x)
+                    y = lines.getValue(index, 'Y', y)
                     if current_z is not None:
                         current_height = current_z - layer_0_z
                         if current_height >= pause_height:
-                            index = data.index(layer)
-                            prevLayer = data[index - 1]
-                            prevLines = prevLayer.split("\n")
                             current_e = 0.
-                            for prevLine in reversed(prevLines):
-                                current_e = self.getValue(prevLine, 'E', -1)
+                            for prev_index in reversed(range(lines.getLayerStart(layer_index - 1), lines.getLayerEnd(layer_index - 1))):
+                                current_e = lines.getValue(prev_index, 'E', -1)
                                 if current_e >= 0:
                                     break
 
                             # include a number of previous layers
+                            layer = lines.getLayer(layer_index)
                             for i in range(1, redo_layers + 1):
-                                prevLayer = data[index - i]
+                                prevLayer = lines.getLayer(layer_index - i)
                                 layer = prevLayer + layer
 
                             prepend_gcode = ";TYPE:CUSTOM\n"
@@ -215,7 +209,6 @@ class PauseAtHeight(Script):
 
                             # Override the data of this layer with the
                             # modified data
-                            data[index] = layer
-                            return data
+                            lines.setLayer(layer_index, layer)
+                            return
                         break
-        return data
@@ -24,10 +24,7 @@ class PauseAtHeightBCN3D(Script):
             }
         }"""
 
-    def execute(self, data: list):
-
-        """data is a list. Each index contains a layer"""
-
+    def executeLines(self, lines):
         current_z = 0.
         layers_started = False
         pause_height = self.getSettingValueByKey("pause_height")
@@ -35,18 +32,18 @@ class PauseAtHeightBCN3D(Script):
         # use offset to calculate the current height: <current_height> = <current_z> - <layer_0_z>
         layer_0_z = 0.
         got_first_g_cmd_on_layer_0 = False
-        for layer in data:
-            lines = layer.split("\n")
-            for line in lines:
-                if ";LAYER:0" in line:
+        for layer_index in range(lines.getLayerCount()):
+            for index in range(lines.getLayerStart(layer_index), lines.getLayerEnd(layer_index)):
+                if ";LAYER:0" in lines.getLine(index):
                     layers_started = True
                     continue
 
                 if not layers_started:
                     continue
 
-                if (self.getValue(line, 'G') == 1 or self.getValue(line, 'G') == 0) and 'X' in line and 'Y' in line and 'Z' in line:
-                    current_z = self.getValue(line, 'Z')
+                line = lines.getLine(index)
+                if (lines.getValue(index, 'G') == 1 or lines.getValue(index, 'G') == 0) and 'X' in line and 'Y' in line and 'Z' in line:
+                    current_z = lines.getValue(index, 'Z')
                     if not got_first_g_cmd_on_layer_0:
                         layer_0_z = current_z
                         got_first_g_cmd_on_layer_0 = True
@@ -54,8 +51,6 @@ class PauseAtHeightBCN3D(Script):
                     if current_z is not None:
                         current_height = current_z - layer_0_z
                         if current_height >= pause_height:
-                            index = data.index(layer)
-
                             prepend_gcode = ";TYPE:CUSTOM\n"
                             prepend_gcode += ";added code by post processing\n"
                             prepend_gcode += ";script: PauseAtHeight - BCN3D.py\n"
@@ -67,11 +62,10 @@ class PauseAtHeightBCN3D(Script):
                             prepend_gcode += "G4 P2\n"
                             prepend_gcode += "G4 P3\n"
 
-                            layer = prepend_gcode + layer
+                            layer = prepend_gcode + lines.getLayer(layer_index)
 
                             # Override the data of this layer with the
                             # modified data
-                            data[index] = layer
-                            return data
+                            lines.setLayer(layer_index, layer)
+                            return
                         break
-        return data
@@ -42,7 +42,7 @@ class SearchAndReplace(Script):
             }
         }"""
 
-    def execute(self, data):
+    def executeLines(self, lines):
         search_string = self.getSettingValueByKey("search")
         if not self.getSettingValueByKey("is_regex"):
             search_string = re.escape(search_string) #Need to search for the actual string, not as a regex.
@@ -50,7 +50,7 @@ class SearchAndReplace(Script):
 
         replace_string = self.getSettingValueByKey("replace")
 
-        for layer_number, layer in enumerate(data):
-            data[layer_number] = re.sub(search_regex, replace_string, layer) #Replace all.
-
-        return data
\ No newline at end of file
+        for layer_number in range(lines.getLayerCount()):
+            layer, replacements = search_regex.subn(replace_string, lines.getLayer(layer_number)) #Replace all.
+            if replacements: #Only layers that changed need to be parsed again.
+                lines.setLayer(layer_number, layer)
\ No newline at end of file
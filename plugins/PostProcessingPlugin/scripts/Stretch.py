@@ -11,23 +11,6 @@ from ..Script import Script
 import numpy as np
 from UM.Logger import Logger
 from UM.Application import Application
-import re
-
-def _getValue(line, key, default=None):
-    """
-    Convenience function that finds the value in a line of g-code.
-    When requesting key = x from line "G1 X100" the value 100 is returned.
-    It is a copy of Stript's method, so it is no DontRepeatYourself, but
-    I split the class into setup part (Stretch) and execution part (Strecher)
-    and only the setup part inherits from Script
-    """
-    if not key in line or (";" in line and line.find(key) > line.find(";")):
-        return default
-    sub_part = line[line.find(key) + 1:]
-    number = re.search(r"^-?[0-9]+\.?[0-9]*", sub_part)
-    if number is None:
-        return default
-    return float(number.group(0))
 
 class GCodeStep():
     """
@@ -43,15 +26,15 @@ class GCodeStep():
         self.step_f = 0
         self.comment = ""
 
-    def readStep(self, line):
+    def readStep(self, lines, index):
         """
-        Reads gcode from line into self
+        Reads gcode from a line of the GCodeLines into self
         """
-        self.step_x = _getValue(line, "X", self.step_x)
-        self.step_y = _getValue(line, "Y", self.step_y)
-        self.step_z = _getValue(line, "Z", self.step_z)
-        self.step_e = _getValue(line, "E", self.step_e)
-        self.step_f = _getValue(line, "F", self.step_f)
+        self.step_x = lines.getValue(index, "X", self.step_x)
+        self.step_y = lines.getValue(index, "Y", self.step_y)
+        self.step_z = lines.getValue(index, "Z", self.step_z)
+        self.step_e = lines.getValue(index, "E", self.step_e)
+        self.step_f = lines.getValue(index, "F", self.step_f)
         return
 
     def copyPosFrom(self, step):
@@ -86,9 +69,10 @@ class Stretcher():
         self.layer_z = 0            # Z position of the extrusion moves of the current layer
         self.layergcode = ""
 
-    def execute(self, data):
+    def execute(self, lines):
         """
         Computes the new X and Y coordinates of all g-code steps
+        and returns the list of modified g-code layers
         """
         Logger.log("d", "Post stretch with line width = " + str(self.line_width)
                    + "mm wide circle stretch = " + str(self.wc_stretch)+ "mm"
@@ -98,22 +82,26 @@ class Stretcher():
         current = GCodeStep(0)
         self.layer_z = 0.
         current_e = 0.
-        for layer in data:
-            lines = layer.rstrip("\n").split("\n")
-            for line in lines:
+        for layer_index in range(lines.getLayerCount()):
+            start = lines.getLayerStart(layer_index)
+            end = lines.getLayerEnd(layer_index)
+            while end > start + 1 and lines.getLine(end - 1) == "": # Skip the newlines at the end of the layer
+                end -= 1
+            for index in range(start, end):
+                line = lines.getLine(index)
                 current.comment = ""
                 if line.find(";") >= 0:
                     current.comment = line[line.find(";"):]
-                if _getValue(line, "G") == 0:
-                    current.readStep(line)
+                if lines.getValue(index, "G") == 0:
+                    current.readStep(lines, index)
                     onestep = GCodeStep(0)
                     onestep.copyPosFrom(current)
-                elif _getValue(line, "G") == 1:
-                    current.readStep(line)
+                elif lines.getValue(index, "G") == 1:
+                    current.readStep(lines, index)
                     onestep = GCodeStep(1)
                     onestep.copyPosFrom(current)
-                elif _getValue(line, "G") == 92:
-                    current.readStep(line)
+                elif lines.getValue(index, "G") == 92:
+                    current.readStep(lines, index)
                     onestep = GCodeStep(-1)
                     onestep.copyPosFrom(current)
                 else:
@@ -456,14 +444,14 @@ class Stretch(Script):
             }
         }"""
 
-    def execute(self, data):
+    def executeLines(self, lines):
         """
         Entry point of the plugin.
-        data is the list of original g-code instructions,
-        the returned string is the list of modified g-code instructions
+        lines are the GCodeLines of the original g-code instructions,
+        which are replaced with the modified g-code instructions
         """
         stretcher = Stretcher(
             Application.getInstance().getGlobalContainerStack().getProperty("line_width", "value")
             , self.getSettingValueByKey("wc_stretch"), self.getSettingValueByKey("pw_stretch"))
-        return stretcher.execute(data)
+        lines.setLayers(stretcher.execute(lines))
 
@@ -302,7 +302,7 @@ class TweakAtZ(Script):
         except:
             return default
 
-    def execute(self, data):
+    def executeLines(self, lines):
         #Check which tweaks should apply
         TweakProp = {"speed": self.getSettingValueByKey("e1_Tweak_speed"),
              "flowrate": self.getSettingValueByKey("g1_Tweak_flowrate"),
@@ -362,11 +362,19 @@ class TweakAtZ(Script):
         else:
             targetL_i = -100000
             targetZ = self.getSettingValueByKey("b_targetZ")
-        index = 0
-        for active_layer in data:
+        for layer_index in range(lines.getLayerCount()):
             modified_gcode = ""
-            lines = active_layer.split("\n")
-            for line in lines:
+            start = lines.getLayerStart(layer_index)
+            #the parameters that are read from (almost) every line are taken for the whole layer at once
+            tool_values = lines.getLayerValues(layer_index, "T")
+            m_values = lines.getLayerValues(layer_index, "M")
+            x_values = lines.getLayerValues(layer_index, "X")
+            y_values = lines.getLayerValues(layer_index, "Y")
+            z_values = lines.getLayerValues(layer_index, "Z")
+            e_values = lines.getLayerValues(layer_index, "E")
+            f_values = lines.getLayerValues(layer_index, "F")
+            for position, line in enumerate(lines.getLayerLines(layer_index)):
+                index = start + position
                 if ";Generated with Cura_SteamEngine" in line:
                     TWinstances += 1
                     modified_gcode += ";TweakAtZ instances: %d\n" % TWinstances
@@ -393,43 +401,42 @@ class TweakAtZ(Script):
                         if (state == 2 or targetL_i == 0) and layer == targetL_i: #determine targetZ from layer no.; checks for tweak on layer 0
                             state = 2
                             targetZ = z + 0.001
-                if (self.getValue(line, "T", None) is not None) and (self.getValue(line, "M", None) is None): #looking for single T-cmd
-                    pres_ext = self.getValue(line, "T", pres_ext)
+                if (tool_values[position] is not None) and (m_values[position] is None): #looking for single T-cmd
+                    pres_ext = tool_values[position]
                 if "M190" in line or "M140" in line and state < 3: #looking for bed temp, stops after target z is passed
-                    old["bedTemp"] = self.getValue(line, "S", old["bedTemp"])
+                    old["bedTemp"] = lines.getValue(index, "S", old["bedTemp"])
                 if "M109" in line or "M104" in line and state < 3: #looking for extruder temp, stops after target z is passed
-                    if self.getValue(line, "T", pres_ext) == 0:
-                        old["extruderOne"] = self.getValue(line, "S", old["extruderOne"])
-                    elif self.getValue(line, "T", pres_ext) == 1:
-                        old["extruderTwo"] = self.getValue(line, "S", old["extruderTwo"])
+                    if lines.getValue(index, "T", pres_ext) == 0:
+                        old["extruderOne"] = lines.getValue(index, "S", old["extruderOne"])
+                    elif lines.getValue(index, "T", pres_ext) == 1:
+                        old["extruderTwo"] = lines.getValue(index, "S", old["extruderTwo"])
                 if "M107" in line: #fan is stopped; is always updated in order not to miss switch off for next object
                     old["fanSpeed"] = 0
                 if "M106" in line and state < 3: #looking for fan speed
-                    old["fanSpeed"] = self.getValue(line, "S", old["fanSpeed"])
+                    old["fanSpeed"] = lines.getValue(index, "S", old["fanSpeed"])
                 if "M221" in line and state < 3: #looking for flow rate
-                    tmp_extruder = self.getValue(line,"T",None)
+                    tmp_extruder = tool_values[position]
                     if tmp_extruder == None: #check if extruder is specified
-                        old["flowrate"] = self.getValue(line, "S", old["flowrate"])
+                        old["flowrate"] = lines.getValue(index, "S", old["flowrate"])
                     elif tmp_extruder == 0: #first extruder
-                        old["flowrateOne"] = self.getValue(line, "S", old["flowrateOne"])
+                        old["flowrateOne"] = lines.getValue(index, "S", old["flowrateOne"])
                     elif tmp_extruder == 1: #second extruder
-                        old["flowrateOne"] = self.getValue(line, "S", old["flowrateOne"])
+                        old["flowrateOne"] = lines.getValue(index, "S", old["flowrateOne"])
                 if ("M84" in line or "M25" in line):
                     if state>0 and TweakProp["speed"]: #"finish" commands for UM Original and UM2
                         modified_gcode += "M220 S100 ; speed reset to 100% at the end of print\n"
                         modified_gcode += "M117                     \n"
                     modified_gcode += line + "\n"
                 if "G1" in line or "G0" in line:
-                    newZ = self.getValue(line, "Z", z)
-                    x = self.getValue(line, "X", None)
-                    y = self.getValue(line, "Y", None)
-                    e = self.getValue(line, "E", None)
-                    f = self.getValue(line, "F", None)
+                    newZ = z_values[position] if z_values[position] is not None else z
+                    x = x_values[position]
+                    y = y_values[position]
+                    e = e_values[position]
+                    f = f_values[position]
                     if 'G1' in line and TweakPrintSpeed and (state==3 or state==4):
                         # check for pure print movement in target range:
                         if x != None and y != None and f != None and e != None and newZ==z:
-                            modified_gcode += "G1 F%d X%1.3f Y%1.3f E%1.5f\n" % (int(f / 100.0 * float(target_values["printspeed"])), self.getValue(line, "X"),
-                                                                          self.getValue(line, "Y"), self.getValue(line, "E"))
+                            modified_gcode += "G1 F%d X%1.3f Y%1.3f E%1.5f\n" % (int(f / 100.0 * float(target_values["printspeed"])), x, y, e)
                         else: #G1 command but not a print movement
                             modified_gcode += line + "\n"
                     # no tweaking on retraction hops which have no x and y coordinate:
@@ -490,6 +497,4 @@ class TweakAtZ(Script):
                                 for key in TweakProp:
                                     if TweakProp[key]:
                                         modified_gcode += TweakStrings[key] % float(old[key])
-            data[index] = modified_gcode
-            index += 1
-        return data
+            lines.setLayer(layer_index, modified_gcode)
@@ -0,0 +1,226 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# The PostProcessingPlugin is released under the terms of the AGPLv3 or higher.
+
+import random
+import re
+import time
+
+import numpy
+import pytest
+
+from GCodeLines import GCodeLines #The module we're testing.
+
+test_gcode = [
+    ";FLAVOR:Marlin\nG28 ;Home\nM104 S210 T0\n",
+    ";LAYER:0\nG0 F3000 X10 Y20 Z0.3\nG1 X11.5 Y20 E1.2 ;E2\n\nG1 F1500 E-3\n",
+    ";LAYER:1\nG0 Z0.6\nT1\nG1 X-5 Y3. E5\n;End of the print"
+]
+
+##  How Script.getValue reads a value from a line, to compare the index with.
+def getValue(line, key, default = None):
+    if not key in line or (";" in line and line.find(key) > line.find(";")):
+        return default
+    m = re.search(r"^-?[0-9]+\.?[0-9]*", line[line.find(key) + 1:])
+    if m is None:
+        return default
+    return float(m.group(0))
+
+##  Make up layers of g-code like CuraEngine writes them.
+def createGCode(layer_count, line_count = 200, seed = 0):
+    generator = random.Random(seed)
+    layers = [";FLAVOR:Marlin\n;Generated with Cura_SteamEngine\nM104 S210\nM109 S210\nG28\n"]
+    e = 0.0
+    for layer_number in range(layer_count):
+        lines = [";LAYER:%d" % layer_number, "G0 F9000 X100 Y100 Z%.1f" % (0.2 * (layer_number + 1)), ";TYPE:WALL-OUTER"]
+        for line_number in range(line_count):
+            e += generator.uniform(0.01, 0.1)
+            lines.append("G1 X%.3f Y%.3f E%.5f" % (generator.uniform(0, 200), generator.uniform(0, 200), e))
+        lines.append("G1 F2700 E%.5f" % (e - 6.5))
+        layers.append("\n".join(lines) + "\n")
+    layers.append("M107\nM104 S0\nM84 ;Disable steppers\n")
+    return layers
+
+def test_lines():
+    lines = GCodeLines(test_gcode)
+
+    assert lines.getLayerCount() == 3
+    all_lines = "\n".join(test_gcode).split("\n")
+    assert lines.getLineCount() == len(all_lines)
+    assert [lines.getLine(index) for index in range(lines.getLineCount())] == all_lines
+    assert lines.getLayerStart(1) == 4
+    assert lines.getLayerEnd(1) == 10
+    assert lines.getLayerStart(-1) == 10 #Counts from the end, like a list.
+    assert lines.getLayerLines(2) == test_gcode[2].split("\n")
+    with pytest.raises(IndexError):
+        lines.getLine(lines.getLineCount())
+    with pytest.raises(IndexError):
+        lines.getLayer(3)
+
+##  The index reads the same values as Script.getValue does, also for odd lines.
+def test_valuesLikeGetValue():
+    generator = random.Random(1)
+    lines = []
+    for line_number in range(2000):
+        lines.append("".join(generator.choice("GXE ;-.0123456789\t") for character in range(generator.randint(0, 12))))
+    store = GCodeLines(["\n".join(lines[:1000]), "\n".join(lines[1000:])])
+
+    for key in "GXE":
+        assert [store.getValue(index, key) for index in range(len(lines))] == [getValue(line, key) for line in lines]
+
+def test_getValue():
+    lines = GCodeLines(test_gcode)
+
+    assert lines.getValue(5, "X") == 10
+    assert lines.getValue(5, "Z") == 0.3
+    assert lines.getValue(6, "E") == 1.2 #Not the E in the comment.
+    assert lines.getValue(8, "E") == -3
+    assert lines.getValue(13, "Y") == 3
+    assert lines.getValue(4, "X") is None
+    assert lines.getValue(4, "X", 7) == 7
+    assert lines.getValue(2, "T") == 0
+    assert lines.getLayerValues(1, "F") == [None, 3000, None, None, 1500, None]
+
+def test_getCommand():
+    lines = GCodeLines(test_gcode)
+
+    assert [lines.getCommand(index) for index in range(lines.getLineCount())] == [
+        None, "G28", "M104", None,
+        None, "G0", "G1", None, "G1", None,
+        None, "G0", "T1", "G1", None]
+
+def test_columns():
+    lines = GCodeLines(test_gcode)
+
+    z = lines.z
+    assert z.shape == (lines.getLineCount(), )
+    assert z[5] == pytest.approx(0.3)
+    assert z[11] == pytest.approx(0.6)
+    assert numpy.isnan(z[6])
+    assert numpy.count_nonzero(~numpy.isnan(lines.e)) == 3
+    assert lines.x[13] == -5
+    assert list(lines.layer) == [0] * 4 + [1] * 6 + [2] * 5
+    with pytest.raises(ValueError): #The columns are shared, so they can't be changed.
+        z[0] = 1
+
+def test_setLine():
+    lines = GCodeLines(test_gcode)
+    assert lines.getValue(6, "X") == 11.5 #Parse the layer first, so that it is patched.
+
+    lines.setLine(6, "G1 X12 Y20 E1.3")
+
+    assert lines.getValue(6, "X") == 12
+    assert lines.getValue(6, "E") == 1.3
+    assert lines.x[6] == 12
+    assert lines.getLayer(1) == ";LAYER:0\nG0 F3000 X10 Y20 Z0.3\nG1 X12 Y20 E1.3\n\nG1 F1500 E-3\n"
+    assert test_gcode[1].startswith(";LAYER:0\nG0 F3000 X10 Y20 Z0.3\nG1 X11.5") #The original g-code is not changed.
+
+def test_insertLines():
+    lines = GCodeLines(test_gcode)
+    assert lines.getValue(11, "Z") == 0.6
+
+    lines.insertLines(5, ["M117 Pause", "M0"])
+
+    assert lines.getLineCount() == 17
+    assert lines.getLayerEnd(1) == 12
+    assert lines.getLayerStart(2) == 12
+    assert lines.getLine(5) == "M117 Pause"
+    assert lines.getCommand(6) == "M0"
+    assert lines.getValue(7, "X") == 10
+    assert lines.getValue(13, "Z") == 0.6
+    assert list(lines.layer) == [0] * 4 + [1] * 8 + [2] * 5
+
+    lines.insertLines(lines.getLineCount(), ["M84"]) #At the end of the last layer.
+    assert lines.getLayer(2).endswith(";End of the print\nM84")
+
+def test_insertLayerLines():
+    lines = GCodeLines(test_gcode)
+
+    lines.insertLayerLines(0, -1, ["M140 S60"]) #Before the empty line after the last newline, like list.insert.
+
+    assert lines.getLayer(0) == ";FLAVOR:Marlin\nG28 ;Home\nM104 S210 T0\nM140 S60\n"
+    assert lines.getValue(3, "S") == 60
+    assert lines.getLayerStart(1) == 5
+
+def test_deleteLines():
+    lines = GCodeLines(test_gcode)
+    assert lines.getValue(8, "F") == 1500
+
+    lines.deleteLines(8, 4) #Over the end of a layer.
+
+    assert lines.getLayer(1) == ";LAYER:0\nG0 F3000 X10 Y20 Z0.3\nG1 X11.5 Y20 E1.2 ;E2\n"
+    assert lines.getLayer(2) == "T1\nG1 X-5 Y3. E5\n;End of the print"
+    assert lines.getCommand(8) == "T1"
+    assert lines.getLineCount() == 11
+
+def test_setLayerLines():
+    lines = GCodeLines(test_gcode)
+    e = lines.getLayerValues(2, "E")
+
+    lines.setLayerLines(2, [";LAYER:1", "G0 Z0.6", "T1", "G1 X-5 Y3 E5.5", "G1 X-6 E6", ";End of the print"])
+
+    assert lines.getLayerValues(2, "E") == [None, None, None, 5.5, 6, None]
+    assert e == lines.getLayerValues(2, "E") #Only the lines that changed were parsed again, in the same column.
+    assert lines.getLineCount() == 16
+
+def test_setLayer():
+    lines = GCodeLines(test_gcode)
+
+    lines.setLayer(1, ";LAYER:0\nG1 X1 E1\n")
+
+    assert lines.getLayer(1) == ";LAYER:0\nG1 X1 E1\n"
+    assert lines.getLayerLines(1) == [";LAYER:0", "G1 X1 E1", ""]
+    assert lines.getValue(5, "X") == 1
+    assert lines.getLayerStart(2) == 7
+    assert lines.getChangedLayers() == [1]
+
+def test_setLayers():
+    lines = GCodeLines(test_gcode)
+    layers = lines.getLayers()
+    assert layers == test_gcode
+
+    layers[2] = layers[2].replace("T1", "T0")
+    lines.setLayers(layers)
+    assert lines.getChangedLayers() == [2] #The others are the same.
+    assert lines.getValue(12, "T") == 0
+
+    lines.setLayers(layers[:2]) #A different number of layers replaces all of them.
+    assert lines.getLayerCount() == 2
+    assert lines.getChangedLayers() == [0, 1]
+    assert lines.getLineCount() == 10
+
+def test_find():
+    lines = GCodeLines(test_gcode)
+
+    assert lines.find(";LAYER:") == 4
+    assert lines.find(";LAYER:", 5) == 10
+    assert lines.find(";LAYER:", 11) == -1
+    assert lines.find("M117") == -1
+    lines.insertLines(12, ["M117 Hello"])
+    assert lines.find("M117") == 12
+
+##  Compare reading the X, Y and E of every line with the index against
+#   searching every line with Script.getValue, as all scripts did before.
+@pytest.mark.benchmark
+def test_benchmarkGetValue(benchmark_report):
+    layers = createGCode(2000)
+
+    start_time = time.perf_counter()
+    for layer in layers:
+        for line in layer.split("\n"):
+            for key in "XYE":
+                getValue(line, key)
+    get_value_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    lines = GCodeLines(layers)
+    for index in range(lines.getLineCount()):
+        for key in "XYE":
+            lines.getValue(index, key)
+    index_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    lines = GCodeLines(layers)
+    columns = (lines.x, lines.y, lines.e)
+    column_time = time.perf_counter() - start_time
+
+    benchmark_report("X, Y and E of %d lines: %.3f s with Script.getValue, %.3f s with GCodeLines.getValue, %.3f s as columns" % (lines.getLineCount(), get_value_time, index_time, column_time))
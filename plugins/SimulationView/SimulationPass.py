@@ -150,14 +150,24 @@ class SimulationPass(RenderPass):
                         self._current_shader = self._layer_shader
                         self._switching_layers = True
 
-                    layers_batch = RenderBatch(self._current_shader, type = RenderBatch.RenderType.Solid, mode = RenderBatch.RenderMode.Lines, range = (start, end), backface_cull = True)
-                    layers_batch.addItem(node.getWorldTransformation(), layer_data)
-                    layers_batch.render(self._scene.getActiveCamera())
-
-                    # Current selected layer is rendered
-                    current_layer_batch = RenderBatch(self._layer_shader, type = RenderBatch.RenderType.Solid, mode = RenderBatch.RenderMode.Lines, range = (current_layer_start, current_layer_end))
-                    current_layer_batch.addItem(node.getWorldTransformation(), layer_data)
-                    current_layer_batch.render(self._scene.getActiveCamera())
+                    # Compact layer data only gets decompressed up to the current layer, in the background. Until
+                    # that is done, the layers of the mesh that is there are rendered.
+                    layer_mesh = node.callDecoration("getLayerMesh", self._layer_view._current_layer_num)
+                    if layer_mesh is not None:
+                        element_count = len(layer_mesh.getIndices())
+                        start = min(start, element_count)
+                        end = min(end, element_count)
+                        current_layer_start = min(current_layer_start, element_count)
+                        current_layer_end = min(current_layer_end, element_count)
+
+                        layers_batch = RenderBatch(self._current_shader, type = RenderBatch.RenderType.Solid, mode = RenderBatch.RenderMode.Lines, range = (start, end), backface_cull = True)
+                        layers_batch.addItem(node.getWorldTransformation(), layer_mesh)
+                        layers_batch.render(self._scene.getActiveCamera())
+
+                        # Current selected layer is rendered
+                        current_layer_batch = RenderBatch(self._layer_shader, type = RenderBatch.RenderType.Solid, mode = RenderBatch.RenderMode.Lines, range = (current_layer_start, current_layer_end))
+                        current_layer_batch.addItem(node.getWorldTransformation(), layer_mesh)
+                        current_layer_batch.render(self._scene.getActiveCamera())
 
                     self._old_current_layer = self._layer_view._current_layer_num
                     self._old_current_path = self._layer_view._current_path_num
@@ -84,6 +84,7 @@ class SimulationView(View):
         Preferences.getInstance().addPreference("view/top_layer_count", 5)
         Preferences.getInstance().addPreference("view/only_show_top_layers", False)
         Preferences.getInstance().addPreference("view/force_layer_view_compatibility_mode", False)
+        Preferences.getInstance().addPreference("view/compact_layer_data", False)  # Use less memory for the layers of large prints.
 
         Preferences.getInstance().addPreference("layerview/layer_view_type", 0)
         Preferences.getInstance().addPreference("layerview/extruder_opacities", "")
@@ -343,13 +344,16 @@ class SimulationView(View):
             max_layer_number = -sys.maxsize
             for layer_id in layer_data.getLayers():
                 # Store the max and min feedrates and thicknesses for display purposes
-                for p in layer_data.getLayer(layer_id).polygons:
-                    self._max_feedrate = max(float(p.lineFeedrates.max()), self._max_feedrate)
-                    self._min_feedrate = min(float(p.lineFeedrates.min()), self._min_feedrate)
-                    self._max_thickness = max(float(p.lineThicknesses.max()), self._max_thickness)
-                    try:
-                        self._min_thickness = min(float(p.lineThicknesses[numpy.nonzero(p.lineThicknesses)].min()), self._min_thickness)
-                    except:
+                # Compact layer data keeps these ranges, so its layers don't have to be decompressed for them.
+                line_ranges = layer_data.getLineRanges(layer_id)
+                if line_ranges is not None:
+                    min_feedrate, max_feedrate, min_thickness, max_thickness = line_ranges
+                    self._max_feedrate = max(max_feedrate, self._max_feedrate)
+                    self._min_feedrate = min(min_feedrate, self._min_feedrate)
+                    self._max_thickness = max(max_thickness, self._max_thickness)
+                    if min_thickness is not None:
+                        self._min_thickness = min(min_thickness, self._min_thickness)
+                    else:
                         # Sometimes, when importing a GCode the line thicknesses are zero and so the minimum (avoiding
                         # the zero) can't be calculated
                         Logger.log("i", "Min thickness can't be calculated because all the values are zero")
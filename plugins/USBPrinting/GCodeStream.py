@@ -0,0 +1,180 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import re
+import threading
+
+import numpy
+
+from UM.Logger import Logger
+
+
+##  The lines of a g-code, ready to be sent to a printer.
+#
+#   Every line is stripped of its comments and gets a line number and a
+#   checksum. This is done in a background thread, a chunk of lines at a time,
+#   so that sending the lines is just writing bytes. The framed lines are kept
+#   with the offset of every line, so that any line can be sent again when the
+#   printer asks for it.
+class GCodeStream:
+    ##  The number of lines that are framed at a time.
+    ChunkSize = 4096
+
+    ##  \param gcode_list List of g-code strings, one per layer.
+    def __init__(self, gcode_list):
+        self._gcode_list = gcode_list
+        # The line number is reset first. If this is not done, the first line is sometimes ignored.
+        self._line_count = 1 + sum(layer.count("\n") + 1 for layer in gcode_list)
+
+        self._chunks = []  # (framed lines, offsets of the lines) for every ChunkSize lines.
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target = self._frameAll)
+        self._thread.daemon = True
+        self._thread.start()
+
+    ##  The number of lines to send, including the line number reset.
+    def getLineCount(self):
+        return self._line_count
+
+    ##  Get a framed line, "N<number> <command>*<checksum>\n".
+    #
+    #   This waits for the line to be framed if it isn't yet.
+    #   \param line_number The number of the line, from 0 to getLineCount().
+    #   \return The line as bytes, or None if the stream was stopped.
+    def getLine(self, line_number):
+        if line_number >= self._line_count:
+            return None
+        chunk_index, index = divmod(line_number, self.ChunkSize)
+        with self._condition:
+            while chunk_index >= len(self._chunks) and not self._stopped:
+                self._condition.wait()
+            if chunk_index >= len(self._chunks):
+                return None
+            data, offsets = self._chunks[chunk_index]
+        return data[offsets[index]:offsets[index + 1]]
+
+    ##  Get the command of a line, without line number and checksum.
+    def getCommand(self, line_number):
+        line = self.getLine(line_number)
+        if line is None:
+            return None
+        line = line.decode("utf-8")
+        return line[line.index(" ") + 1:line.rindex("*")]
+
+    ##  Find where the head is after a line was executed, from the last moves
+    #   before it.
+    #
+    #   \param line_number The line after the last line that was executed.
+    #   \param position Dict with the "x", "y", "z", "e" and "f" before the
+    #   print, for the ones that are not set by the g-code.
+    #   \return Dict with "x", "y", "z", "e" and "f".
+    def getHeadPosition(self, line_number, position):
+        position = dict(position)
+        missing = set(position.keys())
+        for number in range(min(line_number, self._line_count) - 1, 0, -1):
+            if not missing:
+                break
+            line = self.getCommand(number)
+            if line is None:
+                break
+            for axis in list(missing):
+                value = self._getAxisValue(line, axis)
+                if value is not None:
+                    position[axis] = value
+                    missing.remove(axis)
+        return position
+
+    ##  Stop framing lines, for instance when the print is aborted.
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    ##  Get the value of an axis from a line, like it was tracked when sending
+    #   it: X, Y, Z and E from moves and F from anything.
+    @staticmethod
+    def _getAxisValue(line, axis):
+        if axis != "f" and not ("G0" in line or "G1" in line):
+            return None
+        letter = axis.upper()
+        if letter not in line:
+            return None
+        match = re.search(letter + r"(-?[0-9\.]*)", line)
+        try:
+            return float(match.group(1))
+        except ValueError:
+            return None
+
+    ##  Get the command to send for a line of g-code.
+    @staticmethod
+    def prepareLine(line):
+        if ";" in line:
+            if not line.lower().startswith(";layer:"):
+                line = line[:line.find(";")]
+            else:
+                line = "G715"
+        line = line.strip()
+
+        # Don't send empty lines. But we do have to send something, so send
+        # m105 instead.
+        # Don't send the M0 or M1 to the machine, as M0 and M1 are handled as
+        # an LCD menu pause.
+        if line == "" or line == "M0" or line == "M1":
+            line = "M105"
+        return line
+
+    ##  Add the line numbers and checksums to commands.
+    #
+    #   \param first_line_number The line number of the first command.
+    #   \param commands List of commands, as given by prepareLine.
+    #   \return The framed lines as one bytes object, and an array with the
+    #   offset of every line in it, plus the end.
+    @staticmethod
+    def frameLines(first_line_number, commands):
+        numbered = [("N%d %s" % (first_line_number + index, command)).encode("utf-8") for index, command in enumerate(commands)]
+        if not numbered:
+            return b"", numpy.zeros(1, dtype = numpy.int64)
+
+        # The checksum is the XOR of all bytes of the numbered command, for all lines at once.
+        lengths = numpy.fromiter(map(len, numbered), dtype = numpy.int64, count = len(numbered))
+        starts = numpy.zeros(len(numbered), dtype = numpy.int64)
+        numpy.cumsum(lengths[:-1], out = starts[1:])
+        checksums = numpy.bitwise_xor.reduceat(numpy.frombuffer(b"".join(numbered), dtype = numpy.uint8), starts)
+
+        framed = [line + b"*%d\n" % checksum for line, checksum in zip(numbered, checksums.tolist())]
+        offsets = numpy.zeros(len(framed) + 1, dtype = numpy.int64)
+        numpy.cumsum(numpy.fromiter(map(len, framed), dtype = numpy.int64, count = len(framed)), out = offsets[1:])
+        return b"".join(framed), offsets
+
+    ##  Frame all lines, a chunk at a time. Runs in the background thread.
+    def _frameAll(self):
+        try:
+            self._frameLayers()
+        except Exception:
+            Logger.logException("e", "Could not prepare the g-code to send to the printer.")
+            self.stop()
+
+    def _frameLayers(self):
+        commands = ["M110"]
+        line_number = 0
+        for layer in self._gcode_list:
+            for line in layer.split("\n"):
+                commands.append(self.prepareLine(line))
+                if len(commands) == self.ChunkSize:
+                    if not self._addChunk(line_number, commands):
+                        return
+                    line_number += len(commands)
+                    commands = []
+        self._addChunk(line_number, commands)
+
+    ##  Frame a chunk of commands and make it available.
+    #   \return False if the stream was stopped.
+    def _addChunk(self, first_line_number, commands):
+        chunk = self.frameLines(first_line_number, commands)
+        with self._condition:
+            if self._stopped:
+                return False
+            self._chunks.append(chunk)
+            self._condition.notify_all()
+        return True
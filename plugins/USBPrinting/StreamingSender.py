@@ -0,0 +1,195 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import collections
+import re
+
+
+##  Sends the lines of a GCodeStream to a printer, keeping a number of
+#   commands in flight so that the buffer of the printer doesn't run empty
+#   while it waits for the next line.
+#
+#   Every "ok" of the printer means that it took a command out of its buffer,
+#   so another one can be sent. Printers that report how much room their
+#   buffer has left (Marlin with ADVANCED_OK: "ok N123 P15 B3") don't get more
+#   commands than that.
+class StreamingSender:
+    ##  Commands that make the printer wait for a heater, without an "ok"
+    #   until it is hot. It reports the temperatures in the meantime.
+    _heating_command_pattern = re.compile(r"M(109|190|191)\b")
+
+    ##  \param stream The GCodeStream to send.
+    #   \param write Function that writes bytes to the printer, returning
+    #   whether that worked.
+    #   \param max_commands_in_flight The number of commands that can be sent
+    #   before they are acknowledged.
+    #   \param max_bytes_in_flight The number of bytes that can be sent before
+    #   they are acknowledged, to not overflow the serial buffer of the
+    #   printer.
+    def __init__(self, stream, write, max_commands_in_flight = 4, max_bytes_in_flight = 127):
+        self._stream = stream
+        self._write = write
+        self._max_commands_in_flight = max_commands_in_flight
+        self._max_bytes_in_flight = max_bytes_in_flight
+
+        self._position = 0  # The next line of the stream to send.
+        self._commands = collections.deque()  # Other commands to send, before the next line.
+        self._in_flight = collections.deque()  # (line number or None, size) of the sent commands.
+        self._bytes_in_flight = 0
+        self._free_slots = None  # Room in the buffer of the printer, if it reports that.
+
+        self._resend_line = None  # The line that the printer asked for the last time.
+        self._ignored_resends = 0  # The number of resend requests to ignore for that line.
+        self._ignored_oks = 0  # The number of "ok"s that don't acknowledge a command.
+        self._timed_out = False  # Whether only the oldest line is sent again, until the printer responds.
+
+        self._lines_sent = 0
+        self._resend_count = 0
+
+    ##  The next line of the stream to send.
+    def getPosition(self):
+        return self._position
+
+    ##  Whether all lines of the stream were sent.
+    def isFinished(self):
+        return self._position >= self._stream.getLineCount() and not self._commands
+
+    ##  The number of commands that are sent but not acknowledged yet.
+    def getCommandsInFlight(self):
+        return len(self._in_flight)
+
+    ##  The number of lines of the stream that were sent, including the lines
+    #   that were sent again.
+    def getLinesSent(self):
+        return self._lines_sent
+
+    ##  The number of times that the printer asked to send lines again.
+    def getResendCount(self):
+        return self._resend_count
+
+    ##  Send a command before the next line of the stream, without line number.
+    def queueCommand(self, command):
+        self._commands.append((command + "\n").encode("utf-8"))
+
+    ##  Send as many commands as the printer has room for.
+    def fill(self):
+        max_commands_in_flight = 1 if self._timed_out else self._max_commands_in_flight
+        while len(self._in_flight) < max_commands_in_flight and (self._free_slots is None or self._free_slots > 0 or not self._in_flight):
+            if self._commands:
+                line_number = None
+                data = self._commands[0]
+            else:
+                line_number = self._position
+                data = self._stream.getLine(line_number)
+                if data is None:  # Everything is sent.
+                    return
+            # Always send at least one command, even if it is longer than the buffer.
+            if self._in_flight and self._bytes_in_flight + len(data) > self._max_bytes_in_flight:
+                return
+            if not self._write(data):
+                return
+
+            if line_number is None:
+                self._commands.popleft()
+            else:
+                self._position += 1
+                self._lines_sent += 1
+            self._in_flight.append((line_number, len(data)))
+            self._bytes_in_flight += len(data)
+            if self._free_slots is not None:
+                self._free_slots -= 1
+
+    ##  Handle a response of the printer.
+    #   \param line The line that the printer sent, as bytes.
+    #   \return True if the printer is still working on the commands: it was
+    #   an ok, a resend request, a busy message or a temperature report while
+    #   it heats up.
+    def processResponse(self, line):
+        if line.startswith(b"ok"):
+            self._acknowledge(line)
+            return True
+        line_number = self.parseResend(line)
+        if line_number is not None:
+            self._resend(line_number)
+            return True
+        if b"busy" in line:
+            return True
+        if (line.startswith(b"T:") or b" T:" in line) and self._isHeating():
+            return True
+        return False
+
+    ##  Assume that the oldest command in flight is lost, when the printer
+    #   doesn't respond anymore, and send that line again. If the printer did
+    #   get it, it asks for the line after the last one it got. The other
+    #   lines are only sent again when the printer responds.
+    def handleTimeout(self):
+        line_numbers = [line_number for line_number, size in self._in_flight if line_number is not None]
+        if line_numbers:
+            self._position = line_numbers[0]
+        self.clearInFlight()
+        self._timed_out = True
+
+    ##  Forget about the commands that are sent but not acknowledged yet.
+    def clearInFlight(self):
+        self._in_flight.clear()
+        self._bytes_in_flight = 0
+        self._free_slots = None
+        self._ignored_resends = 0
+        self._ignored_oks = 0
+        self._timed_out = False
+
+    ##  Get the line number of a resend request, like "Resend: 12" or "rs 12".
+    #   \return The line number, or None if the line is not a resend request.
+    @staticmethod
+    def parseResend(line):
+        if b"resend" not in line.lower() and not line.startswith(b"rs"):
+            return None
+        try:
+            return int(line.replace(b"N:", b" ").replace(b"N", b" ").replace(b":", b" ").split()[-1])
+        except (ValueError, IndexError):
+            return None
+
+    ##  Whether a command in flight makes the printer wait for a heater.
+    def _isHeating(self):
+        for line_number, size in self._in_flight:
+            if line_number is not None and self._heating_command_pattern.match(self._stream.getCommand(line_number) or ""):
+                return True
+        return False
+
+    ##  A command was taken out of the buffer of the printer.
+    def _acknowledge(self, line):
+        self._timed_out = False
+        if self._ignored_oks > 0:
+            self._ignored_oks -= 1
+        elif self._in_flight:
+            line_number, size = self._in_flight.popleft()
+            self._bytes_in_flight -= size
+
+        match = re.search(b" B(\\d+)", line)
+        if match:
+            self._free_slots = int(match.group(1))
+
+    ##  The printer asks to send the lines again from a line on.
+    def _resend(self, line_number):
+        if self._timed_out:
+            # The line that was sent again after the timeout is refused when
+            # the printer already had it.
+            self.clearInFlight()
+        self._ignored_oks += 1  # The printer sends an "ok" after a resend request.
+        # The lines that were already in flight after the line that went wrong
+        # are refused by the printer too, each with a request for the same
+        # line.
+        if line_number == self._resend_line and self._ignored_resends > 0:
+            self._ignored_resends -= 1
+            return
+
+        self._resend_count += 1
+        self._ignored_resends = sum(1 for number, size in self._in_flight if number is not None and number > line_number)
+        # The lines before it were received, so they are still acknowledged
+        # when they are executed. So are commands without line number, which
+        # the printer doesn't check.
+        self._in_flight = collections.deque((number, size) for number, size in self._in_flight if number is None or number < line_number)
+        self._bytes_in_flight = sum(size for number, size in self._in_flight)
+        self._free_slots = None
+        self._resend_line = line_number
+        self._position = min(line_number, self._stream.getLineCount())
@@ -2,15 +2,15 @@
 # Cura is released under the terms of the LGPLv3 or higher.
 
 from .avr_isp import stk500v2, ispBase, intelHex
+from .GCodeStream import GCodeStream
+from .StreamingSender import StreamingSender
 import serial   # type: ignore
 import threading
 import time
 import queue
 import re
-import functools
 import os
 import urllib.request, json, codecs
-import copy
 
 from UM.Application import Application
 from UM.Logger import Logger
@@ -75,11 +75,10 @@ class USBPrinterOutputDevice(PrinterOutputDevice):
         self._print_start_time = None
         self._print_estimated_time = None
 
-        ## Keep track where in the provided g-code the print is
-        self._gcode_position = 0
-
-        # List of gcode lines to be printed
-        self._gcode = []
+        # The framed lines of the g-code that is printed, and what sends them.
+        self._gcode_stream = None
+        self._streamer = None
+        self._progress_update_time = 0
 
         # Check if endstops are ever pressed (used for first run)
         self._x_min_endstop_pressed = False
@@ -157,6 +156,9 @@ class USBPrinterOutputDevice(PrinterOutputDevice):
 
     endstopStateChanged = pyqtSignal(str ,bool, arguments = ["key","state"])
 
+    ##  The number of seconds between updates of the progress of a print.
+    ProgressUpdateInterval = 1.0
+
     def _onFirmwareChange(self):
         Application.getInstance().firmwareChanged.emit()
 
@@ -275,18 +277,14 @@ class USBPrinterOutputDevice(PrinterOutputDevice):
             self.writeError.emit(self)
             return
 
-        self._gcode.clear()
-        for layer in gcode_list:
-            self._gcode.extend(layer.split("\n"))
-
-        # Reset line number. If this is not done, first line is sometimes ignored
-        self._gcode.insert(0, "M110")
-        self._gcode_position = 0
+        self._empty_queues()
+        self._gcode_stream = GCodeStream(gcode_list)
+        self._streamer = StreamingSender(self._gcode_stream, self._writeToSerial, max_commands_in_flight = 4)
         self._is_printing = True
         self._print_start_time = time.time()
+        self._progress_update_time = 0
 
-        for i in range(0, 4):  # Push first 4 entries before accepting other inputs
-            self._sendNextGcodeLine()
+        self._streamer.fill()  # Push the first entries before accepting other inputs
 
         self.writeFinished.emit(self)
 
@@ -676,6 +674,31 @@ class USBPrinterOutputDevice(PrinterOutputDevice):
             self._setErrorState("Unexpected error while writing serial port %s " % e)
             self.close()
 
+    ##  Write framed lines of the print to the serial port.
+    #   \param data bytes to write
+    #   \return True if it was written.
+    def _writeToSerial(self, data):
+        if self._serial is None:
+            return False
+        try:
+            self._serial.write(data)
+        except serial.SerialTimeoutException:
+            Logger.log("w","Serial timeout while writing to serial port, trying again.")
+            try:
+                time.sleep(0.5)
+                self._serial.write(data)
+            except Exception as e:
+                Logger.log("e","Unexpected error while writing serial port %s " % e)
+                self._setErrorState("Unexpected error while writing serial port %s " % e)
+                self.close()
+                return False
+        except Exception as e:
+            Logger.log("e","Unexpected error while writing serial port %s" % e)
+            self._setErrorState("Unexpected error while writing serial port %s " % e)
+            self.close()
+            return False
+        return True
+
     ##  Send a command to printer.
     #   \param cmd string with g-code
     def sendCommand(self, cmd):
@@ -823,37 +846,23 @@ class USBPrinterOutputDevice(PrinterOutputDevice):
                 tag, value = line.split(b":", 1)
                 self._setEndstopState(tag,(b"H" in value or b"TRIGGERED" in value))
 
-            if self._is_printing:
+            if self._is_printing and self._streamer is not None:
                 if line == b"" and time.time() > ok_timeout:
-                    line = b"ok"  # Force a timeout (basically, send next command)
-
-                if b"ok" in line:
+                    # The printer didn't answer, the lines in flight are lost.
+                    ok_timeout = time.time() + 5
+                    self._streamer.handleTimeout()
+                elif self._streamer.processResponse(line):
                     ok_timeout = time.time() + 5
-                    # if not self._command_queue.empty():
-                    #     aux_queue = copy.copy(self._command_queue.queue)
-                    #     self._sendCommand(aux_queue.popleft(), True)
-                    if self._is_paused:
-                        line = b""  # Force getting temperature as keep alive
 
-                elif b"resend" in line.lower() or b"rs" in line:  # Because a resend can be asked with "resend" and "rs"
-                    try:
-                        Logger.log("d", "Got a resend response")
-                        self._gcode_position = int(line.replace(b"N:",b" ").replace(b"N",b" ").replace(b":",b" ").split()[-1])
-                        self._empty_queues()
-                    except:
-                        if b"rs" in line:
-                            self._gcode_position = int(line.split()[1])
-
-                if not self._command_queue.empty():
-                    aux_queue = copy.copy(self._command_queue.queue)
-                    self._sendCommand(aux_queue.popleft(), True)
-                else:
-                    self._sendNextGcodeLine()
+                # Commands that were sent during the print go before the next line.
+                while not self._command_queue.empty():
+                    self._streamer.queueCommand(self._command_queue.get())
+                self._streamer.fill()
+                self._updatePrintProgress()
 
             elif self._is_paused:
                 if not self._command_queue.empty():
-                    aux_queue = copy.copy(self._command_queue.queue)
-                    self._sendCommand(aux_queue.popleft(), True)
+                    self._sendCommand(self._command_queue.queue[0], True)
 
             # Request the temperature on comm timeout (every 2 seconds) when we are not printing.)
             elif line == b"":
@@ -865,68 +874,34 @@ class USBPrinterOutputDevice(PrinterOutputDevice):
 
         Logger.log("i", "Printer connection listen thread stopped for %s" % self._serial_port)
 
-    ##  Send next Gcode in the gcode list
-    def _sendNextGcodeLine(self):
-        if self._gcode_position >= len(self._gcode):
+    ##  Update the progress and the times of the print, at most every
+    #   ProgressUpdateInterval seconds.
+    def _updatePrintProgress(self):
+        if self._streamer.isFinished() and self._streamer.getCommandsInFlight() == 0:
+            self.setProgress(100)
             return
-        line = self._gcode[self._gcode_position]
-
-        if ";" in line:
-            if not line.lower().startswith(";layer:"):
-                line = line[:line.find(";")]
-            else:
-                line = "G715"
-        line = line.strip()
-
-        # Don't send empty lines. But we do have to send something, so send
-        # m105 instead.
-        # Don't send the M0 or M1 to the machine, as M0 and M1 are handled as
-        # an LCD menu pause.
-        if line == "" or line == "M0" or line == "M1":
-            line = "M105"
-        try:
-            if "G0" in line or "G1" in line:
-                if "Z" in line:
-                    z = float(re.search("Z(-?[0-9\.]*)", line).group(1))
-                    if self._current_z != z:
-                        self._current_z = z
-                if "X" in line:
-                    x = float(re.search("X(-?[0-9\.]*)", line).group(1))
-                    if self._current_x != x:
-                        self._current_x = x
-                if "Y" in line:
-                    y = float(re.search("Y(-?[0-9\.]*)", line).group(1))
-                    if self._current_y != y:
-                        self._current_y = y
-
-                if "E" in line:
-                    e = float(re.search("E(-?[0-9\.]*)", line).group(1))
-                    if self._current_e != e:
-                        self._current_e = e
-
-            if "F" in line:
-                f = float(re.search("F(-?[0-9\.]*)", line).group(1))
-                if self._current_f != f:
-                    self._current_f = f
-        except Exception as e:
-            Logger.log("e", "Unexpected error with printer connection, could not parse current Z: %s: %s" % (e, line))
-            self._setErrorState("Unexpected error: %s" %e)
-        checksum = functools.reduce(lambda x,y: x^y, map(ord, "N%d %s" % (self._gcode_position, line)))
-
-        self._sendCommand("N%d %s*%d" % (self._gcode_position, line, checksum))
+        now = time.time()
+        if now < self._progress_update_time:
+            return
+        self._progress_update_time = now + self.ProgressUpdateInterval
 
-        progress = (self._gcode_position / (len(self._gcode) - 1))
+        progress = self._streamer.getPosition() / max(self._gcode_stream.getLineCount() - 1, 1)
 
-        elapsed_time = int(time.time() - self._print_start_time)
+        elapsed_time = int(now - self._print_start_time)
         self.setTimeElapsed(elapsed_time)
         estimated_time = self._print_estimated_time
         if progress > .1:
             estimated_time = self._print_estimated_time * (1-progress) + elapsed_time
         self.setTimeTotal(estimated_time)
 
-        self._gcode_position += 1
-        self.setProgress(progress * 100)
-        self.progressChanged.emit()
+        self.setProgress(min(progress * 100, 99.99))
+
+    ##  Stop sending the g-code of the print.
+    def _stopStreaming(self):
+        if self._gcode_stream is not None:
+            self._gcode_stream.stop()
+        self._gcode_stream = None
+        self._streamer = None
 
     ##  Set the state of the print.
     #   Sent from the print monitor
@@ -959,7 +934,7 @@ class USBPrinterOutputDevice(PrinterOutputDevice):
             self._sendCommand("M605 S3")
             self._empty_queues()
             # Printing is done, reset progress
-            self._gcode_position = 0
+            self._stopStreaming()
             self.setProgress(0)
             self._is_printing = False
             self._is_paused = False
@@ -968,9 +943,8 @@ class USBPrinterOutputDevice(PrinterOutputDevice):
 
     ##  Cancel the current print. Printer connection wil continue to listen.
     def cancelPrint(self):
-        self._gcode_position = 0
+        self._stopStreaming()
         self.setProgress(0)
-        self._gcode = []
         self._is_printing = False
         self._is_paused = False
         self._empty_queues()
@@ -992,6 +966,13 @@ class USBPrinterOutputDevice(PrinterOutputDevice):
 
     def pausePrint(self):
         self._is_printing = False
+        if self._streamer is not None:
+            position = self._gcode_stream.getHeadPosition(self._streamer.getPosition(), {"x": self._current_x, "y": self._current_y, "z": self._current_z, "e": self._current_e, "f": self._current_f})
+            self._current_x = position["x"]
+            self._current_y = position["y"]
+            self._current_z = position["z"]
+            self._current_e = position["e"]
+            self._current_f = position["f"]
         self._empty_queues()
         time.sleep(0.3)
         self._sendCommand("G1 F2100 E%f" % (self._current_e - 12))
@@ -1026,6 +1007,8 @@ class USBPrinterOutputDevice(PrinterOutputDevice):
         self._bytes_sent = 0
         while not self._command_queue.empty():
             self._command_queue.get()
+        if self._streamer is not None:
+            self._streamer.clearInFlight()
 
     ##  Check if the process did not encounter an error yet.
     def hasError(self):
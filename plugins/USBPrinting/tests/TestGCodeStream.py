@@ -0,0 +1,82 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import functools
+import threading
+import unittest.mock
+
+import pytest
+
+from cura.GCodeStore import GCodeStore
+from GCodeStream import GCodeStream #The module we're testing.
+
+test_gcode = [
+    ";FLAVOR:Marlin\nG28 ;Home\nG1 X10 Y20 Z0.3 F3000\n",
+    ";LAYER:0\nG1 X11.5 Y20 E1.2\nM0\n\nG1 F1500 E-3\nM117 Printing ümlauts\n",
+    ";LAYER:1\nG0 Z0.6\nG1 X-5 Y3 E5\n;End of the print"
+]
+
+##  The lines like they were framed when they were sent.
+def frameLine(line_number, command):
+    checksum = functools.reduce(lambda x, y: x ^ y, "N{0} {1}".format(line_number, command).encode("utf-8"))
+    return "N{0} {1}*{2}\n".format(line_number, command, checksum).encode("utf-8")
+
+def test_prepareLine():
+    assert GCodeStream.prepareLine("G1 X10 ;Move") == "G1 X10"
+    assert GCodeStream.prepareLine(";LAYER:12") == "G715"
+    assert GCodeStream.prepareLine("  G28  ") == "G28"
+    assert GCodeStream.prepareLine("") == "M105"
+    assert GCodeStream.prepareLine(";Just a comment") == "M105"
+    assert GCodeStream.prepareLine("M0") == "M105"
+    assert GCodeStream.prepareLine("M1") == "M105"
+
+@pytest.mark.parametrize("chunk_size", [3, 4096])
+def test_getLine(chunk_size):
+    with unittest.mock.patch.object(GCodeStream, "ChunkSize", chunk_size):
+        stream = GCodeStream(test_gcode)
+        lines = [line for layer in test_gcode for line in layer.split("\n")]
+
+        assert stream.getLineCount() == len(lines) + 1
+        assert stream.getLine(0) == frameLine(0, "M110")
+        for line_number, line in enumerate(lines):
+            assert stream.getLine(line_number + 1) == frameLine(line_number + 1, GCodeStream.prepareLine(line))
+        assert stream.getLine(stream.getLineCount()) is None
+
+##  The g-code of a slice is kept in a GCodeStore.
+def test_getLineGCodeStore():
+    stream = GCodeStream(GCodeStore(test_gcode))
+    expected = GCodeStream(test_gcode)
+
+    assert stream.getLineCount() == expected.getLineCount()
+    for line_number in range(stream.getLineCount()):
+        assert stream.getLine(line_number) == expected.getLine(line_number)
+
+def test_getCommand():
+    stream = GCodeStream(test_gcode)
+
+    assert stream.getCommand(3) == "G1 X10 Y20 Z0.3 F3000"
+    assert stream.getCommand(10) == "M117 Printing ümlauts"
+
+##  The head position is where the last moves before a line went.
+def test_getHeadPosition():
+    stream = GCodeStream(test_gcode)
+    start_position = {"x": 0, "y": 0, "z": 0, "e": 0, "f": 2400}
+
+    assert stream.getHeadPosition(0, start_position) == start_position
+    assert stream.getHeadPosition(4, start_position) == {"x": 10, "y": 20, "z": 0.3, "e": 0, "f": 3000}
+    assert stream.getHeadPosition(10, start_position) == {"x": 11.5, "y": 20, "z": 0.3, "e": -3, "f": 1500}
+    assert stream.getHeadPosition(stream.getLineCount(), start_position) == {"x": -5, "y": 3, "z": 0.6, "e": 5, "f": 1500}
+
+##  Lines of a stream that was stopped are not waited for.
+def test_stop():
+    framing = threading.Event()
+    frame_lines = GCodeStream.frameLines
+    def slowFrameLines(first_line_number, commands):
+        framing.wait()
+        return frame_lines(first_line_number, commands)
+
+    with unittest.mock.patch.object(GCodeStream, "frameLines", staticmethod(slowFrameLines)):
+        stream = GCodeStream(test_gcode)
+        stream.stop()
+        assert stream.getLine(1) is None
+        framing.set()
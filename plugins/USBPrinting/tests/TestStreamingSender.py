@@ -0,0 +1,255 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import functools
+import re
+import time
+
+import pytest
+
+from GCodeStream import GCodeStream
+from StreamingSender import StreamingSender #The module we're testing.
+from VirtualPrinter import VirtualPrinter
+
+##  A g-code with a layer of short moves, like a curved print has.
+def createGCode(layer_count = 3, move_count = 200):
+    gcode_list = [";FLAVOR:Marlin\nG28\nG1 Z0.3 F3000\n"]
+    for layer_number in range(layer_count):
+        moves = ["G1 X%.3f Y%.3f E%.5f" % (100 + index % 7, 100 + index % 5, index * 0.01) for index in range(move_count)]
+        gcode_list.append(";LAYER:%d\n" % layer_number + "\n".join(moves) + "\n")
+    return gcode_list
+
+##  The commands that the printer should execute for a g-code.
+def expectedCommands(gcode_list):
+    return ["M110"] + [GCodeStream.prepareLine(line) for layer in gcode_list for line in layer.split("\n")]
+
+@pytest.fixture
+def printer():
+    printer = VirtualPrinter()
+    yield printer
+    printer.close()
+
+##  Send everything, like the listen thread of the printer connection does.
+#
+#   \param timeout The time without response after which lines are assumed
+#   to be lost, in seconds.
+def streamAll(sender, printer, timeout = 0.0):
+    sender.fill()
+    ok_timeout = time.time() + timeout
+    while not sender.isFinished() or sender.getCommandsInFlight() > 0:
+        line = printer.readline()
+        if line == b"" and time.time() >= ok_timeout:
+            ok_timeout = time.time() + timeout
+            sender.handleTimeout()
+        elif sender.processResponse(line):
+            ok_timeout = time.time() + timeout
+        sender.fill()
+
+##  Collects what is written, without a printer.
+class Recorder:
+    def __init__(self):
+        self.data = []
+
+    def write(self, data):
+        self.data.append(data)
+        return True
+
+@pytest.mark.parametrize("max_commands_in_flight", [1, 4, 16])
+def test_sendAll(printer, max_commands_in_flight):
+    gcode_list = createGCode()
+    sender = StreamingSender(GCodeStream(gcode_list), printer.write, max_commands_in_flight = max_commands_in_flight, max_bytes_in_flight = 127)
+
+    streamAll(sender, printer)
+
+    assert printer.commands == expectedCommands(gcode_list)
+    assert printer.overflow_count == 0
+    assert printer.resend_count == 0
+
+def test_sendAllAdvancedOk():
+    printer = VirtualPrinter(advanced_ok = True, command_buffer_size = 2)
+    gcode_list = createGCode()
+    sender = StreamingSender(GCodeStream(gcode_list), printer.write, max_commands_in_flight = 8)
+
+    streamAll(sender, printer)
+    printer.close()
+
+    assert printer.commands == expectedCommands(gcode_list)
+    assert printer.resend_count == 0
+
+def test_commandsInFlight():
+    recorder = Recorder()
+    sender = StreamingSender(GCodeStream(createGCode()), recorder.write, max_commands_in_flight = 4, max_bytes_in_flight = 1000)
+
+    sender.fill()
+    assert len(recorder.data) == 4
+    assert sender.getCommandsInFlight() == 4
+
+    sender.processResponse(b"ok\n")
+    sender.fill()
+    assert len(recorder.data) == 5
+    assert sender.getPosition() == 5
+
+def test_bytesInFlight():
+    recorder = Recorder()
+    sender = StreamingSender(GCodeStream(createGCode()), recorder.write, max_commands_in_flight = 100, max_bytes_in_flight = 60)
+
+    sender.fill()
+
+    assert sum(len(data) for data in recorder.data) <= 60
+    assert sum(len(data) for data in recorder.data) + len(recorder.data[-1]) > 60
+
+##  With advanced ok, no more commands are sent than the printer has room for.
+def test_freeSlots():
+    recorder = Recorder()
+    sender = StreamingSender(GCodeStream(createGCode()), recorder.write, max_commands_in_flight = 8, max_bytes_in_flight = 1000)
+    sender.fill()
+
+    sender.processResponse(b"ok N0 P15 B0\n")
+    sender.fill()
+    assert len(recorder.data) == 8
+
+    sender.processResponse(b"ok N1 P15 B2\n")
+    sender.fill()
+    assert len(recorder.data) == 10
+
+##  Other commands are sent before the next line.
+def test_queueCommand():
+    recorder = Recorder()
+    sender = StreamingSender(GCodeStream(createGCode()), recorder.write, max_commands_in_flight = 2)
+    sender.fill()
+
+    sender.queueCommand("M105")
+    sender.processResponse(b"ok\n")
+    sender.fill()
+
+    assert recorder.data[2] == b"M105\n"
+    assert sender.getPosition() == 2
+
+@pytest.mark.parametrize("line", [b"Resend: 3\n", b"Resend:N3\n", b"rs 3\n"])
+def test_parseResend(line):
+    assert StreamingSender.parseResend(line) == 3
+
+def test_parseNoResend():
+    assert StreamingSender.parseResend(b"ok T:210.0 /210.0\n") is None
+
+##  Lines that get corrupted on the way are sent again, and everything is executed once.
+@pytest.mark.parametrize("corrupted_lines", [[5], [5, 6], [5, 80, 300]])
+def test_resend(printer, corrupted_lines):
+    gcode_list = createGCode()
+    corrupted_lines = list(corrupted_lines)
+
+    def corruptingWrite(data):
+        match = re.match(b"N(\\d+) ", data)
+        if match and corrupted_lines and int(match.group(1)) == corrupted_lines[0]:
+            corrupted_lines.pop(0)
+            data = data.replace(b"*", b"*1")  # Wrong checksum.
+        return printer.write(data)
+
+    sender = StreamingSender(GCodeStream(gcode_list), corruptingWrite, max_commands_in_flight = 4)
+
+    streamAll(sender, printer)
+
+    assert printer.commands == expectedCommands(gcode_list)
+    assert printer.resend_count >= 1
+    assert sender.getResendCount() >= 1
+
+##  The lines before the line that is asked for were received, so they are still acknowledged.
+def test_resendKeepsReceivedLines():
+    recorder = Recorder()
+    sender = StreamingSender(GCodeStream(createGCode()), recorder.write, max_commands_in_flight = 4, max_bytes_in_flight = 1000)
+    sender.fill()
+
+    sender.processResponse(b"Resend: 2\n")
+    sender.processResponse(b"ok\n")
+
+    assert sender.getCommandsInFlight() == 2
+    assert sender.getPosition() == 2
+
+##  A line that gets lost doesn't stop the print.
+def test_timeout(printer):
+    gcode_list = createGCode(layer_count = 1, move_count = 10)
+    printer.timeout = 0.1
+    lost = []
+
+    def losingWrite(data):
+        if data.startswith(b"N11 ") and not lost:
+            lost.append(data)
+            return True
+        return printer.write(data)
+
+    sender = StreamingSender(GCodeStream(gcode_list), losingWrite, max_commands_in_flight = 1)
+
+    streamAll(sender, printer)
+
+    assert printer.commands == expectedCommands(gcode_list)
+
+##  After a timeout only the oldest line is sent again, and the rest when the printer responds.
+def test_timeoutSendsOldestLine():
+    recorder = Recorder()
+    sender = StreamingSender(GCodeStream(createGCode()), recorder.write, max_commands_in_flight = 4, max_bytes_in_flight = 1000)
+    sender.fill()
+    sender.processResponse(b"ok\n")
+    del recorder.data[:]
+
+    sender.handleTimeout()
+    sender.fill()
+    assert [data.split(b" ")[0] for data in recorder.data] == [b"N1"]
+
+    sender.processResponse(b"Resend: 4\n") #It did get them.
+    sender.processResponse(b"ok\n")
+    sender.fill()
+    assert [data.split(b" ")[0] for data in recorder.data] == [b"N1", b"N4", b"N5", b"N6", b"N7"]
+
+##  A printer that waits for its hotend doesn't send an ok for a long time, but reports the temperatures. The lines
+#   are not lost, so they must not be sent again.
+def test_slowHeating():
+    gcode_list = createGCode(layer_count = 1, move_count = 20)
+    gcode_list[1] = "M109 S210\n" + gcode_list[1]
+    printer = VirtualPrinter(heat_rate = 80.0) #Takes about 2.4 seconds, with a temperature report every second.
+    printer.timeout = 0.1
+    try:
+        sender = StreamingSender(GCodeStream(gcode_list), printer.write, max_commands_in_flight = 4)
+
+        start_time = time.time()
+        streamAll(sender, printer, timeout = 1.5)
+        assert time.time() - start_time > 2 #Otherwise this test is useless.
+    finally:
+        printer.close()
+
+    assert printer.commands == expectedCommands(gcode_list)
+    assert printer.resend_count == 0
+    assert sender.getLinesSent() == GCodeStream(gcode_list).getLineCount()
+
+##  Frame and send lines one by one, like it was done before.
+def frameLinesOneByOne(gcode_list):
+    framed = []
+    position = 0
+    for line in ["M110"] + [line for layer in gcode_list for line in layer.split("\n")]:
+        line = GCodeStream.prepareLine(line)
+        if "G0" in line or "G1" in line:
+            for axis in "ZXYE":
+                if axis in line:
+                    float(re.search(axis + "(-?[0-9\\.]*)", line).group(1))
+        if "F" in line:
+            float(re.search("F(-?[0-9\\.]*)", line).group(1))
+        checksum = functools.reduce(lambda x, y: x ^ y, map(ord, "N%d %s" % (position, line)))
+        framed.append(("N%d %s*%d\n" % (position, line, checksum)).encode())
+        position += 1
+    return framed
+
+##  Compare how fast the lines are framed with framing them one by one.
+@pytest.mark.benchmark
+def test_benchmarkFraming(benchmark_report):
+    gcode_list = createGCode(layer_count = 100, move_count = 5000)
+
+    start_time = time.time()
+    stream = GCodeStream(gcode_list)
+    stream.getLine(stream.getLineCount() - 1)
+    stream_time = time.time() - start_time
+
+    start_time = time.time()
+    framed = frameLinesOneByOne(gcode_list)
+    one_by_one_time = time.time() - start_time
+
+    assert framed[-1] == stream.getLine(stream.getLineCount() - 1)
+    benchmark_report("Framing %d lines: %.2f s, one by one: %.2f s" % (stream.getLineCount(), stream_time, one_by_one_time))
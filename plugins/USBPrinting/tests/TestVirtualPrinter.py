@@ -0,0 +1,165 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import importlib
+import os
+import sys
+import time
+import types
+import unittest.mock #To run the printer connection without the application.
+
+import pytest
+import serial
+
+from cura.PrinterOutputDevice import ConnectionState
+from GCodeStream import GCodeStream
+from StreamingSender import StreamingSender
+from TestStreamingSender import streamAll
+from VirtualPrinter import VirtualPrinter #The module we're testing.
+
+##  The USB printer connection imports the other modules of the plugin
+#   relative to its package, so it is loaded as part of the USBPrinting
+#   package. The __init__ of the package isn't run, since it needs the rest of
+#   the application.
+def loadUSBPrinterOutputDevice():
+    if "USBPrinting" not in sys.modules:
+        package = types.ModuleType("USBPrinting")
+        package.__path__ = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+        sys.modules["USBPrinting"] = package
+    return importlib.import_module("USBPrinting.USBPrinterOutputDevice").USBPrinterOutputDevice
+
+USBPrinterOutputDevice = loadUSBPrinterOutputDevice()
+
+##  A print with many short moves, like a curved object has.
+def curvedGCode(layer_count = 4, move_count = 500):
+    gcode_list = [";FLAVOR:Marlin\nM104 S210\nM140 S60\nG28\nM190 S60\nM109 S210\nG1 Z0.3 F3000\n"]
+    for layer_number in range(layer_count):
+        moves = ["G1 X%.3f Y%.3f E%.5f" % (100 + index % 7 * 0.3, 100 + index % 5 * 0.3, index * 0.01) for index in range(move_count)]
+        gcode_list.append(";LAYER:%d\n;TYPE:WALL-OUTER\n" % layer_number + "\n".join(moves) + "\n")
+    return gcode_list
+
+##  A print with long straight moves and a lot of comments.
+def straightGCode(layer_count = 4, move_count = 50):
+    gcode_list = [";FLAVOR:Marlin\n;Generated with Cura\nG28\nG1 Z0.3 F3000\n"]
+    for layer_number in range(layer_count):
+        moves = ["G1 X%d Y%d E%.5f ;Infill line %d" % (50 + index % 2 * 100, 50 + index, index * 0.5, index) for index in range(move_count)]
+        gcode_list.append(";LAYER:%d\n;TYPE:FILL\nM106 S255\n" % layer_number + "\n".join(moves) + "\n")
+    return gcode_list
+
+##  The reference prints for the benchmarks, with the time that a move of
+#   them takes. More g-code files can be added with CURA_BENCHMARK_GCODE,
+#   separated like paths in PATH.
+def referencePrints():
+    prints = [("curved", curvedGCode, 0.001), ("straight", straightGCode, 0.01)]
+    for path in filter(None, os.environ.get("CURA_BENCHMARK_GCODE", "").split(os.pathsep)):
+        prints.append((os.path.basename(path), lambda path = path: [open(path, encoding = "utf-8").read()], 0.002))
+    return prints
+
+##  Print through a USB printer connection that is connected to the pseudo
+#   terminal of the printer, like Cura does when the print is sent to it.
+#   \return The time that the print took and the CPU time of the listen
+#   thread, in seconds.
+def printOverUSB(printer, gcode_list):
+    port = printer.openPty()
+    global_stack = unittest.mock.MagicMock()
+    global_stack.getProperty.side_effect = lambda key, property_name: {"machine_extruder_count": 1, "machine_heated_bed": True}.get(key)
+    with unittest.mock.patch("USBPrinting.USBPrinterOutputDevice.Application") as application, unittest.mock.patch("cura.PrinterOutputDevice.Application"):
+        application.getInstance().getGlobalContainerStack.return_value = None #Otherwise it connects by itself.
+        device = USBPrinterOutputDevice(port)
+        application.getInstance().getGlobalContainerStack.return_value = global_stack
+        application.getInstance().getBuildPlateModel().activeBuildPlate = 0
+        application.getInstance().getController().getScene().gcode_dict = {0: gcode_list}
+        application.getInstance().getPrintInformation().currentPrintTime.getDisplayString.return_value = "600"
+
+        # Connect like _connect does, without looking for the baud rate.
+        device._serial = serial.Serial(port, 250000, timeout = 0.5)
+        device.setConnectionState(ConnectionState.connected)
+        device._listen_thread.start()
+
+        start_time = time.time()
+        device.requestWrite([])
+        while device._is_printing:
+            time.sleep(0.01)
+        total_time = time.time() - start_time
+        cpu_time = time.clock_gettime(time.pthread_getcpuclockid(device._listen_thread.ident))
+        device.close() #Stops listening.
+    return total_time, cpu_time
+
+@pytest.fixture
+def printer():
+    printer = VirtualPrinter()
+    yield printer
+    printer.close()
+
+def test_temperature(printer):
+    printer.write(b"M104 S210\nM140 S60\nM105\n")
+
+    assert printer.readline() == b"ok\n"
+    assert printer.readline() == b"ok\n"
+    assert printer.readline() == b"ok T:210.00 /210.00 B:60.00 /60.00\n"
+
+##  While heating up, the temperatures are reported and the next commands wait.
+def test_heatUp():
+    printer = VirtualPrinter(heat_rate = 200.0)
+    printer.write(b"M109 S100\nG28\n")
+
+    responses = [printer.readline(), printer.readline(), printer.readline()]
+    printer.close()
+
+    assert responses[0].startswith(b"T:")
+    assert responses[1:] == [b"ok\n", b"ok\n"]
+    assert printer.getTemperature("T") == 100
+    assert printer.commands == ["M109 S100", "G28"]
+
+##  Lines that get corrupted on a noisy connection are asked for again.
+@pytest.mark.parametrize("max_commands_in_flight", [1, 4])
+def test_corruption(max_commands_in_flight):
+    gcode_list = curvedGCode(layer_count = 2, move_count = 200)
+    printer = VirtualPrinter(corruption_rate = 0.05, seed = 3)
+    printer.timeout = 0.1
+    sender = StreamingSender(GCodeStream(gcode_list), printer.write, max_commands_in_flight = max_commands_in_flight)
+
+    streamAll(sender, printer)
+    printer.close()
+
+    assert printer.commands == ["M110"] + [GCodeStream.prepareLine(line) for layer in gcode_list for line in layer.split("\n")]
+    assert printer.corrupted_count > 0
+    assert printer.resend_count > 0
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason = "Pseudo terminals are not available on this system.")
+def test_pty(printer):
+    port = os.open(printer.openPty(), os.O_RDWR | os.O_NOCTTY)
+    try:
+        os.write(port, b"M105\n")
+        response = b""
+        while not response.endswith(b"\n"):
+            response += os.read(port, 100)
+    finally:
+        os.close(port)
+
+    assert response.startswith(b"ok T:")
+
+##  Send the reference prints to printers that are connected in different
+#   ways, through the USB printer connection, and report how many lines per
+#   second were sent, how long the printer had to wait for lines and how much
+#   CPU time listening to the printer took.
+@pytest.mark.benchmark
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason = "Pseudo terminals are not available on this system.")
+@pytest.mark.parametrize("name, create_gcode, move_time", referencePrints())
+@pytest.mark.parametrize("advanced_ok, corruption_rate", [(False, 0.0), (True, 0.0), (False, 0.01)])
+def test_benchmarkUSBPrinting(name, create_gcode, move_time, advanced_ok, corruption_rate, benchmark_report):
+    gcode_list = create_gcode()
+    printer = VirtualPrinter(move_time = move_time, latency = 0.0005, baud_rate = 250000, advanced_ok = advanced_ok, corruption_rate = corruption_rate)
+    try:
+        total_time, cpu_time = printOverUSB(printer, gcode_list)
+    finally:
+        printer.close()
+
+    expected_commands = ["M110"] + [GCodeStream.prepareLine(line) for layer in gcode_list for line in layer.split("\n")]
+    #The connection asks for the temperatures in between, and sends an M605 when the print is done.
+    print_commands = [command for command in printer.commands if not command.startswith("M105")]
+    assert print_commands[:-1] == [command for command in expected_commands if command != "M105"]
+    assert print_commands[-1] == "M605 S3"
+    benchmark_report("%s%s, %.0f%% corrupted: %d lines/s, the printer waited %.2f s of %.2f s, listening took %.2f s CPU, %d resends" % (
+        name, " (advanced ok)" if advanced_ok else "", corruption_rate * 100,
+        len(expected_commands) / total_time, printer.stall_time, total_time, cpu_time, printer.resend_count))
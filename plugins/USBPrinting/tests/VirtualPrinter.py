@@ -0,0 +1,336 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import collections
+import functools
+import os
+import random
+import re
+import threading
+import time
+
+
+##  A printer with Marlin firmware behind a serial port that lives in the same
+#   process, to test and measure sending g-code without hardware.
+#
+#   It has the buffers of Marlin: the serial receive buffer, the command buffer
+#   and the planner buffer. Lines are checked for their line number and
+#   checksum when they go from the receive buffer to the command buffer, and
+#   an "ok" is sent when a command was executed, which for moves is when they
+#   are in the planner. Every move takes move_time to print. It has the
+#   interface of serial.Serial that the USB printing uses: write(), readline()
+#   and timeout. It can also be reached through a pseudo terminal, to connect
+#   Cura to it like to a real printer.
+#
+#   It has a hotend and a heated bed, which report their temperatures like
+#   Marlin does for M105 and while waiting for M109 and M190.
+class VirtualPrinter:
+    ##  The temperature of the heaters when they are off.
+    AmbientTemperature = 20.0
+
+
+    ##  \param command_buffer_size The number of commands in the command
+    #   buffer (BUFSIZE in Marlin).
+    #   \param planner_buffer_size The number of moves in the planner.
+    #   \param rx_buffer_size The size of the serial receive buffer in bytes.
+    #   Lines that don't fit are lost.
+    #   \param move_time The time that every move takes to print, in seconds.
+    #   \param latency The time that it takes the USB connection to deliver
+    #   data in either direction, in seconds.
+    #   \param baud_rate The speed of the serial connection, or 0 to send data
+    #   without delay.
+    #   \param advanced_ok Whether to report the free room in the buffers with
+    #   every ok, like Marlin with ADVANCED_OK.
+    #   \param corruption_rate The fraction of the numbered lines that get a
+    #   flipped bit on the way to the printer, like a noisy cable causes.
+    #   \param heat_rate How fast the heaters heat up and cool down, in
+    #   degrees per second, or 0 to reach the target temperatures at once.
+    #   \param seed The seed of the random corruption, to repeat a run.
+    def __init__(self, command_buffer_size = 4, planner_buffer_size = 16, rx_buffer_size = 128, move_time = 0.0, latency = 0.0, baud_rate = 0, advanced_ok = False, corruption_rate = 0.0, heat_rate = 0.0, seed = 0):
+        self.timeout = 2
+        self._command_buffer_size = command_buffer_size
+        self._planner_buffer_size = planner_buffer_size
+        self._rx_buffer_size = rx_buffer_size
+        self._move_time = move_time
+        self._latency = latency
+        self._byte_time = 10 / baud_rate if baud_rate else 0.0  # 8 bits with a start and a stop bit.
+        self._advanced_ok = advanced_ok
+        self._corruption_rate = corruption_rate
+        self._heat_rate = heat_rate
+        self._random = random.Random(seed)
+
+        self._condition = threading.Condition()
+        self._rx = collections.deque()  # (arrival time, line) of the lines that were written.
+        self._rx_bytes = 0
+        self._rx_partial = b""
+        self._host_line_free_time = 0.0  # When the previous write is sent completely.
+        self._tx = collections.deque()  # (arrival time, line) of the responses.
+        self._printer_line_free_time = 0.0
+
+        self._command_buffer = collections.deque()
+        self._planner = collections.deque()  # End times of the moves in the planner.
+        self._last_move_end_time = None
+        self._last_line_number = 0
+
+        # Temperature, target temperature and when the temperature was computed, per heater.
+        self._heaters = {"T": [self.AmbientTemperature, 0.0, 0.0], "B": [self.AmbientTemperature, 0.0, 0.0]}
+        self._heating = False  # Whether an M109 or M190 is waiting for its heater.
+        self._next_report_time = None  # When to report the temperatures while heating up.
+
+        self._pty_master = None
+        self._pty_slave = None
+
+        self.commands = []  # The commands that were executed, without line numbers and checksums.
+        self.overflow_count = 0  # The number of lines that didn't fit in the receive buffer.
+        self.resend_count = 0
+        self.corrupted_count = 0  # The number of lines that got corrupted on the way.
+        self.stall_time = 0.0  # The time that the planner was empty between moves, waiting for the host.
+
+        self._running = True
+        self._thread = threading.Thread(target = self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    ##  Send data to the printer.
+    def write(self, data):
+        with self._condition:
+            now = time.monotonic()
+            arrival = max(now + self._latency, self._host_line_free_time) + len(data) * self._byte_time
+            self._host_line_free_time = arrival
+            lines = (self._rx_partial + data).split(b"\n")
+            self._rx_partial = lines.pop()
+            for line in lines:
+                if self._corruption_rate and line.startswith(b"N") and self._random.random() < self._corruption_rate:
+                    line = self._corrupt(line)
+                if self._rx_bytes + len(line) + 1 > self._rx_buffer_size:
+                    self.overflow_count += 1
+                    continue
+                self._rx.append((arrival, line))
+                self._rx_bytes += len(line) + 1
+            self._condition.notify_all()
+        return len(data)
+
+    ##  Read a response of the printer, or b"" after the timeout.
+    def readline(self):
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while self._running:
+                now = time.monotonic()
+                if self._tx and self._tx[0][0] <= now:
+                    return self._tx.popleft()[1]
+                if now >= deadline:
+                    return b""
+                wait_until = min(deadline, self._tx[0][0]) if self._tx else deadline
+                self._condition.wait(wait_until - now)
+        return b""
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+        if self._pty_master is not None:
+            os.close(self._pty_master)
+            os.close(self._pty_slave)
+            self._pty_master = None
+
+    ##  Make the printer available through a pseudo terminal. Only works on
+    #   Unix-like systems.
+    #   \return The name of the serial port to connect to, like "/dev/pts/3".
+    def openPty(self):
+        import tty
+        self._pty_master, self._pty_slave = os.openpty()
+        tty.setraw(self._pty_slave)
+        for target in (self._readPty, self._writePty):
+            thread = threading.Thread(target = target)
+            thread.daemon = True
+            thread.start()
+        return os.ttyname(self._pty_slave)
+
+    ##  Get the temperature of a heater.
+    #   \param heater "T" for the hotend or "B" for the bed.
+    def getTemperature(self, heater):
+        with self._condition:
+            return self._updateHeater(heater, time.monotonic())
+
+    ##  The firmware, running in its own thread.
+    def _run(self):
+        with self._condition:
+            while self._running:
+                now = time.monotonic()
+                while self._planner and self._planner[0] <= now:
+                    self._planner.popleft()
+
+                # Take the lines that arrived into the command buffer.
+                while self._rx and self._rx[0][0] <= now and len(self._command_buffer) < self._command_buffer_size:
+                    arrival, line = self._rx.popleft()
+                    self._rx_bytes -= len(line) + 1
+                    self._receiveLine(line.decode("utf-8", "replace").strip())
+
+                if self._command_buffer:
+                    response = self._executeCommand(self._command_buffer[0], now)
+                    if response is not None:
+                        self._command_buffer.popleft()
+                        self._respond(response)
+                        continue
+
+                # Wait for something to happen.
+                wake_times = []
+                if self._rx and len(self._command_buffer) < self._command_buffer_size:
+                    wake_times.append(self._rx[0][0])
+                if self._command_buffer and self._planner:
+                    wake_times.append(self._planner[0])
+                if self._next_report_time is not None:
+                    wake_times.append(self._next_report_time)
+                self._condition.wait(max(min(wake_times) - now, 0) if wake_times else None)
+
+    ##  Check the line number and checksum of a line and put it in the command
+    #   buffer, or ask for it again.
+    def _receiveLine(self, line):
+        if line == "":
+            return
+        if not line.startswith("N"):
+            self._command_buffer.append(line)
+            return
+        match = re.match(r"N(\d+) (.*)\*(\d+)$", line)
+        if not match:
+            self._requestResend("No Checksum with line number, Last Line: %d" % self._last_line_number)
+            return
+        line_number = int(match.group(1))
+        checksum = functools.reduce(lambda x, y: x ^ y, line[:line.rindex("*")].encode("utf-8"))
+        command = match.group(2)
+        if command.startswith("M110"):
+            self._last_line_number = line_number
+        elif line_number != self._last_line_number + 1:
+            self._requestResend("Line Number is not Last Line Number+1, Last Line: %d" % self._last_line_number)
+            return
+        elif checksum != int(match.group(3)):
+            self._requestResend("checksum mismatch, Last Line: %d" % self._last_line_number)
+            return
+        self._last_line_number = line_number
+        self._command_buffer.append(command)
+
+    ##  Ask for the lines again from the last correct line on, and forget the
+    #   lines that were received after the wrong one. Lines that arrive later
+    #   are refused one by one.
+    def _requestResend(self, error):
+        self.resend_count += 1
+        self._respond(b"Error:" + error.encode("utf-8"))
+        self._respond(b"Resend: %d" % (self._last_line_number + 1))
+        self._respond(self._okLine())
+        now = time.monotonic()
+        while self._rx and self._rx[0][0] <= now:
+            arrival, line = self._rx.popleft()
+            self._rx_bytes -= len(line) + 1
+
+    ##  Execute a command.
+    #   \return The response to send, or None if the command has to wait, for
+    #   room in the planner or for the heaters.
+    def _executeCommand(self, command, now):
+        response = self._okLine()
+        if re.match(r"G[0-3]\b", command):
+            if len(self._planner) >= self._planner_buffer_size:
+                return None
+            if self._planner:
+                start_time = self._planner[-1]
+            else:
+                if self.commands and self._last_move_end_time is not None and self._last_move_end_time < now:
+                    self.stall_time += now - self._last_move_end_time
+                start_time = now
+            self._planner.append(start_time + self._move_time)
+            self._last_move_end_time = self._planner[-1]
+        elif re.match(r"M(104|109|140|190)\b", command):
+            heater = "B" if command.startswith(("M140", "M190")) else "T"
+            if not self._heating:
+                match = re.search(r"[SR](-?[0-9\.]+)", command)
+                if match:
+                    self._updateHeater(heater, now)
+                    self._heaters[heater][1] = float(match.group(1))
+            self._heating = command.startswith(("M109", "M190")) and not self._heaterReached(heater, now)
+            if self._heating:
+                return None
+        elif re.match(r"M105\b", command):
+            response = b"ok " + self._temperatureLine(now)
+        self.commands.append(command)
+        return response
+
+    ##  Get the temperature of a heater now, moving it towards its target.
+    def _updateHeater(self, heater, now):
+        temperature, target, last_time = self._heaters[heater]
+        goal = target if target > 0 else self.AmbientTemperature
+        if self._heat_rate <= 0:
+            temperature = goal
+        else:
+            step = self._heat_rate * (now - last_time)
+            temperature = min(temperature + step, goal) if temperature < goal else max(temperature - step, goal)
+        self._heaters[heater] = [temperature, target, now]
+        return temperature
+
+    ##  Whether a heater reached its target, and report the temperatures
+    #   every second while it didn't.
+    def _heaterReached(self, heater, now):
+        if self._updateHeater(heater, now) >= self._heaters[heater][1] - 0.5:
+            self._next_report_time = None
+            return True
+        if self._next_report_time is None or now >= self._next_report_time:
+            self._respond(self._temperatureLine(now))
+            self._next_report_time = now + 1.0
+        return False
+
+    def _temperatureLine(self, now):
+        return b"T:%.2f /%.2f B:%.2f /%.2f" % (self._updateHeater("T", now), self._heaters["T"][1], self._updateHeater("B", now), self._heaters["B"][1])
+
+    ##  Flip a bit of a line, but not one that makes it another line or a
+    #   line without line number.
+    def _corrupt(self, line):
+        self.corrupted_count += 1
+        data = bytearray(line)
+        while True:
+            index = self._random.randrange(1, len(data))
+            value = data[index] ^ (1 << self._random.randrange(8))
+            if value != ord("\n"):
+                data[index] = value
+                return bytes(data)
+
+    ##  Pass what is written to the pseudo terminal on to the printer.
+    def _readPty(self):
+        while self._running:
+            try:
+                data = os.read(self._pty_master, 1024)
+            except OSError:  # Closed.
+                return
+            if data:
+                self.write(data)
+
+    ##  Pass the responses of the printer on to the pseudo terminal.
+    def _writePty(self):
+        while self._running:
+            line = self.readline()
+            if line:
+                try:
+                    os.write(self._pty_master, line)
+                except OSError:
+                    return
+
+    def _okLine(self):
+        if self._advanced_ok:
+            return b"ok N%d P%d B%d" % (self._last_line_number, self._planner_buffer_size - len(self._planner), self._command_buffer_size - len(self._command_buffer))
+        return b"ok"
+
+    def _respond(self, line):
+        now = time.monotonic()
+        arrival = max(now + self._latency, self._printer_line_free_time) + (len(line) + 1) * self._byte_time
+        self._printer_line_free_time = arrival
+        self._tx.append((arrival, line + b"\n"))
+        self._condition.notify_all()
+
+
+##  Run a printer that Cura can connect to, until it is interrupted.
+if __name__ == "__main__":
+    printer = VirtualPrinter(move_time = 0.01, latency = 0.001, baud_rate = 250000, heat_rate = 5.0)
+    print("Virtual printer at %s" % printer.openPty())
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        printer.close()
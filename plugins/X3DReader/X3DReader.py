@@ -2,6 +2,7 @@
 # Cura is released under the terms of the LGPLv3 or higher.
 
 from math import pi, sin, cos, sqrt
+import warnings
 
 import numpy
 
@@ -26,6 +27,14 @@ except ImportError:
 DEFAULT_SUBDIV = 16 # Default subdivision factor for spheres, cones, and cylinders
 EPSILON = 0.000001
 
+GROUP_TAGS = ("Group", "StaticGroup", "CADAssembly", "CADFace", "CADLayer", "Collision")
+TRANSFORM_TAGS = ("Transform", "CADPart")
+
+# Which children of an element are nodes of the scene, while streaming through the file
+ALL_CHILDREN = 0
+FIRST_CHILD = 1
+NO_CHILDREN = 2
+
 class Shape:
 
     # Expects verts in MeshBuilder-ready format, as a n by 3 mdarray
@@ -49,32 +58,13 @@ class X3DReader(MeshReader):
         try:
             self.defs = {}
             self.shapes = []
-
-            tree = ET.parse(file_name)
-            xml_root = tree.getroot()
-
-            if xml_root.tag != "X3D":
-                return None
-
-            scale = 1000 # Default X3D unit it one meter, while Cura's is one millimeters
-            if xml_root[0].tag == "head":
-                for head_node in xml_root[0]:
-                    if head_node.tag == "unit" and head_node.attrib.get("category") == "length":
-                        scale *= float(head_node.attrib["conversionFactor"])
-                        break
-                xml_scene = xml_root[1]
-            else:
-                xml_scene = xml_root[0]
-
-            if xml_scene.tag != "Scene":
-                return None
-
             self.transform = Matrix()
-            self.transform.setByScaleFactor(scale)
+            self.transform_stack = []
             self.index_base = 0
 
-            # Traverse the scene tree, populate the shapes list
-            self.processChildNodes(xml_scene)
+            # Traverse the scene tree while the file is parsed, populate the shapes list
+            if not self.processFile(file_name):
+                return None
 
             if self.shapes:
                 builder = MeshBuilder()
@@ -104,6 +94,83 @@ class X3DReader(MeshReader):
 
     # ------------------------- XML tree traversal
 
+    # Streams through the file, and imports every shape as soon as it has been read.
+    # The elements are freed once they're processed, unless they have a DEF, so that
+    # large files don't have to fit in memory as a tree.
+    # Returns False if the file doesn't contain an X3D scene.
+    def processFile(self, file_name):
+        scale = 1000 # Default X3D unit it one meter, while Cura's is one millimeters
+        got_unit = False
+        root_children = [] # The tags of the children of the root, to find the scene
+        elements = [] # The open elements, from the root down
+        # For every open element: which children are scene nodes, the number of children so far,
+        # whether it is a scene node itself and whether it pushed a transform.
+        frames = []
+        kept_depth = 0 # The number of open elements with a DEF; their contents are kept for USE
+
+        for event, element in iterateXML(file_name):
+            if event == "start":
+                depth = len(elements)
+                is_node = pushed = False
+                child_mode = NO_CHILDREN
+                if depth == 0:
+                    if element.tag != "X3D":
+                        return False
+                elif depth == 1:
+                    root_children.append(element.tag)
+                    if root_children not in (["head"], ["Scene"], ["head", "Scene"]):
+                        return False
+                    if element.tag == "Scene":
+                        self.transform.setByScaleFactor(scale)
+                        child_mode = ALL_CHILDREN
+                else:
+                    parent = frames[-1]
+                    is_node = parent[0] == ALL_CHILDREN or (parent[0] == FIRST_CHILD and parent[1] == 0)
+                    parent[1] += 1
+                    if is_node and not element.attrib.get("USE"):
+                        if element.tag in GROUP_TAGS:
+                            child_mode = ALL_CHILDREN
+                        elif element.tag in TRANSFORM_TAGS:
+                            self.pushTransform(element)
+                            pushed = True
+                            child_mode = ALL_CHILDREN
+                        elif element.tag == "LOD":
+                            child_mode = FIRST_CHILD
+                if element.attrib.get("DEF"):
+                    kept_depth += 1
+                elements.append(element)
+                frames.append([child_mode, 0, is_node, pushed])
+                continue
+
+            elements.pop()
+            child_mode, child_count, is_node, pushed = frames.pop()
+            if pushed:
+                self.popTransform()
+            if is_node:
+                if element.attrib.get("USE"):
+                    self.processNode(element)
+                elif element.tag == "Shape":
+                    self.processShape(element)
+                Job.yieldThread()
+            elif element.tag == "unit" and elements[-1].tag == "head" and len(elements) == 2:
+                if not got_unit and element.attrib.get("category") == "length":
+                    scale *= float(element.attrib["conversionFactor"])
+                    got_unit = True
+            elif element.tag == "Scene":
+                break
+
+            DEF = element.attrib.get("DEF")
+            if DEF:
+                self.defs[DEF] = element
+                kept_depth -= 1
+            if is_node and kept_depth == 0:
+                # Done with this node; a USE can only refer to it by its DEF
+                if not DEF:
+                    element.clear()
+                elements[-1].remove(element)
+
+        return "Scene" in root_children
+
     def processNode(self, xml_node):
         xml_node =  self.resolveDefUse(xml_node)
         if xml_node is None:
@@ -166,11 +233,17 @@ class X3DReader(MeshReader):
             Job.yieldThread()
 
     # Since this is a grouping node, will recurse down the tree.
+    def processTransform(self, node):
+        self.pushTransform(node)
+        self.processChildNodes(node)
+        self.popTransform()
+
+    # Applies the transform of a node on top of the current one.
     # According to the spec, the final transform matrix is:
     # T * C * R * SR * S * -SR * -C
     # Where SR corresponds to the rotation matrix to scaleOrientation
     # C and SR are rather exotic. S, slightly less so.
-    def processTransform(self, node):
+    def pushTransform(self, node):
         rot = readRotation(node, "rotation", (0, 0, 1, 0)) # (angle, axisVactor) tuple
         trans = readVector(node, "translation", (0, 0, 0)) # Vector
         scale = readVector(node, "scale", (1, 1, 1)) # Vector
@@ -178,7 +251,7 @@ class X3DReader(MeshReader):
         scale_orient = readRotation(node, "scaleOrientation", (0, 0, 1, 0)) # (angle, axisVactor) tuple
 
         # Store the previous transform; in Cura, the default matrix multiplication is in place
-        prev = Matrix(self.transform.getData()) # It's deep copy, I've checked
+        self.transform_stack.append(Matrix(self.transform.getData())) # It's deep copy, I've checked
 
         # The rest of transform manipulation will be applied in place
         got_center = (center.x != 0 or center.y != 0 or center.z != 0)
@@ -203,8 +276,9 @@ class X3DReader(MeshReader):
         if got_center:
             T.translate(-center)
 
-        self.processChildNodes(node)
-        self.transform = prev
+    # Goes back to the transform from before the last pushTransform.
+    def popTransform(self):
+        self.transform = self.transform_stack.pop()
 
     # ------------------------- Geometry importers
     # They are supposed to fill the self.verts and self.faces arrays, the caller will do the rest
@@ -354,7 +428,7 @@ class X3DReader(MeshReader):
         dz = readFloat(node, "zSpacing", 1)
         nx = readInt(node, "xDimension", 0)
         nz = readInt(node, "zDimension", 0)
-        height = readFloatArray(node, "height", False)
+        height = readNumpyFloatArray(node, "height")
         ccw = readBoolean(node, "ccw", True)
 
         if nx <= 0 or nz <= 0 or len(height) < nx*nz:
@@ -362,14 +436,17 @@ class X3DReader(MeshReader):
 
         self.reserveFaceAndVertexCount(2*(nx-1)*(nz-1), nx*nz)
 
-        for z in range(nz):
-            for x in range(nx):
-                self.addVertex(x * dx, height[z*nx + x], z * dz)
+        self.verts[0] = numpy.tile(numpy.arange(nx) * dx, nz)
+        self.verts[1] = height[:nx*nz]
+        self.verts[2] = numpy.repeat(numpy.arange(nz) * dz, nx)
+        self.num_verts = nx*nz
 
-        for z in range(1, nz):
-            for x in range(1, nx):
-                self.addTriFlip((z - 1)*nx + x - 1, z*nx + x, (z - 1)*nx + x, ccw)
-                self.addTriFlip((z - 1)*nx + x - 1, z*nx + x - 1, z*nx + x, ccw)
+        # The top left corner of every quad, and the corners of its two triangles
+        corner = (numpy.arange(nz - 1)[:, numpy.newaxis] * nx + numpy.arange(nx - 1)).ravel()
+        tris = numpy.empty((len(corner), 2, 3), dtype = numpy.int32)
+        tris[:, 0] = numpy.column_stack((corner, corner + nx + 1, corner + 1))
+        tris[:, 1] = numpy.column_stack((corner, corner + nx, corner + nx + 1))
+        self.addTris(flipTris(tris.reshape((-1, 3)), ccw))
 
     def processGeometryExtrusion(self, node):
         ccw = readBoolean(node, "ccw", True)
@@ -546,73 +623,56 @@ class X3DReader(MeshReader):
         return ccw
 
 
+    # The triangles of all these sets are built at once with numpy, from the
+    # indices of their corners.
+
     def processGeometryIndexedTriangleSet(self, node):
-        index = readIntArray(node, "index", [])
+        index = readNumpyIntArray(node, "index")
         num_faces = len(index) // 3
-        ccw = int(self.startCoordMesh(node, num_faces))
+        ccw = self.startCoordMesh(node, num_faces)
 
-        for i in range(0, num_faces*3, 3):
-            self.addTri(index[i + 1 - ccw], index[i + ccw], index[i+2])
+        self.addTris(flipTris(index[:num_faces*3].reshape((-1, 3)), ccw))
 
     def processGeometryIndexedTriangleStripSet(self, node):
-        strips = readIndex(node, "index")
-        ccw = int(self.startCoordMesh(node, sum([len(strip) - 2 for strip in strips])))
+        (index, lengths) = readIndex(node, "index")
+        ccw = self.startCoordMesh(node, countRunTris(lengths))
 
-        for strip in strips:
-            sccw = ccw # Running CCW value, reset for each strip
-            for i in range(len(strip) - 2):
-                self.addTri(strip[i + 1 - sccw], strip[i + sccw], strip[i+2])
-                sccw = 1 - sccw
+        self.addTris(stripTris(index, lengths, ccw))
 
     def processGeometryIndexedTriangleFanSet(self, node):
-        fans = readIndex(node, "index")
-        ccw = int(self.startCoordMesh(node, sum([len(fan) - 2 for fan in fans])))
+        (index, lengths) = readIndex(node, "index")
+        ccw = self.startCoordMesh(node, countRunTris(lengths))
 
-        for fan in fans:
-            for i in range(1, len(fan) - 1):
-                self.addTri(fan[0], fan[i + 1 - ccw], fan[i + ccw])
+        self.addTris(fanTris(index, lengths, ccw))
 
     def processGeometryTriangleSet(self, node):
-        ccw = int(self.startCoordMesh(node, lambda num_vert: num_vert // 3))
-        for i in range(0, self.getVertexCount(), 3):
-            self.addTri(i + 1 - ccw, i + ccw, i+2)
+        ccw = self.startCoordMesh(node, lambda num_vert: num_vert // 3)
+        self.addTris(flipTris(numpy.arange(self.num_faces_reserved * 3).reshape((-1, 3)), ccw))
 
     def processGeometryTriangleStripSet(self, node):
-        strips = readIntArray(node, "stripCount", [])
-        ccw = int(self.startCoordMesh(node, sum([n-2 for n in strips])))
+        lengths = readNumpyIntArray(node, "stripCount")
+        ccw = self.startCoordMesh(node, countRunTris(lengths))
 
-        vb = 0
-        for n in strips:
-            sccw = ccw
-            for i in range(n-2):
-                self.addTri(vb + i + 1 - sccw, vb + i + sccw, vb + i + 2)
-                sccw = 1 - sccw
-            vb += n
+        self.addTris(stripTris(numpy.arange(lengths.sum()), lengths, ccw))
 
     def processGeometryTriangleFanSet(self, node):
-        fans = readIntArray(node, "fanCount", [])
-        ccw = int(self.startCoordMesh(node, sum([n-2 for n in fans])))
+        lengths = readNumpyIntArray(node, "fanCount")
+        ccw = self.startCoordMesh(node, countRunTris(lengths))
 
-        vb = 0
-        for n in fans:
-            for i in range(1, n-1):
-                self.addTri(vb, vb + i + 1 - ccw, vb + i + ccw)
-            vb += n
+        self.addTris(fanTris(numpy.arange(lengths.sum()), lengths, ccw))
 
     # Quad geometries from the CAD module, might be relevant for printing
 
     def processGeometryQuadSet(self, node):
         ccw = self.startCoordMesh(node, lambda num_vert: 2*(num_vert // 4))
-        for i in range(0, self.getVertexCount(), 4):
-            self.addQuadFlip(i, i+1, i+2, i+3, ccw)
+        self.addTris(quadTris(numpy.arange(self.num_faces_reserved * 2).reshape((-1, 4)), ccw))
 
     def processGeometryIndexedQuadSet(self, node):
-        index = readIntArray(node, "index", [])
+        index = readNumpyIntArray(node, "index")
         num_quads = len(index) // 4
         ccw = self.startCoordMesh(node, num_quads*2)
 
-        for i in range(0, num_quads*4, 4):
-            self.addQuadFlip(index[i], index[i+1], index[i+2], index[i+3], ccw)
+        self.addTris(quadTris(index[:num_quads*4].reshape((-1, 4)), ccw))
 
     # 2D polygon geometries
     # Won't work for now, since Cura expects every mesh to have a nontrivial convex hull
@@ -665,15 +725,23 @@ class X3DReader(MeshReader):
 
     # General purpose polygon mesh
 
+    # Triangles and convex faces are cut into fans all at once, only the faces
+    # that are not convex go through the ear cutting of addFace.
     def processGeometryIndexedFaceSet(self, node):
-        faces = readIndex(node, "coordIndex")
-        ccw = self.startCoordMesh(node, sum([len(face) - 2 for face in faces]))
+        (index, lengths) = readIndex(node, "coordIndex")
+        ccw = self.startCoordMesh(node, countRunTris(lengths))
 
-        for face in faces:
-            if len(face) == 3:
-                self.addTriFlip(face[0], face[1], face[2], ccw)
-            elif len(face) > 3:
-                self.addFace(face, ccw)
+        convex = lengths == 3
+        polygons = lengths > 3
+        if polygons.any():
+            corners = index[numpy.repeat(polygons, lengths)]
+            convex[polygons] = findConvexPolygons(self.verts[0:3, corners].transpose(), lengths[polygons])
+
+        self.addTris(fanTris(index[numpy.repeat(convex, lengths)], lengths[convex], ccw))
+
+        starts = numpy.cumsum(lengths) - lengths
+        for face in numpy.flatnonzero(polygons & ~convex):
+            self.addFace(index[starts[face]:starts[face] + lengths[face]].tolist(), ccw)
 
     geometry_importers = {
         "IndexedFaceSet": processGeometryIndexedFaceSet,
@@ -702,19 +770,17 @@ class X3DReader(MeshReader):
             if c.tag == "Coordinate":
                 c = self.resolveDefUse(c)
                 if not c is None:
-                    pt = c.attrib.get("point")
-                    if pt:
-                        # allow the list of float values in 'point' attribute to
-                        # be separated by commas or whitespace as per spec of
-                        # XML encoding of X3D
-                        # Ref  ISO/IEC 19776-1:2015 : Section 5.1.2
-                        co = [float(x) for vec in pt.split(',') for x in vec.split()]
+                    # allow the list of float values in 'point' attribute to
+                    # be separated by commas or whitespace as per spec of
+                    # XML encoding of X3D
+                    # Ref  ISO/IEC 19776-1:2015 : Section 5.1.2
+                    co = readNumpyFloatArray(c, "point")
+                    if len(co):
                         num_verts = len(co) // 3
                         self.verts = numpy.empty((4, num_verts), dtype=numpy.float32)
                         self.verts[3,:] = numpy.ones((num_verts), dtype=numpy.float32)
                         # Group by three
-                        for i in range(num_verts):
-                            self.verts[:3,i] = co[3*i:3*i+3]
+                        self.verts[:3,:] = co[:num_verts*3].reshape((-1, 3)).transpose()
 
     # Mesh builder helpers
 
@@ -728,6 +794,7 @@ class X3DReader(MeshReader):
     def reserveFaceCount(self, num_faces):
         self.faces = numpy.zeros((num_faces, 3), dtype=numpy.int32)
         self.num_faces = 0
+        self.num_faces_reserved = num_faces
 
     def getVertexCount(self):
         return self.verts.shape[1]
@@ -745,6 +812,11 @@ class X3DReader(MeshReader):
         self.faces[self.num_faces, 2] = self.index_base + c
         self.num_faces += 1
 
+    # Adds triangles at once, as an n by 3 array of indices
+    def addTris(self, tris):
+        self.faces[self.num_faces:self.num_faces + len(tris)] = tris + self.index_base
+        self.num_faces += len(tris)
+
     def addTriFlip(self, a, b, c, ccw):
         if ccw:
             self.addTri(a, b, c)
@@ -787,7 +859,7 @@ class X3DReader(MeshReader):
         n = len(face)
         vi = [i for i in range(n)] # We'll be using this to kick vertices from the face
         while n > 3:
-            max_cos = EPSILON # We don't want to check anything on Pi angles
+            max_cos = -1 + EPSILON # We don't want to check anything on Pi angles
             i_min = 0 # max cos corresponds to min angle
             for i in range(n):
                 inext = (i + 1) % n
@@ -818,6 +890,33 @@ class X3DReader(MeshReader):
         self.addTriFlip(indices[vi[0]], indices[vi[1]], indices[vi[2]], ccw)
 
 
+# ------------------------------------------------------------
+# XML streaming
+# ------------------------------------------------------------
+
+# Yields the start and end events of the elements in the file, as iterparse does.
+# Expat parses an attribute that spans several chunks from its start again with every
+# chunk, which takes quadratic time on the huge attributes of CAD exports, so the
+# chunks grow while no element comes out of them.
+def iterateXML(file_name):
+    parser = ET.XMLPullParser(events = ("start", "end"))
+    chunk_size = 64 * 1024
+    with open(file_name, "rb") as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            parser.feed(data)
+            got_events = False
+            for event in parser.read_events():
+                got_events = True
+                yield event
+            if not got_events:
+                chunk_size *= 2
+    parser.close()
+    for event in parser.read_events():
+        yield event
+
 # ------------------------------------------------------------
 # X3D field parsers
 # ------------------------------------------------------------
@@ -845,6 +944,28 @@ def readInt(node, attr, default):
         return default
     return int(s, 0)
 
+# Parses the values of the attribute at once, into a numpy array.
+# Values can be separated by commas as well as by whitespace.
+def readNumpyFloatArray(node, attr):
+    return readNumpyArray(node, attr, numpy.float32, float)
+
+def readNumpyIntArray(node, attr):
+    return readNumpyArray(node, attr, numpy.int32, lambda x: int(x, 0))
+
+def readNumpyArray(node, attr, dtype, convert):
+    s = node.attrib.get(attr)
+    if not s:
+        return numpy.zeros(0, dtype = dtype)
+    s = s.replace(",", " ")
+    try:
+        with warnings.catch_warnings():
+            # Older numpy only warns about values it can't parse, and stops there
+            warnings.simplefilter("error", DeprecationWarning)
+            return numpy.fromstring(s, dtype = dtype, sep = " ")
+    except (ValueError, DeprecationWarning):
+        # Something like a hexadecimal number; parse them one by one
+        return numpy.array([convert(x) for x in s.split()], dtype = dtype)
+
 def readBoolean(node, attr, default):
     s = node.attrib.get(attr)
     if not s:
@@ -859,21 +980,85 @@ def readRotation(node, attr, default):
     v = readFloatArray(node, attr, default)
     return (v[3], Vector(v[0], v[1], v[2]))
 
-# Returns the -1-separated runs
+# Returns the -1-separated runs, as the indices without the separators and
+# the length of each run
 def readIndex(node, attr):
-    v = readIntArray(node, attr, [])
-    chunks = []
-    chunk = []
-    for i in range(len(v)):
-        if v[i] == -1:
-            if chunk:
-                chunks.append(chunk)
-                chunk = []
-        else:
-            chunk.append(v[i])
-    if chunk:
-        chunks.append(chunk)
-    return chunks
+    v = readNumpyIntArray(node, attr)
+    separators = v == -1
+    runs = numpy.cumsum(separators)[~separators] # The number of the run of every index
+    return (v[~separators], numpy.unique(runs, return_counts = True)[1])
+
+# ------------------------------------------------------------
+# Vectorized triangulation
+# Runs are strips, fans or faces, given as their indices one after the other
+# and the length of every run.
+# ------------------------------------------------------------
+
+def countRunTris(lengths):
+    return int(numpy.maximum(lengths - 2, 0).sum())
+
+# Returns the position of the first index of every run, and for every
+# triangle of the runs: its run and its number within the run
+def enumerateRunTris(lengths):
+    starts = numpy.cumsum(lengths) - lengths
+    counts = numpy.maximum(lengths - 2, 0)
+    runs = numpy.repeat(numpy.arange(len(lengths)), counts)
+    numbers = numpy.arange(counts.sum()) - (numpy.cumsum(counts) - counts)[runs]
+    return (starts, runs, numbers)
+
+# Clockwise triangles get their first two corners swapped
+def flipTris(tris, ccw):
+    if ccw:
+        return tris
+    return tris[:, (1, 0, 2)]
+
+def stripTris(index, lengths, ccw):
+    (starts, runs, numbers) = enumerateRunTris(lengths)
+    first = starts[runs] + numbers
+    sccw = (numbers + int(ccw)) % 2 # The running CCW value, flips with every triangle of a strip
+    return numpy.column_stack((index[first + 1 - sccw], index[first + sccw], index[first + 2]))
+
+def fanTris(index, lengths, ccw):
+    (starts, runs, numbers) = enumerateRunTris(lengths)
+    first = starts[runs]
+    return flipTris(numpy.column_stack((index[first], index[first + numbers + 1], index[first + numbers + 2])), ccw)
+
+# Convex, but not necessarily planar quads as an n by 4 array, cut along the ac diagonal
+def quadTris(quads, ccw):
+    if ccw:
+        tris = numpy.stack((quads[:, (0, 1, 2)], quads[:, (2, 3, 0)]), axis = 1)
+    else:
+        tris = numpy.stack((quads[:, (0, 2, 1)], quads[:, (2, 0, 3)]), axis = 1)
+    return tris.reshape((-1, 3))
+
+# Given the corners of polygons one after the other as an n by 3 array and
+# the number of corners of each polygon (at least 3), returns for every
+# polygon whether it is convex, so that it can be cut into a fan from its
+# first corner. Polygons with collinear or coinciding corners don't count
+# as convex, those are left to the ear cutting.
+def findConvexPolygons(points, lengths):
+    if len(lengths) == 0:
+        return numpy.zeros(0, dtype = numpy.bool_)
+    points = points.astype(numpy.float64)
+    starts = numpy.cumsum(lengths) - lengths
+    polygons = numpy.repeat(numpy.arange(len(lengths)), lengths)
+    corners = numpy.arange(len(points))
+    numbers = corners - starts[polygons]
+    next = numpy.where(numbers == lengths[polygons] - 1, starts[polygons], corners + 1)
+    prev = numpy.where(numbers == 0, starts[polygons] + lengths[polygons] - 1, corners - 1)
+
+    # The normal of every polygon by Newell's method, pointing so that the corners go ccw around it
+    normals = numpy.add.reduceat(numpy.cross(points, points[next]), starts)[polygons]
+
+    # All corners have to turn the same way...
+    turns = numpy.einsum("ij,ij->i", numpy.cross(points[next] - points, points[prev] - points), normals)
+    # ...and all triangles of the fan have to face the same way, which rules out
+    # polygons that go around more than once, like a pentagram
+    first = points[starts[polygons]]
+    fan = numpy.einsum("ij,ij->i", numpy.cross(points - first, points[next] - first), normals)
+    fan[(numbers == 0) | (numbers == lengths[polygons] - 1)] = numpy.inf # Not triangles of the fan
+
+    return (numpy.minimum.reduceat(turns, starts) > 0) & (numpy.minimum.reduceat(fan, starts) > 0)
 
 # Given a face as a sequence of vectors, returns a normal to the polygon place that forms a right triple
 # with a vector along the polygon sequence and a vector backwards
@@ -0,0 +1,127 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import time
+import xml.etree.ElementTree as ET
+
+import numpy
+import pytest
+
+import X3DReader #The module we're testing.
+
+def writeX3D(file_name, scene, head = ""):
+    with open(file_name, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<X3D profile="Interchange" version="3.3">%s<Scene>%s</Scene></X3D>\n' % (head, scene))
+
+##  A grid of quads in the xz plane as an IndexedFaceSet.
+def gridFaceSet(size, DEF = ""):
+    x, z = numpy.meshgrid(numpy.arange(size + 1), numpy.arange(size + 1))
+    points = numpy.column_stack((x.ravel(), numpy.zeros(x.size), z.ravel()))
+    corner = (numpy.arange(size)[:, numpy.newaxis] * (size + 1) + numpy.arange(size)).ravel()
+    faces = numpy.column_stack((corner, corner + size + 1, corner + size + 2, corner + 1, numpy.full(len(corner), -1)))
+    return '<Shape%s><IndexedFaceSet coordIndex="%s"><Coordinate point="%s" /></IndexedFaceSet></Shape>' % (
+        ' DEF="%s"' % DEF if DEF else "", " ".join(map(str, faces.ravel())), ", ".join("%g %g %g" % tuple(point) for point in points))
+
+def test_readNumpyArray():
+    node = ET.Element("Coordinate", point = "1 2 3, 4.5 5 6", index = "0 1 0x2 -1", empty = "")
+
+    assert numpy.array_equal(X3DReader.readNumpyFloatArray(node, "point"), [1, 2, 3, 4.5, 5, 6])
+    assert numpy.array_equal(X3DReader.readNumpyIntArray(node, "index"), [0, 1, 2, -1])
+    assert len(X3DReader.readNumpyIntArray(node, "empty")) == 0
+    assert len(X3DReader.readNumpyIntArray(node, "missing")) == 0
+
+def test_readIndex():
+    node = ET.Element("IndexedFaceSet", coordIndex = "0 1 2 -1 3 4 5 6 -1 -1 7 8 9")
+
+    (index, lengths) = X3DReader.readIndex(node, "coordIndex")
+
+    assert numpy.array_equal(index, numpy.arange(10))
+    assert numpy.array_equal(lengths, [3, 4, 3])
+
+@pytest.mark.parametrize("ccw, expected", [(True, [[0, 1, 2], [2, 1, 3], [2, 3, 4], [5, 6, 7]]),
+                                           (False, [[1, 0, 2], [1, 2, 3], [3, 2, 4], [6, 5, 7]])])
+def test_stripTris(ccw, expected):
+    assert numpy.array_equal(X3DReader.stripTris(numpy.arange(8), numpy.array([5, 3]), ccw), expected)
+
+@pytest.mark.parametrize("ccw, expected", [(True, [[0, 1, 2], [0, 2, 3], [0, 3, 4], [5, 6, 7]]),
+                                           (False, [[1, 0, 2], [2, 0, 3], [3, 0, 4], [6, 5, 7]])])
+def test_fanTris(ccw, expected):
+    assert numpy.array_equal(X3DReader.fanTris(numpy.arange(8), numpy.array([5, 3]), ccw), expected)
+
+def test_fanTrisShortRuns():
+    assert numpy.array_equal(X3DReader.fanTris(numpy.arange(6), numpy.array([2, 1, 3]), True), [[3, 4, 5]])
+
+@pytest.mark.parametrize("polygon, convex", [
+    ([(0, 0), (1, 0), (1, 1), (0, 1)], True),
+    ([(0, 1), (1, 1), (1, 0), (0, 0)], True), # Clockwise
+    ([(0, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2)], False), # L-shape
+    ([(0, 0), (1, 0), (2, 0), (2, 1)], False), # Collinear corners
+    ([(1, 0), (-0.81, 0.59), (0.31, -0.95), (0.31, 0.95), (-0.81, -0.59)], False), # Pentagram
+])
+def test_findConvexPolygons(polygon, convex):
+    points = numpy.array([(x, 5, y) for x, y in polygon] * 2)
+    lengths = numpy.array([len(polygon), len(polygon)])
+
+    assert list(X3DReader.findConvexPolygons(points, lengths)) == [convex, convex]
+
+##  Convex faces are cut into fans, the concave one by cutting ears, and the
+#   area stays the same.
+def test_indexedFaceSet(tmpdir):
+    file_name = str(tmpdir.join("faces.x3d"))
+    points = "0 0 0, 3 0 0, 3 0 1, 1 0 1, 1 0 2, 0 0 2, 3 0 0, 4 0 0, 4 0 1"
+    writeX3D(file_name, '<Shape><IndexedFaceSet coordIndex="0 1 2 3 4 5 -1 6 7 8"><Coordinate point="%s" /></IndexedFaceSet></Shape>' % points)
+
+    node = X3DReader.X3DReader().read(file_name)
+
+    mesh_data = node.getMeshData()
+    assert mesh_data.getFaceCount() == 5
+    vertices = mesh_data.getVertices()[mesh_data.getIndices()]
+    areas = numpy.linalg.norm(numpy.cross(vertices[:, 1] - vertices[:, 0], vertices[:, 2] - vertices[:, 0]), axis = 1) / 2
+    assert areas.sum() == pytest.approx((4 + 0.5) * 1000 * 1000) # In mm, and every triangle has an area.
+    assert (areas > 0).all()
+
+##  Shapes that are used again keep their own transformation.
+def test_defUse(tmpdir):
+    file_name = str(tmpdir.join("use.x3d"))
+    writeX3D(file_name, '<Transform DEF="grid" translation="1 0 0">%s</Transform><Transform translation="0 0 5"><Transform USE="grid" /></Transform>' % gridFaceSet(2),
+             head = '<head><unit category="length" name="millimeter" conversionFactor="0.001" /></head>')
+
+    node = X3DReader.X3DReader().read(file_name)
+
+    mesh_data = node.getMeshData()
+    assert mesh_data.getFaceCount() == 2 * 4 * 2
+    assert numpy.allclose(mesh_data.getVertices().min(axis = 0), [1, 0, 0])
+    assert numpy.allclose(mesh_data.getVertices().max(axis = 0), [3, 0, 7])
+
+##  The coordinates of a shape that was read and freed can still be used.
+def test_useCoordinate(tmpdir):
+    file_name = str(tmpdir.join("coordinate.x3d"))
+    writeX3D(file_name, '<Group><Shape><IndexedTriangleSet index="0 1 2"><Coordinate DEF="points" point="0 0 0 1 0 0 0 0 1" /></IndexedTriangleSet></Shape></Group>'
+                        '<Group><Shape><IndexedTriangleSet index="0 2 1" ccw="false"><Coordinate USE="points" /></IndexedTriangleSet></Shape></Group>')
+
+    node = X3DReader.X3DReader().read(file_name)
+
+    mesh_data = node.getMeshData()
+    assert numpy.array_equal(mesh_data.getIndices(), [[0, 1, 2], [5, 3, 4]])
+    assert numpy.array_equal(mesh_data.getVertices()[0:3], mesh_data.getVertices()[3:6])
+
+def test_notX3D(tmpdir):
+    file_name = str(tmpdir.join("other.x3d"))
+    with open(file_name, "w") as f:
+        f.write("<svg><Scene /></svg>")
+
+    assert X3DReader.X3DReader().read(file_name) is None
+
+##  Read a large CAD export and report how long it took.
+@pytest.mark.benchmark
+def test_benchmarkRead(tmpdir, benchmark_report):
+    file_name = str(tmpdir.join("grid.x3d"))
+    size = 500
+    writeX3D(file_name, gridFaceSet(size))
+
+    start_time = time.time()
+    node = X3DReader.X3DReader().read(file_name)
+    read_time = time.time() - start_time
+
+    assert node.getMeshData().getFaceCount() == size * size * 2
+    benchmark_report("Read %d quads in %.2f s" % (size * size, read_time))
@@ -0,0 +1,71 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import json
+import os
+import os.path
+
+import pytest #This module contains automated tests.
+import unittest.mock #For the mocking and monkeypatching functionality.
+
+from cura.Settings.Bcn3DFixes import Bcn3DFixes #The module we're testing.
+
+##  The g-code files that are checked. Each file has the settings of the print, the g-code as it comes from the
+#   engine and the g-code as it has to be after applying the fixes.
+golden_files = sorted(os.path.join(os.path.dirname(__file__), "gcode", file_name) for file_name in os.listdir(os.path.join(os.path.dirname(__file__), "gcode")) if file_name.endswith(".json"))
+
+def loadGoldenFile(file_path):
+    with open(file_path, encoding = "utf-8") as f:
+        return json.load(f)
+
+##  Creates a fake stack that returns the values of the settings in a dictionary.
+def createStack(settings, position = 0, material = None):
+    stack = unittest.mock.MagicMock()
+    stack.getProperty = lambda key, property_name: settings[key]
+    stack.getMetaData = unittest.mock.MagicMock(return_value = {"position": str(position)})
+    stack.material.getMetaData = unittest.mock.MagicMock(return_value = {"material": material})
+    return stack
+
+##  Applies the fixes to the g-code of a golden file.
+#
+#   \return The fixed g-code and the job that fixed it.
+def applyFixes(golden, gcode_list):
+    container = createStack(golden["global"])
+    extruder_stacks = [createStack(settings, position, golden["materials"][position]) for position, settings in enumerate(golden["extruders"])]
+
+    extruder_manager = unittest.mock.MagicMock()
+    extruder_manager.getExtruderStacks = lambda: extruder_stacks
+    extruder_manager.getExtruderStack = lambda position: extruder_stacks[position]
+    extruder_manager.getActiveExtruderStack = lambda: extruder_stacks[0]
+    extruder_manager.getUsedExtruderStacks = lambda: [extruder_stacks[position] for position in golden["used_extruders"]]
+
+    with unittest.mock.patch("cura.Settings.ExtruderManager.ExtruderManager.getInstance", unittest.mock.MagicMock(return_value = extruder_manager)):
+        with unittest.mock.patch("UM.Application.Application.getInstance", unittest.mock.MagicMock()):
+            job = Bcn3DFixes(container, gcode_list)
+            job.run()
+    return job.getResult(), job
+
+@pytest.mark.parametrize("file_path", golden_files)
+def test_goldenFile(file_path):
+    golden = loadGoldenFile(file_path)
+
+    result, job = applyFixes(golden, list(golden["gcode"]))
+
+    assert result == golden["expected"]
+    assert [name for name, time in job.getStageTimes()] #The fixes that were applied are reported with their time.
+
+##  Applies the fixes to a large print made by repeating the layers of each golden file and prints how long every fix
+#   took.
+@pytest.mark.benchmark
+@pytest.mark.parametrize("file_path", golden_files)
+def test_benchmarkFixes(file_path, benchmark_report):
+    golden = loadGoldenFile(file_path)
+    layers = [layer for layer in golden["gcode"] if layer.startswith(";LAYER:") and not layer.startswith(";LAYER:0")]
+    gcode_list = golden["gcode"][:2] + layers * (5000 // len(layers)) + golden["gcode"][-1:]
+
+    result, job = applyFixes(golden, gcode_list)
+
+    benchmark_report("%s - %d layers" % (os.path.basename(file_path), len(gcode_list)))
+    for name, time in job.getStageTimes():
+        benchmark_report("    %-45s %.3f s" % (name, time))
+    benchmark_report("    %-45s %.3f s" % ("total", sum(time for name, time in job.getStageTimes())))
@@ -1,4 +1,8 @@
+import time
+import unittest.mock
+
 import numpy
+import pytest
 
 from cura.Arranging.Arrange import Arrange
 from cura.Arranging.ShapeArray import ShapeArray
@@ -145,3 +149,179 @@ def test_check2():
     assert numpy.any(check_array)
     assert not check_array[3][0]
     assert check_array[3][4]
+
+
+##  Polygon -> array, the way it was done before: check every cell against every edge
+def arrayFromPolygonWithCheck(shape, vertices):
+    base_array = numpy.zeros(shape, dtype=float)
+    fill = numpy.ones(base_array.shape) * True
+    for k in range(vertices.shape[0]):
+        fill = numpy.all([fill, ShapeArray._check(vertices[k - 1], vertices[k], base_array)], axis=0)
+    base_array[fill] = 1
+    return base_array
+
+
+##  Some convex polygons, in the coordinates that arrayFromPolygon gets
+def gimmePolygons():
+    angles = numpy.linspace(0, 2 * numpy.pi, 33)[:-1]
+    return [
+        numpy.array([[0, 0], [4, 0], [4, 4], [0, 4]]),  # square
+        numpy.array([[0, 0.5], [3.7, 0], [6.2, 7.9], [0.3, 4.4]]),
+        numpy.array([[4, 0], [8, 6], [0, 6]]),  # triangle
+        numpy.array([[4, 0], [0, 6], [8, 6]]),  # other direction
+        numpy.stack([numpy.cos(angles) * 20 + 20, numpy.sin(angles) * 12 + 12], axis = 1),  # ellipse
+        numpy.stack([numpy.cos(angles) * 20 + 20, numpy.sin(angles) * 12 + 12], axis = 1)[::-1]
+    ]
+
+
+##  Polygon -> array gives the same array as checking every cell
+def test_arrayFromPolygonSameAsCheck():
+    for vertices in gimmePolygons():
+        shape = numpy.array([int(numpy.amax(vertices[:, 0])), int(numpy.amax(vertices[:, 1]))])
+        array = ShapeArray.arrayFromPolygon(shape, vertices)
+        assert numpy.array_equal(array, arrayFromPolygonWithCheck(shape, vertices))
+
+
+##  Create a node with a convex hull for fromNode
+def gimmeNode(x, y, points):
+    node = unittest.mock.MagicMock()
+    node._transformation._data = numpy.array([[1, 0, 0, x], [0, 1, 0, 0], [0, 0, 1, y], [0, 0, 0, 1]])
+    hull = unittest.mock.MagicMock()
+    hull._points = numpy.array(points, dtype = numpy.float32) + numpy.array([x, y])
+    hull.getPoints = lambda: hull._points
+    hull.getMinkowskiHull = unittest.mock.MagicMock(return_value = hull)
+    node.callDecoration = lambda name: hull if name == "getConvexHull" else None
+    return node, hull
+
+
+##  Nodes with the same footprint get the same ShapeArrays, without calculating them again
+def test_fromNodeFootprintCache():
+    ShapeArray.clearFootprintCache()
+    node, hull = gimmeNode(10, 20, [[-3, 1], [3, 1], [0, -3]])
+    other_node, other_hull = gimmeNode(-50, 30, [[-3, 1], [3, 1], [0, -3]])  # Same shape, other place
+    different_node, different_hull = gimmeNode(10, 20, [[-5, 1], [3, 1], [0, -3]])
+
+    preferences = unittest.mock.MagicMock()
+    preferences.getValue = unittest.mock.MagicMock(return_value = False)  # Don't align to the bounding box.
+    with unittest.mock.patch("cura.Arranging.ShapeArray.Preferences.getInstance", unittest.mock.MagicMock(return_value = preferences)):
+        offset_shape_arr, hull_shape_arr = ShapeArray.fromNode(node, min_offset = 2)
+        other_offset_shape_arr, other_hull_shape_arr = ShapeArray.fromNode(other_node, min_offset = 2)
+        different_offset_shape_arr, different_hull_shape_arr = ShapeArray.fromNode(different_node, min_offset = 2)
+        ShapeArray.fromNode(node, min_offset = 3)
+
+    assert other_offset_shape_arr is offset_shape_arr
+    assert other_hull_shape_arr is hull_shape_arr
+    assert other_hull.getMinkowskiHull.call_count == 0
+    assert different_hull_shape_arr is not hull_shape_arr
+    assert different_hull.getMinkowskiHull.call_count == 1
+    assert hull.getMinkowskiHull.call_count == 2  # Once more for the other offset.
+    ShapeArray.clearFootprintCache()
+
+
+##  Compare the time it takes to turn polygons into arrays with checking every cell
+@pytest.mark.benchmark
+def test_benchmarkArrayFromPolygon(benchmark_report):
+    angles = numpy.linspace(0, 2 * numpy.pi, 65)[:-1]
+    for radius in [10, 50, 100, 200]:
+        vertices = numpy.stack([numpy.cos(angles) * radius + radius, numpy.sin(angles) * radius + radius], axis = 1)
+        shape = numpy.array([int(numpy.amax(vertices[:, 0])), int(numpy.amax(vertices[:, 1]))])
+
+        start_time = time.time()
+        for i in range(10):
+            array = ShapeArray.arrayFromPolygon(shape, vertices)
+        new_time = (time.time() - start_time) / 10
+
+        start_time = time.time()
+        for i in range(10):
+            expected = arrayFromPolygonWithCheck(shape, vertices)
+        check_time = (time.time() - start_time) / 10
+
+        assert numpy.array_equal(array, expected)
+        benchmark_report("Radius %d: %.2f ms, checking every cell %.2f ms" % (radius, new_time * 1000, check_time * 1000))
+
+
+##  Find the best spot the way it was done before: checkShape for every cell, in the order of the priorities
+def bestSpotWithCheck(ar, shape_arr, start_prio = 0, step = 1):
+    start_idx = numpy.where(ar._priority_unique_values == start_prio)[0][0]
+    for priority in ar._priority_unique_values[start_idx::step]:
+        tryout_idx = numpy.where(ar._priority == priority)
+        for idx in range(len(tryout_idx[0])):
+            projected_x = tryout_idx[1][idx] - ar._offset_x
+            projected_y = tryout_idx[0][idx] - ar._offset_y
+            penalty_points = ar.checkShape(projected_x, projected_y, shape_arr)
+            if penalty_points is not None:
+                return projected_x, projected_y, penalty_points, priority
+    return None, None, None, priority
+
+
+##  Some shape arrays of different sizes, around the origin like the ones of nodes
+def gimmeShapeArrays():
+    angles = numpy.linspace(0, 2 * numpy.pi, 17)[:-1]
+    return [
+        gimmeShapeArray(),
+        ShapeArray.fromPolygon(numpy.array([[-2, -2], [2, -2], [2, 2], [-2, 2]], dtype = numpy.float32)),
+        ShapeArray.fromPolygon(numpy.array([[-6, 3], [6, 3], [0, -5]], dtype = numpy.float32)),
+        ShapeArray.fromPolygon(numpy.array([[-1, -9], [3, -9], [3, 1], [-1, 1]], dtype = numpy.float32)),  # Not centered
+        ShapeArray.fromPolygon(numpy.stack([numpy.cos(angles) * 11, -numpy.sin(angles) * 7], axis = 1))
+    ]
+
+
+##  The best spots are the same as when checking every cell, while filling up the build plate
+@pytest.mark.parametrize("strategy", ["centerFirst", "backFirst"])
+@pytest.mark.parametrize("step", [1, 10])
+def test_bestSpotSameAsCheck(strategy, step):
+    ar = Arrange(40, 50, 25, 20)
+    getattr(ar, strategy)()
+    shape_arrs = gimmeShapeArrays()
+    start_prio = ar._priority_unique_values[0]
+
+    for i in range(60):
+        shape_arr = shape_arrs[i % len(shape_arrs)]
+        best_spot = ar.bestSpot(shape_arr, start_prio = start_prio, step = step)
+        assert tuple(best_spot) == bestSpotWithCheck(ar, shape_arr, start_prio = start_prio, step = step)
+        if best_spot.x is not None:
+            ar.place(best_spot.x, best_spot.y, shape_arr)
+
+
+##  The best spot is the same as when checking every cell when starting halfway the priorities
+def test_bestSpotSameAsCheckStartPrio():
+    ar = Arrange(30, 30, 15, 15)
+    ar.centerFirst()
+    ar.place(0, 0, ShapeArray.fromPolygon(numpy.array([[-4, -4], [4, -4], [4, 4], [-4, 4]], dtype = numpy.float32)))
+
+    for shape_arr in gimmeShapeArrays():
+        for start_prio in ar._priority_unique_values[::17]:
+            assert tuple(ar.bestSpot(shape_arr, start_prio = start_prio, step = 3)) == bestSpotWithCheck(ar, shape_arr, start_prio = start_prio, step = 3)
+
+
+##  With a scale, the spots are still the same as when checking every cell
+def test_bestSpotSameAsCheckScaled():
+    ar = Arrange(30, 30, 15, 15, scale = 0.5)
+    ar.centerFirst()
+    shape_arr = gimmeShapeArrays()[2]
+    for i in range(20):
+        best_spot = ar.bestSpot(shape_arr)
+        assert tuple(best_spot) == bestSpotWithCheck(ar, shape_arr)
+        if best_spot.x is not None:
+            ar.place(best_spot.x, best_spot.y, shape_arr)
+    assert best_spot.x is None  # The build plate is full by now.
+
+
+##  Compare the time it takes to fill a build plate with checking every cell
+@pytest.mark.benchmark
+def test_benchmarkBestSpot(benchmark_report):
+    angles = numpy.linspace(0, 2 * numpy.pi, 33)[:-1]
+    shape_arr = ShapeArray.fromPolygon(numpy.stack([numpy.cos(angles) * 12, -numpy.sin(angles) * 12], axis = 1))
+    for method in ["bestSpot", "bestSpotWithCheck"]:
+        ar = Arrange(210, 297, 148, 105)
+        ar.centerFirst()
+        best_spot = bestSpotWithCheck if method == "bestSpotWithCheck" else Arrange.bestSpot
+        count = 0
+        start_time = time.time()
+        while True:
+            x, y, penalty_points, priority = best_spot(ar, shape_arr, start_prio = ar._priority_unique_values[0], step = 10)
+            if x is None:
+                break
+            ar.place(x, y, shape_arr)
+            count += 1
+        benchmark_report("%s: %d objects in %.2f s" % (method, count, time.time() - start_time))
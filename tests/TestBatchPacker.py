@@ -0,0 +1,165 @@
+import time
+
+import numpy
+import pytest
+
+from cura.Arranging.Arrange import Arrange
+from cura.Arranging.BatchPacker import BatchPacker
+from cura.Arranging.ShapeArray import ShapeArray
+
+
+##  Create an empty arranger with the back as the best side
+def gimmeArranger(width = 60, depth = 40):
+    ar = Arrange(depth, width, int(width / 2), int(depth / 2))
+    ar.backFirst()
+    return ar
+
+
+##  Offset and hull shape arrays of a square, like ShapeArray.fromNode makes them
+def gimmeFootprint(size, min_offset = 1):
+    half_size = size / 2
+    hull_points = numpy.array([[-half_size, -half_size], [half_size, -half_size], [half_size, half_size], [-half_size, half_size]], dtype = numpy.float32)
+    offset_points = hull_points * (half_size + min_offset) / half_size
+    return ShapeArray.fromPolygon(offset_points), ShapeArray.fromPolygon(hull_points)
+
+
+##  Occupied cells of the hull of an object at a spot
+def hullCells(ar, x, y, hull_shape_arr):
+    occupied = numpy.zeros(ar._occupied.shape, dtype = numpy.int32)
+    offset_x = x + ar._offset_x + hull_shape_arr.offset_x
+    offset_y = y + ar._offset_y + hull_shape_arr.offset_y
+    occupied[offset_y:offset_y + hull_shape_arr.arr.shape[0], offset_x:offset_x + hull_shape_arr.arr.shape[1]] += hull_shape_arr.arr == 1
+    return occupied
+
+
+##  No placed object is closer to another one than its offset shape allows, and all are placed in the arranger
+def assertNoOverlap(arrangers, placements, footprints):
+    for build_plate, ar in enumerate(arrangers):
+        on_build_plate = [(placement, footprint) for placement, footprint in zip(placements, footprints) if placement.build_plate == build_plate]
+        hulls = [hullCells(ar, placement.x, placement.y, footprint[1]) for placement, footprint in on_build_plate]
+        assert numpy.array_equal(sum(hulls) > 0, ar._occupied > 0)
+        for index, (placement, (offset_shape_arr, hull_shape_arr)) in enumerate(on_build_plate):
+            others = sum(hulls[:index] + hulls[index + 1:]) if len(hulls) > 1 else numpy.zeros(ar._occupied.shape)
+            assert not numpy.any(others[hullCells(ar, placement.x, placement.y, offset_shape_arr) > 0])
+
+
+def test_packCopies():
+    ar = gimmeArranger()
+    footprints = [gimmeFootprint(6)] * 20
+
+    placements = BatchPacker(ar).pack(footprints)
+
+    assert all(placement.x is not None and placement.build_plate == 0 for placement in placements)
+    assert len(set((placement.x, placement.y) for placement in placements)) == 20
+    assertNoOverlap([ar], placements, footprints)
+
+
+##  The copies that are placed first are the ones on the best spots
+def test_packCopiesBestFirst():
+    ar = gimmeArranger()
+    footprints = [gimmeFootprint(6)] * 5
+
+    placements = BatchPacker(ar).pack(footprints)
+
+    priorities = [ar._priority[placement.y + ar._offset_y, placement.x + ar._offset_x] for placement in placements]
+    assert priorities == sorted(priorities)
+
+
+##  Copies are placed around the objects that are already on the build plate
+def test_packCopiesAroundFixed():
+    ar = gimmeArranger()
+    fixed_offset_shape_arr, fixed_hull_shape_arr = gimmeFootprint(10)
+    ar.place(0, 0, fixed_hull_shape_arr)
+    footprints = [gimmeFootprint(6)] * 10
+
+    placements = BatchPacker(ar).pack(footprints)
+
+    fixed_cells = hullCells(ar, 0, 0, fixed_hull_shape_arr)
+    for placement, (offset_shape_arr, hull_shape_arr) in zip(placements, footprints):
+        assert not numpy.any(fixed_cells[hullCells(ar, placement.x, placement.y, offset_shape_arr) > 0])
+
+
+##  What doesn't fit on the build plate is not placed, unless there can be more build plates
+def test_packTooMany():
+    footprints = [gimmeFootprint(8)] * 100
+
+    ar = gimmeArranger()
+    placements = BatchPacker(ar).pack(footprints)
+    placed_count = sum(1 for placement in placements if placement.x is not None)
+    assert 0 < placed_count < 100
+
+    packer = BatchPacker(gimmeArranger(), create_arranger = gimmeArranger)
+    placements = packer.pack(footprints)
+    assert all(placement.x is not None for placement in placements)
+    assert [placement.build_plate for placement in placements] == sorted(placement.build_plate for placement in placements)
+    assert sum(1 for placement in placements if placement.build_plate == 0) == placed_count
+    assertNoOverlap(packer.getArrangers(), placements, footprints)
+
+
+##  Big objects are placed first, smaller ones fill up the build plates that are already used
+def test_packFirstFitDecreasing():
+    small = gimmeFootprint(4)
+    big = gimmeFootprint(16)
+    footprints = [small] * 10 + [big] * 8
+
+    packer = BatchPacker(gimmeArranger(), create_arranger = gimmeArranger)
+    placements = packer.pack(footprints)
+
+    assert all(placement.x is not None for placement in placements)
+    big_build_plates = set(placement.build_plate for placement in placements[10:])
+    assert len(packer.getArrangers()) == len(big_build_plates)  # The small ones didn't need another build plate.
+    assertNoOverlap(packer.getArrangers(), placements, footprints)
+
+
+##  Objects that don't fit on an empty build plate, or have no footprint, are not placed
+def test_packTooBig():
+    packer = BatchPacker(gimmeArranger(), create_arranger = gimmeArranger)
+
+    placements = packer.pack([gimmeFootprint(50), (None, None), gimmeFootprint(4)])
+
+    assert placements[0].x is None
+    assert placements[1].x is None
+    assert placements[2].x is not None
+    assert len(packer.getArrangers()) == 1
+
+
+def test_report():
+    ar = gimmeArranger()
+    offset_shape_arr, hull_shape_arr = gimmeFootprint(6)
+    packer = BatchPacker(ar)
+
+    packer.pack([(offset_shape_arr, hull_shape_arr)] * 10)
+
+    report = packer.getReport()
+    assert report.placed == 10
+    assert report.total == 10
+    assert report.build_plates == 1
+    assert report.density == pytest.approx(10 * numpy.count_nonzero(hull_shape_arr.arr) / (40 * 60))
+    assert report.time >= 0
+
+
+##  Compare the time it takes to multiply an object 200 times with finding a spot for every copy
+@pytest.mark.benchmark
+def test_benchmarkMultiply(benchmark_report):
+    footprints = [gimmeFootprint(10, min_offset = 2)] * 200
+    offset_shape_arr, hull_shape_arr = footprints[0]
+
+    packer = BatchPacker(gimmeArranger(420, 420))
+    start_time = time.time()
+    placements = packer.pack(footprints)
+    packer_time = time.time() - start_time
+    report = packer.getReport()
+
+    ar = gimmeArranger(420, 420)
+    start_time = time.time()
+    spot_count = 0
+    for i in range(200):
+        best_spot = ar.bestSpot(offset_shape_arr)
+        if best_spot.x is None:
+            break
+        ar.place(best_spot.x, best_spot.y, hull_shape_arr)
+        spot_count += 1
+    spot_time = time.time() - start_time
+
+    benchmark_report("Batch packer: %d copies in %.2f s, packing density %.1f%%" % (report.placed, packer_time, report.density * 100))
+    benchmark_report("Best spot for every copy: %d copies in %.2f s" % (spot_count, spot_time))
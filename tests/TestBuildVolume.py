@@ -0,0 +1,152 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import random
+import time
+import unittest.mock
+
+import numpy
+import pytest
+
+from UM.Math.AxisAlignedBox import AxisAlignedBox
+from UM.Math.Polygon import Polygon
+from UM.Math.Vector import Vector
+from UM.Mesh.MeshBuilder import MeshBuilder
+from UM.Scene.SceneNode import SceneNode
+
+from cura.BuildVolume import BuildVolume #The class we're testing.
+from cura.Scene.ConvexHullDecorator import ConvexHullDecorator
+from cura.Scene.CuraSceneNode import CuraSceneNode
+from cura.Scene.SliceableObjectDecorator import SliceableObjectDecorator
+
+##  A convex hull decorator with a square around the node as convex hull, so
+#   that no settings are needed to compute it.
+class SquareHullDecorator(ConvexHullDecorator):
+    def __init__(self, size = 10):
+        super().__init__()
+        self._size = size
+
+    def getConvexHull(self):
+        position = self._node.getWorldPosition()
+        half = self._size / 2
+        return Polygon(numpy.array([[-half, -half], [-half, half], [half, half], [half, -half]], numpy.float32) + [position.x, position.z])
+
+##  A build volume of 200 by 200 mm in a scene, without the rest of the
+#   application.
+class BuildVolumeScene:
+    def __init__(self):
+        self.root = SceneNode()
+
+        application = unittest.mock.MagicMock()
+        application.getGlobalContainerStack.return_value = None
+        application.getController.return_value.getScene.return_value.getRoot.return_value = self.root
+        self._patch = unittest.mock.patch("UM.Application.Application.getInstance", return_value = application)
+        self._patch.start()
+
+        self.volume = BuildVolume()
+        self.volume._global_container_stack = unittest.mock.MagicMock()
+        self.volume._global_container_stack.getProperty.return_value = "regular"
+        self.volume._volume_aabb = AxisAlignedBox(minimum = Vector(-100, -1, -100), maximum = Vector(100, 100, 100))
+
+        self.checked_nodes = []
+        check_node_boundary = self.volume._checkNodeBoundary
+        def checkNodeBoundary(node, build_volume_bounding_box):
+            self.checked_nodes.append(node)
+            return check_node_boundary(node, build_volume_bounding_box)
+        self.volume._checkNodeBoundary = checkNodeBoundary
+
+    def addNode(self, x, z, size = 10):
+        node = CuraSceneNode(self.root)
+        builder = MeshBuilder()
+        builder.addCube(size, size, size, Vector(0, size / 2, 0))
+        node.setMeshData(builder.build())
+        node.setPosition(Vector(x, 0, z))
+        node.addDecorator(SliceableObjectDecorator())
+        node.addDecorator(SquareHullDecorator(size))
+        return node
+
+    ##  Check the nodes.
+    #   \return The nodes that were checked.
+    def check(self):
+        del self.checked_nodes[:]
+        self.volume.updateNodeBoundaryCheck()
+        return self.checked_nodes
+
+    def close(self):
+        self._patch.stop()
+
+@pytest.fixture
+def build_volume_scene():
+    build_volume_scene = BuildVolumeScene()
+    yield build_volume_scene
+    build_volume_scene.close()
+
+def square(x, z, size):
+    half = size / 2
+    return Polygon(numpy.array([[x - half, z - half], [x - half, z + half], [x + half, z + half], [x + half, z - half]], numpy.float32))
+
+def test_outsideBuildArea(build_volume_scene):
+    build_volume_scene.volume.setDisallowedAreas([square(50, 50, 20)])
+    inside = build_volume_scene.addNode(0, 0)
+    in_disallowed_area = build_volume_scene.addNode(45, 45)
+    outside_volume = build_volume_scene.addNode(150, 0)
+
+    build_volume_scene.check()
+
+    assert not inside._outside_buildarea
+    assert in_disallowed_area._outside_buildarea
+    assert outside_volume._outside_buildarea
+
+##  Only the nodes that changed since the last check are checked again.
+def test_onlyChangedNodes(build_volume_scene):
+    build_volume_scene.volume.setDisallowedAreas([square(50, 50, 20)])
+    first = build_volume_scene.addNode(0, 0)
+    build_volume_scene.addNode(-50, 0)
+    assert len(build_volume_scene.check()) == 2
+
+    assert build_volume_scene.check() == []
+
+    first.setPosition(Vector(48, 0, 52))
+    assert build_volume_scene.check() == [first]
+    assert first._outside_buildarea
+
+    first.setPosition(Vector(0, 0, 0))
+    assert build_volume_scene.check() == [first]
+    assert not first._outside_buildarea
+
+##  All nodes are checked again when the disallowed areas change.
+def test_disallowedAreasChanged(build_volume_scene):
+    first = build_volume_scene.addNode(0, 0)
+    second = build_volume_scene.addNode(50, 50)
+    build_volume_scene.check()
+    assert not second._outside_buildarea
+
+    build_volume_scene.volume.setDisallowedAreas([square(50, 50, 20)])
+
+    assert build_volume_scene.check() == [first, second]
+    assert not first._outside_buildarea
+    assert second._outside_buildarea
+
+##  Check plates with more and more nodes and disallowed areas around the
+#   edges, and report how long checking all nodes takes and how long checking
+#   again after moving one node takes.
+@pytest.mark.benchmark
+@pytest.mark.parametrize("node_count", [10, 100, 1000])
+def test_benchmarkUpdateNodeBoundaryCheck(build_volume_scene, node_count, benchmark_report):
+    random.seed(node_count)
+    areas = [square(x, z, 10) for x in range(-95, 100, 10) for z in (-95, 95)]
+    areas += [square(x, z, 10) for x in (-95, 95) for z in range(-85, 90, 10)]
+    build_volume_scene.volume.setDisallowedAreas(areas)
+    nodes = [build_volume_scene.addNode(random.uniform(-95, 95), random.uniform(-95, 95), size = 5) for _ in range(node_count)]
+
+    start_time = time.perf_counter()
+    build_volume_scene.check()
+    all_time = time.perf_counter() - start_time
+
+    nodes[0].setPosition(Vector(0, 0, 0))
+    start_time = time.perf_counter()
+    checked_nodes = build_volume_scene.check()
+    changed_time = time.perf_counter() - start_time
+
+    assert checked_nodes == [nodes[0]]
+    benchmark_report("%d nodes, %d disallowed areas: checking all nodes took %.4f s, checking after moving one node took %.4f s" % (node_count, len(areas), all_time, changed_time))
@@ -0,0 +1,164 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import math
+import time
+import unittest.mock
+
+import numpy
+import pytest
+
+from UM.Math.Quaternion import Quaternion
+from UM.Math.Vector import Vector
+from UM.Mesh.MeshBuilder import MeshBuilder
+
+from cura.Scene.ConvexHullDecorator import ConvexHullDecorator #The class we're testing.
+from cura.Scene.CuraSceneNode import CuraSceneNode
+
+##  A convex hull decorator without the offsets from the settings, so that no
+#   settings are needed to compute the convex hull.
+class NoOffsetHullDecorator(ConvexHullDecorator):
+    def _offsetHull(self, convex_hull):
+        return convex_hull
+
+##  Create an ellipsoid mesh, standing on the build plate.
+#   \param rings The number of rings of faces from the top to the bottom.
+#   \param segments The number of faces around every ring.
+#   \return Mesh data with 2 * rings * segments triangles.
+def ellipsoidMesh(rings, segments, radii = (60, 40, 30)):
+    theta = numpy.linspace(0, math.pi, rings + 1)[:, numpy.newaxis]
+    phi = numpy.linspace(0, 2 * math.pi, segments, endpoint = False)[numpy.newaxis, :]
+    vertices = numpy.stack([
+        (radii[0] * numpy.sin(theta) * numpy.cos(phi)).flatten(),
+        (radii[1] * (1 - numpy.cos(theta)) * numpy.ones(phi.shape)).flatten(),
+        (radii[2] * numpy.sin(theta) * numpy.sin(phi)).flatten()
+    ], axis = 1).astype(numpy.float32)
+
+    ring_start = numpy.arange(rings)[:, numpy.newaxis] * segments
+    segment = numpy.arange(segments)[numpy.newaxis, :]
+    next_segment = (segment + 1) % segments
+    corners = [ring_start + segment, ring_start + next_segment, ring_start + segments + segment, ring_start + segments + next_segment]
+    corners = [corner.flatten() for corner in corners]
+    indices = numpy.concatenate([
+        numpy.stack([corners[0], corners[2], corners[1]], axis = 1),
+        numpy.stack([corners[1], corners[2], corners[3]], axis = 1)
+    ]).astype(numpy.int32)
+
+    builder = MeshBuilder()
+    builder.setVertices(vertices)
+    builder.setIndices(indices)
+    return builder.build()
+
+##  A node with an ellipsoid mesh and a convex hull decorator, of which the
+#   calls to the complete computation of the convex hull are counted.
+class HullNode:
+    def __init__(self, rings = 20, segments = 40):
+        application = unittest.mock.MagicMock()
+        application.getGlobalContainerStack.return_value = None
+        self._patch = unittest.mock.patch("UM.Application.Application.getInstance", return_value = application)
+        self._patch.start()
+
+        self.node = CuraSceneNode()
+        self.node.setMeshData(ellipsoidMesh(rings, segments))
+        self.decorator = NoOffsetHullDecorator()
+        self.node.addDecorator(self.decorator)
+
+        self.complete_computations = 0
+        compute = self.decorator._computeMesh2DConvexHull
+        def computeCounting(mesh, world_transform):
+            self.complete_computations += 1
+            return compute(mesh, world_transform)
+        self.decorator._computeMesh2DConvexHull = computeCounting
+
+    ##  The convex hull computed from all vertices, without any cache.
+    def completeConvexHull(self):
+        return self.decorator.__class__._computeMesh2DConvexHull(self.decorator, self.node.getMeshData(), self.node.getWorldTransformation())
+
+    def close(self):
+        self._patch.stop()
+
+@pytest.fixture
+def hull_node():
+    hull_node = HullNode()
+    yield hull_node
+    hull_node.close()
+
+##  Check that two convex hulls are the same, up to the rounding to 1/10th of
+#   a mm, by comparing how far they reach in many directions.
+def assertSameHull(hull, expected_hull):
+    angles = numpy.linspace(0, 2 * math.pi, 64, endpoint = False)
+    directions = numpy.stack([numpy.cos(angles), numpy.sin(angles)])
+    reach = hull.getPoints().dot(directions).max(axis = 0)
+    expected_reach = expected_hull.getPoints().dot(directions).max(axis = 0)
+    assert numpy.allclose(reach, expected_reach, atol = 0.15)
+
+def test_translate(hull_node):
+    hull_node.decorator.getConvexHull()
+    hull_node.node.translate(Vector(25.3, 10, -12.6))
+
+    assertSameHull(hull_node.decorator.getConvexHull(), hull_node.completeConvexHull())
+    assert hull_node.complete_computations == 0
+
+def test_rotateAroundVertical(hull_node):
+    hull_node.decorator.getConvexHull()
+    hull_node.node.rotate(Quaternion.fromAngleAxis(math.radians(30), Vector.Unit_Y))
+    hull_node.node.translate(Vector(-40, 0, 15))
+
+    assertSameHull(hull_node.decorator.getConvexHull(), hull_node.completeConvexHull())
+    assert hull_node.complete_computations == 0
+
+##  Tilting the mesh changes its shape seen from above, so the convex hull has
+#   to be computed from all vertices.
+def test_tilt(hull_node):
+    hull_node.decorator.getConvexHull()
+    hull_node.node.rotate(Quaternion.fromAngleAxis(math.radians(45), Vector.Unit_X))
+
+    assertSameHull(hull_node.decorator.getConvexHull(), hull_node.completeConvexHull())
+    assert hull_node.complete_computations == 1
+
+    # Moving the tilted mesh only moves its convex hull.
+    hull_node.node.translate(Vector(10, 0, 10))
+    assertSameHull(hull_node.decorator.getConvexHull(), hull_node.completeConvexHull())
+    assert hull_node.complete_computations == 1
+
+def test_meshChanged(hull_node):
+    hull_node.decorator.getConvexHull()
+    hull_node.node.setMeshData(ellipsoidMesh(10, 20, radii = (10, 10, 80)))
+
+    hull = hull_node.decorator.getConvexHull()
+    assertSameHull(hull, hull_node.completeConvexHull())
+    assert hull.getPoints()[:, 1].max() == pytest.approx(80, abs = 0.1)
+
+##  Move, turn and tilt an ellipsoid of a million triangles, and report how
+#   long it takes to get its convex hull compared to computing it from all
+#   vertices.
+@pytest.mark.benchmark
+def test_benchmarkConvexHull(benchmark_report):
+    hull_node = HullNode(rings = 500, segments = 1000)
+    try:
+        start_time = time.perf_counter()
+        hull_node.decorator.getConvexHull()
+        first_time = time.perf_counter() - start_time
+
+        def measure(transform, repeats = 20):
+            hull_time = 0
+            complete_time = 0
+            for index in range(repeats):
+                transform(index)
+                start_time = time.perf_counter()
+                hull_node.decorator.getConvexHull()
+                hull_time += time.perf_counter() - start_time
+                start_time = time.perf_counter()
+                hull_node.completeConvexHull()
+                complete_time += time.perf_counter() - start_time
+            return hull_time / repeats, complete_time / repeats
+
+        translate_times = measure(lambda index: hull_node.node.translate(Vector(1, 0, 0.5)))
+        rotate_times = measure(lambda index: hull_node.node.rotate(Quaternion.fromAngleAxis(math.radians(7), Vector.Unit_Y)))
+        tilt_times = measure(lambda index: hull_node.node.rotate(Quaternion.fromAngleAxis(math.radians(7), Vector.Unit_X)), repeats = 3)
+    finally:
+        hull_node.close()
+
+    benchmark_report("%d triangles: the first convex hull took %.3f s" % (len(hull_node.node.getMeshData().getIndices()), first_time))
+    for name, (hull_time, complete_time) in (("translating", translate_times), ("rotating around the vertical axis", rotate_times), ("tilting", tilt_times)):
+        benchmark_report("After %s: %.5f s, instead of %.5f s to compute it from all vertices" % (name, hull_time, complete_time))
@@ -0,0 +1,84 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+from cura.Scene.ConvexHullGrid import ConvexHullGrid #The class we're testing.
+
+def test_findNodes():
+    grid = ConvexHullGrid(cell_size = 10)
+    grid.update("a", 0, (0, 0, 5, 5))
+    grid.update("b", 0, (20, 20, 25, 25))
+    grid.update("c", 0, (4, -30, 8, 30))
+
+    assert sorted(grid.findNodes(0, (3, 3, 6, 6))) == ["a", "c"]
+    assert grid.findNodes(0, (19, 19, 21, 21)) == ["b"]
+    assert grid.findNodes(0, (40, 40, 50, 50)) == []
+
+##  Bounds that only touch are found, because their hulls may still overlap.
+def test_findNodesTouching():
+    grid = ConvexHullGrid(cell_size = 10)
+    grid.update("a", 0, (0, 0, 10, 10))
+
+    assert grid.findNodes(0, (10, 10, 20, 20)) == ["a"]
+    assert grid.findNodes(0, (-5, -5, 0, 0)) == ["a"]
+    assert grid.findNodes(0, (10.1, 0, 20, 10)) == []
+
+def test_buildPlates():
+    grid = ConvexHullGrid()
+    grid.update("a", 0, (0, 0, 5, 5))
+    grid.update("b", 1, (0, 0, 5, 5))
+
+    assert grid.findNodes(0, (0, 0, 5, 5)) == ["a"]
+    assert grid.findNodes(1, (0, 0, 5, 5)) == ["b"]
+    assert grid.findNodes(2, (0, 0, 5, 5)) == []
+
+def test_update():
+    grid = ConvexHullGrid(cell_size = 10)
+    assert grid.update("a", 0, (0, 0, 5, 5))
+    assert not grid.update("a", 0, (0, 0, 5, 5)) #Nothing changed.
+
+    assert grid.update("a", 0, (100, 100, 105, 105))
+    assert grid.findNodes(0, (0, 0, 5, 5)) == []
+    assert grid.findNodes(0, (100, 100, 101, 101)) == ["a"]
+    assert grid.getBounds("a") == (100, 100, 105, 105)
+
+    assert grid.update("a", 1, (100, 100, 105, 105))
+    assert grid.findNodes(0, (100, 100, 101, 101)) == []
+    assert grid.getBuildPlate("a") == 1
+    assert len(grid) == 1
+
+def test_remove():
+    grid = ConvexHullGrid(cell_size = 10)
+    grid.update("a", 0, (0, 0, 25, 25))
+    grid.update("b", 0, (0, 0, 5, 5))
+
+    grid.remove("a")
+    grid.remove("c") #Not in the grid, so nothing happens.
+
+    assert "a" not in grid
+    assert grid.getBounds("a") is None
+    assert grid.findNodes(0, (0, 0, 30, 30)) == ["b"]
+    assert list(grid) == ["b"]
+
+    grid.clear()
+    assert len(grid) == 0
+    assert grid.findNodes(0, (0, 0, 30, 30)) == []
+
+##  Nodes that cover a lot of cells, and searches over a lot of cells.
+def test_largeBounds():
+    grid = ConvexHullGrid(cell_size = 1)
+    grid.update("large", 0, (-1000, -1000, 1000, 1000))
+    grid.update("small", 0, (500, 500, 501, 501))
+    grid.update("other plate", 1, (500, 500, 501, 501))
+
+    assert grid.findNodes(0, (0, 0, 0.5, 0.5)) == ["large"]
+    assert sorted(grid.findNodes(0, (-2000, -2000, 2000, 2000))) == ["large", "small"]
+    assert grid.findNodes(0, (2000, 2000, 3000, 3000)) == []
+
+    grid.remove("large")
+    assert grid.findNodes(0, (0, 0, 0.5, 0.5)) == []
+
+def test_infiniteBounds():
+    grid = ConvexHullGrid()
+    grid.update("infinite", 0, (float("-inf"), 0, float("inf"), 10))
+
+    assert grid.findNodes(0, (0, 0, 1, 1)) == ["infinite"]
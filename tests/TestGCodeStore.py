@@ -0,0 +1,104 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import copy
+import io
+
+import pytest
+
+from cura.GCodeStore import GCodeStore
+
+
+def test_appendAndGet():
+    store = GCodeStore()
+    store.append(";LAYER:0\nG1 X10\n")
+    store.append(";LAYER:1\nG1 X20\n")
+    assert len(store) == 2
+    assert store[1] == ";LAYER:1\nG1 X20\n"
+    assert store.layer(-1) == ";LAYER:1\nG1 X20\n"
+    assert store[0:1] == [";LAYER:0\nG1 X10\n"]
+    assert list(store) == [";LAYER:0\nG1 X10\n", ";LAYER:1\nG1 X20\n"]
+
+
+def test_insertPrefix():
+    store = GCodeStore([";LAYER:0\n"])
+    store.insert(0, ";FLAVOR:Marlin\n")
+    assert "".join(store) == ";FLAVOR:Marlin\n;LAYER:0\n"
+
+
+def test_replaceLayers():
+    store = GCodeStore(["a" * 10, "b" * 10])
+    store[0] = "short"  # Fits in place.
+    store[1] = "c" * 100  # Needs to be stored again.
+    store[0] += "er"  # Like the post-processing scripts do.
+    assert list(store) == ["shorter", "c" * 100]
+
+
+def test_compact():
+    store = GCodeStore(["x" * 100 for _ in range(10)], max_memory = 0)
+    for _ in range(5):
+        for index in range(len(store)):
+            store[index] = store[index] + "y"  # Never fits in place.
+    assert store[3] == "x" * 100 + "y" * 5
+    # Replaced layers don't keep growing the file.
+    assert store._end < 2 * store.byteSize() + 1000
+
+
+def test_spillToDisk():
+    store = GCodeStore(max_memory = 1000)
+    for layer_number in range(100):
+        store.append(";LAYER:%d\n" % layer_number + "G1 X1 Y1 E1\n" * 10)
+    assert store._file._rolled  # Written to an actual file.
+    assert store.layer(42).startswith(";LAYER:42\n")
+
+
+def test_unicode():
+    store = GCodeStore(["; Ünïcödé\n"])
+    assert store[0] == "; Ünïcödé\n"
+    stream = io.BytesIO()
+    store.writeTo(stream)
+    assert stream.getvalue() == "; Ünïcödé\n".encode("utf-8")
+
+
+def test_index():
+    store = GCodeStore(["a", "b", "c"])
+    assert store.index("b") == 1
+    with pytest.raises(ValueError):
+        store.index("d")
+
+
+def test_deepcopy():
+    store = GCodeStore(["a", "b"])
+    copied = copy.deepcopy(store)
+    copied[0] = "changed"
+    assert store[0] == "a"
+    assert list(copied) == ["changed", "b"]
+
+
+def test_snapshot():
+    store = GCodeStore(["aaaa", "b", "c"])
+    snapshot = store.snapshot()
+    store[0] = "x"  # Would fit in place, but the file is shared.
+    store.append("d")
+    assert list(snapshot) == ["aaaa", "b", "c"]
+    assert snapshot.layerSizes() == [4, 1, 1]
+    assert list(store) == ["x", "b", "c", "d"]
+
+    snapshot.close()
+    store[1] = ""  # In place again.
+    assert store._end == len("aaaabcxd")
+
+
+def test_snapshotOutlivesStore():
+    store = GCodeStore(["x" * 100 for _ in range(10)], max_memory = 0)
+    snapshot = store.snapshot()
+    for index in range(len(store)):
+        store[index] = "y" * 200  # Compacts the file, which the snapshot still reads.
+    store.clear()
+    store.close()
+
+    assert list(snapshot) == ["x" * 100] * 10
+    stream = io.BytesIO()
+    snapshot.writeTo(stream)
+    assert stream.getvalue() == b"x" * 1000
+    snapshot.close()
@@ -0,0 +1,212 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import http.server
+import json
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+import requests
+
+from cura.Bcn3DApi import http_helper
+from cura.Bcn3DApi.DataApiService import DataApiService
+
+
+##  A local stand-in for the API, that counts the requests and connections,
+#   and can be slow or unavailable.
+class MockApiServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), MockApiRequestHandler)
+        self.url = "http://127.0.0.1:%d" % self.server_address[1]
+        self.responses = {}  # Path -> JSON to answer with.
+        self.request_count = 0
+        self.connections = set()  # The client addresses that connected.
+        self.delay = 0.0  # Seconds to wait before answering.
+        self.failures = 0  # The number of requests to answer with 503 first.
+        self._lock = threading.Lock()
+
+        thread = threading.Thread(target = self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class MockApiRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections open.
+    disable_nagle_algorithm = True  # Don't hold back the body of a response.
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._handle()
+
+    def _handle(self):
+        with self.server._lock:
+            self.server.request_count += 1
+            self.server.connections.add(self.client_address)
+            failing = self.server.failures > 0
+            if failing:
+                self.server.failures -= 1
+        time.sleep(self.server.delay)
+        if failing:
+            self._respond(503, b"")
+        elif self.path in self.server.responses:
+            self._respond(200, json.dumps(self.server.responses[self.path]).encode("utf-8"))
+        else:
+            self._respond(404, b"")
+
+    def _respond(self, status, body):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):  # The client timed out.
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = MockApiServer()
+    server.responses["/ping"] = {"pong": True}
+    monkeypatch.setattr(http_helper, "RETRY_BACKOFF", 0.01)
+    monkeypatch.setattr(http_helper, "_session", None)
+    yield server
+    server.close()
+
+
+##  All requests go over one connection.
+def test_keepAlive(server):
+    for i in range(20):
+        assert http_helper.get(server.url + "/ping").json() == {"pong": True}
+
+    assert server.request_count == 20
+    assert len(server.connections) == 1
+
+
+def test_retryUnavailable(server):
+    server.failures = 2
+
+    response = http_helper.get(server.url + "/ping")
+
+    assert response.status_code == 200
+    assert server.request_count == 3
+
+
+def test_retryGiveUp(server):
+    server.failures = 100
+
+    response = http_helper.get(server.url + "/ping")
+
+    assert response.status_code == 503
+    assert server.request_count == http_helper.RETRIES + 1
+
+
+##  A post could have been handled already, so it is not sent again.
+def test_postNotRetried(server):
+    server.failures = 1
+
+    response = http_helper.post(server.url + "/ping", {})
+
+    assert response.status_code == 503
+    assert server.request_count == 1
+
+
+def test_timeout(server, monkeypatch):
+    monkeypatch.setattr(http_helper, "TIMEOUT", (1, 0.2))
+    server.delay = 2
+
+    start_time = time.time()
+    response = http_helper.get(server.url + "/ping")
+
+    assert response.status_code == -1
+    assert time.time() - start_time < 2
+    assert server.request_count == http_helper.RETRIES + 1
+
+
+def test_connectionRefused(server):
+    closed_socket = socket.socket()
+    closed_socket.bind(("127.0.0.1", 0))
+    url = "http://127.0.0.1:%d/ping" % closed_socket.getsockname()[1]
+    closed_socket.close()
+
+    assert http_helper.get(url).status_code == -1
+
+
+##  A post that couldn't connect was not sent, so it is tried again.
+def test_postRetriedWhenRefused(server, monkeypatch):
+    closed_socket = socket.socket()
+    closed_socket.bind(("127.0.0.1", 0))
+    url = "http://127.0.0.1:%d/ping" % closed_socket.getsockname()[1]
+    closed_socket.close()
+    session = http_helper.get_session()
+    attempts = []
+    request = session.request
+    monkeypatch.setattr(session, "request", lambda *args, **kwargs: attempts.append(args) or request(*args, **kwargs))
+
+    assert http_helper.post(url, {}).status_code == -1
+    assert len(attempts) == http_helper.RETRIES + 1
+
+
+##  The printers are only asked for again when they are too old.
+def test_printersCached(server, monkeypatch):
+    monkeypatch.setattr(DataApiService, "data_api_url", server.url + "/data")
+    server.responses["/data/printers"] = [{"printerName": "Sigma", "serialNumber": "SN1"}]
+    server.responses["/data/printers/SN1"] = {"state": "Idle"}
+    service = DataApiService.getInstance()
+    service.clearCache()
+
+    for i in range(5):
+        assert service.getPrinters() == [{"printerName": "Sigma", "serialNumber": "SN1"}]
+        assert service.getPrinter("SN1") == {"state": "Idle"}
+    assert server.request_count == 2
+
+    service.clearCache()
+    service.getPrinters()
+    assert server.request_count == 3
+
+
+##  Failed requests are not remembered.
+def test_failureNotCached(server, monkeypatch):
+    monkeypatch.setattr(DataApiService, "data_api_url", server.url + "/data")
+    service = DataApiService.getInstance()
+    service.clearCache()
+
+    assert service.getPrinter("SN2") == {}
+    server.responses["/data/printers/SN2"] = {"state": "Idle"}
+    assert service.getPrinter("SN2") == {"state": "Idle"}
+
+
+##  Compare the latency of requests over the pooled connection with a new
+#   connection for every request, to a server that answers at once.
+@pytest.mark.benchmark
+def test_benchmarkPooling(server, benchmark_report):
+    request_count = 200
+
+    start_time = time.time()
+    for i in range(request_count):
+        requests.get(server.url + "/ping")
+    unpooled_time = time.time() - start_time
+    unpooled_connections = len(server.connections)
+
+    server.connections.clear()
+    start_time = time.time()
+    for i in range(request_count):
+        http_helper.get(server.url + "/ping")
+    pooled_time = time.time() - start_time
+
+    benchmark_report("%d requests: %.2f ms each over %d connections, %.2f ms each without pooling over %d connections" % (
+        request_count, pooled_time / request_count * 1000, len(server.connections), unpooled_time / request_count * 1000, unpooled_connections))
@@ -0,0 +1,183 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+
+import numpy
+import pytest #This module contains automated tests.
+import unittest.mock #For the mocking and monkeypatching functionality.
+
+from cura.CompactLayerData import CompactLayerData
+from cura.LayerDataBuilder import LayerDataBuilder #The module we're testing.
+from cura.LayerPolygon import LayerPolygon
+
+material_color_map = numpy.array([[1, 0, 0, 1], [0, 0, 1, 1]], dtype = numpy.float32)
+
+@pytest.fixture(autouse = True)
+def colorMap():
+    color_map = numpy.arange(11 * 4, dtype = numpy.float32).reshape((11, 4)) / 44
+    with unittest.mock.patch.object(LayerPolygon, "getColorMap", unittest.mock.MagicMock(return_value = color_map)):
+        yield
+
+##  Creates a builder with some layers of zig-zagging lines with all kinds of line types.
+def createBuilder(layer_count = 5, polygon_count = 3, line_count = 20, compact = False):
+    builder = LayerDataBuilder(compact = compact)
+    for layer_number in range(layer_count):
+        builder.addLayer(layer_number)
+        builder.setLayerHeight(layer_number, (layer_number + 1) * 0.2)
+        builder.setLayerThickness(layer_number, 0.2)
+        for polygon_number in range(polygon_count):
+            line_types = ((numpy.arange(line_count) // 3 + layer_number + polygon_number) % 11).astype(numpy.uint8).reshape((-1, 1))
+            points = numpy.zeros((line_count + 1, 3), dtype = numpy.float32)
+            points[:, 0] = numpy.arange(line_count + 1) + polygon_number
+            points[:, 1] = (layer_number + 1) * 0.2
+            points[:, 2] = numpy.arange(line_count + 1) % 2 + 0.123
+            line_widths = numpy.full((line_count, 1), 0.4, dtype = numpy.float32)
+            line_thicknesses = numpy.full((line_count, 1), 0.2, dtype = numpy.float32)
+            line_feedrates = numpy.full((line_count, 1), 50 + layer_number, dtype = numpy.float32)
+            polygon = LayerPolygon(polygon_number % 2, line_types, points, line_widths, line_thicknesses, line_feedrates)
+            polygon.buildCache()
+            builder.getLayer(layer_number).polygons.append(polygon)
+    return builder
+
+def assertSameMesh(layer_data, expected):
+    numpy.testing.assert_array_equal(layer_data.getVertices(), expected.getVertices())
+    numpy.testing.assert_array_equal(layer_data.getIndices(), expected.getIndices())
+    numpy.testing.assert_array_equal(layer_data.getColors(), expected.getColors())
+    for name in ["line_dimensions", "extruders", "colors", "line_types", "feedrates"]:
+        numpy.testing.assert_array_equal(layer_data.getAttribute(name)["value"], expected.getAttribute(name)["value"])
+    assert layer_data.getElementCounts() == expected.getElementCounts()
+
+##  Building the layers one at a time gives the same mesh as building them all at once, even if the buffers have to
+#   grow along the way.
+@pytest.mark.parametrize("reserved", [0, 10, 100000])
+def test_buildLayers(reserved):
+    expected = createBuilder().build(material_color_map, 0.5)
+
+    builder = createBuilder()
+    builder.reserve(reserved, reserved)
+    with unittest.mock.patch.object(LayerDataBuilder, "MinimumChunkSize", 7):
+        for layer_number in range(3):
+            builder.buildLayer(layer_number, material_color_map, 0.5)
+        layer_data = builder.build(material_color_map, 0.5)
+
+    assertSameMesh(layer_data, expected)
+
+##  The partial layer data only has the layers that are built so far.
+def test_buildPartial():
+    builder = createBuilder()
+    for layer_number in range(2):
+        builder.buildLayer(layer_number, material_color_map)
+
+    partial = builder.buildPartial()
+
+    assert sorted(partial.getLayers().keys()) == [0, 1]
+    assert sorted(partial.getElementCounts().keys()) == [0, 1]
+    assert len(partial.getVertices()) == sum(builder.getLayer(layer_number).lineMeshVertexCount() for layer_number in range(2))
+    assert len(partial.getIndices()) == sum(partial.getElementCounts().values())
+
+    #Building the other layers doesn't change the partial layer data.
+    vertices = partial.getVertices().copy()
+    layer_data = builder.build(material_color_map)
+    numpy.testing.assert_array_equal(partial.getVertices(), vertices)
+    numpy.testing.assert_array_equal(layer_data.getVertices()[:len(vertices)], vertices)
+    assert sorted(layer_data.getLayers().keys()) == [0, 1, 2, 3, 4]
+
+##  Compact layer data gives the same mesh, apart from the precision of the coordinates, line dimensions and
+#   feedrates.
+def test_compactDecompress():
+    expected = createBuilder().build(material_color_map, 0.5)
+
+    builder = createBuilder(compact = True)
+    builder.buildLayer(0, material_color_map, 0.5)
+    layer_data = builder.build(material_color_map, 0.5).decompress()
+
+    numpy.testing.assert_allclose(layer_data.getVertices(), expected.getVertices(), atol = 0.001)
+    numpy.testing.assert_array_equal(layer_data.getIndices(), expected.getIndices())
+    numpy.testing.assert_array_equal(layer_data.getColors(), expected.getColors())
+    for name in ["extruders", "colors", "line_types"]:
+        numpy.testing.assert_array_equal(layer_data.getAttribute(name)["value"], expected.getAttribute(name)["value"])
+    for name in ["line_dimensions", "feedrates"]:
+        numpy.testing.assert_allclose(layer_data.getAttribute(name)["value"], expected.getAttribute(name)["value"], rtol = 0.001)
+    assert layer_data.getElementCounts() == expected.getElementCounts()
+
+##  Only the layers that are asked for are decompressed.
+def test_compactDecompressLayers():
+    expected = createBuilder().build(material_color_map)
+    compact_layer_data = createBuilder(compact = True).build(material_color_map)
+
+    layer_data = compact_layer_data.decompress(1)
+
+    assert len(layer_data.getVertices()) == sum(expected.getLayer(layer_number).lineMeshVertexCount() for layer_number in range(2))
+    assert len(layer_data.getIndices()) == sum(compact_layer_data.getElementCounts()[layer_number] for layer_number in range(2))
+    assert sorted(layer_data.getLayers().keys()) == [0, 1, 2, 3, 4] #All layers are still known, to show the layer slider.
+
+##  The polygons are dropped once a layer is compressed, and created again from the compact arrays when a layer is
+#   asked for.
+def test_compactLayerPolygons():
+    expected = createBuilder().build(material_color_map)
+    builder = createBuilder(compact = True)
+    compact_layer_data = builder.build(material_color_map)
+
+    assert all(len(builder.getLayer(layer_number).polygons) == 0 for layer_number in range(5))
+    for layer_number in range(5):
+        layer = compact_layer_data.getLayer(layer_number)
+        expected_layer = expected.getLayer(layer_number)
+        assert layer.height == expected_layer.height
+        assert layer.lineMeshElementCount() == expected_layer.lineMeshElementCount()
+        assert len(layer.polygons) == len(expected_layer.polygons)
+        for polygon, expected_polygon in zip(layer.polygons, expected_layer.polygons):
+            assert polygon.extruder == expected_polygon.extruder
+            numpy.testing.assert_array_equal(polygon.types, expected_polygon.types)
+            numpy.testing.assert_allclose(polygon.data, expected_polygon.data, atol = 0.001)
+            numpy.testing.assert_allclose(polygon.lineWidths, expected_polygon.lineWidths, rtol = 0.001)
+            numpy.testing.assert_allclose(polygon.lineThicknesses, expected_polygon.lineThicknesses, rtol = 0.001)
+            numpy.testing.assert_allclose(polygon.lineFeedrates, expected_polygon.lineFeedrates, rtol = 0.001)
+    assert compact_layer_data.getLayer(5) is None
+
+##  The ranges of the feedrates and thicknesses are kept when a layer is compressed, so the simulation view gets them
+#   without creating the polygons of every layer.
+def test_compactLineRanges():
+    expected = createBuilder().build(material_color_map)
+    compact_layer_data = createBuilder(compact = True).build(material_color_map)
+
+    with unittest.mock.patch.object(CompactLayerData, "_createLayer") as create_layer:
+        for layer_number in range(5):
+            assert compact_layer_data.getLineRanges(layer_number) == expected.getLineRanges(layer_number)
+        assert compact_layer_data.getLineRanges(5) is None
+    assert create_layer.call_count == 0
+    assert expected.getLineRanges(2) == pytest.approx((52, 52, 0.2, 0.2))
+
+##  The first vertices of the lines are stored relative to their layer, in a larger type only if a layer is too large
+#   for the small one.
+@pytest.mark.parametrize("line_count, dtype", [(20, numpy.uint16), (70000, numpy.int32)])
+def test_compactLineStarts(line_count, dtype):
+    expected = createBuilder(layer_count = 2, polygon_count = 1, line_count = line_count).build(material_color_map)
+    compact_layer_data = createBuilder(layer_count = 2, polygon_count = 1, line_count = line_count, compact = True).build(material_color_map)
+
+    layer_data = compact_layer_data.decompress()
+
+    assert compact_layer_data._buffers["line_starts"].dtype == dtype
+    assert compact_layer_data._buffers["line_starts"].max() < expected.getLayer(0).lineMeshVertexCount()
+    numpy.testing.assert_array_equal(layer_data.getIndices(), expected.getIndices())
+
+##  Counts the bytes of the mesh of layer data.
+def layerDataSize(layer_data):
+    size = layer_data.getVertices().nbytes + layer_data.getColors().nbytes + layer_data.getIndices().nbytes
+    for name in ["line_dimensions", "extruders", "colors", "line_types", "feedrates"]:
+        size += layer_data.getAttribute(name)["value"].nbytes
+    return size
+
+def test_compactSize():
+    layer_data = createBuilder().build(material_color_map)
+    compact_layer_data = createBuilder(compact = True).build(material_color_map)
+
+    assert compact_layer_data.getByteSize() < layerDataSize(layer_data) / 3
+
+##  Compares the memory used by compact layer data to normal layer data for a large print.
+@pytest.mark.benchmark
+def test_benchmarkMemory(benchmark_report):
+    layer_data = createBuilder(layer_count = 500, polygon_count = 20, line_count = 500).build(material_color_map)
+    compact_layer_data = createBuilder(layer_count = 500, polygon_count = 20, line_count = 500, compact = True).build(material_color_map)
+
+    benchmark_report("Layer data:         %.1f MB" % (layerDataSize(layer_data) / 1024 / 1024))
+    benchmark_report("Compact layer data: %.1f MB" % (compact_layer_data.getByteSize() / 1024 / 1024))
@@ -0,0 +1,60 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import unittest.mock #For the mocking and monkeypatching functionality.
+
+import numpy
+import pytest #This module contains automated tests.
+
+from cura.LayerDataDecorator import LayerDataDecorator, _DecompressLayerDataJob #The module we're testing.
+from cura.LayerPolygon import LayerPolygon
+
+from TestLayerDataBuilder import createBuilder, material_color_map
+
+##  The jobs that were started, which only run when the test says so.
+@pytest.fixture
+def jobs():
+    started_jobs = []
+    color_map = numpy.arange(11 * 4, dtype = numpy.float32).reshape((11, 4)) / 44
+    with unittest.mock.patch.object(_DecompressLayerDataJob, "start", lambda job: started_jobs.append(job)), \
+         unittest.mock.patch.object(LayerPolygon, "getColorMap", unittest.mock.MagicMock(return_value = color_map)), \
+         unittest.mock.patch("cura.LayerDataDecorator.Application"):
+        yield started_jobs
+
+def finishJob(decorator, job):
+    job.run()
+    decorator._onLayerMeshJobFinished(job)
+
+##  Compact layer data is decompressed in a job, not while rendering.
+def test_decompressInJob(jobs):
+    decorator = LayerDataDecorator()
+    decorator.setLayerData(createBuilder(layer_count = 40, polygon_count = 1, compact = True).build(material_color_map))
+
+    assert decorator.getLayerMesh(3) is None #Nothing to render until the job is done.
+    assert len(jobs) == 1
+    assert decorator.getLayerMesh(5) is None #The same chunk of layers, so no other job.
+    assert len(jobs) == 1
+    finishJob(decorator, jobs.pop())
+
+    layer_mesh = decorator.getLayerMesh(5)
+    assert layer_mesh is not None
+    assert sorted(layer_mesh.getElementCounts()) == list(range(40))
+    assert len(layer_mesh.getIndices()) == sum(layer_mesh.getElementCounts()[layer_number] for layer_number in range(32))
+    assert jobs == []
+
+##  When other layers are asked for while a job runs, they are decompressed after it, and the old mesh is rendered in
+#   the meantime.
+def test_otherLayersWhileDecompressing(jobs):
+    decorator = LayerDataDecorator()
+    decorator.setLayerData(createBuilder(layer_count = 40, polygon_count = 1, compact = True).build(material_color_map))
+    decorator.getLayerMesh(3)
+    old_mesh_job = jobs.pop()
+    finishJob(decorator, old_mesh_job)
+
+    assert decorator.getLayerMesh(35) is old_mesh_job.getResult()
+    new_mesh_job = jobs.pop()
+    assert decorator.getLayerMesh(3) is old_mesh_job.getResult() #Back to the first chunk, but a job is running.
+    assert jobs == []
+    finishJob(decorator, new_mesh_job)
+    assert len(jobs) == 1 #The first chunk is wanted again.
+    assert jobs[0].getEndLayer() == 31
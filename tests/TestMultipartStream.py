@@ -0,0 +1,63 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import email.parser
+import io
+
+import pytest
+
+from cura.Bcn3DApi.MultipartStream import MultipartStream, UploadCancelledError
+
+
+##  Parse a multipart body like a server does.
+#   \return Dict with the content of every part by its name.
+def parseForm(stream, body):
+    message = email.parser.BytesParser().parsebytes(b"Content-Type: " + stream.getContentType().encode("utf-8") + b"\r\n\r\n" + body)
+    return {part.get_param("name", header = "content-disposition"): part.get_payload(decode = True) for part in message.get_payload()}
+
+
+def test_body():
+    data = bytes(range(256)) * 100
+    stream = MultipartStream({"key": "gcodes/1", "policy": "ümlaut"}, "file", "print.gcode.zip", io.BytesIO(data))
+
+    body = stream.read()
+
+    assert len(body) == len(stream)
+    assert parseForm(stream, body) == {"key": b"gcodes/1", "policy": "ümlaut".encode("utf-8"), "file": data}
+
+
+##  Reading in chunks gives the same body, and reports the progress.
+@pytest.mark.parametrize("chunk_size", [1, 100, 8192])
+def test_readChunks(chunk_size):
+    data = b"G1 X10 Y10\n" * 1000
+    progress = []
+    stream = MultipartStream({"key": "gcodes/1"}, "file", "print.gcode.zip", io.BytesIO(data), progress_callback = lambda sent, total: progress.append((sent, total)))
+
+    chunks = []
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        assert len(chunk) <= chunk_size
+        chunks.append(chunk)
+
+    assert parseForm(stream, b"".join(chunks))["file"] == data
+    assert progress[-1] == (len(stream), len(stream))
+    assert [sent for sent, total in progress] == sorted(sent for sent, total in progress)
+
+
+def test_iterate():
+    data = b"G1 X10 Y10\n" * 10000
+    stream = MultipartStream({}, "file", "print.gcode.zip", io.BytesIO(data))
+
+    assert parseForm(stream, b"".join(stream))["file"] == data
+
+
+def test_cancel():
+    stream = MultipartStream({}, "file", "print.gcode.zip", io.BytesIO(b"G1 X10\n" * 1000))
+    stream.read(100)
+
+    stream.cancel()
+
+    with pytest.raises(UploadCancelledError):
+        stream.read(100)
@@ -0,0 +1,193 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import random
+import time
+import unittest.mock
+
+import numpy
+import pytest
+
+from UM.Math.Polygon import Polygon
+from UM.Math.Vector import Vector
+from UM.Mesh.MeshBuilder import MeshBuilder
+from UM.Scene.Iterator.BreadthFirstIterator import BreadthFirstIterator
+from UM.Scene.Scene import Scene
+from UM.Scene.SceneNodeDecorator import SceneNodeDecorator
+
+from cura.PlatformPhysics import PlatformPhysics #The class we're testing.
+from cura.Scene.CuraSceneNode import CuraSceneNode
+
+##  A convex hull of a square around the node, which is kept while the node
+#   doesn't move, like the convex hull decorator does.
+class SquareHullDecorator(SceneNodeDecorator):
+    def __init__(self, size = 10, build_plate = 0):
+        super().__init__()
+        self._size = size
+        self._build_plate = build_plate
+        self._hull = None
+        self._hull_position = None
+
+    def getConvexHull(self):
+        position = self._node.getWorldPosition()
+        if self._hull is None or not position.equals(self._hull_position):
+            half = self._size / 2
+            self._hull = Polygon(numpy.array([[-half, -half], [-half, half], [half, half], [half, -half]], numpy.float32) + [position.x, position.z])
+            self._hull_position = position
+        return self._hull
+
+    def getConvexHullHead(self):
+        return None
+
+    def getBuildPlateNumber(self):
+        return self._build_plate
+
+##  Preferences in which objects are pushed apart but not dropped down.
+class PushFreePreferences:
+    def addPreference(self, key, default_value):
+        pass
+
+    def getValue(self, key):
+        return key == "physics/automatic_push_free"
+
+##  A scene with the physics of the platform, of which the nodes are moved as
+#   soon as the physics push them away from each other.
+class PhysicsScene:
+    def __init__(self):
+        self.scene = Scene()
+        self.controller = unittest.mock.MagicMock()
+        self.controller.getScene.return_value = self.scene
+
+        application = unittest.mock.MagicMock()
+        application.getOperationStack.return_value.push.side_effect = lambda operation: operation.redo()
+        self._patches = [
+            unittest.mock.patch("UM.Application.Application.getInstance", return_value = application),
+            unittest.mock.patch("UM.Preferences.Preferences.getInstance", lambda: PushFreePreferences()),
+            unittest.mock.patch("cura.PlatformPhysics.ConvexHullDecorator", SquareHullDecorator)
+        ]
+        for patch in self._patches:
+            patch.start()
+
+        self.physics = PlatformPhysics(self.controller, unittest.mock.MagicMock())
+
+    def addNode(self, x, z, size = 10, build_plate = 0):
+        node = CuraSceneNode(self.scene.getRoot())
+        builder = MeshBuilder()
+        builder.addCube(size, size, size, Vector(0, size / 2, 0))
+        node.setMeshData(builder.build())
+        node.setPosition(Vector(x, 0, z))
+        node.setOutsideBuildArea(False)
+        node.addDecorator(SquareHullDecorator(size, build_plate))
+        return node
+
+    def update(self):
+        self.physics._onChangeTimerFinished()
+
+    def close(self):
+        for patch in self._patches:
+            patch.stop()
+
+@pytest.fixture
+def physics_scene():
+    physics_scene = PhysicsScene()
+    yield physics_scene
+    physics_scene.close()
+
+##  The number of pairs of nodes that overlap.
+def countOverlaps(root):
+    nodes = [node for node in BreadthFirstIterator(root) if node.callDecoration("getConvexHull")]
+    overlaps = 0
+    for index, node in enumerate(nodes):
+        for other_node in nodes[index + 1:]:
+            if node.callDecoration("getBuildPlateNumber") == other_node.callDecoration("getBuildPlateNumber") and node.callDecoration("getConvexHull").intersectsPolygon(other_node.callDecoration("getConvexHull")):
+                overlaps += 1
+    return overlaps
+
+def test_pushApart(physics_scene):
+    physics_scene.addNode(0, 0)
+    physics_scene.addNode(3, 2)
+
+    for _ in range(5):
+        physics_scene.update()
+
+    assert countOverlaps(physics_scene.scene.getRoot()) == 0
+
+def test_farApart(physics_scene):
+    first = physics_scene.addNode(0, 0)
+    second = physics_scene.addNode(50, 0)
+
+    physics_scene.update()
+
+    assert first.getPosition().equals(Vector(0, 0, 0))
+    assert second.getPosition().equals(Vector(50, 0, 0))
+
+def test_otherBuildPlate(physics_scene):
+    first = physics_scene.addNode(0, 0, build_plate = 0)
+    second = physics_scene.addNode(3, 0, build_plate = 1)
+
+    physics_scene.update()
+
+    assert first.getPosition().equals(Vector(0, 0, 0))
+    assert second.getPosition().equals(Vector(3, 0, 0))
+
+##  Nodes that moved after the last update are found where they are now.
+def test_moveOnTop(physics_scene):
+    physics_scene.addNode(0, 0)
+    second = physics_scene.addNode(50, 0)
+    physics_scene.update()
+
+    second.setPosition(Vector(2, 0, 0))
+    for _ in range(5):
+        physics_scene.update()
+
+    assert countOverlaps(physics_scene.scene.getRoot()) == 0
+
+##  Nodes that were removed from the scene are forgotten.
+def test_removeNode(physics_scene):
+    physics_scene.addNode(0, 0)
+    second = physics_scene.addNode(50, 0)
+    physics_scene.update()
+
+    second.setParent(None)
+    physics_scene.update()
+    physics_scene.addNode(3, 0)
+    physics_scene.update()
+
+    assert second not in physics_scene.physics._hull_grid
+    assert len(physics_scene.physics._hull_grid) == 2
+
+def countingIterator(iterate, comparisons):
+    def iterateCounting(node, get_move_vector):
+        for other_node in iterate(node, get_move_vector):
+            comparisons.append(other_node)
+            yield other_node
+    return iterateCounting
+
+##  Update the physics of plates with more and more nodes, of which some
+#   overlap, and report how long an update takes and how many pairs of nodes
+#   were compared.
+@pytest.mark.benchmark
+@pytest.mark.parametrize("node_count", [10, 100, 250, 1000])
+def test_benchmarkUpdate(physics_scene, node_count, benchmark_report):
+    random.seed(node_count)
+    side = int(node_count ** 0.5 + 1) * 15 #Room for all nodes with some space between them.
+    for _ in range(node_count):
+        physics_scene.addNode(random.uniform(0, side), random.uniform(0, side), size = 10)
+    comparisons = []
+    physics_scene.physics._iterateNearbyNodes = countingIterator(physics_scene.physics._iterateNearbyNodes, comparisons)
+
+    start_time = time.perf_counter()
+    physics_scene.update()
+    first_time = time.perf_counter() - start_time
+    first_comparisons = len(comparisons)
+
+    # Once nothing overlaps anymore, an update only has to look around every node.
+    for _ in range(20):
+        physics_scene.update()
+    del comparisons[:]
+    start_time = time.perf_counter()
+    physics_scene.update()
+    settled_time = time.perf_counter() - start_time
+
+    benchmark_report("%d nodes: the first update took %.3f s and compared %d pairs, an update after settling took %.3f s and compared %d pairs (%d pairs for every node with every other node)" % (
+        node_count, first_time, first_comparisons, settled_time, len(comparisons), node_count * (node_count - 1)))
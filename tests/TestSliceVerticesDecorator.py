@@ -0,0 +1,166 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import copy
+import hashlib
+import math
+import time
+
+import numpy
+import pytest
+
+from UM.Math.Matrix import Matrix
+from UM.Math.Vector import Vector
+from UM.Mesh.MeshData import MeshData
+from UM.Scene.SceneNode import SceneNode
+
+from cura.Scene.SliceVerticesDecorator import SliceVerticesDecorator, collectSliceVertices, createSliceVertices #The module we're testing.
+
+def createNode(mesh_data, x = 0, z = 0):
+    node = SceneNode()
+    node.setMeshData(mesh_data)
+    node.setPosition(Vector(x, 0, z))
+    return node
+
+def createMesh(face_count, indexed = True, seed = 0):
+    random = numpy.random.RandomState(seed)
+    if indexed:
+        vertices = random.uniform(-50, 50, (face_count // 2 + 3, 3)).astype(numpy.float32)
+        indices = random.randint(0, len(vertices), (face_count, 3)).astype(numpy.int32)
+        return MeshData(vertices = vertices, indices = indices)
+    return MeshData(vertices = random.uniform(-50, 50, (face_count * 3, 3)).astype(numpy.float32))
+
+##  A world transformation that turns around the vertical axis, scales and
+#   moves.
+def createTransformation(angle = 0.0, scale = 1.0, x = 0.0, y = 0.0, z = 0.0):
+    data = numpy.identity(4)
+    data[0, 0] = data[2, 2] = math.cos(angle) * scale
+    data[0, 2] = math.sin(angle) * scale
+    data[2, 0] = -math.sin(angle) * scale
+    data[1, 1] = scale
+    data[0:3, 3] = [x, y, z]
+    return Matrix(data)
+
+##  How the vertices were computed for every object on its own.
+def transformEachObject(mesh_data, transformation):
+    rot_scale = transformation.getTransposed().getData()[0:3, 0:3]
+    translate = transformation.getData()[:3, 3]
+
+    verts = mesh_data.getVertices()
+    verts = verts.dot(rot_scale)
+    verts += translate
+
+    verts[:, [1, 2]] = verts[:, [2, 1]]
+    verts[:, 1] *= -1
+
+    indices = mesh_data.getIndices()
+    if indices is not None:
+        return numpy.take(verts, indices.flatten(), axis = 0)
+    return numpy.array(verts)
+
+@pytest.mark.parametrize("indexed", [True, False])
+def test_createSliceVertices(indexed):
+    mesh_data = createMesh(100, indexed)
+    transformations = [createTransformation(), createTransformation(0.5, 2.0, 10, 5, -20), createTransformation(0.5, 2.0, -30, 0, 40), createTransformation(x = 7)]
+
+    result = createSliceVertices(mesh_data, transformations)
+
+    assert len(result) == len(transformations)
+    for vertices, transformation in zip(result, transformations):
+        assert vertices.shape == (300, 3)
+        assert numpy.allclose(vertices, transformEachObject(mesh_data, transformation))
+
+##  Copies that share their rotation still get vertices of their own.
+def test_copiesHaveTheirOwnVertices():
+    mesh_data = createMesh(10)
+
+    first, second = createSliceVertices(mesh_data, [createTransformation(x = 1), createTransformation(x = 2)])
+
+    assert first is not second
+    assert numpy.allclose(second - first, [1, 0, 0])
+
+def test_decoratorKeepsVertices():
+    mesh_data = createMesh(10)
+    transformation = createTransformation(0.5, x = 3)
+    vertices = createSliceVertices(mesh_data, [transformation])[0]
+    decorator = SliceVerticesDecorator()
+
+    decorator.setSliceVertices(mesh_data, transformation, vertices)
+
+    assert decorator.getSliceVertices(mesh_data, createTransformation(0.5, x = 3)) is vertices #An equal transformation.
+    assert decorator.getSliceVerticesDigest() == hashlib.sha1(vertices.tobytes()).digest()
+    assert not vertices.flags.writeable
+
+def test_decoratorChanged():
+    mesh_data = createMesh(10)
+    transformation = createTransformation()
+    decorator = SliceVerticesDecorator()
+    assert decorator.getSliceVertices(mesh_data, transformation) is None
+
+    decorator.setSliceVertices(mesh_data, transformation, createSliceVertices(mesh_data, [transformation])[0])
+
+    assert decorator.getSliceVertices(mesh_data, createTransformation(x = 0.001)) is None
+    assert decorator.getSliceVertices(createMesh(10), transformation) is None #Another mesh, even with the same vertices.
+
+def test_deepcopyIsEmpty():
+    mesh_data = createMesh(10)
+    transformation = createTransformation()
+    decorator = SliceVerticesDecorator()
+    decorator.setSliceVertices(mesh_data, transformation, createSliceVertices(mesh_data, [transformation])[0])
+
+    assert copy.deepcopy(decorator).getSliceVertices(mesh_data, transformation) is None
+
+def test_collectSliceVertices():
+    shared_mesh = createMesh(20)
+    nodes = [createNode(shared_mesh, 10, 20), createNode(shared_mesh, -10, 0), createNode(createMesh(30, seed = 1), 0, 30)]
+
+    result = collectSliceVertices(nodes)
+
+    for node in nodes:
+        vertices, digest = result[id(node)]
+        assert numpy.allclose(vertices, transformEachObject(node.getMeshData(), node.getWorldTransformation()))
+        assert digest == hashlib.sha1(vertices.tobytes()).digest()
+        assert node.getDecorator(SliceVerticesDecorator) is not None
+
+##  Only the vertices of nodes that changed are computed again.
+def test_collectSliceVerticesAfterChange():
+    shared_mesh = createMesh(20)
+    nodes = [createNode(shared_mesh, 10, 20), createNode(shared_mesh, -10, 0)]
+    first_result = collectSliceVertices(nodes)
+
+    nodes[1].setPosition(Vector(-20, 0, 0))
+    result = collectSliceVertices(nodes)
+
+    assert result[id(nodes[0])][0] is first_result[id(nodes[0])][0]
+    assert result[id(nodes[1])][0] is not first_result[id(nodes[1])][0]
+    assert numpy.allclose(result[id(nodes[1])][0], transformEachObject(shared_mesh, nodes[1].getWorldTransformation()))
+
+##  Get the vertices of a plate with copies of different meshes, and report
+#   how long it takes for every object on its own, for all objects at once in
+#   worker threads, when nothing changed and when one object moved.
+@pytest.mark.benchmark
+@pytest.mark.parametrize("mesh_count", [1, 4, 16])
+def test_benchmarkCollectSliceVertices(mesh_count, benchmark_report):
+    meshes = [createMesh(100000, seed = index) for index in range(mesh_count)]
+    nodes = [createNode(mesh_data, 10 * index, 10 * copy_index) for index, mesh_data in enumerate(meshes) for copy_index in range(4)]
+
+    start_time = time.perf_counter()
+    for node in nodes:
+        hashlib.sha1(transformEachObject(node.getMeshData(), node.getWorldTransformation()).data) #The fingerprint of the slice hashed all vertices.
+    each_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    collectSliceVertices(nodes)
+    first_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    collectSliceVertices(nodes)
+    unchanged_time = time.perf_counter() - start_time
+
+    nodes[0].setPosition(Vector(-50, 0, 0))
+    start_time = time.perf_counter()
+    collectSliceVertices(nodes)
+    moved_time = time.perf_counter() - start_time
+
+    benchmark_report("%d meshes of 100000 faces with 4 copies each: %.4f s for every object on its own, %.4f s for all at once, %.6f s unchanged, %.4f s after moving one" % (
+        mesh_count, each_time, first_time, unchanged_time, moved_time))
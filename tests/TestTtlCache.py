@@ -0,0 +1,47 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+from cura.Bcn3DApi.TtlCache import TtlCache
+
+
+##  A clock that only moves when it is told to.
+class FakeClock:
+    def __init__(self):
+        self.time = 100.0
+
+    def __call__(self):
+        return self.time
+
+
+def test_getPut():
+    cache = TtlCache(10, clock = FakeClock())
+    assert cache.get("printers") is None
+    assert cache.get("printers", []) == []
+
+    cache.put("printers", ["Sigma"])
+
+    assert cache.get("printers") == ["Sigma"]
+
+
+def test_expire():
+    clock = FakeClock()
+    cache = TtlCache(10, clock = clock)
+    cache.put("printers", ["Sigma"])
+
+    clock.time += 9.9
+    assert cache.get("printers") == ["Sigma"]
+    clock.time += 0.1
+    assert cache.get("printers") is None
+
+
+def test_invalidate():
+    cache = TtlCache(10, clock = FakeClock())
+    cache.put("SN1", {"state": "Idle"})
+    cache.put("SN2", {"state": "Printing"})
+
+    cache.invalidate("SN1")
+    assert cache.get("SN1") is None
+    assert cache.get("SN2") == {"state": "Printing"}
+
+    cache.invalidate()
+    assert cache.get("SN2") is None
@@ -0,0 +1,68 @@
+# Copyright (c) 2017 Ultimaker B.V.
+# Cura is released under the terms of the LGPLv3 or higher.
+
+import io
+import tracemalloc
+import zipfile
+
+import pytest
+
+from cura.ZipStreamWriter import ZipStreamWriter
+
+
+##  A stream that can't seek, like a socket.
+class UnseekableStream:
+    def __init__(self):
+        self.data = io.BytesIO()
+
+    def write(self, data):
+        self.data.write(data)
+
+##  A stream that forgets what is written to it.
+class NullStream:
+    def write(self, data):
+        pass
+
+def gcodeLayers(layer_count, move_count = 1000):
+    for layer_number in range(layer_count):
+        yield (";LAYER:%d\n" % layer_number + "".join("G1 X%.3f Y%.3f E%.5f\n" % (index % 97, index % 89, index * 0.01) for index in range(move_count))).encode("utf-8")
+
+
+@pytest.mark.parametrize("chunks", [[], [b""], [b"G28\n"], list(gcodeLayers(20))])
+def test_readable(chunks):
+    stream = UnseekableStream()
+    writer = ZipStreamWriter(stream, "print.gcode")
+    for chunk in chunks:
+        writer.write(chunk)
+    writer.close()
+
+    with zipfile.ZipFile(io.BytesIO(stream.data.getvalue())) as zip_file:
+        assert zip_file.testzip() is None
+        assert zip_file.namelist() == ["print.gcode"]
+        assert zip_file.read("print.gcode") == b"".join(chunks)
+        assert zip_file.getinfo("print.gcode").compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_unicodeName():
+    stream = io.BytesIO()
+    writer = ZipStreamWriter(stream, "Büste.gcode")
+    writer.write(b"G28\n")
+    writer.close()
+
+    assert zipfile.ZipFile(stream).namelist() == ["Büste.gcode"]
+
+
+##  The memory that zipping takes doesn't grow with the size of the g-code.
+def test_flatMemory():
+    peaks = []
+    for layer_count in (10, 100):
+        layers = gcodeLayers(layer_count)
+        tracemalloc.start()
+        writer = ZipStreamWriter(NullStream(), "print.gcode")
+        for layer in layers:
+            writer.write(layer)
+        writer.close()
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    assert peaks[1] < peaks[0] * 1.5